@@ -0,0 +1,379 @@
+"""
+主动学习采样：从尚未人工标注的图像中挑出下一批最值得人工标注的图像。
+
+每张图像的不确定度由自动标注的缓存输出给出（不重新推理）:
+    confidence     1 - 图中最不可信目标的置信度（目标置信度与其关键点平均置信度取较小者，与复核队列一致）
+    spread         图中各目标关键点置信度标准差的平均（部分关键点可信、部分不可信，多为遮挡或姿态少见），x2 截断到 1
+    disagreement   两个模型检测数之差 / 较大者（只在提供第二个模型的预测时使用）
+按权重（默认 0.5 / 0.2 / 0.3，缺少的分量不参与）加权平均为 uncertainty。
+
+多样性用图像的外观特征（image_dedup.py 在同一次解码中缓存的 63 维 DCT 低频系数，单位向量）:
+    diversity = min(1, 到已标注/已选图像的最近距离 / radius)
+    priority  = uncertainty * (1 - w + w * diversity)，w 为多样性权重
+已标注和已选集合只会增大，priority 只会下降，因此用惰性贪心: 堆中存放 priority 的上界，弹出时只计算
+该图像到上次以来新增锚点的距离，若 priority 下降则放回堆中，否则选中并作为新锚点。
+新的预测到达时只更新对应图像的分数并压入新的堆项，不重新计算整个图像池。
+
+状态保存在预测标签目录下的 .al/state.npz，记录已读取的置信度分片（文件名 + mtime）；再次运行时
+只读取新增或更新过的分片（分布式自动标注的各块分片陆续到达时即可边跑边排序）。
+
+命令行（写出选样清单）:
+    python active_learning.py --images data/images --predictions out/labels --budget 200
+    python active_learning.py --images data/images --predictions out/labels --second out_b/labels \\
+        --labels data/labels --budget 200 --out selection.csv
+"""
+import argparse
+import csv
+import heapq
+import os
+import time
+import warnings
+
+import numpy as np
+
+from conf_sidecar import sidecar_dir
+from image_dedup import SIGNATURE_DIM, load_image_features
+
+STATE_DIRNAME = ".al"
+STATE_VERSION = 1
+DEFAULT_WEIGHTS = (0.5, 0.2, 0.3)
+
+
+def state_path(labels_dir):
+    return os.path.join(labels_dir, STATE_DIRNAME, "state.npz")
+
+
+def prediction_scores(offsets, obj_conf, kp_conf):
+    """按图像汇总置信度分片，返回 (confidence 不确定度, spread 不确定度, 检测数)，均为 (M,)"""
+    counts = np.diff(offsets)
+    if len(counts) == 0:
+        empty = np.zeros(0, dtype=np.float32)
+        return empty, empty, counts
+    per_obj = obj_conf
+    spread = np.zeros_like(obj_conf)
+    if kp_conf.shape[1] > 0:
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            # 全为 NaN 的行（关键点置信度不足 K 个时补的 NaN）会触发 RuntimeWarning
+            warnings.simplefilter("ignore", RuntimeWarning)
+            kp_mean = np.nanmean(kp_conf, axis=1)
+            spread = np.nan_to_num(np.nanstd(kp_conf, axis=1))
+        per_obj = np.fmin(obj_conf, kp_mean)
+    starts = offsets[:-1]
+    conf_u = 1.0 - np.minimum.reduceat(per_obj, starts)
+    spread_u = np.clip(2.0 * np.add.reduceat(spread, starts) / counts, 0.0, 1.0)
+    return conf_u.astype(np.float32), spread_u.astype(np.float32), counts
+
+
+class ActiveSampler:
+    """图像池的不确定度、多样性与惰性贪心选样状态"""
+
+    def __init__(self, names, signatures, weights=DEFAULT_WEIGHTS, diversity=0.5, radius=0.5):
+        self.names = np.asarray(names, dtype=str)
+        self.stems = np.array([os.path.splitext(n)[0] for n in self.names.tolist()], dtype=str)
+        self._order = np.argsort(self.stems)
+        self.signatures = np.asarray(signatures, dtype=np.float32).reshape(len(self.names), SIGNATURE_DIM)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.diversity = diversity
+        self.radius = radius
+        n = len(self.names)
+        # 各分量，NaN 表示未知；counts[m] 为第 m 个模型的检测数
+        self.conf_u = np.full(n, np.nan, dtype=np.float32)
+        self.spread_u = np.full(n, np.nan, dtype=np.float32)
+        self.counts = np.zeros((2, n), dtype=np.int32)
+        self.has_model = np.zeros(2, dtype=bool)
+        self.labeled = np.zeros(n, dtype=bool)
+        self.selected = np.zeros(n, dtype=bool)
+        self.min_dist = np.full(n, 2.0, dtype=np.float32)
+        # checked[i]: min_dist[i] 已考虑了前 checked[i] 个锚点
+        self.checked = np.zeros(n, dtype=np.int64)
+        self._anchors = np.zeros((0, SIGNATURE_DIM), dtype=np.float32)
+        self._num_anchors = 0
+        self._version = np.zeros(n, dtype=np.int64)
+        self._heap = []
+        self.shards = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    # ---------- 查找 ----------
+    def lookup(self, stems):
+        """stems -> 图像序号，不在图像池中的为 -1"""
+        stems = np.asarray(stems, dtype=str)
+        if len(self.stems) == 0 or len(stems) == 0:
+            return np.full(len(stems), -1, dtype=np.int64)
+        sorted_stems = self.stems[self._order]
+        pos = np.searchsorted(sorted_stems, stems).clip(0, len(sorted_stems) - 1)
+        return np.where(sorted_stems[pos] == stems, self._order[pos], -1)
+
+    # ---------- 分数 ----------
+    def uncertainty(self, idx=None):
+        """各图像的加权不确定度（缺少的分量不参与加权）"""
+        idx = np.arange(len(self)) if idx is None else np.asarray(idx)
+        parts = [self.conf_u[idx], self.spread_u[idx], self.disagreement(idx)]
+        total = np.zeros(len(idx), dtype=np.float32)
+        weight = np.zeros(len(idx), dtype=np.float32)
+        for w, part in zip(self.weights.tolist(), parts):
+            known = ~np.isnan(part)
+            total[known] += w * part[known]
+            weight[known] += w
+        return np.where(weight > 0, total / np.maximum(weight, 1e-6), 0.0).astype(np.float32)
+
+    def disagreement(self, idx):
+        if not self.has_model.all():
+            return np.full(len(idx), np.nan, dtype=np.float32)
+        a, b = self.counts[0, idx], self.counts[1, idx]
+        return (np.abs(a - b) / np.maximum(np.maximum(a, b), 1)).astype(np.float32)
+
+    def priority(self, idx):
+        idx = np.asarray(idx)
+        div = np.minimum(1.0, self.min_dist[idx] / self.radius)
+        return self.uncertainty(idx) * (1.0 - self.diversity + self.diversity * div)
+
+    def _push(self, idx):
+        """为 idx 中的图像压入新的堆项（旧项按版本号作废）"""
+        idx = np.asarray(idx, dtype=np.int64)
+        idx = idx[~(self.labeled[idx] | self.selected[idx])]
+        if len(idx) == 0:
+            return
+        self._version[idx] += 1
+        for i, p, v in zip(idx.tolist(), self.priority(idx).tolist(), self._version[idx].tolist()):
+            heapq.heappush(self._heap, (-p, i, v))
+
+    def rebuild_heap(self):
+        """按当前分数重建整个堆（加载状态后调用一次）"""
+        idx = np.flatnonzero(~(self.labeled | self.selected))
+        self._version[idx] += 1
+        self._heap = list(zip((-self.priority(idx)).tolist(), idx.tolist(), self._version[idx].tolist()))
+        heapq.heapify(self._heap)
+
+    # ---------- 增量更新 ----------
+    def update_predictions(self, stems, offsets, obj_conf, kp_conf, model=0):
+        """读入一批图像的自动标注置信度（一个分片），返回更新的图像数
+
+        model=0 为主模型（提供置信度和检测数），model=1 为第二个模型（只用检测数计算分歧）。
+        """
+        idx = self.lookup(stems)
+        found = idx >= 0
+        conf_u, spread_u, counts = prediction_scores(offsets, obj_conf, kp_conf)
+        idx = idx[found]
+        if model == 0:
+            self.conf_u[idx] = conf_u[found]
+            self.spread_u[idx] = spread_u[found]
+        self.counts[model, idx] = counts[found]
+        if not self.has_model[model]:
+            # 该模型的第一个分片: 分片中没有记录的图像即没有检测到目标，检测数为 0，分歧分量对所有图像生效
+            self.has_model[model] = True
+            if self.has_model.all():
+                self._push(np.arange(len(self)))
+                return int(found.sum())
+        self._push(idx)
+        return int(found.sum())
+
+    def ingest_sidecar(self, labels_dir, model=0):
+        """读取 labels_dir/.conf/ 中新增或更新过的分片，返回读取的分片数"""
+        directory = sidecar_dir(labels_dir)
+        if not directory.is_dir():
+            return 0
+        read = 0
+        for path in sorted(directory.glob("*.npz"), key=lambda p: p.stat().st_mtime_ns):
+            key = f"{model}:{path.name}"
+            mtime = path.stat().st_mtime_ns
+            if self.shards.get(key) == mtime:
+                continue
+            try:
+                with np.load(path) as data:
+                    self.update_predictions(data["stems"], data["offsets"], data["obj_conf"], data["kp_conf"], model)
+            except (OSError, ValueError, KeyError):
+                # 正在被替换的分片下次再读
+                continue
+            self.shards[key] = mtime
+            read += 1
+        return read
+
+    def _add_anchors(self, idx):
+        vectors = self.signatures[np.asarray(idx, dtype=np.int64)]
+        need = self._num_anchors + len(vectors)
+        if need > len(self._anchors):
+            grown = np.zeros((max(need, 2 * len(self._anchors), 64), SIGNATURE_DIM), dtype=np.float32)
+            grown[:self._num_anchors] = self._anchors[:self._num_anchors]
+            self._anchors = grown
+        self._anchors[self._num_anchors:need] = vectors
+        self._num_anchors = need
+
+    def mark_labeled(self, stems):
+        """把已人工标注的图像移出候选并作为多样性锚点，返回新增的数量"""
+        idx = self.lookup(stems)
+        idx = idx[idx >= 0]
+        idx = idx[~self.labeled[idx]]
+        if len(idx) == 0:
+            return 0
+        self.labeled[idx] = True
+        self.selected[idx] = False
+        self._add_anchors(idx)
+        return len(idx)
+
+    def _refresh_min_dist(self, i):
+        start = self.checked[i]
+        if start < self._num_anchors:
+            diff = self._anchors[start:self._num_anchors] - self.signatures[i]
+            d = float(np.sqrt(np.einsum("ij,ij->i", diff, diff).min()))
+            self.min_dist[i] = min(self.min_dist[i], d)
+            self.checked[i] = self._num_anchors
+
+    def next_batch(self, k):
+        """惰性贪心选出 k 张图像（依次作为锚点，使同一批内也相互分散），返回图像序号列表"""
+        picked = []
+        while self._heap and len(picked) < k:
+            _, i, version = heapq.heappop(self._heap)
+            if version != self._version[i] or self.labeled[i] or self.selected[i]:
+                continue
+            self._refresh_min_dist(i)
+            p = float(self.priority([i])[0])
+            # 其余图像的堆键都是上界，仍不低于下一个上界即可选中
+            if self._heap and p < -self._heap[0][0]:
+                heapq.heappush(self._heap, (-p, i, version))
+                continue
+            self.selected[i] = True
+            self._add_anchors([i])
+            picked.append(i)
+        return picked
+
+    def queue_order(self):
+        """文件列表中的排队顺序: 已选未标注的图像在前，其余未标注图像在后（各自按当前 priority 从高到低），已标注的在最后"""
+        selected = np.flatnonzero(self.selected)
+        selected = selected[np.argsort(-self.priority(selected), kind="stable")]
+        rest = np.flatnonzero(~(self.labeled | self.selected))
+        rest = rest[np.argsort(-self.priority(rest), kind="stable")]
+        labeled = np.flatnonzero(self.labeled)
+        return np.concatenate([selected, rest, labeled])
+
+    # ---------- 保存 / 加载 ----------
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shard_keys = np.array(list(self.shards.keys()), dtype=str)
+        shard_mtimes = np.array(list(self.shards.values()), dtype=np.int64)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, version=STATE_VERSION, names=self.names, conf_u=self.conf_u, spread_u=self.spread_u,
+                 counts=self.counts, has_model=self.has_model, labeled=self.labeled, selected=self.selected,
+                 shard_keys=shard_keys, shard_mtimes=shard_mtimes)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, image_dir, labels_dir, workers=None, **kwargs):
+        """按图像目录当前内容建立采样器，沿用 labels_dir/.al/state.npz 中仍然有效的分数和已读分片"""
+        names, _, signatures, valid = load_image_features(image_dir, workers)
+        sampler = cls(names, signatures, **kwargs)
+        path = state_path(labels_dir)
+        if os.path.exists(path):
+            try:
+                with np.load(path) as state:
+                    if int(state["version"]) == STATE_VERSION:
+                        sampler._restore(state)
+            except (OSError, ValueError, KeyError):
+                pass
+        # 无法解码的图像不参与选样
+        sampler.labeled |= ~valid
+        sampler.selected &= ~sampler.labeled
+        sampler._add_anchors(np.flatnonzero(sampler.labeled & valid))
+        sampler._add_anchors(np.flatnonzero(sampler.selected))
+        sampler.rebuild_heap()
+        return sampler
+
+    def _restore(self, state):
+        self.shards = dict(zip(state["shard_keys"].tolist(), state["shard_mtimes"].tolist()))
+        self.has_model[:] = state["has_model"]
+        old_names = state["names"]
+        if len(old_names) == 0:
+            return
+        order = np.argsort(old_names)
+        pos = np.searchsorted(old_names[order], self.names).clip(0, len(old_names) - 1)
+        src = order[pos]
+        hit = old_names[src] == self.names
+        self.conf_u[hit] = state["conf_u"][src[hit]]
+        self.spread_u[hit] = state["spread_u"][src[hit]]
+        self.counts[:, hit] = state["counts"][:, src[hit]]
+        self.labeled[hit] = state["labeled"][src[hit]]
+        self.selected[hit] = state["selected"][src[hit]]
+
+
+def human_labeled_stems(labels_dir, predictions_dir=None):
+    """人工标注过的图像 stem 集合
+
+    predictions_dir 为 None 时，人工标注与自动标注在同一目录（GUI 的用法）: 标签文件修改时间晚于
+    最新置信度分片的，或没有置信度记录的，视为人工标注；否则 labels_dir 中有标签文件的都算。
+    """
+    if not labels_dir or not os.path.isdir(labels_dir):
+        return set()
+    entries = [(e.name[:-4], e.stat().st_mtime_ns) for e in os.scandir(labels_dir)
+               if e.name.endswith(".txt") and e.is_file()]
+    if predictions_dir is not None:
+        return {stem for stem, _ in entries}
+    directory = sidecar_dir(labels_dir)
+    shards = list(directory.glob("*.npz")) if directory.is_dir() else []
+    if not shards:
+        return {stem for stem, _ in entries}
+    newest = max(p.stat().st_mtime_ns for p in shards)
+    predicted = set()
+    for path in shards:
+        with np.load(path) as data:
+            predicted.update(data["stems"].tolist())
+    return {stem for stem, mtime in entries if mtime > newest or stem not in predicted}
+
+
+def write_manifest(sampler, picked, path):
+    """写出选样清单 rank,image,priority,uncertainty,confidence,spread,disagreement,min_dist"""
+    picked = np.asarray(picked, dtype=np.int64)
+    disagreement = sampler.disagreement(picked)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", "image", "priority", "uncertainty", "confidence", "spread", "disagreement",
+                         "min_dist"])
+        for rank, (i, p, u, dis) in enumerate(zip(picked.tolist(), sampler.priority(picked).tolist(),
+                                                  sampler.uncertainty(picked).tolist(), disagreement.tolist())):
+            writer.writerow([rank + 1, sampler.names[i], f"{p:.4f}", f"{u:.4f}", f"{sampler.conf_u[i]:.4f}",
+                             f"{sampler.spread_u[i]:.4f}", f"{dis:.4f}", f"{sampler.min_dist[i]:.4f}"])
+    return path
+
+
+def select(image_dir, predictions_dir, budget, labels_dir=None, second_dir=None, out=None, workers=None,
+           weights=DEFAULT_WEIGHTS, diversity=0.5, radius=0.5):
+    """读取新增的预测分片、更新排序并选出 budget 张图像写入清单，返回选中的图像文件名列表"""
+    t0 = time.perf_counter()
+    sampler = ActiveSampler.open(image_dir, predictions_dir, workers, weights=weights, diversity=diversity,
+                                 radius=radius)
+    shards = sampler.ingest_sidecar(predictions_dir, model=0)
+    if second_dir:
+        shards += sampler.ingest_sidecar(second_dir, model=1)
+    if labels_dir:
+        sampler.mark_labeled(list(human_labeled_stems(labels_dir, predictions_dir)))
+    else:
+        sampler.mark_labeled(list(human_labeled_stems(predictions_dir)))
+    picked = sampler.next_batch(budget)
+    out = out or os.path.join(predictions_dir, "al_selection.csv")
+    write_manifest(sampler, picked, out)
+    sampler.save(state_path(predictions_dir))
+    print(f"图像池: {len(sampler)} 张，已标注 {int(sampler.labeled.sum())} 张，本次读取预测分片 {shards} 个；"
+          f"选出 {len(picked)} 张（耗时 {time.perf_counter() - t0:.2f}s），清单: {out}")
+    return sampler.names[np.asarray(picked, dtype=np.int64)].tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="主动学习采样：按自动标注不确定度和外观多样性选出下一批人工标注的图像")
+    parser.add_argument('--images', type=str, required=True, help='图像目录')
+    parser.add_argument('--predictions', type=str, required=True,
+                        help='自动标注输出的标签目录（含 .conf/ 置信度分片），状态保存在其下 .al/')
+    parser.add_argument('--second', type=str, default=None,
+                        help='第二个模型的自动标注标签目录（含 .conf/），用于计算检测数分歧')
+    parser.add_argument('--labels', type=str, default=None,
+                        help='人工标注的标签目录（默认: 与 --predictions 相同，按修改时间判断人工编辑）')
+    parser.add_argument('--budget', type=int, default=100, help='本次选出的图像数（默认: 100）')
+    parser.add_argument('--out', type=str, default=None, help='选样清单路径（默认: <predictions>/al_selection.csv）')
+    parser.add_argument('--weights', type=float, nargs=3, default=list(DEFAULT_WEIGHTS),
+                        metavar=('CONF', 'SPREAD', 'DISAGREE'), help='不确定度各分量权重（默认: 0.5 0.2 0.3）')
+    parser.add_argument('--diversity', type=float, default=0.5, help='多样性权重 0-1（默认: 0.5）')
+    parser.add_argument('--radius', type=float, default=0.5, help='外观特征距离达到该值即视为完全不同（默认: 0.5）')
+    parser.add_argument('--workers', type=int, default=None, help='计算外观特征的进程数（默认: CPU 核数）')
+    args = parser.parse_args()
+    select(args.images, args.predictions, args.budget, labels_dir=args.labels, second_dir=args.second,
+           out=args.out, workers=args.workers, weights=tuple(args.weights), diversity=args.diversity,
+           radius=args.radius)
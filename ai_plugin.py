@@ -0,0 +1,259 @@
+"""
+标注工具的 AI 自动标注插件：选择模型、推理方式、AI 标注全部图像（进度、暂停/取消、实时结果）。
+
+main.py 的 KeypointAnnotationTool(ai=True) 创建 AIPlugin 并调用 build() 把控件加到左侧面板；
+labeling_tool_without_ai.py 以 ai=False 启动，这个模块及 annotate_worker / annotate_job 等依赖都不会被导入。
+插件通过主窗口的公开方法读写当前图像和文件列表，主窗口只在以下位置回调插件:
+    file_list_refreshed()   文件列表重建后，重新标出已出结果的行
+    folder_opened()         打开新的图像文件夹
+    shutdown()              关闭窗口前，取消进行中的标注并等待收尾
+"""
+import os
+import sys
+import threading
+
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QComboBox, QFileDialog, QHBoxLayout, QLabel, QMessageBox, QProgressBar, QPushButton
+
+from annotate_job import LIVE_UPDATES_PER_SECOND, format_eta, preload_ultralytics, ultralytics_available
+from annotate_worker import AutoAnnotateWorker
+
+# 只查安装元数据，ultralytics（连带 torch）在选择模型后才在后台线程导入
+ULTRALYTICS_AVAILABLE = ultralytics_available()
+
+# 推理方式：测试时增强（翻转/多尺度推理后按置信度融合）或高分辨率大图分块推理，小目标更准，每张图像多几次前向
+INFERENCE_MODES = (("推理: 单次", None), ("推理: TTA 翻转", ("tta", (1.0,))),
+                   ("推理: TTA 翻转+多尺度", ("tta", (1.0, 1.5))), ("推理: 分块（高分辨率大图）", ("tile", 1024)))
+
+AUTO_LABELED_COLOR = QColor(0, 150, 0)
+
+
+class AIPlugin(QObject):
+    # 后台预加载 ultralytics 完成后发出错误信息（成功时为空串）
+    backendLoaded = pyqtSignal(str)
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.model_path = ""  # 用户选择的 .pt 模型路径
+        # 运行中的 AI 标注 worker 及其线程
+        self.worker = None
+        self.thread = None
+        # AI 标注过程中已出结果的图像（文件列表中标出），及合并刷新这些结果的定时器
+        self.labeled_stems = set()
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(1000 // LIVE_UPDATES_PER_SECOND)
+        self.live_timer.timeout.connect(self._apply_live_results)
+        self._backend_loading = False
+        self.backendLoaded.connect(self._on_backend_loaded)
+
+    def build(self, layout):
+        """把模型选择、推理方式、AI 标注按钮和进度控件加到 layout"""
+        self.btn_select_model = QPushButton("选择 .pt 模型")
+        self.btn_select_model.clicked.connect(self.select_model)
+        layout.addWidget(self.btn_select_model)
+
+        self.lbl_model_path = QLabel("未选择模型")
+        layout.addWidget(self.lbl_model_path)
+
+        self.infer_combo = QComboBox()
+        for text, spec in INFERENCE_MODES:
+            self.infer_combo.addItem(text, spec)
+        layout.addWidget(self.infer_combo)
+
+        self.btn_auto_annotate = QPushButton("AI 标注全部图像")
+        self.btn_auto_annotate.clicked.connect(self.auto_annotate_all)
+        layout.addWidget(self.btn_auto_annotate)
+
+        # AI 标注进度（吞吐量、剩余时间）与暂停/取消，只在运行时显示
+        self.progress_bar = QProgressBar()
+        self.lbl_progress = QLabel()
+        self.btn_pause = QPushButton("暂停")
+        self.btn_pause.clicked.connect(self.toggle_pause)
+        self.btn_cancel = QPushButton("取消")
+        self.btn_cancel.clicked.connect(self.cancel)
+        controls = QHBoxLayout()
+        controls.addWidget(self.btn_pause)
+        controls.addWidget(self.btn_cancel)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.lbl_progress)
+        layout.addLayout(controls)
+        self._set_progress_visible(False)
+
+    def _set_progress_visible(self, visible):
+        for w in (self.progress_bar, self.lbl_progress, self.btn_pause, self.btn_cancel):
+            w.setVisible(visible)
+
+    def select_model(self):
+        """选择已训练好的 .pt 模型（独立于手动标注）"""
+        window = self.window
+        file_path, _ = QFileDialog.getOpenFileName(window, "选择模型文件(.pt/.pth)", filter="模型文件 (*.pt *.pth);;所有文件 (*)")
+        if file_path:
+            self.model_path = file_path
+            self.lbl_model_path.setText(os.path.basename(file_path))
+            window.status_bar.showMessage(f"已选择模型: {file_path}")
+            if not ULTRALYTICS_AVAILABLE:
+                QMessageBox.warning(window, "依赖缺失", "ultralytics 库未检测到，自动标注功能将无法运行。请 pip install ultralytics")
+            elif not self._backend_loading and "ultralytics" not in sys.modules:
+                # 用户挑选图像、确认对话框的同时在后台导入，点击“AI 标注”时不再等待
+                self._backend_loading = True
+                window.status_bar.showMessage(f"已选择模型: {file_path}（正在后台加载 ultralytics...）")
+                threading.Thread(target=self._preload_backend, daemon=True).start()
+
+    def _preload_backend(self):
+        try:
+            preload_ultralytics()
+            self.backendLoaded.emit("")
+        except Exception as e:
+            self.backendLoaded.emit(str(e))
+
+    def _on_backend_loaded(self, error):
+        self._backend_loading = False
+        if error:
+            QMessageBox.warning(self.window, "依赖缺失", f"ultralytics 导入失败，自动标注功能将无法运行: {error}")
+        else:
+            self.window.status_bar.showMessage(
+                f"ultralytics 已加载，可以开始 AI 标注（模型: {os.path.basename(self.model_path)}）")
+
+    def auto_annotate_all(self):
+        """开始对当前 image_dir 中所有图片进行 AI 标注（后台线程执行）"""
+        window = self.window
+        if not ULTRALYTICS_AVAILABLE:
+            QMessageBox.warning(window, "错误", "ultralytics 库未安装，无法执行自动标注。")
+            return
+        if not self.model_path:
+            QMessageBox.warning(window, "错误", "请先选择 .pt 模型")
+            return
+        if not window.image_dir:
+            QMessageBox.warning(window, "错误", "请先选择图像文件夹")
+            return
+
+        box = QMessageBox(window)
+        box.setWindowTitle("确认")
+        box.setText("开始对所有图像执行 AI 标注？\n\n"
+                    "合并：保留人工标注过的目标，只补充新检测到的目标；\n"
+                    "覆盖：用预测结果覆盖 labels 目录中已有的标签文件。")
+        btn_merge = box.addButton("合并（保留人工标注）", QMessageBox.AcceptRole)
+        btn_overwrite = box.addButton("覆盖", QMessageBox.DestructiveRole)
+        box.addButton("取消", QMessageBox.RejectRole)
+        box.setDefaultButton(btn_merge)
+        box.exec_()
+        if box.clickedButton() not in (btn_merge, btn_overwrite):
+            return
+        merge = box.clickedButton() is btn_merge
+
+        window.status_bar.showMessage("AI 标注进行中...（后台）")
+        self.btn_auto_annotate.setEnabled(False)
+        self.btn_select_model.setEnabled(False)
+        # TTA 按关键点最多的类别的关键点名称推出翻转时的左右互换
+        keypoint_names = max((c["keypoints"] for c in window.categories), key=len, default=[])
+        # 覆盖模式在结束时才移入预测：在实时预览上修改过（已保存或仍在自动保存日志中）的图像保留人工标注
+        worker = AutoAnnotateWorker(self.model_path, window.image_dir, window.get_labels_dir(), merge=merge,
+                                    inference=self.infer_combo.currentData(), keypoint_names=keypoint_names,
+                                    has_unsaved=window.journal.has_unsaved)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self._on_progress)
+        worker.finished.connect(self._on_done)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self.worker, self.thread = worker, thread
+        self.labeled_stems = set()
+        self.live_timer.start()
+        self.progress_bar.setValue(0)
+        self.lbl_progress.setText("AI 标注: 加载模型...")
+        self.btn_pause.setText("暂停")
+        self._set_progress_visible(True)
+        self.btn_pause.setEnabled(True)
+        self.btn_cancel.setEnabled(True)
+        thread.start()
+
+    def _apply_live_results(self):
+        """定时取出 worker 新出的结果：标出文件列表中的行，当前图像有新结果且未编辑时立即显示"""
+        if self.worker is None:
+            return
+        latest = self.worker.drain_results()
+        if not latest:
+            return
+        window = self.window
+        self.labeled_stems.update(latest)
+        window.mark_file_rows(latest, AUTO_LABELED_COLOR, "AI 已标注")
+        image_name = window.current_image_name()
+        text = latest.get(os.path.splitext(image_name)[0]) if image_name else None
+        if text is None:
+            return
+        if window.history.can_undo() or window.dragging:
+            # 不打断正在进行的编辑，结束后重新加载时再显示
+            window.status_bar.showMessage(f"{image_name} 已有 AI 标注结果，当前图像有未保存的编辑，暂不刷新")
+            return
+        try:
+            window.show_label_text(text)
+        except ValueError as e:
+            window.status_bar.showMessage(f"解析 AI 标注结果时出错: {str(e)}")
+            return
+        window.status_bar.showMessage(f"已显示 AI 标注结果: {image_name}")
+
+    def _on_progress(self, done, total, rate, eta):
+        """worker 的进度信号（已合并为每 0.2 秒至多一次）"""
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+        state = "已暂停" if self.worker is not None and self.worker.paused else f"剩余 {format_eta(eta)}"
+        self.lbl_progress.setText(f"AI 标注: {done}/{total}  {rate:.1f} 张/s  {state}")
+
+    def toggle_pause(self):
+        if self.worker is None:
+            return
+        if self.worker.paused:
+            self.worker.resume()
+            self.btn_pause.setText("暂停")
+            self.window.status_bar.showMessage("AI 标注已继续")
+        else:
+            self.worker.pause()
+            self.btn_pause.setText("继续")
+            self.window.status_bar.showMessage("AI 标注已暂停（当前图像处理完后停下）")
+
+    def cancel(self):
+        """取消 AI 标注：当前图像处理完后停止，已推理图像的标签照常写入"""
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        self.btn_pause.setEnabled(False)
+        self.btn_cancel.setEnabled(False)
+        self.window.status_bar.showMessage("正在取消 AI 标注...（当前图像处理完后停止）")
+
+    def _on_done(self, success, message, cancelled=False):
+        window = self.window
+        # 取出最后一批结果（finished 信号之前放入的都已在队列中）
+        self._apply_live_results()
+        self.live_timer.stop()
+        self.worker = self.thread = None
+        self.btn_auto_annotate.setEnabled(True)
+        self.btn_select_model.setEnabled(True)
+        self._set_progress_visible(False)
+        window.status_bar.showMessage(message)
+        if success:
+            window.labels_changed_on_disk()
+            QMessageBox.information(window, "AI 标注已取消" if cancelled else "AI 标注完成", message)
+            try:
+                window.load_annotation_file()
+            except Exception:
+                pass
+        else:
+            QMessageBox.critical(window, "AI 标注失败", message)
+
+    def file_list_refreshed(self):
+        self.window.mark_file_rows(self.labeled_stems, AUTO_LABELED_COLOR, "AI 已标注")
+
+    def folder_opened(self):
+        self.labeled_stems = set()
+
+    def shutdown(self):
+        if self.thread is not None:
+            # 取消进行中的 AI 标注并等它收尾（已推理图像的标签、置信度和来源记录照常写完）
+            self.worker.finished.disconnect(self._on_done)
+            self.worker.cancel()
+            self.thread.quit()
+            self.thread.wait()
@@ -0,0 +1,289 @@
+"""
+对一个图像目录全部图像做 AI 标注的任务（不依赖 Qt）：GUI 的 AutoAnnotateWorker（annotate_worker.py）
+和无界面的 label_api.Dataset.auto_annotate 都用它。
+
+    job = AnnotateJob("best.pt", "data/images", "data/labels", merge=True, on_progress=print)
+    success, message, cancelled = job.run()
+
+    on_progress(已完成, 总数, 张/秒, 预计剩余秒数)   最多每 PROGRESS_INTERVAL 秒调用一次（最后一张必调），在 run() 的线程中
+
+每张图像写入（合并模式）或推理出（覆盖模式，结束时才移入标签目录）的标签文本放进线程安全的 results 队列，
+GUI 用不超过 LIVE_UPDATES_PER_SECOND 次/秒的定时器 drain_results()，实时刷新当前图像和文件列表
+（不逐张发信号，大批量时也不会刷屏事件循环）。
+
+pause() / resume() / cancel() 可以在其他线程直接调用（只设置 threading.Event），run() 在两张图像之间检查:
+暂停时阻塞在 run() 的线程里，取消时停止推理并照常收尾——
+    合并模式   每张图像在循环内已原子写入，收尾只保存置信度和来源分片（只含已处理的图像）
+    覆盖模式   已推理图像的预测标签（推理时已按 6 位小数写入临时目录）照常移入标签目录，其余图像的标签保持不变
+因此取消后标签目录、.conf/ 与 .provenance/ 始终互相一致。所有文件操作都在 run() 的线程完成。
+覆盖模式的预测结束时才移入标签目录，运行期间被人工保存过或还有未保存修改的标签（例如在实时预览上修改）不覆盖，
+在返回的消息中列出。
+"""
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from importlib import metadata
+from pathlib import Path
+
+from conf_sidecar import ConfidenceWriter
+from label_diff import snapshot_labels
+from label_merge import LabelMerger, ProvenanceWriter, auto_shard_name, result_text
+from postprocess import run_postprocess
+from work_queue import IMAGE_EXTS
+
+PROGRESS_INTERVAL = 0.2
+LIVE_UPDATES_PER_SECOND = 5
+
+
+def ultralytics_available():
+    """按安装元数据判断 ultralytics 是否可用；不导入（导入会连带加载 torch，耗时数秒）"""
+    try:
+        metadata.version("ultralytics")
+    except metadata.PackageNotFoundError:
+        return False
+    return True
+
+
+def preload_ultralytics():
+    """导入 ultralytics（GUI 选择模型后在后台线程调用），之后 worker 中的导入直接命中 sys.modules"""
+    from ultralytics import YOLO  # noqa: F401
+
+
+def make_predictor(model, spec, keypoint_names=()):
+    """按推理方式 spec（("tta", 尺度) 或 ("tile", 块边长)）构造 TTA / 分块推理器
+
+    TTA 按关键点名称推出翻转时的左右互换。
+    """
+    from tiled_inference import TiledPredictor
+    from tta_inference import TTAPredictor, flip_index_from_names
+
+    kind, param = spec
+    if kind == "tile":
+        return TiledPredictor(model, tile=param)
+    flip_idx = flip_index_from_names(list(keypoint_names)) if keypoint_names else None
+    return TTAPredictor(model, scales=param, flip=True, flip_idx=flip_idx)
+
+
+def format_six_decimals(path):
+    """把标签文件改写为严格六位小数（类别 ID 保持整数），ultralytics save_txt 输出的是 %g 格式"""
+    lines = []
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.strip().split()
+            new_parts = []
+            for idx, p in enumerate(parts):
+                try:
+                    if idx == 0:
+                        new_parts.append(str(int(float(p))))
+                    else:
+                        new_parts.append(f"{float(p):.6f}")
+                except ValueError:
+                    new_parts.append(p)
+            lines.append(" ".join(new_parts))
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def label_states(labels_dir):
+    """{标签文件名: (字节数, 修改时间 ns)}，用来找出运行期间被其他程序（如 GUI 保存）改写的标签"""
+    with os.scandir(labels_dir) as it:
+        return {e.name: _file_state(e) for e in it if e.name.endswith(".txt") and e.is_file()}
+
+
+def _file_state(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def format_eta(seconds):
+    if seconds is None or seconds != seconds or seconds == float("inf"):
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class AnnotateJob:
+    """对 image_dir 中全部图像推理并写入 labels_dir；merge 为合并模式，inference 为 TTA / 分块推理方式
+
+    model 为模型权重路径，或已加载的模型对象（接口同 YOLO.predict）。has_unsaved(标签路径) 在覆盖模式收尾时
+    （run() 的线程中）对每个预测的图像调用，返回 True 表示该标签在别处（如 GUI 的自动保存日志）还有未写回的修改，不覆盖。
+    """
+
+    def __init__(self, model, image_dir, labels_dir, merge=False, inference=None, keypoint_names=(),
+                 on_progress=None, has_unsaved=None):
+        self.model = model
+        self.image_dir = image_dir
+        self.labels_dir = Path(labels_dir)
+        self.merge = merge
+        self.inference = inference
+        self.keypoint_names = list(keypoint_names)
+        self.on_progress = on_progress
+        self.has_unsaved = has_unsaved
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancel = threading.Event()
+        self._last_emit = 0.0
+        # (stem, 标签文本)，run() 的线程放入、GUI 线程取出
+        self.results = queue.SimpleQueue()
+
+    # 以下三个方法在其他线程调用
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    def cancel(self):
+        self._cancel.set()
+        self._resume.set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    def _keep_going(self):
+        """两张图像之间调用：暂停时在此阻塞，返回 False 表示已取消"""
+        self._resume.wait()
+        return not self._cancel.is_set()
+
+    def drain_results(self):
+        """取出目前为止的全部结果（GUI 线程调用），返回 {stem: 标签文本}，同一图像只保留最新的"""
+        latest = {}
+        while True:
+            try:
+                stem, text = self.results.get_nowait()
+            except queue.Empty:
+                return latest
+            latest[stem] = text
+
+    def _report(self, done, total, start, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last_emit < PROGRESS_INTERVAL:
+            return
+        self._last_emit = now
+        rate = done / max(now - start, 1e-6)
+        eta = (total - done) / rate if rate > 0 else float("inf")
+        if self.on_progress is not None:
+            self.on_progress(done, total, rate, eta)
+
+    def _iter_results(self, model, predictor, sources, **predict_kwargs):
+        """逐张推理；被取消时停止（ultralytics 的流式生成器随之关闭）"""
+        results = (predictor.predict(sources) if predictor is not None
+                   else model.predict(source=sources, stream=True, verbose=False, **predict_kwargs))
+        for result in results:
+            yield result
+            if not self._keep_going():
+                break
+
+    def run(self):
+        """执行标注，返回 (是否成功, 消息, 是否被取消)；失败时不抛异常"""
+        try:
+            return self._run()
+        except Exception as e:
+            return False, f"AI 标注失败: {str(e)}", self._cancel.is_set()
+
+    def load_model(self):
+        """在 run() 的线程中加载模型；已传入模型对象时直接使用"""
+        if not isinstance(self.model, (str, os.PathLike)):
+            return self.model
+        from ultralytics import YOLO
+        return YOLO(str(self.model))
+
+    def _edited(self, stem, initial):
+        """覆盖模式收尾时：该图像的标签在运行期间被人工保存过，或还有未写回的修改"""
+        path = self.labels_dir / (stem + ".txt")
+        if _file_state(path) != initial.get(path.name):
+            return True
+        return self.has_unsaved is not None and self.has_unsaved(str(path))
+
+    def _run(self):
+        model = self.load_model()
+        predictor = make_predictor(model, self.inference, self.keypoint_names) if self.inference else None
+        sources = [os.path.join(self.image_dir, n) for n in sorted(os.listdir(self.image_dir))
+                   if n.lower().endswith(IMAGE_EXTS)]
+        total = len(sources)
+        self.labels_dir.mkdir(parents=True, exist_ok=True)
+        # 置信度单独写入 labels/.conf/ 旁路文件，供复核队列排序
+        conf_writer = ConfidenceWriter(self.labels_dir)
+        start = time.perf_counter()
+        done = 0
+        self._report(0, total, start, force=True)
+
+        if self.merge:
+            # 在推理的流式循环中逐张合并，不生成临时预测目录，也不需要之后的移动和格式修正
+            merger = LabelMerger(self.labels_dir)
+            try:
+                for result in self._iter_results(model, predictor, sources, save=False):
+                    conf_writer.add_result(result)
+                    stem = Path(result.path).stem
+                    text = merger.merge(stem, result_text(result))
+                    if text:
+                        self.results.put((stem, text))
+                    done += 1
+                    self._report(done, total, start)
+            finally:
+                conf_writer.save()
+                merger.close()
+            message = f"AI 合并标注{'已取消' if self._cancel.is_set() else '完成'}（{done}/{total} 张），{merger.summary()}"
+        else:
+            # 覆盖前保留现有标签（labels/.prev_labels/），之后可用“对比标签”查看 AI 标注改动了哪些标注；
+            # 合并模式不覆盖人工标注，不做快照
+            snapshot_labels(str(self.labels_dir))
+            # 预测结束时才移入标签目录：运行期间人工保存过的标签（如在实时预览上修改后保存）不能被覆盖
+            initial = label_states(self.labels_dir)
+            edited = []
+            # 预测标签先写到临时目录，结束时再移入标签目录
+            tmp_root = tempfile.mkdtemp(prefix="auto_annot_")
+            default_labels_dir = Path(tmp_root) / "predictions" / "labels"
+            default_labels_dir.mkdir(parents=True, exist_ok=True)
+            # 覆盖写出的预测标签全部记为模型目标，之后合并标注时可被新预测替换
+            provenance = ProvenanceWriter(self.labels_dir, auto_shard_name())
+            predicted = []
+            try:
+                for result in self._iter_results(model, predictor, sources, save=False):
+                    conf_writer.add_result(result)
+                    if result.boxes is not None and len(result.boxes):
+                        stem = Path(result.path).stem
+                        provenance.add_model(stem, len(result.boxes))
+                        predicted.append(stem)
+                        # 实时预览与最终移入标签目录的是同一份文本（列同 save_txt，已是 6 位小数）
+                        text = result_text(result)
+                        (default_labels_dir / (stem + ".txt")).write_text(text)
+                        self.results.put((stem, text))
+                    done += 1
+                    self._report(done, total, start)
+            finally:
+                # 取消时同样移动已推理图像的标签，并保存与之对应的置信度和来源记录
+                moved = 0
+                if default_labels_dir.is_dir():
+                    edited = [stem for stem in predicted if self._edited(stem, initial)]
+                    if edited:
+                        # 保留人工标注，丢弃这些图像的预测及其置信度、来源记录
+                        for stem in edited:
+                            (default_labels_dir / (stem + ".txt")).unlink(missing_ok=True)
+                        conf_writer.discard(edited)
+                        provenance.discard(edited)
+                    # 单遍移动预测标签（一次目录扫描，同盘 rename，跨盘自动退回复制）
+                    moved = run_postprocess(str(default_labels_dir), str(self.labels_dir), verbose=False)["labels"]
+                # 置信度分片在标签移入之后保存，主动学习按“标签晚于分片”识别人工编辑时不会误判
+                conf_writer.save()
+                provenance.save()
+                shutil.rmtree(tmp_root, ignore_errors=True)
+            message = (f"AI 标注{'已取消' if self._cancel.is_set() else '完成'}（{done}/{total} 张），"
+                       f"已生成 {moved} 个标签文件，存放于: {self.labels_dir}")
+            if edited:
+                names = "、".join(edited[:5]) + (" 等" if len(edited) > 5 else "")
+                message += f"；{len(edited)} 张图像在 AI 标注期间被人工修改，已保留人工标注、未覆盖: {names}"
+        if predictor is not None:
+            message += f"；{predictor.summary()}"
+        self._report(done, total, start, force=True)
+        return True, message, self._cancel.is_set()
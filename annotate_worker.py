@@ -0,0 +1,44 @@
+"""
+AI 标注全部图像的后台 worker：把 AnnotateJob（annotate_job.py）包装为 QObject，moveToThread 到 QThread 中运行。
+
+    progress(已完成, 总数, 张/秒, 预计剩余秒数)   最多每 PROGRESS_INTERVAL 秒发一次（最后一张必发），不会刷屏事件循环
+    finished(成功, 消息, 是否被取消)
+
+pause() / resume() / cancel() / drain_results() 在 GUI 线程直接调用，转给 AnnotateJob。
+"""
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from annotate_job import AnnotateJob
+
+
+class AutoAnnotateWorker(QObject):
+    """参数同 AnnotateJob（不含 on_progress）"""
+
+    progress = pyqtSignal(int, int, float, float)
+    finished = pyqtSignal(bool, str, bool)
+
+    def __init__(self, model, image_dir, labels_dir, merge=False, inference=None, keypoint_names=(),
+                 has_unsaved=None):
+        super().__init__()
+        self.job = AnnotateJob(model, image_dir, labels_dir, merge=merge, inference=inference,
+                               keypoint_names=keypoint_names, on_progress=self.progress.emit,
+                               has_unsaved=has_unsaved)
+
+    def pause(self):
+        self.job.pause()
+
+    def resume(self):
+        self.job.resume()
+
+    def cancel(self):
+        self.job.cancel()
+
+    @property
+    def paused(self):
+        return self.job.paused
+
+    def drain_results(self):
+        return self.job.drain_results()
+
+    def run(self):
+        self.finished.emit(*self.job.run())
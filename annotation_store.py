@@ -0,0 +1,358 @@
+"""
+单张图像的标注数据模型，底层为连续的 NumPy 数组。
+
+原先 self.annotations 是 dict 列表，每个关键点是 3 元素 Python list，显示、保存、点击检测都要
+逐点 float()/int() 转换。这里改为:
+    keypoints   float64 (N, K, 3)   归一化 x, y 和可见性 v；K 为当前最大关键点数，多余位置补 0
+    num_kps     int32   (N,)        每个目标实际的关键点数
+    class_ids   int32   (N,)
+    bboxes      float64 (N, 4)      读入时的 x_center y_center w h（保存时按可见关键点重新计算）
+    ids         int64   (N,)        稳定的目标 id，删除其他目标后不变，供 AnnotationView 定位
+坐标使用 float64，保存结果与原先 Python float 的实现逐字节一致。数组按容量倍增，追加是摊还 O(1)。
+UI 通过 AnnotationView（只保存 store 和 id 的轻量视图）访问单个目标。
+"""
+import itertools
+
+import numpy as np
+
+_id_counter = itertools.count(1)
+
+
+def new_object_id():
+    """分配一个新的稳定目标 id（所有 store 共用一个计数器，id 全局唯一）"""
+    return next(_id_counter)
+
+
+def _normalize_xy(xy, img_w, img_h):
+    """像素坐标转归一化：与原实现一致，逐点判断 x>1 或 y>1 时才除以宽高（原地修改）"""
+    pixel = (xy[..., 0] > 1.0) | (xy[..., 1] > 1.0)
+    if pixel.any():
+        xy[..., 0] = np.where(pixel, xy[..., 0] / img_w, xy[..., 0])
+        xy[..., 1] = np.where(pixel, xy[..., 1] / img_h, xy[..., 1])
+    return xy
+
+
+def parse_keypoint_block(values, img_w, img_h):
+    """把若干行 bbox 之后的数值 (R, C) 一次性解析为 (R, M, 3) 关键点数组
+
+    与 main.py 原 parse_keypoints_with_v 一致：
+        数值个数能被 3 整除时按 (x, y, v) 解析，v 一律视为 2（可见）；
+        否则能被 2 整除时按 (x, y) 解析，x、y 均非 0 时 v=2，否则 v=0；
+        其他情况没有关键点。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rows, n = values.shape
+    if n and n % 3 == 0:
+        kps = values.reshape(rows, -1, 3).copy()
+        kps[..., 2] = 2
+    elif n % 2 == 0:
+        xy = values.reshape(rows, -1, 2)
+        kps = np.empty(xy.shape[:2] + (3,), dtype=np.float64)
+        kps[..., :2] = xy
+        kps[..., 2] = np.where((xy[..., 0] != 0) & (xy[..., 1] != 0), 2, 0)
+    else:
+        return np.zeros((rows, 0, 3), dtype=np.float64)
+    _normalize_xy(kps[..., :2], img_w, img_h)
+    return kps
+
+
+def parse_keypoint_values(values, img_w, img_h):
+    """单行版本的 parse_keypoint_block，返回 (M, 3)"""
+    values = np.asarray(values, dtype=np.float64).reshape(1, -1)
+    return parse_keypoint_block(values, img_w, img_h)[0]
+
+
+class AnnotationView:
+    """单个目标的轻量视图，只保存 store 与稳定 id；目标被删除后 index 为 -1"""
+
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, obj_id):
+        self.store = store
+        self.id = obj_id
+
+    @property
+    def index(self):
+        return self.store.index_of(self.id)
+
+    @property
+    def category_id(self):
+        return int(self.store.class_ids[self.index])
+
+    @property
+    def keypoints(self):
+        """(num_kps, 3) 数组视图，修改会直接写回 store"""
+        i = self.index
+        return self.store.keypoints[i, :self.store.num_kps[i]]
+
+    @property
+    def bbox(self):
+        return self.store.bboxes[self.index]
+
+    def __eq__(self, other):
+        return isinstance(other, AnnotationView) and other.store is self.store and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self.store), self.id))
+
+
+class AnnotationStore:
+    """单张图像全部目标的数组存储"""
+
+    def __init__(self, width=0, capacity=8):
+        self._n = 0
+        self._kps = np.zeros((capacity, width, 3), dtype=np.float64)
+        self._nkp = np.zeros(capacity, dtype=np.int32)
+        self._cls = np.zeros(capacity, dtype=np.int32)
+        self._bbox = np.zeros((capacity, 4), dtype=np.float64)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+
+    # ---------- 基本访问 ----------
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return (AnnotationView(self, int(obj_id)) for obj_id in self._ids[:self._n])
+
+    def __getitem__(self, index):
+        if not -self._n <= index < self._n:
+            raise IndexError(index)
+        if index < 0:
+            index += self._n
+        return AnnotationView(self, int(self._ids[index]))
+
+    @property
+    def keypoints(self):
+        return self._kps[:self._n]
+
+    @property
+    def num_kps(self):
+        return self._nkp[:self._n]
+
+    @property
+    def class_ids(self):
+        return self._cls[:self._n]
+
+    @property
+    def bboxes(self):
+        return self._bbox[:self._n]
+
+    @property
+    def ids(self):
+        return self._ids[:self._n]
+
+    @property
+    def width(self):
+        return self._kps.shape[1]
+
+    def index_of(self, obj_id):
+        hits = np.flatnonzero(self._ids[:self._n] == obj_id)
+        return int(hits[0]) if hits.size else -1
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self._kps, self._nkp, self._cls, self._bbox, self._ids))
+
+    def to_arrays(self):
+        """当前全部目标数组的副本 (keypoints, num_kps, class_ids, bboxes, ids)，与 from_arrays 互逆"""
+        n = self._n
+        return tuple(arr[:n].copy() for arr in (self._kps, self._nkp, self._cls, self._bbox, self._ids))
+
+    @classmethod
+    def from_arrays(cls, keypoints, num_kps, class_ids, bboxes, ids):
+        """由 to_arrays 的结果重建（保留原目标 id，回放编辑命令时按 id 定位）"""
+        n = len(ids)
+        store = cls(width=keypoints.shape[1] if keypoints.ndim == 3 else 0, capacity=max(n, 8))
+        store._kps[:n] = keypoints
+        store._nkp[:n] = num_kps
+        store._cls[:n] = class_ids
+        store._bbox[:n] = bboxes
+        store._ids[:n] = ids
+        store._n = n
+        return store
+
+    # ---------- 容量管理 ----------
+    def _reserve(self, capacity):
+        if capacity <= self._kps.shape[0]:
+            return
+        capacity = max(capacity, self._kps.shape[0] * 2, 8)
+        for name in ("_kps", "_nkp", "_cls", "_bbox", "_ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def ensure_width(self, width):
+        """保证关键点维度至少为 width，新增位置补 0（不可见）"""
+        if width <= self.width:
+            return
+        new = np.zeros((self._kps.shape[0], width, 3), dtype=np.float64)
+        new[:, :self.width] = self._kps
+        self._kps = new
+
+    # ---------- 增删改 ----------
+    def add(self, class_id, keypoints=None, num_kps=0, bbox=None, obj_id=None):
+        """追加一个目标，keypoints 为 (M, 3) 数组；不给 keypoints 时创建 num_kps 个不可见点，返回视图"""
+        return self.insert(self._n, class_id, keypoints, num_kps, bbox, obj_id)
+
+    def insert(self, index, class_id, keypoints=None, num_kps=0, bbox=None, obj_id=None):
+        """在 index 处插入一个目标（撤销删除时用于恢复原位置），参数同 add"""
+        if keypoints is not None:
+            keypoints = np.asarray(keypoints, dtype=np.float64).reshape(-1, 3)
+            num_kps = keypoints.shape[0]
+        self._reserve(self._n + 1)
+        self.ensure_width(num_kps)
+        i = index
+        n = self._n
+        for arr in (self._kps, self._nkp, self._cls, self._bbox, self._ids):
+            arr[i + 1:n + 1] = arr[i:n]
+        self._kps[i] = 0
+        if keypoints is not None:
+            self._kps[i, :num_kps] = keypoints
+        self._nkp[i] = num_kps
+        self._cls[i] = class_id
+        self._bbox[i] = bbox if bbox is not None else 0
+        self._ids[i] = obj_id if obj_id is not None else next(_id_counter)
+        self._n += 1
+        return AnnotationView(self, int(self._ids[i]))
+
+    def remove(self, index):
+        n = self._n
+        for arr in (self._kps, self._nkp, self._cls, self._bbox, self._ids):
+            arr[index:n - 1] = arr[index + 1:n]
+        self._n -= 1
+
+    def clear(self):
+        self._n = 0
+
+    def set_class(self, index, class_id, needed):
+        """修改目标类别，并把关键点数补齐/截断为 needed"""
+        self.ensure_width(needed)
+        self._kps[index, needed:] = 0
+        self._nkp[index] = needed
+        self._cls[index] = class_id
+
+    def restore_class(self, index, class_id, num_kps, tail=None):
+        """set_class 的逆操作：恢复类别和关键点数，tail 为被截断的关键点 (num_kps - needed, 3)"""
+        self.ensure_width(num_kps)
+        current = int(self._nkp[index])
+        self._kps[index, num_kps:] = 0
+        if tail is not None and len(tail):
+            self._kps[index, current:current + len(tail)] = tail
+        self._nkp[index] = num_kps
+        self._cls[index] = class_id
+
+    def resize_keypoints(self, index, needed):
+        """只增不减：关键点数不足 needed 时补不可见点"""
+        if self._nkp[index] < needed:
+            self.ensure_width(needed)
+            self._nkp[index] = needed
+
+    def set_keypoint(self, index, k, x, y, v=2):
+        if k >= self._nkp[index]:
+            self.resize_keypoints(index, k + 1)
+        self._kps[index, k] = (x, y, v)
+
+    def move_keypoint(self, index, k, x, y):
+        self._kps[index, k, 0] = x
+        self._kps[index, k, 1] = y
+
+    # ---------- 查询 ----------
+    def hit_test(self, index, x_px, y_px, img_w, img_h, radius=10.0):
+        """返回 radius 像素内最近的可见关键点序号，没有则返回 -1"""
+        kps = self._kps[index, :self._nkp[index]]
+        if kps.shape[0] == 0:
+            return -1
+        d2 = (kps[:, 0] * img_w - x_px) ** 2 + (kps[:, 1] * img_h - y_px) ** 2
+        d2 = np.where(kps[:, 2] > 0, d2, np.inf)
+        k = int(np.argmin(d2))
+        return k if d2[k] < radius * radius else -1
+
+    def first_free_keypoint(self, index, needed):
+        """类别定义的前 needed 个关键点中第一个不可见点的序号（必要时先补齐），没有则返回 -1"""
+        self.resize_keypoints(index, needed)
+        free = np.flatnonzero(self._kps[index, :needed, 2] == 0)
+        return int(free[0]) if free.size else -1
+
+    def last_visible_keypoint(self, index):
+        vis = np.flatnonzero(self._kps[index, :self._nkp[index], 2] > 0)
+        return int(vis[-1]) if vis.size else -1
+
+    def visible_points(self):
+        """所有可见关键点: (目标序号, 关键点序号, x, y) 四个一维数组，用于批量绘制"""
+        n = self._n
+        if n == 0 or self.width == 0:
+            empty = np.zeros(0)
+            return empty.astype(np.int64), empty.astype(np.int64), empty, empty
+        mask = self._kps[:n, :, 2] > 0
+        mask &= np.arange(self.width)[None, :] < self._nkp[:n, None]
+        obj_idx, kp_idx = np.nonzero(mask)
+        pts = self._kps[obj_idx, kp_idx]
+        return obj_idx, kp_idx, pts[:, 0], pts[:, 1]
+
+    # ---------- 读写 YOLO 文本 ----------
+    @classmethod
+    def from_yolo_text(cls, text, img_w, img_h):
+        """解析 YOLO keypoints 标签文本（少于 5 列的行忽略），关键点坐标统一为归一化"""
+        rows = [line.split() for line in text.splitlines()]
+        rows = [r for r in rows if len(r) >= 5]
+        store = cls()
+        if not rows:
+            return store
+        store._reserve(len(rows))
+        # 按列数分组后整组转换为数组，避免逐值 float()
+        by_len = {}
+        for i, r in enumerate(rows):
+            by_len.setdefault(len(r), []).append(i)
+        parsed = [None] * len(rows)
+        for ncol, idxs in by_len.items():
+            data = np.array([rows[i] for i in idxs], dtype=np.float64)
+            kp_all = parse_keypoint_block(data[:, 5:], img_w, img_h)
+            for j, i in enumerate(idxs):
+                parsed[i] = (int(data[j, 0]), data[j, 1:5], kp_all[j])
+        for class_id, bbox, kps in parsed:
+            store.add(class_id, keypoints=kps, bbox=bbox)
+        return store
+
+    def to_yolo_text(self, category_sizes, img_w, img_h):
+        """按 main.py 的保存格式生成标签文本
+
+        每个目标的关键点数补齐/截断为其类别定义的数量（未知类别保持自身数量），
+        没有可见关键点的目标跳过；bbox 由可见关键点的外接框计算；不可见点写 0 0；统一 6 位小数。
+        """
+        n = self._n
+        if n == 0:
+            return ""
+        sizes = np.asarray(category_sizes, dtype=np.int64)
+        cls_ids = self._cls[:n].astype(np.int64)
+        known = (cls_ids >= 0) & (cls_ids < sizes.size)
+        needed = np.where(known, sizes[np.clip(cls_ids, 0, max(sizes.size - 1, 0))] if sizes.size else 0,
+                          self._nkp[:n])
+        width = int(needed.max()) if n else 0
+        self.ensure_width(width)
+
+        kps = self._kps[:n, :width].copy()
+        # 超出各自 needed 的位置视为不存在；超出自身 num_kps 的位置本来就是 0
+        in_range = np.arange(width)[None, :] < needed[:, None]
+        kps[~in_range] = 0
+        _normalize_xy(kps[..., :2], img_w, img_h)
+        visible = (kps[..., 2] > 0) & in_range
+        keep = visible.any(axis=1)
+
+        # 不可见点用 ±inf 占位，不参与外接框；没有可见点的目标会被 keep 跳过
+        x_min = np.where(visible, kps[..., 0], np.inf).min(axis=1)
+        x_max = np.where(visible, kps[..., 0], -np.inf).max(axis=1)
+        y_min = np.where(visible, kps[..., 1], np.inf).min(axis=1)
+        y_max = np.where(visible, kps[..., 1], -np.inf).max(axis=1)
+        with np.errstate(invalid="ignore"):
+            boxes = np.stack([(x_min + x_max) / 2.0, (y_min + y_max) / 2.0, x_max - x_min, y_max - y_min], axis=1)
+        coords = np.where(visible[..., None], kps[..., :2], 0.0)
+
+        lines = []
+        formats = {}
+        for i in np.flatnonzero(keep):
+            m = int(needed[i])
+            fmt = formats.get(m)
+            if fmt is None:
+                fmt = formats[m] = "%d" + " %.6f" * (4 + 2 * m) + "\n"
+            lines.append(fmt % ((int(cls_ids[i]),) + tuple(boxes[i].tolist()) + tuple(coords[i, :m].ravel().tolist())))
+        return "".join(lines)
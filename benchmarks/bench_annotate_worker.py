@@ -0,0 +1,208 @@
+"""
+AI 标注 worker 基准：后台推理期间 GUI 事件循环是否被阻塞、进度信号频率、暂停与取消后标签目录是否一致。
+
+不需要真实模型: 在临时目录生成 --images 张小图像，用一个“假模型”代替 YOLO（每张图像 sleep --infer-ms 毫秒
+模拟前向，并输出 1~3 个带关键点的目标；覆盖模式下像 ultralytics 的 save_txt 一样以 %g 格式写临时标签）。
+AutoAnnotateWorker 照常 moveToThread 到 QThread 中运行，主线程用 5 ms 的 QTimer 测量事件循环的最大间隔。
+每种模式（覆盖 / 合并）跑两遍:
+    完整运行   事件循环最大间隔、进度信号次数（每秒至多 1 / PROGRESS_INTERVAL 次）、吞吐量，
+               以及像 GUI 一样按 LIVE_UPDATES_PER_SECOND 定时取出的实时结果数和合并后的刷新次数
+    暂停+取消  处理到一半时暂停 --pause-ms 毫秒（检查暂停期间没有新图像完成），继续后再取消；
+               检查已写入的标签都是六位小数、置信度分片与来源分片恰好覆盖已推理的图像、临时目录已清理
+
+用法:
+    python benchmarks/bench_annotate_worker.py
+    python benchmarks/bench_annotate_worker.py --images 500 --infer-ms 2
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QThread, QTimer  # noqa: E402
+
+from annotate_job import LIVE_UPDATES_PER_SECOND  # noqa: E402
+from annotate_worker import AutoAnnotateWorker  # noqa: E402
+from conf_sidecar import load_confidence_index  # noqa: E402
+from label_merge import load_provenance  # noqa: E402
+
+
+class _Tensor:
+    """ultralytics 结果中张量的最小替身（.cpu().numpy() / .int().tolist()）"""
+
+    def __init__(self, array):
+        self.array = np.asarray(array)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+    def int(self):
+        return _Tensor(self.array.astype(np.int64))
+
+    def tolist(self):
+        return self.array.tolist()
+
+
+class _Boxes:
+    def __init__(self, xywhn, conf, cls):
+        self.xywhn, self.conf, self.cls = _Tensor(xywhn), _Tensor(conf), _Tensor(cls)
+
+    def __len__(self):
+        return len(self.conf.array)
+
+
+class FakeModel:
+    """接口与 YOLO.predict(stream=True) 一致的假模型"""
+
+    def __init__(self, infer_ms, keypoints=4):
+        self.infer_ms = infer_ms
+        self.keypoints = keypoints
+        self.rng = np.random.default_rng(0)
+
+    def predict(self, source, stream=True, save_txt=False, project=None, name=None, **kwargs):
+        for path in source:
+            time.sleep(self.infer_ms / 1000.0)
+            n = int(self.rng.integers(1, 4))
+            xywhn = self.rng.uniform(0.1, 0.9, (n, 4))
+            kps = self.rng.uniform(0.1, 0.9, (n, self.keypoints, 2))
+            result = SimpleNamespace(path=path, names={0: "obj"},
+                                     boxes=_Boxes(xywhn, self.rng.uniform(0.3, 1.0, n), np.zeros(n)),
+                                     keypoints=SimpleNamespace(xyn=_Tensor(kps),
+                                                               conf=_Tensor(self.rng.uniform(0, 1, (n, self.keypoints)))))
+            if save_txt:
+                out = Path(project) / name / "labels"
+                out.mkdir(parents=True, exist_ok=True)
+                rows = np.concatenate([xywhn, kps.reshape(n, -1)], axis=1)
+                (out / (Path(path).stem + ".txt")).write_text(
+                    "".join("0 " + " ".join(f"{v:g}" for v in row) + "\n" for row in rows))
+            yield result
+
+
+def run_once(app, args, image_dir, labels_dir, merge, interrupt):
+    """运行一次 worker，返回统计字典"""
+    worker = AutoAnnotateWorker(FakeModel(args.infer_ms), image_dir, labels_dir, merge=merge)
+    thread = QThread()
+    worker.moveToThread(thread)
+    stats = {"max_gap": 0.0, "signals": 0, "done": 0, "paused_advance": None, "result": None,
+             "live": set(), "refreshes": 0}
+    last_tick = [time.perf_counter()]
+    pause = {}
+
+    def tick():
+        now = time.perf_counter()
+        stats["max_gap"] = max(stats["max_gap"], now - last_tick[0])
+        last_tick[0] = now
+
+    def drain():
+        latest = worker.drain_results()
+        if latest:
+            stats["live"].update(latest)
+            stats["refreshes"] += 1
+
+    def on_progress(done, total, rate, eta):
+        stats["signals"] += 1
+        stats["done"] = done
+        if interrupt and not pause and done >= total // 2:
+            worker.pause()
+            pause["done"] = done
+            QTimer.singleShot(args.pause_ms, resume_then_cancel)
+
+    def resume_then_cancel():
+        # 暂停前最后一张可能还在处理中，允许多完成一张
+        stats["paused_advance"] = stats["done"] - pause["done"]
+        worker.resume()
+        # 用 lambda 在主线程直接调用（worker.cancel 作为槽会排队到正忙于推理的 worker 线程）
+        QTimer.singleShot(20, lambda: worker.cancel())
+
+    def on_finished(success, message, cancelled):
+        drain()
+        stats["result"] = (success, message, cancelled)
+        thread.quit()
+
+    timer = QTimer()
+    timer.setInterval(5)
+    timer.timeout.connect(tick)
+    live_timer = QTimer()
+    live_timer.setInterval(1000 // LIVE_UPDATES_PER_SECOND)
+    live_timer.timeout.connect(drain)
+    thread.started.connect(worker.run)
+    worker.progress.connect(on_progress)
+    worker.finished.connect(on_finished)
+    thread.finished.connect(app.quit)
+    t0 = time.perf_counter()
+    timer.start()
+    live_timer.start()
+    thread.start()
+    app.exec_()
+    thread.wait()
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+
+def check_consistency(labels_dir):
+    """(标签数, 全部六位小数, 置信度分片覆盖的图像与标签一致, 来源记录覆盖的图像与标签一致)"""
+    stems = set()
+    six = True
+    for path in Path(labels_dir).glob("*.txt"):
+        stems.add(path.stem)
+        for line in path.read_text().splitlines():
+            six &= all(len(v.split(".")[1]) == 6 for v in line.split()[1:])
+    index = load_confidence_index(labels_dir)
+    conf_stems = set(index.stems.tolist()) if index is not None else set()
+    return len(stems), six, conf_stems == stems, set(load_provenance(labels_dir)) == stems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI 标注 worker 基准")
+    parser.add_argument("--images", type=int, default=300, help="图像数（默认: 300）")
+    parser.add_argument("--infer-ms", type=float, default=5.0, help="假模型每张图像的推理耗时，毫秒（默认: 5）")
+    parser.add_argument("--pause-ms", type=int, default=300, help="暂停时长，毫秒（默认: 300）")
+    args = parser.parse_args()
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    tmp = tempfile.mkdtemp(prefix="bench_worker_")
+    tmp_before = set(os.listdir(tempfile.gettempdir()))
+    try:
+        image_dir = os.path.join(tmp, "images")
+        os.makedirs(image_dir)
+        blank = np.zeros((32, 32, 3), dtype=np.uint8)
+        for i in range(args.images):
+            cv2.imwrite(os.path.join(image_dir, f"img_{i:05d}.png"), blank)
+        print(f"图像: {args.images} 张  假模型推理: {args.infer_ms} ms/张")
+        for merge in (False, True):
+            for interrupt in (False, True):
+                labels_dir = os.path.join(tmp, f"labels_{int(merge)}_{int(interrupt)}")
+                stats = run_once(app, args, image_dir, labels_dir, merge, interrupt)
+                success, message, cancelled = stats["result"]
+                count, six, conf_ok, prov_ok = check_consistency(labels_dir)
+                mode = "合并" if merge else "覆盖"
+                kind = "暂停+取消" if interrupt else "完整运行"
+                print(f"[{mode}/{kind}] 成功 {success}  已取消 {cancelled}  完成 {stats['done']}/{args.images}  "
+                      f"{stats['done'] / stats['seconds']:.0f} 张/s")
+                print(f"    事件循环最大间隔 {stats['max_gap'] * 1e3:.1f} ms  进度信号 {stats['signals']} 次"
+                      f"（{stats['signals'] / stats['seconds']:.1f} 次/s）")
+                print(f"    实时结果 {len(stats['live'])} 张，合并为 {stats['refreshes']} 次界面刷新")
+                if interrupt:
+                    print(f"    暂停 {args.pause_ms} ms 期间完成的图像: {stats['paused_advance']}")
+                print(f"    标签 {count} 个  六位小数 {six}  置信度分片一致 {conf_ok}  来源记录一致 {prov_ok}")
+        leaked = [n for n in set(os.listdir(tempfile.gettempdir())) - tmp_before if n.startswith("auto_annot_")]
+        print(f"残留临时预测目录: {len(leaked)}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+标注数据模型基准：原 dict-of-lists 实现 vs AnnotationStore。
+
+生成一张含 N 个目标、每个 K 个关键点的标签文本，分别测量
+    load   解析标签文本为内存中的标注
+    edit   逐个目标移动一个关键点、撤销一个关键点（模拟拖拽/撤销）
+    save   生成保存用的标签文本
+三个阶段的耗时和加载后常驻内存（tracemalloc），并检查两种实现保存的文本一致。
+
+用法:
+    python benchmarks/bench_annotation_store.py
+    python benchmarks/bench_annotation_store.py --objects 2000 --keypoints 17 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import AnnotationStore  # noqa: E402
+
+IMG_W, IMG_H = 1920, 1080
+
+
+def make_label_text(num_objects, num_kps, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(num_objects):
+        values = [i % 3, 0.5, 0.5, 0.1, 0.1]
+        for _ in range(num_kps):
+            if rng.random() < 0.2:
+                values += [0.0, 0.0]
+            else:
+                values += [rng.uniform(0.01, 0.99), rng.uniform(0.01, 0.99)]
+        lines.append(" ".join(f"{v:.6f}" if isinstance(v, float) else str(v) for v in values))
+    return "\n".join(lines) + "\n"
+
+
+# ---------- 原实现（摘自 main.py 重构前的解析/编辑/保存循环） ----------
+def legacy_parse_keypoints(parts, img_w, img_h):
+    kp_data = list(map(float, parts))
+    keypoints = []
+    if len(kp_data) % 3 == 0:
+        for i in range(0, len(kp_data), 3):
+            x, y = kp_data[i], kp_data[i + 1]
+            if x > 1.0 or y > 1.0:
+                x = x / img_w
+                y = y / img_h
+            keypoints.append([x, y, 2])
+    elif len(kp_data) % 2 == 0:
+        for i in range(0, len(kp_data), 2):
+            x, y = kp_data[i], kp_data[i + 1]
+            if x > 1.0 or y > 1.0:
+                x = x / img_w
+                y = y / img_h
+            v = 2 if (x != 0 and y != 0) else 0
+            keypoints.append([x, y, v])
+    return keypoints
+
+
+def legacy_load(text, categories):
+    annotations = []
+    for line in text.splitlines():
+        parts = line.strip().split()
+        if len(parts) < 5:
+            continue
+        category_id = int(parts[0])
+        bbox = list(map(float, parts[1:5]))
+        keypoints = legacy_parse_keypoints(parts[5:], IMG_W, IMG_H) if len(parts) > 5 else []
+        normalized_keypoints = []
+        for x, y, v in keypoints:
+            if x > 1.0 or y > 1.0:
+                x, y = x / IMG_W, y / IMG_H
+            normalized_keypoints.append([x, y, v])
+        needed = len(categories[category_id]["keypoints"])
+        while len(normalized_keypoints) < needed:
+            normalized_keypoints.append([0.0, 0.0, 0])
+        annotations.append({"category_id": category_id, "bbox": bbox, "keypoints": normalized_keypoints})
+    return annotations
+
+
+def legacy_edit(annotations):
+    for ann in annotations:
+        kps = ann["keypoints"]
+        kps[0][0] = 0.25
+        kps[0][1] = 0.75
+        kps[0][2] = 2
+        for i in range(len(kps) - 1, -1, -1):
+            if kps[i][2] > 0:
+                kps[i][2] = 0
+                break
+
+
+def legacy_save(annotations, categories):
+    out = []
+    for annotation in annotations:
+        category_id = int(annotation.get("category_id", 0))
+        keypoints = annotation.get("keypoints", [])
+        needed = len(categories[category_id]["keypoints"])
+        kps = [list(k) for k in keypoints]
+        while len(kps) < needed:
+            kps.append([0.0, 0.0, 0])
+        kps = kps[:needed]
+        valid_points = [kp for kp in kps if kp[2] > 0]
+        if not valid_points:
+            continue
+        xs, ys = [], []
+        for kp in valid_points:
+            x, y = float(kp[0]), float(kp[1])
+            if x > 1.0 or y > 1.0:
+                x, y = x / IMG_W, y / IMG_H
+            xs.append(x)
+            ys.append(y)
+        x_min, x_max = min(xs), max(xs)
+        y_min, y_max = min(ys), max(ys)
+        out.append(f"{category_id} {(x_min + x_max) / 2.0:.6f} {(y_min + y_max) / 2.0:.6f} "
+                   f"{x_max - x_min:.6f} {y_max - y_min:.6f}")
+        for kp in kps:
+            x, y, v = float(kp[0]), float(kp[1]), int(kp[2])
+            if x > 1.0 or y > 1.0:
+                x, y = x / IMG_W, y / IMG_H
+            out.append(f" {x:.6f} {y:.6f}" if v > 0 else f" {0.0:.6f} {0.0:.6f}")
+        out.append("\n")
+    return "".join(out)
+
+
+# ---------- AnnotationStore ----------
+def store_load(text, categories):
+    store = AnnotationStore.from_yolo_text(text, IMG_W, IMG_H)
+    for i, cid in enumerate(store.class_ids.tolist()):
+        store.resize_keypoints(i, len(categories[cid]["keypoints"]))
+    return store
+
+
+def store_edit(store):
+    for i in range(len(store)):
+        store.set_keypoint(i, 0, 0.25, 0.75, 2)
+        k = store.last_visible_keypoint(i)
+        if k >= 0:
+            store.keypoints[i, k, 2] = 0
+
+
+def store_save(store, categories):
+    return store.to_yolo_text([len(c["keypoints"]) for c in categories], IMG_W, IMG_H)
+
+
+def measure(func, *args, repeat=3):
+    """返回 (最小耗时, 结果常驻内存字节, 结果)；计时与内存统计分开跑，避免 tracemalloc 影响计时"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    result = func(*args)
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return best, current, result
+
+
+def _timed_edit(load, edit, text, categories):
+    model = load(text, categories)
+    t0 = time.perf_counter()
+    edit(model)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标注数据模型基准（dict-of-lists vs AnnotationStore）")
+    parser.add_argument("--objects", type=int, default=500, help="目标数（默认: 500）")
+    parser.add_argument("--keypoints", type=int, default=17, help="每个目标的关键点数（默认: 17）")
+    parser.add_argument("--repeat", type=int, default=5, help="计时重复次数，取最小值（默认: 5）")
+    args = parser.parse_args()
+
+    text = make_label_text(args.objects, args.keypoints)
+    categories = [{"name": f"class_{i}", "keypoints": [f"kp{k}" for k in range(args.keypoints)]} for i in range(3)]
+
+    rows = []
+    for name, load, edit, save in [("dict-of-lists", legacy_load, legacy_edit, legacy_save),
+                                   ("AnnotationStore", store_load, store_edit, store_save)]:
+        t_load, m_load, model = measure(load, text, categories, repeat=args.repeat)
+        # 编辑会修改数据，每次都在新加载的副本上做
+        t_edit = min(_timed_edit(load, edit, text, categories) for _ in range(args.repeat))
+        edit(model)
+        t_save, m_save, saved = measure(save, model, categories, repeat=args.repeat)
+        rows.append((name, t_load, t_edit, t_save, m_load, saved))
+
+    print(f"目标数: {args.objects}  关键点数: {args.keypoints}")
+    print(f"{'实现':<18}{'load(ms)':>10}{'edit(ms)':>10}{'save(ms)':>10}{'合计(ms)':>10}{'常驻内存(KB)':>14}")
+    for name, t_load, t_edit, t_save, m_load, _ in rows:
+        total = t_load + t_edit + t_save
+        print(f"{name:<18}{t_load * 1e3:>10.2f}{t_edit * 1e3:>10.2f}{t_save * 1e3:>10.2f}{total * 1e3:>10.2f}"
+              f"{m_load / 1024:>14.1f}")
+    base, new = rows
+    print(f"\n保存结果一致: {base[5] == new[5]}  "
+          f"总耗时: {sum(base[1:4]) / max(1e-9, sum(new[1:4])):.2f}x  内存: {base[4] / max(1, new[4]):.1f}x 减少")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+数据集标签库基准：建库、mmap 加载、增量刷新以及常见的数据集级查询耗时。
+
+在临时目录中生成 --images 个标签文件（每个 --objects 个目标，10% 为空标签），然后:
+    build      并行解析全部 txt 并写入 .store/
+    load       mmap 加载
+    refresh    无变化时的增量刷新（只 stat，不解析）
+    查询       类别计数、无目标图像、小目标所在图像、关键点可见率
+    update     保存一张图像后的同步，以及同步后的第一次查询（需要合并增量）
+    统计       数据集统计面板的全量汇总与保存单张图像后的增量更新
+
+用法:
+    python benchmarks/bench_dataset_store.py                       # 20000 张 x 50 个目标 = 90 万目标
+    python benchmarks/bench_dataset_store.py --images 5000 --objects 20
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_stats import LabelStats  # noqa: E402
+from dataset_store import DatasetLabelStore  # noqa: E402
+
+
+def make_fixture(labels_dir, num_images, num_objects, num_kps, seed=0):
+    rng = np.random.default_rng(seed)
+    fmt = "%d" + " %.6f" * (4 + 2 * num_kps) + "\n"
+    for i in range(num_images):
+        n = 0 if i % 10 == 0 else num_objects
+        values = rng.random((n, 4 + 2 * num_kps))
+        classes = rng.integers(0, 5, n)
+        with open(os.path.join(labels_dir, f"img_{i:07d}.txt"), "w") as f:
+            f.write("".join(fmt % ((c,) + tuple(v)) for c, v in zip(classes.tolist(), values.tolist())))
+
+
+def timed(func, repeat=1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据集标签库基准")
+    parser.add_argument("--images", type=int, default=20000, help="标签文件数（默认: 20000）")
+    parser.add_argument("--objects", type=int, default=50, help="每个标签文件的目标数（默认: 50）")
+    parser.add_argument("--keypoints", type=int, default=4, help="每个目标的关键点数（默认: 4）")
+    parser.add_argument("--workers", type=int, default=None, help="建库时的进程数（默认: CPU 核数）")
+    parser.add_argument("--root", type=str, default=None, help="临时目录所在位置")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_store_", dir=args.root)
+    try:
+        make_fixture(root, args.images, args.objects, args.keypoints)
+        rows = []
+        t, store = timed(lambda: DatasetLabelStore.build(root, args.workers))
+        rows.append(("build", t))
+        rows.append(("load (mmap)", timed(lambda: DatasetLabelStore.load(root), repeat=3)[0]))
+        store = DatasetLabelStore.load(root)
+        rows.append(("refresh (无变化)", timed(store.refresh)[0]))
+        queries = [
+            ("类别计数", lambda: store.class_counts()),
+            ("无目标图像", lambda: store.images_without_targets()),
+            ("含小目标的图像", lambda: store.image_mask(store.bboxes[:, 2] * store.bboxes[:, 3] < 0.01)),
+            ("关键点可见率", lambda: (store.keypoints()[..., 2] > 0).mean(axis=0)),
+        ]
+        for name, query in queries:
+            query()
+            rows.append((name, timed(query, repeat=5)[0]))
+        stem = store.stems[1]
+        rows.append(("update_text", timed(lambda: store.update_text(stem, "1 0.5 0.5 0.1 0.1\n"))[0]))
+        rows.append(("update 后首次查询", timed(store.class_counts)[0]))
+        t, stats = timed(lambda: LabelStats.from_store(store))
+        rows.append(("统计全量汇总", t))
+        stem = store.stems[2]
+        rows.append(("统计增量更新", timed(lambda: stats.update_image(store, stem, "2 0.5 0.5 0.2 0.1\n"))[0]))
+
+        print(f"标签文件: {store.num_images}  目标: {store.num_objects}  列宽: {store.values.shape[1]}")
+        for name, t in rows:
+            print(f"{name:<20}{t * 1e3:>12.2f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+近重复帧检测基准：哈希吞吐、缓存重跑耗时、分组准确率，以及百万级哈希的分组耗时。
+
+在临时目录中生成 --scenes 个不同场景，每个场景连续写出 --dups 帧（轻微平移 + 噪声 + JPEG 压缩，
+模拟视频抽帧中几乎相同的相邻帧），测量
+    hash     首次运行计算全部哈希的耗时（进程池，含 JPEG 1/8 缩小解码）
+    cached   再次运行（全部命中 .phash_cache.npz）的耗时
+    append   新增 10% 图像后重跑的耗时（只计算新文件）
+    group    --index-size 个随机哈希（含按比例扰动出的近重复）的分组耗时，不读文件
+并检查分组结果与真实场景的一致性（同场景被分到同组、不同场景不被合并）。
+
+用法:
+    python benchmarks/bench_dedup.py
+    python benchmarks/bench_dedup.py --scenes 500 --dups 8 --index-size 1000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_dedup  # noqa: E402
+from image_dedup import find_duplicates, group_duplicates  # noqa: E402
+
+W, H = 1280, 720
+
+
+def make_scene(rng):
+    texture = (rng.random((H // 8 + 8, W // 8 + 8)) * 255).astype(np.uint8)
+    texture = cv2.resize(texture, (W + 64, H + 64), interpolation=cv2.INTER_CUBIC)
+    return cv2.cvtColor(texture, cv2.COLOR_GRAY2BGR)
+
+
+def write_frames(image_dir, scenes, dups, rng, start=0):
+    """每个场景写出 dups 帧，返回 {文件名: 场景号}"""
+    truth = {}
+    for s in range(scenes):
+        scene = make_scene(rng)
+        for d in range(dups):
+            dx, dy = rng.integers(0, 3, 2)
+            frame = scene[32 + dy:32 + dy + H, 32 + dx:32 + dx + W].astype(np.int16)
+            frame = np.clip(frame + rng.normal(0, 2, frame.shape), 0, 255).astype(np.uint8)
+            name = f"frame_{start + s:05d}_{d:02d}.jpg"
+            cv2.imwrite(os.path.join(image_dir, name), frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            truth[name] = start + s
+    return truth
+
+
+def synthetic_hashes(n, dup_rate, threshold, rng):
+    """随机哈希，其中 dup_rate 比例的条目由前一条翻转至多 threshold 位得到"""
+    hashes = rng.integers(0, 1 << 64, n, dtype=np.uint64, endpoint=False)
+    flips = rng.random(n) < dup_rate
+    for i in np.flatnonzero(flips).tolist():
+        if i == 0:
+            continue
+        h = int(hashes[i - 1])
+        for bit in rng.choice(64, int(rng.integers(0, threshold + 1)), replace=False).tolist():
+            h ^= 1 << bit
+        hashes[i] = h
+    return hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近重复帧检测基准")
+    parser.add_argument("--scenes", type=int, default=300, help="场景数（默认: 300）")
+    parser.add_argument("--dups", type=int, default=8, help="每个场景的帧数（默认: 8）")
+    parser.add_argument("--threshold", type=int, default=4, help="Hamming 距离阈值（默认: 4）")
+    parser.add_argument("--workers", type=int, default=None, help="哈希进程数（默认: CPU 核数）")
+    parser.add_argument("--index-size", type=int, default=1000000, help="分组基准的哈希数（默认: 1000000）")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tmp = tempfile.mkdtemp(prefix="bench_dedup_")
+    try:
+        image_dir = os.path.join(tmp, "images")
+        os.makedirs(image_dir)
+        truth = write_frames(image_dir, args.scenes, args.dups, rng)
+        # 让小数据集也走进程池，测到的是真实的并行吞吐
+        image_dedup._PARALLEL_MIN_FILES = 0
+
+        t0 = time.perf_counter()
+        result = find_duplicates(image_dir, args.threshold, args.workers)
+        t_hash = time.perf_counter() - t0
+        n_first = len(result.names)
+        t0 = time.perf_counter()
+        cached = find_duplicates(image_dir, args.threshold, args.workers)
+        t_cached = time.perf_counter() - t0
+        same_cache = np.array_equal(result.hashes, cached.hashes)
+
+        extra = max(1, args.scenes // 10)
+        truth.update(write_frames(image_dir, extra, args.dups, rng, start=args.scenes))
+        t0 = time.perf_counter()
+        result = find_duplicates(image_dir, args.threshold, args.workers)
+        t_append = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    scene = np.array([truth[n] for n in result.names.tolist()])
+    rep_scene = scene[result.rep]
+    merged = int((rep_scene != scene).sum())
+    split = len(np.unique(result.rep)) - len(np.unique(scene))
+    n_images = len(result.names)
+
+    hashes = synthetic_hashes(args.index_size, 0.5, args.threshold, np.random.default_rng(1))
+    t0 = time.perf_counter()
+    rep, _ = group_duplicates(hashes, np.ones(len(hashes), dtype=bool), args.threshold)
+    t_group = time.perf_counter() - t0
+
+    print(f"图像: {n_images} 张（{args.scenes + extra} 个场景 x {args.dups} 帧，{W}x{H} JPEG）  阈值: {args.threshold}")
+    print(f"hash {n_first} 张: {t_hash:.2f}s（{n_first / t_hash:.0f} 张/s）    "
+          f"cached: {t_cached * 1e3:.1f} ms    append {extra * args.dups} 张: {t_append * 1e3:.1f} ms")
+    print(f"缓存结果一致: {same_cache}  保留代表帧: {int(result.keep_mask.sum())}  "
+          f"误合并不同场景的帧: {merged}  多分出的组: {split}")
+    print(f"group: {args.index_size} 个哈希 {t_group:.2f}s（{len(np.unique(rep))} 组）")
+
+
+if __name__ == "__main__":
+    main()
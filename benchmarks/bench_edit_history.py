@@ -0,0 +1,166 @@
+"""
+撤销/重做历史基准：差异命令（EditHistory）vs 每步深拷贝整份标注。
+
+在一张含 N 个目标、每个 K 个关键点的图像上随机执行若干步编辑（加点、拖拽、撤销上一点、
+新建/删除目标、切换类别），测量
+    record  执行编辑并记录历史的耗时
+    memory  历史本身占用的内存（tracemalloc）
+    undo    全部撤销的耗时
+并检查: 全部撤销后与初始状态一致、全部重做后与编辑结束时一致、每一步撤销后都与当时的快照一致。
+
+用法:
+    python benchmarks/bench_edit_history.py
+    python benchmarks/bench_edit_history.py --objects 200 --keypoints 17 --steps 5000
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import AnnotationStore  # noqa: E402
+from edit_history import AddObject, EditHistory, RemoveObject, SetClass, SetKeypoint  # noqa: E402
+
+IMG_W, IMG_H = 1920, 1080
+
+
+def make_store(num_objects, category_sizes, seed=0):
+    """与 main.py 加载后的状态相同：每个目标的关键点数等于其类别定义的关键点数"""
+    rng = random.Random(seed)
+    store = AnnotationStore()
+    for i in range(num_objects):
+        cid = i % len(category_sizes)
+        kps = [(rng.uniform(0.01, 0.99), rng.uniform(0.01, 0.99), 2 if rng.random() > 0.2 else 0)
+               for _ in range(category_sizes[cid])]
+        store.add(cid, keypoints=kps)
+    return store
+
+
+def snapshot(store):
+    """与保存结果等价的完整快照（含 id，用于判断撤销是否精确还原）"""
+    return [(int(store.ids[i]), int(store.class_ids[i]), store.keypoints[i, :store.num_kps[i]].tolist())
+            for i in range(len(store))]
+
+
+def random_edit(store, history, rng, category_sizes):
+    """模拟 main.py 中的一步编辑，返回是否真的产生了编辑"""
+    op = rng.random()
+    if not len(store) or op < 0.05:
+        cid = rng.randrange(len(category_sizes))
+        view = store.add(cid, num_kps=category_sizes[cid])
+        history.record(AddObject(view.id, view.index, cid, category_sizes[cid]))
+        return True
+    index = rng.randrange(len(store))
+    if op < 0.55:
+        # 加点（对已有点即为覆盖）
+        k = rng.randrange(category_sizes[int(store.class_ids[index])])
+        history.execute(store, SetKeypoint.capture(store, index, k, (rng.random(), rng.random(), 2)))
+    elif op < 0.85:
+        # 拖拽：过程中实时修改，松开时记录一步
+        k = rng.randrange(int(store.num_kps[index]))
+        start = tuple(store.keypoints[index, k])
+        for _ in range(5):
+            store.move_keypoint(index, k, rng.random(), rng.random())
+        history.record(SetKeypoint(int(store.ids[index]), k, start, tuple(store.keypoints[index, k])))
+    elif op < 0.90:
+        k = store.last_visible_keypoint(index)
+        if k < 0:
+            return False
+        old = store.keypoints[index, k]
+        history.execute(store, SetKeypoint(int(store.ids[index]), k, old, (old[0], old[1], 0)))
+    elif op < 0.95:
+        history.execute(store, RemoveObject(store, index))
+    else:
+        cid = rng.randrange(len(category_sizes))
+        history.execute(store, SetClass(store, index, cid, category_sizes[cid]))
+    return True
+
+
+def check_round_trip(args, category_sizes):
+    """逐步撤销与快照比较，再全部重做与最终状态比较"""
+    rng = random.Random(1)
+    store = make_store(args.objects, category_sizes)
+    history = EditHistory(max_bytes=1 << 40)
+    snapshots = [snapshot(store)]
+    for _ in range(min(args.steps, 2000)):
+        if random_edit(store, history, rng, category_sizes):
+            snapshots.append(snapshot(store))
+    final = snapshots[-1]
+    for expected in reversed(snapshots[:-1]):
+        history.undo(store)
+        if snapshot(store) != expected:
+            return False
+    while history.redo(store) is not None:
+        pass
+    return snapshot(store) == final
+
+
+def run_history(args, category_sizes):
+    rng = random.Random(2)
+    store = make_store(args.objects, category_sizes)
+    history = EditHistory(max_bytes=1 << 40)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    for _ in range(args.steps):
+        random_edit(store, history, rng, category_sizes)
+    t_record = time.perf_counter() - t0
+    memory = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    t0 = time.perf_counter()
+    while history.undo(store) is not None:
+        pass
+    t_undo = time.perf_counter() - t0
+    return t_record, memory, t_undo, len(history._redo)
+
+
+def run_deepcopy(args, category_sizes):
+    """对照：每步编辑前深拷贝整份标注（dict-of-lists，与重构前 main.py 的数据结构相同）"""
+    rng = random.Random(2)
+    store = make_store(args.objects, category_sizes)
+    shadow = EditHistory(max_bytes=1 << 40)
+    annotations = [{"category_id": int(store.class_ids[i]), "bbox": store.bboxes[i].tolist(),
+                    "keypoints": store.keypoints[i, :store.num_kps[i]].tolist()} for i in range(len(store))]
+    stack = []
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    for _ in range(args.steps):
+        stack.append(copy.deepcopy(annotations))
+        random_edit(store, shadow, rng, category_sizes)
+        shadow.reset()
+    t_record = time.perf_counter() - t0
+    memory = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    t0 = time.perf_counter()
+    while stack:
+        annotations = stack.pop()
+    t_undo = time.perf_counter() - t0
+    return t_record, memory, t_undo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="撤销/重做历史基准（差异命令 vs 深拷贝快照）")
+    parser.add_argument("--objects", type=int, default=50, help="目标数（默认: 50）")
+    parser.add_argument("--keypoints", type=int, default=17, help="每个目标的关键点数（默认: 17）")
+    parser.add_argument("--steps", type=int, default=3000, help="编辑步数（默认: 3000）")
+    args = parser.parse_args()
+    category_sizes = [args.keypoints, max(1, args.keypoints // 2), args.keypoints + 4]
+
+    ok = check_round_trip(args, category_sizes)
+    t_rec, mem, t_undo, redo_len = run_history(args, category_sizes)
+    d_rec, d_mem, d_undo = run_deepcopy(args, category_sizes)
+
+    print(f"目标数: {args.objects}  关键点数: {args.keypoints}  编辑步数: {args.steps}")
+    print(f"{'实现':<14}{'record(ms)':>12}{'undo(ms)':>10}{'历史内存(KB)':>14}{'每步(B)':>10}")
+    for name, rec, und, m in [("EditHistory", t_rec, t_undo, mem), ("deepcopy", d_rec, d_undo, d_mem)]:
+        print(f"{name:<14}{rec * 1e3:>12.2f}{und * 1e3:>10.2f}{m / 1024:>14.1f}{m / args.steps:>10.0f}")
+    print(f"\n撤销/重做往返一致: {ok}  可重做步数: {redo_len}  内存: {d_mem / max(1, mem):.0f}x 减少")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+自动保存日志基准：append 耗时、后台写入吞吐、崩溃恢复的正确性和耗时。
+
+在临时目录中模拟 main.py 的编辑流程: 打开图像 A，随机编辑若干步后切换到图像 B（后台把 A 写回标签文件），
+再编辑 B 后不关闭日志直接复制日志文件（模拟崩溃），测量
+    append      GUI 线程每记录一条命令的耗时（只是内存追加）
+    flush       后台线程编码、写入并 fsync 全部记录的耗时
+    recover     读取并回放日志的耗时
+并检查: A 的标签文件与编辑结果一致、从日志恢复的 B 与编辑结果一致、末尾写了一半的记录被丢弃。
+
+用法:
+    python benchmarks/bench_edit_journal.py
+    python benchmarks/bench_edit_journal.py --objects 50 --keypoints 17 --steps 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_edit_history import make_store, random_edit  # noqa: E402
+from edit_history import EditHistory  # noqa: E402
+from edit_journal import APPLY, EditJournal, read_journal  # noqa: E402
+
+IMG_W, IMG_H = 1920, 1080
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自动保存日志基准")
+    parser.add_argument("--objects", type=int, default=50, help="目标数（默认: 50）")
+    parser.add_argument("--keypoints", type=int, default=17, help="每个目标的关键点数（默认: 17）")
+    parser.add_argument("--steps", type=int, default=10000, help="每张图像的编辑步数（默认: 10000）")
+    args = parser.parse_args()
+    category_sizes = [args.keypoints, max(1, args.keypoints // 2), args.keypoints + 4]
+
+    tmp = tempfile.mkdtemp(prefix="bench_journal_")
+    try:
+        label_a = os.path.join(tmp, "labels", "a.txt")
+        label_b = os.path.join(tmp, "labels", "b.txt")
+        os.makedirs(os.path.dirname(label_a))
+        journal = EditJournal(journal_dir=os.path.join(tmp, "journal"), interval=0.05,
+                              compact_bytes=1 << 40)
+        history = EditHistory(journal=journal)
+        rng = random.Random(0)
+
+        # 图像 A：编辑后切换，由后台写回
+        store = make_store(args.objects, category_sizes)
+        journal.open_image(label_a, store, IMG_W, IMG_H, category_sizes)
+        for _ in range(args.steps):
+            random_edit(store, history, rng, category_sizes)
+        expected_a = store.to_yolo_text(category_sizes, IMG_W, IMG_H)
+
+        store = make_store(args.objects, category_sizes, seed=1)
+        history.reset()
+        journal.open_image(label_b, store, IMG_W, IMG_H, category_sizes)
+        journal.settle(label_a)
+        with open(label_a) as f:
+            ok_a = f.read() == expected_a
+
+        # 图像 B：历史不直接连日志，编辑后手动追加，只计 append 本身的耗时
+        history = EditHistory()
+        t_append = 0.0
+        appends = 0
+        for _ in range(args.steps):
+            if not random_edit(store, history, rng, category_sizes):
+                continue
+            t0 = time.perf_counter()
+            journal.append(APPLY, history._undo[-1])
+            t_append += time.perf_counter() - t0
+            appends += 1
+        expected_b = store.to_yolo_text(category_sizes, IMG_W, IMG_H)
+        t0 = time.perf_counter()
+        journal.flush(wait=True)
+        t_flush = time.perf_counter() - t0
+
+        crash_path = os.path.join(tmp, "crash.journal")
+        shutil.copy(journal.path, crash_path)
+        t0 = time.perf_counter()
+        images = {image.label_path: image for image in read_journal(crash_path)}
+        t_recover = time.perf_counter() - t0
+        recovered = images.get(os.path.abspath(label_b))
+        ok_b = recovered is not None and recovered.dirty and recovered.label_text() == expected_b
+
+        with open(crash_path, "rb") as f:
+            data = f.read()
+        with open(crash_path, "wb") as f:
+            f.write(data[:-5])
+        ok_torn = len(read_journal(crash_path)) == 1
+        size = os.path.getsize(journal.path)
+        journal.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"目标数: {args.objects}  关键点数: {args.keypoints}  每张图像编辑步数: {args.steps}")
+    print(f"append: {t_append / appends * 1e6:.2f} us/条    flush 剩余记录: {t_flush * 1e3:.1f} ms    "
+          f"日志大小: {size / 1024:.1f} KB    回放: {t_recover * 1e3:.1f} ms")
+    print(f"切换图像后写回 A 一致: {ok_a}  崩溃后恢复 B 一致: {ok_b}  丢弃写了一半的记录: {ok_torn}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+关键点跟踪传播基准：1080p 帧对的跟踪耗时与精度。
+
+用随机纹理平移生成一段已知运动的合成帧序列（每帧平移 --dx/--dy 像素），在第一帧上放 N 个目标 x K 个关键点，
+测量
+    frame   一帧转灰度并缩小到工作分辨率（FrameCache 缓存的内容）的耗时
+    track   一个帧对上全部关键点的光流跟踪（含前向-后向检查）的耗时
+    seq     propagate_sequence 在整段序列上的总耗时（含 JPEG 编解码）
+并检查跟踪结果与真实平移的最大误差（像素）。
+
+用法:
+    python benchmarks/bench_keypoint_tracking.py
+    python benchmarks/bench_keypoint_tracking.py --objects 20 --keypoints 17 --frames 30
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annotation_store import AnnotationStore  # noqa: E402
+from keypoint_tracking import TrackingFrame, propagate_sequence, propagate_store  # noqa: E402
+
+W, H = 1920, 1080
+
+
+def make_frames(num_frames, dx, dy, seed=0):
+    rng = np.random.default_rng(seed)
+    margin = 20 + num_frames * max(abs(dx), abs(dy))
+    texture = (rng.random((H + 2 * margin, W + 2 * margin)) * 255).astype(np.uint8)
+    texture = cv2.cvtColor(cv2.GaussianBlur(texture, (0, 0), 3), cv2.COLOR_GRAY2BGR)
+    return [texture[margin + t * dy:margin + t * dy + H, margin + t * dx:margin + t * dx + W].copy()
+            for t in range(num_frames)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键点跟踪传播基准")
+    parser.add_argument("--objects", type=int, default=20, help="目标数（默认: 20）")
+    parser.add_argument("--keypoints", type=int, default=17, help="每个目标的关键点数（默认: 17）")
+    parser.add_argument("--frames", type=int, default=20, help="序列帧数（默认: 20）")
+    parser.add_argument("--dx", type=int, default=4, help="每帧水平平移像素（默认: 4）")
+    parser.add_argument("--dy", type=int, default=2, help="每帧垂直平移像素（默认: 2）")
+    parser.add_argument("--repeat", type=int, default=10, help="计时重复次数，取最小值（默认: 10）")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.dx, args.dy)
+    rng = np.random.default_rng(1)
+    store = AnnotationStore()
+    for i in range(args.objects):
+        kps = np.column_stack([rng.uniform(0.1, 0.9, args.keypoints), rng.uniform(0.1, 0.9, args.keypoints),
+                               np.full(args.keypoints, 2.0)])
+        store.add(i % 3, keypoints=kps)
+
+    t_frame = t_track = float("inf")
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        prev = TrackingFrame(frames[0])
+        t_frame = min(t_frame, time.perf_counter() - t0)
+        nxt = TrackingFrame(frames[1])
+        t0 = time.perf_counter()
+        proposal = propagate_store(store, prev, nxt)
+        t_track = min(t_track, time.perf_counter() - t0)
+    shift = np.array([args.dx / W, args.dy / H])
+    error = np.abs((proposal.keypoints[..., :2] - (store.keypoints[..., :2] - shift)) * [W, H]).max()
+
+    tmp = tempfile.mkdtemp(prefix="bench_tracking_")
+    try:
+        image_dir = os.path.join(tmp, "images")
+        labels_dir = os.path.join(tmp, "labels")
+        os.makedirs(image_dir)
+        os.makedirs(labels_dir)
+        for t, frame in enumerate(frames):
+            cv2.imwrite(os.path.join(image_dir, f"frame_{t:06d}.jpg"), frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        with open(os.path.join(labels_dir, "frame_000000.txt"), "w") as f:
+            f.write(store.to_yolo_text([], W, H))
+        t0 = time.perf_counter()
+        propagate_sequence(image_dir, labels_dir)
+        t_seq = time.perf_counter() - t0
+        with open(os.path.join(labels_dir, f"frame_{args.frames - 1:06d}.txt")) as f:
+            last = AnnotationStore.from_yolo_text(f.read(), W, H)
+        drift = np.abs((last.keypoints[..., :2] - (store.keypoints[..., :2] - shift * (args.frames - 1)))
+                       * [W, H]).max() if len(last) == len(store) else float("nan")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    points = args.objects * args.keypoints
+    print(f"帧尺寸: {W}x{H}  关键点: {points} 个  序列: {args.frames} 帧")
+    print(f"frame: {t_frame * 1e3:.2f} ms/帧    track: {t_track * 1e3:.2f} ms/帧对    "
+          f"seq: {t_seq * 1e3 / max(args.frames - 1, 1):.1f} ms/帧（含 JPEG 解码）")
+    print(f"单帧最大误差: {error:.3f} px    {args.frames - 1} 帧累计漂移: {drift:.3f} px")
+
+
+if __name__ == "__main__":
+    main()
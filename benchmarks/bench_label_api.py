@@ -0,0 +1,130 @@
+"""
+无界面标注接口（label_api）基准：导入耗时、逐张读写标注的吞吐量、多进程 worker 中的用法。
+
+    导入      每次在新的子进程中 import label_api，报告 --runs 次的中位数（不含解释器启动），
+              并检查没有导入 PyQt5 / numpy / cv2 / torch / ultralytics
+    读写      在临时目录用 synth_dataset 生成 --images 张小图像和标签（归一化坐标），逐张 read_arrays() / write_arrays()
+    多进程    multiprocessing.Pool 直接 map 整个 Dataset（ImageItem 只保存路径，pickle 很小），
+              每个 worker 读标签、改写后写回，与单进程结果逐字节比较
+检查项（回归时退出码为 1）: 导入中位数不超过 --budget-ms 毫秒、没有导入上述模块、多进程结果与单进程一致
+
+用法:
+    python benchmarks/bench_label_api.py
+    python benchmarks/bench_label_api.py --images 5000 --objects 10 --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from label_api import Dataset  # noqa: E402
+from synth_dataset import generate  # noqa: E402
+
+# import label_api 时不应导入的模块
+FORBIDDEN_MODULES = ("PyQt5", "numpy", "cv2", "torch", "ultralytics")
+
+_CHILD = r"""
+import sys, time
+sys.path.insert(0, sys.argv[1])
+t0 = time.perf_counter()
+import label_api
+elapsed = time.perf_counter() - t0
+loaded = sorted(m for m in sys.argv[2].split(",") if m in sys.modules)
+print(f"{elapsed * 1e3:.2f} {','.join(loaded)}")
+"""
+
+
+def import_time():
+    """(毫秒, 已导入的不应导入的模块)"""
+    out = subprocess.run([sys.executable, "-c", _CHILD, ROOT, ",".join(FORBIDDEN_MODULES)],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    ms, _, loaded = out.strip().splitlines()[-1].partition(" ")
+    return float(ms), [m for m in loaded.split(",") if m]
+
+
+def shift_item(item):
+    """worker 中执行：读入、把关键点右移 0.01、写回；返回写入的文本"""
+    keypoints, num_kps, class_ids, bboxes, ids = item.read_arrays()
+    keypoints[..., 0] = np.clip(keypoints[..., 0] + 0.01, 0.0, 1.0)
+    return item.write_arrays(keypoints, num_kps, class_ids, bboxes, ids, human=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面标注接口基准")
+    parser.add_argument("--images", type=int, default=1000, help="图像数（默认: 1000）")
+    parser.add_argument("--objects", type=int, default=5, help="每张图像的目标数（默认: 5）")
+    parser.add_argument("--keypoints", type=int, default=17, help="每个目标的关键点数（默认: 17）")
+    parser.add_argument("--workers", type=int, default=4, help="多进程 worker 数（默认: 4）")
+    parser.add_argument("--runs", type=int, default=5, help="导入耗时测量次数（默认: 5）")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="导入耗时上限，毫秒（默认: 100）")
+    args = parser.parse_args()
+
+    failures = []
+    samples, loaded = [], set()
+    for _ in range(args.runs):
+        ms, modules = import_time()
+        samples.append(ms)
+        loaded.update(modules)
+    median = statistics.median(samples)
+    print(f"import label_api: 中位数 {median:.1f} ms（{args.runs} 次，最大 {max(samples):.1f} ms），"
+          f"上限 {args.budget_ms:.0f} ms；不应导入但已导入的模块: {', '.join(sorted(loaded)) or '无'}")
+    if median > args.budget_ms:
+        failures.append(f"导入耗时 {median:.1f} ms 超过上限 {args.budget_ms:.0f} ms")
+    if loaded:
+        failures.append(f"导入时加载了 {', '.join(sorted(loaded))}")
+
+    tmp = tempfile.mkdtemp(prefix="bench_label_api_")
+    try:
+        stats = generate(tmp, args.images, width=32, height=32, image_format="png",
+                         objects=(args.objects, args.objects), keypoints=args.keypoints)
+        image_dir, labels_dir = stats["images_dir"], stats["labels_dir"]
+        t0 = time.perf_counter()
+        dataset = Dataset(image_dir, labels_dir)
+        list_s = time.perf_counter() - t0
+        print(f"图像: {len(dataset)} 张  每张 {args.objects} 个目标 × {args.keypoints} 个关键点  "
+              f"列出目录 {list_s * 1e3:.1f} ms")
+
+        t0 = time.perf_counter()
+        arrays = [item.read_arrays() for item in dataset]
+        read_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for item, (keypoints, num_kps, class_ids, bboxes, ids) in zip(dataset, arrays):
+            item.write_arrays(keypoints, num_kps, class_ids, bboxes, ids, human=False)
+        write_s = time.perf_counter() - t0
+        print(f"read_arrays: {len(dataset) / read_s:.0f} 张/s  write_arrays: {len(dataset) / write_s:.0f} 张/s")
+
+        t0 = time.perf_counter()
+        serial = [shift_item(item) for item in dataset]
+        serial_s = time.perf_counter() - t0
+        # 恢复原标签后用多进程再做一遍，结果应逐字节一致
+        for item, (keypoints, num_kps, class_ids, bboxes, ids) in zip(dataset, arrays):
+            item.write_arrays(keypoints, num_kps, class_ids, bboxes, ids, human=False)
+        t0 = time.perf_counter()
+        with multiprocessing.Pool(args.workers) as pool:
+            parallel = pool.map(shift_item, dataset, chunksize=max(1, len(dataset) // (args.workers * 4)))
+        parallel_s = time.perf_counter() - t0
+        same = parallel == serial and all(item.read_text() == text for item, text in zip(dataset, serial))
+        print(f"读-改-写 单进程: {len(dataset) / serial_s:.0f} 张/s  {args.workers} 进程: "
+              f"{len(dataset) / parallel_s:.0f} 张/s（含进程启动）  结果一致 {same}")
+        if not same:
+            failures.append("多进程结果与单进程不一致")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for f in failures:
+        print(f"回归: {f}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
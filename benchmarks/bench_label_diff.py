@@ -0,0 +1,111 @@
+"""
+标签对比基准：两个标签目录逐图像匹配对比的总耗时，以及统计结果是否与已知改动一致。
+
+在临时目录中生成参照目录 A（--images 个标签文件，每个 --objects 个目标 x --keypoints 个关键点），
+再按比例生成对比目录 B:
+    --changed 比例的图像被改动: 每个目标关键点抖动 ±0.002，其中一部分图像再删除一个目标、新增一个目标、
+    改一个目标的类别、把一个目标整体平移 0.02；其余图像与 A 完全相同
+测量 diff_dirs 的总耗时（进程池），并检查新增/删除/类别变化/移动的总数与生成时记录的一致。
+
+用法:
+    python benchmarks/bench_label_diff.py
+    python benchmarks/bench_label_diff.py --images 100000 --objects 5 --keypoints 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from label_diff import diff_dirs  # noqa: E402
+
+
+def make_objects(rng, n, k):
+    """n 个互不重叠的目标: 每个占 1/n 宽的竖条，关键点在框内"""
+    cls = rng.integers(0, 3, n)
+    cx = (np.arange(n) + 0.5) / n
+    cy = rng.uniform(0.3, 0.7, n)
+    w = np.full(n, 0.6 / n)
+    h = rng.uniform(0.1, 0.3, n)
+    kx = cx[:, None] + rng.uniform(-0.4, 0.4, (n, k)) * w[:, None]
+    ky = cy[:, None] + rng.uniform(-0.4, 0.4, (n, k)) * h[:, None]
+    return cls, np.column_stack([cx, cy, w, h]), np.stack([kx, ky], axis=2)
+
+
+def to_text(cls, boxes, kps):
+    lines = []
+    for c, b, p in zip(cls.tolist(), boxes, kps):
+        lines.append(" ".join([str(c)] + [f"{v:.6f}" for v in b.tolist()] + [f"{v:.6f}" for v in p.ravel().tolist()]))
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标签对比基准")
+    parser.add_argument("--images", type=int, default=20000, help="图像数（默认: 20000）")
+    parser.add_argument("--objects", type=int, default=5, help="每张图像的目标数（默认: 5）")
+    parser.add_argument("--keypoints", type=int, default=4, help="每个目标的关键点数（默认: 4）")
+    parser.add_argument("--changed", type=float, default=0.3, help="被改动的图像比例（默认: 0.3）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认: CPU 核数）")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    expected = {"added": 0, "removed": 0, "class_changed": 0, "moved": 0}
+    tmp = tempfile.mkdtemp(prefix="bench_label_diff_")
+    try:
+        dir_a, dir_b = os.path.join(tmp, "a"), os.path.join(tmp, "b")
+        os.makedirs(dir_a)
+        os.makedirs(dir_b)
+        for i in range(args.images):
+            cls, boxes, kps = make_objects(rng, args.objects, args.keypoints)
+            text_a = to_text(cls, boxes, kps)
+            text_b = text_a
+            if rng.random() < args.changed:
+                kps = kps + rng.uniform(-0.002, 0.002, kps.shape)
+                cls = cls.copy()
+                if rng.random() < 0.5:
+                    # 整体平移一个目标（超过默认移动阈值 0.01，仍能配对）
+                    boxes = boxes.copy()
+                    boxes[0, :2] += 0.02 / np.sqrt(2)
+                    kps[0] += 0.02 / np.sqrt(2)
+                    expected["moved"] += 1
+                if rng.random() < 0.3:
+                    cls[1] = (cls[1] + 1) % 3
+                    expected["class_changed"] += 1
+                if rng.random() < 0.3:
+                    cls, boxes, kps = cls[:-1], boxes[:-1], kps[:-1]
+                    expected["removed"] += 1
+                if rng.random() < 0.3:
+                    # 新增目标放在图像下方，不与已有目标重叠
+                    c2, b2, k2 = make_objects(rng, 1, args.keypoints)
+                    b2[:, 1] = 0.9
+                    b2[:, 3] = 0.05
+                    k2[..., 1] = 0.9
+                    cls, boxes, kps = np.concatenate([cls, c2]), np.concatenate([boxes, b2]), np.concatenate([kps, k2])
+                    expected["added"] += 1
+                text_b = to_text(cls, boxes, kps)
+            with open(os.path.join(dir_a, f"img_{i:07d}.txt"), "w") as f:
+                f.write(text_a)
+            with open(os.path.join(dir_b, f"img_{i:07d}.txt"), "w") as f:
+                f.write(text_b)
+
+        t0 = time.perf_counter()
+        result = diff_dirs(dir_a, dir_b, args.workers)
+        elapsed = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    totals = result.totals()
+    ok = all(int(totals[k]) == v for k, v in expected.items())
+    print(f"图像: {args.images} 对  目标: {args.objects} 个/张  关键点: {args.keypoints} 个/目标  改动比例: {args.changed}")
+    print(f"diff: {elapsed:.2f}s（{args.images / elapsed:.0f} 对/s，{elapsed / args.images * 1e6:.0f} us/对）")
+    print(result.summary())
+    print(f"统计与生成时的改动一致: {ok}  期望: {expected}")
+
+
+if __name__ == "__main__":
+    main()
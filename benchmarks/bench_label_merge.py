@@ -0,0 +1,119 @@
+"""
+合并模式基准：自动标注流式循环中逐张合并预测的开销，以及合并结果是否保留了全部人工目标。
+
+在临时标签目录中生成 --images 个标签文件（每个 --objects 个目标 x --keypoints 个关键点），
+其中 --human 比例的目标记为人工标注（写入来源旁路文件），其余为旧的模型目标。
+每张图像的“本次预测”为: 全部已有目标加 ±0.003 的抖动（模拟模型重新检出）+ 一个新的目标。
+测量
+    merge_texts   纯内存合并（解析 + 相似度矩阵 + 贪心配对）每张图像的耗时
+    LabelMerger   含读写标签文件和来源记录的逐张合并耗时（即推理循环中每张图像增加的开销）
+并检查: 人工目标逐行原样保留、与人工目标重合的预测全部被忽略、新目标全部追加、旧模型目标被替换，
+以及重新读取来源旁路文件后每个标签文件的来源记录与目标行数一致。
+
+用法:
+    python benchmarks/bench_label_merge.py
+    python benchmarks/bench_label_merge.py --images 50000 --objects 8 --keypoints 17
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from label_merge import (HUMAN, LabelMerger, ProvenanceWriter, _object_lines, load_provenance,  # noqa: E402
+                         merge_texts)
+
+
+def make_objects(rng, n, k):
+    """n 个互不重叠的目标: 每个占 1/n 宽的竖条，关键点在框内"""
+    cls = rng.integers(0, 3, n)
+    cx = (np.arange(n) + 0.5) / n
+    cy = rng.uniform(0.3, 0.6, n)
+    w = np.full(n, 0.6 / n)
+    h = rng.uniform(0.1, 0.3, n)
+    kx = cx[:, None] + rng.uniform(-0.4, 0.4, (n, k)) * w[:, None]
+    ky = cy[:, None] + rng.uniform(-0.4, 0.4, (n, k)) * h[:, None]
+    return cls, np.column_stack([cx, cy, w, h]), np.stack([kx, ky], axis=2)
+
+
+def to_lines(cls, boxes, kps):
+    return [" ".join([str(c)] + [f"{v:.6f}" for v in b.tolist()] + [f"{v:.6f}" for v in p.ravel().tolist()])
+            for c, b, p in zip(cls.tolist(), boxes, kps)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并模式基准")
+    parser.add_argument("--images", type=int, default=10000, help="图像数（默认: 10000）")
+    parser.add_argument("--objects", type=int, default=5, help="每张图像已有的目标数（默认: 5）")
+    parser.add_argument("--keypoints", type=int, default=4, help="每个目标的关键点数（默认: 4）")
+    parser.add_argument("--human", type=float, default=0.4, help="人工标注目标的比例（默认: 0.4）")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tmp = tempfile.mkdtemp(prefix="bench_label_merge_")
+    try:
+        labels_dir = os.path.join(tmp, "labels")
+        os.makedirs(labels_dir)
+        writer = ProvenanceWriter(labels_dir, "existing")
+        cases = []
+        for i in range(args.images):
+            stem = f"img_{i:07d}"
+            cls, boxes, kps = make_objects(rng, args.objects, args.keypoints)
+            old_lines = to_lines(cls, boxes, kps)
+            sources = (rng.random(args.objects) < args.human).astype(np.uint8)
+            # 本次预测: 已有目标重新检出（抖动）+ 图像下方一个新目标
+            c2, b2, k2 = make_objects(rng, 1, args.keypoints)
+            b2[:, 1], b2[:, 3], k2[..., 1] = 0.9, 0.05, 0.9
+            jitter = rng.uniform(-0.003, 0.003, kps.shape)
+            pred_lines = to_lines(np.concatenate([cls, c2]), np.concatenate([boxes, b2]),
+                                  np.concatenate([kps + jitter, k2]))
+            with open(os.path.join(labels_dir, stem + ".txt"), "w") as f:
+                f.write("\n".join(old_lines) + "\n")
+            writer.add(stem, sources, when=0.0)
+            cases.append((stem, old_lines, sources, "\n".join(pred_lines) + "\n", pred_lines[-1]))
+        writer.save()
+
+        t0 = time.perf_counter()
+        for _, old_lines, sources, pred_text, _ in cases:
+            merge_texts("\n".join(old_lines) + "\n", sources, pred_text)
+        t_texts = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        merger = LabelMerger(labels_dir)
+        for stem, _, _, pred_text, _ in cases:
+            merger.merge(stem, pred_text)
+        merger.close()
+        t_merger = time.perf_counter() - t0
+
+        ok = True
+        records = load_provenance(labels_dir)
+        for stem, old_lines, sources, _, new_line in cases:
+            with open(os.path.join(labels_dir, stem + ".txt")) as f:
+                lines = _object_lines(f.read())
+            human_lines = [line for line, s in zip(old_lines, sources.tolist()) if s == HUMAN]
+            n_model = args.objects - len(human_lines)
+            rec = records.get(stem)
+            ok &= (lines[:len(human_lines)] == human_lines and len(lines) == len(human_lines) + n_model + 1
+                   and lines[-1] == new_line and rec is not None and len(rec) == len(lines)
+                   and int((rec == HUMAN).sum()) == len(human_lines))
+        kept, suppressed, added, dropped = merger.totals.tolist()
+        expected_human = sum(int((c[2] == HUMAN).sum()) for c in cases)
+        ok &= kept == expected_human and suppressed == expected_human
+        ok &= dropped == args.images * args.objects - expected_human
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"图像: {args.images} 张  目标: {args.objects} 个/张  关键点: {args.keypoints} 个/目标  人工比例: {args.human}")
+    print(f"merge_texts: {t_texts / args.images * 1e6:.0f} us/张    "
+          f"LabelMerger（含读写文件）: {t_merger / args.images * 1e6:.0f} us/张，共 {t_merger:.2f}s")
+    print(merger.summary())
+    print(f"人工目标全部原样保留、新目标全部追加、来源记录与标签一致: {ok}")
+
+
+if __name__ == "__main__":
+    main()
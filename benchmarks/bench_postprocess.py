@@ -0,0 +1,172 @@
+"""
+auto_annotate 后处理基准：原三遍 glob 实现 vs 单遍 run_postprocess。
+
+在临时目录中生成 N 个预测标签（部分列数不对）和对应源图像，分别统计耗时与
+Python 层文件系统调用次数（stat/open/scandir/rename/unlink/copy 等，近似系统调用数）。
+
+用法:
+    python benchmarks/bench_postprocess.py --labels 5000
+    python benchmarks/bench_postprocess.py --labels 5000 --root /mnt/nfs/tmp   # 在网络存储上测
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from postprocess import LINK_MODES, run_postprocess  # noqa: E402
+
+_COUNTED = ["stat", "lstat", "fstat", "open", "listdir", "scandir", "rename", "replace", "unlink",
+            "remove", "rmdir", "utime", "chmod", "mkdir", "sendfile"]
+_COUNTED += ["link", "symlink"]
+_DATA_CALLS = {"open", "fstat", "sendfile"}
+
+
+@contextmanager
+def count_fs_calls():
+    """临时包装 os 模块中的文件系统函数和内置 open，统计调用次数"""
+    import builtins
+    counter = Counter()
+    originals = {name: getattr(os, name) for name in _COUNTED}
+    original_open = builtins.open
+
+    def wrap(name, func):
+        def wrapper(*args, **kwargs):
+            counter[name] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    for name, func in originals.items():
+        setattr(os, name, wrap(name, func))
+    builtins.open = wrap("open", original_open)
+    try:
+        yield counter
+    finally:
+        for name, func in originals.items():
+            setattr(os, name, func)
+        builtins.open = original_open
+
+
+def legacy_postprocess(default_labels_dir, source_path, labels_output_dir, images_output_dir, expected_columns):
+    """原 auto_annotate 中的三遍实现（保留用于对比）"""
+    for label_file in default_labels_dir.glob("*.txt"):
+        with open(label_file, 'r') as f:
+            lines = f.readlines()
+        new_lines = []
+        for line in lines:
+            parts = line.strip().split()
+            if len(parts) != expected_columns:
+                if len(parts) < expected_columns:
+                    parts.extend(['0'] * (expected_columns - len(parts)))
+                else:
+                    parts = parts[:expected_columns]
+            new_lines.append(" ".join(parts) + "\n")
+        with open(label_file, 'w') as f:
+            f.writelines(new_lines)
+
+    for label_file in default_labels_dir.glob("*.txt"):
+        stem = label_file.stem
+        for ext in [".jpg", ".jpeg", ".png", ".bmp", ".JPG", ".JPEG", ".PNG", ".BMP"]:
+            potential_image_path = source_path / (stem + ext)
+            if potential_image_path.exists():
+                shutil.copy2(str(potential_image_path), str(images_output_dir / (stem + ext)))
+                break
+
+    for label_file in default_labels_dir.glob("*.txt"):
+        shutil.move(str(label_file), str(labels_output_dir / label_file.name))
+    try:
+        default_labels_dir.rmdir()
+    except OSError:
+        pass
+
+    labels_count = len(list(labels_output_dir.glob("*.txt")))
+    images_count = len(list(images_output_dir.glob("*.*")))
+    return labels_count, images_count
+
+
+def make_fixture(root, num_labels, bad_ratio, image_ext):
+    """生成预测标签目录与源图像目录；源图像用小文件代替，只关心文件操作开销"""
+    source = root / "source"
+    pred = root / "predictions" / "labels"
+    source.mkdir(parents=True)
+    pred.mkdir(parents=True)
+    payload = os.urandom(32 * 1024)
+    bad_every = max(1, int(1 / bad_ratio)) if bad_ratio > 0 else 0
+    for i in range(num_labels):
+        stem = f"frame_{i:07d}"
+        (source / (stem + image_ext)).write_bytes(payload)
+        cols = 17 if bad_every and i % bad_every == 0 else 13
+        line = " ".join(["0"] + ["0.500000"] * (cols - 1)) + "\n"
+        (pred / (stem + ".txt")).write_text(line * 3)
+    # 另加一些没有目标的源图像（不会有标签）
+    for i in range(num_labels // 4):
+        (source / f"empty_{i:07d}{image_ext}").write_bytes(payload)
+    return source, pred
+
+
+def run_case(name, func, root_dir, args, counted):
+    """在全新夹具上跑一次；counted=True 时统计文件调用（包装本身有开销，因此计时单独跑一遍）"""
+    root = Path(tempfile.mkdtemp(prefix=f"bench_{name}_", dir=root_dir))
+    try:
+        source, pred = make_fixture(root, args.labels, args.bad_ratio, args.ext)
+        labels_out = root / "out" / "labels"
+        images_out = root / "out" / "images"
+        labels_out.mkdir(parents=True)
+        images_out.mkdir(parents=True)
+        if counted:
+            with count_fs_calls() as counter:
+                labels, images = func(pred, source, labels_out, images_out)
+            return counter, labels, images
+        t0 = time.perf_counter()
+        func(pred, source, labels_out, images_out)
+        return time.perf_counter() - t0
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="auto_annotate 后处理基准（三遍 glob vs 单遍流水线）")
+    parser.add_argument("--labels", type=int, default=2000, help="预测标签文件数（默认: 2000）")
+    parser.add_argument("--bad-ratio", type=float, default=0.1, help="列数错误的标签比例（默认: 0.1）")
+    parser.add_argument("--ext", type=str, default=".png", help="源图像扩展名，.png 会让原实现多探测两次（默认: .png）")
+    parser.add_argument("--workers", type=int, default=8, help="单遍实现的线程数（默认: 8）")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default="copy", help="单遍实现放置原图的方式（默认: copy）")
+    parser.add_argument("--root", type=str, default=None, help="临时目录所在位置，可指向网络存储")
+    parser.add_argument("--repeat", type=int, default=3, help="计时重复次数，取最小值（默认: 3）")
+    args = parser.parse_args()
+
+    def legacy(pred, source, labels_out, images_out):
+        return legacy_postprocess(pred, source, labels_out, images_out, 13)
+
+    def single_pass(pred, source, labels_out, images_out):
+        stats = run_postprocess(str(pred), str(labels_out), str(source), str(images_out),
+                                expected_columns=13, workers=args.workers, verbose=False,
+                                link_mode=args.link_mode)
+        return stats["labels"], stats["images"]
+
+    rows = []
+    for name, func in [("legacy", legacy), ("single_pass", single_pass)]:
+        elapsed = min(run_case(name, func, args.root, args, counted=False) for _ in range(args.repeat))
+        counter, labels, images = run_case(name, func, args.root, args, counted=True)
+        rows.append((name, elapsed, sum(counter.values()), counter, labels, images))
+
+    print(f"标签数: {args.labels}  源图像扩展名: {args.ext}  错误列比例: {args.bad_ratio}  放置方式: {args.link_mode}")
+    print(f"{'实现':<12}{'耗时(s)':>10}{'文件调用':>12}{'标签':>8}{'图像':>8}   明细")
+    for name, elapsed, calls, counter, labels, images in rows:
+        detail = ", ".join(f"{k}={v}" for k, v in counter.most_common())
+        print(f"{name:<12}{elapsed:>10.3f}{calls:>12}{labels:>8}{images:>8}   {detail}")
+    base, new = rows[0], rows[1]
+    # 元数据调用（不含真正搬运数据的 open/fstat/sendfile）在网络存储上每次都是一次往返，单独统计
+    meta = [sum(v for k, v in row[3].items() if k not in _DATA_CALLS) for row in rows]
+    print(f"\n文件调用次数: {base[2] / max(1, new[2]):.1f}x 减少（其中元数据调用 {meta[0]} -> {meta[1]}，"
+          f"{meta[0] / max(1, meta[1]):.1f}x 减少），耗时: {base[1] / max(1e-9, new[1]):.2f}x 加速")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+启动耗时基准：从解释器启动到主窗口第一次显示的时间，以及启动时导入了哪些重量级模块。
+
+每次在新的子进程中（QT_QPA_PLATFORM=offscreen）导入 main、创建 QApplication 和 KeypointAnnotationTool、
+show() 并处理一轮事件，报告 --runs 次的中位数；带 AI 插件（main.py）和仅人工标注（labeling_tool_without_ai.py，
+ai=False）两种启动方式分别测量。另用 python -X importtime 导入 main，列出累计耗时最多的模块。
+检查项（回归时退出码为 1，可直接放进 CI）:
+    两种启动方式的中位数都不超过 --budget-ms 毫秒
+    启动时没有导入 torch / ultralytics / cv2（只在选择模型、打开图像文件夹时才加载）
+    仅人工标注时没有导入 AI 插件（ai_plugin / annotate_worker / annotate_job）
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 500 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动时不应导入的模块（顶层包名）
+HEAVY_MODULES = ("torch", "ultralytics", "cv2")
+# 仅人工标注时另外不应导入的模块
+AI_MODULES = ("ai_plugin", "annotate_worker", "annotate_job")
+
+# 子进程中执行：起点为父进程启动子进程前的 time.time()，包含解释器自身的启动时间
+_CHILD = r"""
+import os, sys, time
+t0 = float(sys.argv[1])
+sys.path.insert(0, sys.argv[2])
+from PyQt5.QtWidgets import QApplication
+app = QApplication([])
+import main
+window = main.KeypointAnnotationTool(ai=sys.argv[4] == "1")
+window.show()
+app.processEvents()
+elapsed = time.time() - t0
+heavy = sorted(m for m in sys.argv[3].split(",") if m in sys.modules)
+window.journal.close()
+print(f"{elapsed * 1e3:.1f} {','.join(heavy)}")
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def time_to_window(ai):
+    """(毫秒, 启动时已导入的不应导入的模块)"""
+    forbidden = HEAVY_MODULES if ai else HEAVY_MODULES + AI_MODULES
+    t0 = time.time()
+    out = subprocess.run([sys.executable, "-c", _CHILD, repr(t0), ROOT, ",".join(forbidden), "1" if ai else "0"],
+                         env=_env(), cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    ms, _, heavy = out.strip().splitlines()[-1].partition(" ")
+    return float(ms), [m for m in heavy.split(",") if m]
+
+
+def import_times(top):
+    """python -X importtime -c "import main" 的结果，按累计耗时从大到小取前 top 个 (模块, 累计微秒)"""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         env=_env(), cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(cumulative)))
+    return sorted(rows, key=lambda r: -r[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="测量次数（默认: 5）")
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="首个窗口显示的耗时上限，毫秒（默认: 500）")
+    parser.add_argument("--top", type=int, default=10, help="列出累计导入耗时最多的模块数（默认: 10）")
+    args = parser.parse_args()
+
+    failures = []
+    for ai, label in ((True, "带 AI 插件"), (False, "仅人工标注")):
+        samples, loaded = [], set()
+        for _ in range(args.runs):
+            ms, modules = time_to_window(ai)
+            samples.append(ms)
+            loaded.update(modules)
+        median = statistics.median(samples)
+        print(f"[{label}] 首个窗口显示: 中位数 {median:.0f} ms（{args.runs} 次，最小 {min(samples):.0f} / "
+              f"最大 {max(samples):.0f} ms），上限 {args.budget_ms:.0f} ms；不应导入但已导入的模块: "
+              f"{', '.join(sorted(loaded)) or '无'}")
+        if median > args.budget_ms:
+            failures.append(f"{label}: 首个窗口显示 {median:.0f} ms 超过上限 {args.budget_ms:.0f} ms")
+        if loaded:
+            failures.append(f"{label}: 启动时导入了 {', '.join(sorted(loaded))}")
+    print("import main 累计耗时最多的模块:")
+    for name, us in import_times(args.top):
+        print(f"    {us / 1e3:8.1f} ms  {name}")
+
+    for f in failures:
+        print(f"回归: {f}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+标注工具热路径基准套件（offscreen），结果保存为 JSON，可与之前某次提交的结果比较。
+
+在临时目录用 synth_dataset 生成 --images 张 --width x --height 的图像和标签（每张 --objects 个目标 × --keypoints 个关键点），
+offscreen 创建 KeypointAnnotationTool(ai=False) 后逐项测量（每项重复 --repeat 次，记录中位数/最小/平均毫秒）:
+
+    load_image                   解码图像、显示并加载标注（轮流加载不同图像）
+    update_display               重绘当前图像的全部关键点
+    drag                         按下一个关键点、拖动 --drag-moves 步、松开（每步都重绘）
+    parse_labels                 _read_label_file 解析标签文件并同步类别
+    save_labels                  save_annotations 按 6 位小数保存当前图像的标注
+    format_six_decimals          把 ultralytics save_txt 的 %g 格式标签改写为六位小数（每次一个 --images 个文件的目录）
+    delete_images_without_targets  删除无目标图片（一半图像没有目标，每次重新准备目录，只计删除本身）
+    auto_annotate_postprocess    AnnotateJob 覆盖模式跑完 --images 张图像（假模型不计推理耗时，
+                                 主要是写六位小数的预测标签、run_postprocess 移动与置信度/来源分片）
+
+结果写入 --output（默认 benchmarks/results/<提交号>.json，该目录不纳入版本控制）；给出 --compare 时逐项比较，
+中位数比基线慢超过 --threshold 倍的记为回归，退出码为 1。
+
+用法:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --compare benchmarks/results/9d5752a.json
+    python benchmarks/bench_suite.py --images 200 --width 3840 --height 2160 --only load_image,update_display
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from PyQt5.QtCore import QEvent, QPoint, Qt  # noqa: E402
+from PyQt5.QtGui import QMouseEvent  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+import main as annotation_tool  # noqa: E402
+from annotate_job import AnnotateJob, format_six_decimals  # noqa: E402
+from bench_annotate_worker import FakeModel  # noqa: E402
+from synth_dataset import generate  # noqa: E402
+
+
+def measure(results, args, name, func, setup=None):
+    """不在 --only 之外时调用 func --repeat 次（每次之前调用不计时的 setup），每次的毫秒数记入 results[name]"""
+    if args.only and name not in args.only:
+        return
+    samples = []
+    for _ in range(args.repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1e3)
+    results[name] = samples
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def label_rows(rng, objects, keypoints):
+    """(objects, 4 + keypoints * 3) 的归一化 bbox + 关键点 (x, y, v)"""
+    kps = rng.uniform(0.05, 0.95, (objects, keypoints, 3))
+    kps[..., 2] = 2
+    return np.concatenate([rng.uniform(0.1, 0.9, (objects, 4)), kps.reshape(objects, -1)], axis=1)
+
+
+def _mouse(kind, pos):
+    return QMouseEvent(kind, QPoint(*pos), Qt.LeftButton, Qt.LeftButton, Qt.NoModifier)
+
+
+def bench_window(window, image_dir, labels_dir, args, results):
+    """load_image / update_display / drag / parse_labels / save_labels"""
+    window.categories = [{"name": "obj", "keypoints": [f"kp{k}" for k in range(args.keypoints)]}]
+    window.update_category_combo()
+    window.image_dir = image_dir
+    window.labels_dir = labels_dir
+    window.image_files = annotation_tool.list_images(image_dir)
+    cursor = iter(range(1 << 30))
+
+    def load_next():
+        window.load_image(next(cursor) % len(window.image_files))
+
+    measure(results, args, "load_image", load_next)
+    window.load_image(0)
+    measure(results, args, "update_display", window.update_display)
+
+    def drag():
+        # 按下当前目标第一个关键点所在的屏幕位置，逐步向右下拖动
+        pixmap = window.image_label.pixmap()
+        left = (window.image_label.width() - pixmap.width()) / 2
+        top = (window.image_label.height() - pixmap.height()) / 2
+        x, y = window.annotations.keypoints[window.current_annotation.index, 0, :2]
+        px = int(left + x * window.current_image.width() * window.scale_factor)
+        py = int(top + y * window.current_image.height() * window.scale_factor)
+        window.image_mouse_press(_mouse(QEvent.MouseButtonPress, (px, py)))
+        for step in range(1, args.drag_moves + 1):
+            window.image_mouse_move(_mouse(QEvent.MouseMove, (px + step % 5, py + step % 5)))
+        window.image_mouse_release(_mouse(QEvent.MouseButtonRelease, (px, py)))
+
+    measure(results, args, "drag", drag)
+    label_path = window.get_label_path(window.image_files[0])
+    measure(results, args, "parse_labels", lambda: window._read_label_file(label_path))
+    measure(results, args, "save_labels", window.save_annotations)
+
+
+def bench_files(window, root, image_dir, args, results):
+    """format_six_decimals / delete_images_without_targets / auto_annotate_postprocess"""
+    rng = np.random.default_rng(1)
+    pred_dir = os.path.join(root, "pred")
+
+    def write_predictions():
+        shutil.rmtree(pred_dir, ignore_errors=True)
+        os.makedirs(pred_dir)
+        for i in range(args.images):
+            # ultralytics save_txt 的 %g 格式
+            with open(os.path.join(pred_dir, f"img_{i:05d}.txt"), "w") as f:
+                f.writelines("0 " + " ".join(f"{v:g}" for v in row) + "\n"
+                             for row in label_rows(rng, args.objects, args.keypoints))
+
+    def format_all():
+        for name in os.listdir(pred_dir):
+            format_six_decimals(os.path.join(pred_dir, name))
+
+    measure(results, args, "format_six_decimals", format_all, setup=write_predictions)
+
+    prune_root = os.path.join(root, "prune")
+
+    def prepare_prune():
+        # 图像硬链接到原图（不复制像素），偶数号有目标、奇数号标签为空
+        shutil.rmtree(prune_root, ignore_errors=True)
+        images = os.path.join(prune_root, "images")
+        labels = os.path.join(prune_root, "labels")
+        os.makedirs(images)
+        os.makedirs(labels)
+        names = annotation_tool.list_images(image_dir)
+        for i, name in enumerate(names):
+            os.link(os.path.join(image_dir, name), os.path.join(images, name))
+            with open(os.path.join(labels, os.path.splitext(name)[0] + ".txt"), "w") as f:
+                f.write("" if i % 2 else "0 0.5 0.5 0.1 0.1 0.5 0.5 2\n")
+        window.image_dir, window.labels_dir, window.image_files = images, labels, names
+
+    measure(results, args, "delete_images_without_targets", window.delete_images_without_targets,
+            setup=prepare_prune)
+
+    job_labels = os.path.join(root, "auto_labels")
+
+    def auto_annotate():
+        job = AnnotateJob(FakeModel(0.0, args.keypoints), image_dir, job_labels)
+        success, message, _ = job.run()
+        if not success:
+            raise RuntimeError(message)
+
+    measure(results, args, "auto_annotate_postprocess", auto_annotate,
+            setup=lambda: shutil.rmtree(job_labels, ignore_errors=True))
+
+
+def summarize(samples):
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples), "mean_ms": statistics.mean(samples),
+            "runs": len(samples)}
+
+
+def compare(results, baseline_path, threshold):
+    """打印与基线的比较，返回回归项列表"""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    print(f"与 {baseline_path}（提交 {baseline.get('commit', '?')}）比较，回归阈值 {threshold:.2f} 倍:")
+    if baseline.get("params") != results["params"]:
+        print("    注意: 两次运行的参数不同，结果不可直接比较")
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if old is None:
+            print(f"    {name:32s} 基线中没有该项")
+            continue
+        ratio = current["median_ms"] / max(old["median_ms"], 1e-9)
+        flag = "  回归" if ratio > threshold else ""
+        print(f"    {name:32s} {old['median_ms']:10.2f} -> {current['median_ms']:10.2f} ms  ×{ratio:.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(f"{name} 慢了 {ratio:.2f} 倍")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标注工具热路径基准套件")
+    parser.add_argument("--images", type=int, default=50, help="图像数（默认: 50）")
+    parser.add_argument("--width", type=int, default=1920, help="图像宽度（默认: 1920）")
+    parser.add_argument("--height", type=int, default=1080, help="图像高度（默认: 1080）")
+    parser.add_argument("--objects", type=int, default=10, help="每张图像的目标数（默认: 10）")
+    parser.add_argument("--keypoints", type=int, default=17, help="每个目标的关键点数（默认: 17）")
+    parser.add_argument("--drag-moves", type=int, default=30, help="每次拖动的移动步数（默认: 30）")
+    parser.add_argument("--repeat", type=int, default=10, help="每项重复次数（默认: 10）")
+    parser.add_argument("--only", default="", help="只运行这些项（逗号分隔，默认全部）")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径（默认: benchmarks/results/<提交号>.json）")
+    parser.add_argument("--compare", default=None, help="与该基线 JSON 比较")
+    parser.add_argument("--threshold", type=float, default=1.5, help="中位数变慢超过该倍数视为回归（默认: 1.5）")
+    args = parser.parse_args()
+    args.only = {name for name in args.only.split(",") if name}
+
+    samples = {}
+    tmp = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        # 生成数据用进程池，要在创建 QApplication 之前 fork
+        stats = generate(tmp, args.images, width=args.width, height=args.height, objects=(args.objects, args.objects),
+                         keypoints=args.keypoints)
+        image_dir, labels_dir = stats["images_dir"], stats["labels_dir"]
+        app = QApplication.instance() or QApplication(sys.argv)
+        window = annotation_tool.KeypointAnnotationTool(ai=False)
+        window.resize(1280, 800)
+        window.show()
+        app.processEvents()
+        try:
+            bench_window(window, image_dir, labels_dir, args, samples)
+            bench_files(window, tmp, image_dir, args, samples)
+        finally:
+            window.journal.close()
+            # 拖动等编辑只针对临时数据，不留下下次启动时询问恢复的自动保存日志
+            window.journal.path.unlink(missing_ok=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("only", "output", "compare", "threshold")},
+        "benchmarks": {name: summarize(s) for name, s in samples.items()},
+    }
+    for name, r in results["benchmarks"].items():
+        print(f"{name:32s} 中位数 {r['median_ms']:10.2f} ms  最小 {r['min_ms']:10.2f} ms  "
+              f"平均 {r['mean_ms']:10.2f} ms  （{r['runs']} 次）")
+
+    output = args.output or os.path.join(BENCH_DIR, "results", f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"结果已保存: {output}")
+
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+    for r in regressions:
+        print(f"回归: {r}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
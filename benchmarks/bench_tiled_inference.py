@@ -0,0 +1,155 @@
+"""
+分块推理基准：大图切块、跨图像批处理、合并块边界重复检测的正确性、耗时与峰值内存。
+
+不需要真实模型: 在临时目录生成 --images 张 --width x --height 的图像，每张随机放 --objects 个白色矩形
+（边长 --min-size 到 --max-size 像素，部分必然跨越块边界），用一个“假模型”代替 YOLO:
+    在输入图像上找白色矩形的外接框，四个角作为关键点（贴着输入边缘的角置信度低）；
+    模拟模型把输入缩小到 imgsz: 缩小后边长小于 --detect-px 像素的矩形检不出来
+分别测量
+    整图单次推理（假模型直接看整图）    小目标被缩小后漏检
+    分块推理                             召回率、重复检测数（同一矩形输出多于一个）、框与真值的平均 IoU
+以及分块推理每张图像的耗时（含解码、切块、合并）和 tracemalloc 统计的峰值内存（相对单张解码图像大小）。
+
+用法:
+    python benchmarks/bench_tiled_inference.py
+    python benchmarks/bench_tiled_inference.py --images 8 --width 7680 --height 4320 --tile 1024
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiled_inference import TiledPredictor  # noqa: E402
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class RectModel:
+    """找白色矩形的假模型，接口与 YOLO.predict（列表输入）一致"""
+
+    def __init__(self, detect_px):
+        self.detect_px = detect_px
+
+    def _detect(self, image, imgsz):
+        h, w = image.shape[:2]
+        scale = min(1.0, imgsz / float(max(h, w)))
+        mask = (image[:, :, 0] > 128).astype(np.uint8)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for c in contours:
+            x, y, bw, bh = cv2.boundingRect(c)
+            if min(bw, bh) * scale >= self.detect_px:
+                boxes.append((x, y, x + bw, y + bh))
+        xyxy = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        corners = np.stack([xyxy[:, [0, 1]], xyxy[:, [2, 1]], xyxy[:, [2, 3]], xyxy[:, [0, 3]]], axis=1)
+        at_edge = ((corners[..., 0] <= 1) | (corners[..., 0] >= w - 1) |
+                   (corners[..., 1] <= 1) | (corners[..., 1] >= h - 1))
+        kps = np.concatenate([corners, np.where(at_edge, 0.2, 0.95)[..., None]], axis=2)
+        result = SimpleNamespace(boxes=_Boxes(xyxy, np.full(len(xyxy), 0.9), np.zeros(len(xyxy))),
+                                 keypoints=SimpleNamespace(data=kps), names={0: "rect"})
+        return result
+
+    def predict(self, source, imgsz=640, conf=0.25, verbose=False):
+        return [self._detect(image, imgsz) for image in source]
+
+
+def make_image(rng, width, height, n, min_size, max_size):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    boxes = []
+    while len(boxes) < n:
+        bw, bh = rng.integers(min_size, max_size, 2)
+        x, y = rng.integers(0, width - bw), rng.integers(0, height - bh)
+        box = np.array([x, y, x + bw, y + bh])
+        # 矩形之间留出间隔，便于按连通域区分
+        if any((box[:2] < b[2:] + 4).all() and (b[:2] < box[2:] + 4).all() for b in boxes):
+            continue
+        boxes.append(box)
+        image[y:y + bh, x:x + bw] = 255
+    return image, np.array(boxes, dtype=np.float64)
+
+
+def iou(a, b):
+    lo, hi = np.maximum(a[:, None, :2], b[None, :, :2]), np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(hi - lo, 0, None).prod(axis=2)
+    area_a, area_b = (a[:, 2:] - a[:, :2]).prod(axis=1), (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter)
+
+
+def score(pred, truth):
+    """(检出的真值数, 多余检测数, 检出目标的平均 IoU)"""
+    if len(pred) == 0:
+        return 0, 0, 0.0
+    m = iou(pred, truth)
+    best = m.max(axis=0)
+    hit = best >= 0.5
+    return int(hit.sum()), int(len(pred) - hit.sum()), float(best[hit].mean()) if hit.any() else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分块推理基准")
+    parser.add_argument("--images", type=int, default=6, help="图像数（默认: 6）")
+    parser.add_argument("--width", type=int, default=3840, help="图像宽（默认: 3840）")
+    parser.add_argument("--height", type=int, default=2160, help="图像高（默认: 2160）")
+    parser.add_argument("--objects", type=int, default=40, help="每张图像的矩形数（默认: 40）")
+    parser.add_argument("--min-size", type=int, default=12, help="矩形最小边长（默认: 12）")
+    parser.add_argument("--max-size", type=int, default=400, help="矩形最大边长（默认: 400）")
+    parser.add_argument("--detect-px", type=float, default=6.0, help="缩小后能检出的最小边长（默认: 6）")
+    parser.add_argument("--tile", type=int, default=640, help="块边长（默认: 640）")
+    parser.add_argument("--overlap", type=float, default=0.2, help="块重叠比例（默认: 0.2）")
+    parser.add_argument("--batch", type=int, default=16, help="每批块数（默认: 16）")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tmp = tempfile.mkdtemp(prefix="bench_tiled_")
+    try:
+        truths = {}
+        for i in range(args.images):
+            image, boxes = make_image(rng, args.width, args.height, args.objects, args.min_size, args.max_size)
+            path = os.path.join(tmp, f"img_{i:04d}.png")
+            cv2.imwrite(path, image)
+            truths[path] = boxes
+        model = RectModel(args.detect_px)
+
+        whole = np.zeros(3)
+        for path, boxes in truths.items():
+            pred = model.predict([cv2.imread(path)], imgsz=args.tile)[0].boxes.xyxy
+            whole += score(pred.astype(np.float64), boxes)
+
+        predictor = TiledPredictor(model, tile=args.tile, overlap=args.overlap, batch=args.batch)
+        tiled = np.zeros(3)
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        for path, image, names, xyxy, conf, cls, kps in predictor.predict_arrays(sorted(truths)):
+            tiled += score(xyxy, truths[path])
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    total = args.images * args.objects
+    frame_mb = args.width * args.height * 3 / 1e6
+    print(f"图像: {args.images} 张 {args.width}x{args.height}  矩形: {args.objects} 个/张  块: {args.tile}px 重叠 {args.overlap}")
+    print(f"整图单次: 召回 {whole[0] / total:.1%}  多余检测 {int(whole[1])}  平均 IoU {whole[2] / args.images:.3f}")
+    print(f"分块推理: 召回 {tiled[0] / total:.1%}  多余检测 {int(tiled[1])}  平均 IoU {tiled[2] / args.images:.3f}")
+    print(predictor.summary())
+    print(f"总耗时 {elapsed:.2f}s  峰值内存 {peak / 1e6:.0f} MB（单张解码图像 {frame_mb:.0f} MB）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+TTA 基准：翻转 + 多尺度推理相对单次推理每张图像多花的时间，以及融合本身的开销和精度。
+
+两部分:
+    合成（不需要模型）  --images 张图像，每张 --objects 个目标 x --keypoints 个关键点（左右成对），
+                        每个视图的预测 = 真值 + 高斯噪声（翻转视图在翻转坐标系中生成并交换左右关键点，
+                        再经 view_predictions 翻回），测量 fuse_views 每张图像的耗时，
+                        并比较单个视图与融合结果的关键点平均误差（像素）；另检查无噪声翻转视图翻回后与真值一致
+    真实模型（可选）    提供 --model 和 --source 时，分别用单次推理、TTA 翻转、TTA 翻转+多尺度跑同一批图像，
+                        报告每张图像的耗时和相对单次推理的倍数（需要 ultralytics）
+
+用法:
+    python benchmarks/bench_tta.py
+    python benchmarks/bench_tta.py --model best.pt --source data/images --limit 200
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_inference import TTAPredictor, flip_index_from_names, fuse_views, view_predictions  # noqa: E402
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+def make_truth(rng, n, k):
+    cx = (np.arange(n) + 0.5) / n * WIDTH
+    cy = rng.uniform(0.3, 0.7, n) * HEIGHT
+    w, h = np.full(n, 0.5 * WIDTH / n), rng.uniform(0.1, 0.3, n) * HEIGHT
+    kx = cx[:, None] + rng.uniform(-0.4, 0.4, (n, k)) * w[:, None]
+    ky = cy[:, None] + rng.uniform(-0.4, 0.4, (n, k)) * h[:, None]
+    xyxy = np.column_stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+    kps = np.stack([kx, ky, np.ones((n, k))], axis=2)
+    return xyxy, rng.integers(0, 2, n), kps
+
+
+def make_view(rng, xyxy, cls, kps, flipped, flip_idx, noise):
+    """一个视图的带噪预测；翻转视图在翻转图像坐标系中，关键点按 flip_idx 交换左右"""
+    xyxy = xyxy + rng.normal(0, noise, xyxy.shape)
+    kps = kps.copy()
+    kps[..., :2] += rng.normal(0, noise, kps[..., :2].shape)
+    kps[..., 2] = rng.uniform(0.5, 1.0, kps.shape[:2])
+    if flipped:
+        xyxy = np.column_stack([WIDTH - xyxy[:, 2], xyxy[:, 1], WIDTH - xyxy[:, 0], xyxy[:, 3]])
+        kps[..., 0] = WIDTH - kps[..., 0]
+        kps = kps[:, flip_idx]
+    result = SimpleNamespace(boxes=_Boxes(xyxy, rng.uniform(0.5, 1.0, len(cls)), cls.astype(np.float32)),
+                             keypoints=SimpleNamespace(data=kps))
+    return view_predictions(result, flipped, WIDTH, flip_idx)
+
+
+def kp_error(pred_kps, truth_kps):
+    return float(np.linalg.norm(pred_kps[..., :2] - truth_kps[..., :2], axis=2).mean())
+
+
+def synthetic(args):
+    rng = np.random.default_rng(0)
+    pairs = args.keypoints // 2
+    names = [f"left_{i}" for i in range(pairs)] + [f"right_{i}" for i in range(pairs)]
+    names += [f"center_{i}" for i in range(args.keypoints - len(names))]
+    flip_idx = flip_index_from_names(names)
+    num_views = 2 * len(args.scales.split(","))
+
+    t_fuse = 0.0
+    err_single, err_fused, flip_exact = [], [], True
+    for _ in range(args.images):
+        xyxy, cls, kps = make_truth(rng, args.objects, args.keypoints)
+        views = [make_view(rng, xyxy, cls, kps, v % 2 == 1, flip_idx, args.noise) for v in range(num_views)]
+        t0 = time.perf_counter()
+        fused = fuse_views(views, num_views, WIDTH, HEIGHT)
+        t_fuse += time.perf_counter() - t0
+        err_single.append(kp_error(views[0][3], kps))
+        # 融合结果按框中心与真值对应
+        order = np.argsort((fused[0][:, 0] + fused[0][:, 2]) / 2)
+        if len(order) == args.objects:
+            err_fused.append(kp_error(fused[3][order], kps))
+        exact = make_view(np.random.default_rng(1), xyxy, cls, kps, True, flip_idx, 0.0)
+        flip_exact &= np.allclose(exact[0], xyxy) and np.allclose(exact[3][..., :2], kps[..., :2])
+
+    print(f"合成: {args.images} 张  目标: {args.objects} 个/张  关键点: {args.keypoints} 个  视图: {num_views}  "
+          f"噪声 σ={args.noise}px")
+    print(f"fuse_views: {t_fuse / args.images * 1e6:.0f} us/张    融合出全部目标的图像: {len(err_fused)}/{args.images}")
+    print(f"关键点平均误差: 单个视图 {np.mean(err_single):.2f}px  融合 {np.mean(err_fused):.2f}px")
+    print(f"无噪声翻转视图翻回后与真值一致（含左右关键点互换）: {flip_exact}")
+
+
+def real_model(args):
+    from ultralytics import YOLO
+
+    names = sorted(n for n in os.listdir(args.source) if n.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+    paths = [os.path.join(args.source, n) for n in names[:args.limit]]
+    model = YOLO(args.model)
+    model.predict(source=paths[:1], imgsz=args.imgsz, verbose=False)  # 预热
+    t0 = time.perf_counter()
+    for _ in model.predict(source=paths, imgsz=args.imgsz, stream=True, verbose=False):
+        pass
+    base = (time.perf_counter() - t0) / len(paths)
+    print(f"真实模型: {len(paths)} 张  imgsz={args.imgsz}")
+    print(f"  单次推理: {base * 1e3:.1f} ms/张")
+    scales = tuple(float(s) for s in args.scales.split(","))
+    for label, s in (("TTA 翻转", (1.0,)), (f"TTA 翻转+多尺度 {scales}", scales)):
+        tta = TTAPredictor(model, scales=s, flip=True, imgsz=args.imgsz)
+        for _ in tta.predict(paths):
+            pass
+        per_image = tta.seconds / max(tta.images, 1)
+        print(f"  {label}: {per_image * 1e3:.1f} ms/张（{per_image / base:.2f}x）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTA 基准")
+    parser.add_argument("--images", type=int, default=2000, help="合成图像数（默认: 2000）")
+    parser.add_argument("--objects", type=int, default=5, help="每张图像的目标数（默认: 5）")
+    parser.add_argument("--keypoints", type=int, default=8, help="每个目标的关键点数（默认: 8）")
+    parser.add_argument("--noise", type=float, default=4.0, help="每个视图关键点的噪声标准差，像素（默认: 4）")
+    parser.add_argument("--scales", type=str, default="1.0,1.5", help="TTA 尺度（默认: 1.0,1.5）")
+    parser.add_argument("--model", type=str, default=None, help="真实模型权重（可选）")
+    parser.add_argument("--source", type=str, default=None, help="真实模型测试图像目录（可选）")
+    parser.add_argument("--limit", type=int, default=100, help="真实模型测试的图像数（默认: 100）")
+    parser.add_argument("--imgsz", type=int, default=640, help="推理输入尺寸（默认: 640）")
+    args = parser.parse_args()
+    synthetic(args)
+    if args.model and args.source:
+        real_model(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+合成数据集生成器：写出 N 张图像和对应的 YOLO keypoints 标签，用于在本地复现大规模（几十万张）数据目录，
+驱动 benchmarks/ 下的基准和 main.py / only_auto_label_yolov8.py 的加载、解析、删除无目标图片等压力测试。
+
+    输出       <output>/images/<prefix>_000000.<format> 与 <output>/labels/<prefix>_000000.txt（标注工具的默认标签目录）
+    图像       --width x --height，格式 jpg/png/bmp/tiff；背景为随机渐变色，画出目标框和可见关键点，
+               --unique-images K 时只渲染 K 张，其余硬链接到它们（不支持硬链接时复制），几十万张也只需几分钟
+    标签       每张图像的目标数在 --objects 范围内均匀取（如 0-10），类别 --classes 个，每个目标 --keypoints 个关键点；
+               --kp-format xyv（x y v）或 xy（x y，坐标为 0 表示不可见）；--invisible-ratio 的关键点写为 0 0 0
+    坐标       --coords normalized 归一化 / pixel 像素（标注工具按图像尺寸换算）/ mixed 每个目标随机其一
+    数值格式   --float-format 6f（标注工具保存的格式）或 g（ultralytics save_txt 输出的格式）
+    无目标     --empty-ratio 的图像标签为空文件，--unlabeled-ratio 的图像没有标签文件
+    格式错误   --malformed-ratio 的行替换为错误行，种类由 --malformed-kinds 选择:
+                   short       少于 5 列（解析时忽略）
+                   columns     多出或缺少几列（only_auto_label_yolov8.py 的 --columns 修复）
+                   blank       空行
+                   whitespace  多余的空格与制表符
+                   text        含非数字字段（解析整个文件会报错，默认不生成）
+
+每张图像的内容只由 (--seed, 序号) 决定，与 --workers 无关，同样的参数总是生成同样的数据。
+在其他脚本中使用:
+
+    from synth_dataset import generate
+    stats = generate("/tmp/ds", 1000, width=640, height=480, objects=(0, 5), malformed_ratio=0.01)
+
+用法:
+    python benchmarks/synth_dataset.py /tmp/synth --images 1000
+    python benchmarks/synth_dataset.py /tmp/synth_500k --images 500000 --unique-images 200 --width 1280 --height 720
+    python benchmarks/synth_dataset.py /tmp/synth_bad --images 2000 --coords mixed --kp-format xy \\
+        --empty-ratio 0.2 --unlabeled-ratio 0.1 --malformed-ratio 0.05 --malformed-kinds short,columns,text
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+IMAGE_FORMATS = ("jpg", "png", "bmp", "tiff")
+COORD_MODES = ("normalized", "pixel", "mixed")
+KP_FORMATS = ("xyv", "xy")
+MALFORMED_KINDS = ("short", "columns", "blank", "whitespace", "text")
+# 解析器都能容忍的错误行；text 会让整个文件解析失败，需要显式选择
+DEFAULT_MALFORMED_KINDS = ("short", "columns", "blank", "whitespace")
+
+# 每个进程任务处理的图像数
+_CHUNK = 256
+
+
+def _parse_range(text):
+    """"3" -> (3, 3)，"0-10" -> (0, 10)"""
+    lo, _, hi = str(text).partition("-")
+    lo = int(lo)
+    hi = int(hi) if hi else lo
+    if lo < 0 or hi < lo:
+        raise argparse.ArgumentTypeError(f"无效的范围: {text}")
+    return lo, hi
+
+
+def _render(rng, width, height, boxes, kps):
+    """随机渐变背景，画出目标框和可见关键点（像素坐标）"""
+    c0, c1 = rng.integers(0, 256, (2, 3))
+    ramp = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :, None]
+    row = (c0 * (1.0 - ramp) + c1 * ramp).astype(np.uint8)
+    image = np.ascontiguousarray(np.broadcast_to(row, (height, width, 3)))
+    radius = max(2, min(width, height) // 200)
+    for (x0, y0, x1, y1), points in zip(boxes.astype(int).tolist(), kps):
+        cv2.rectangle(image, (x0, y0), (x1, y1), (0, 255, 0), max(1, radius // 2))
+        for x, y, v in points.tolist():
+            if v > 0:
+                cv2.circle(image, (int(x), int(y)), radius, (0, 0, 255), -1)
+    return image
+
+
+def _label_lines(rng, params, width, height):
+    """一张图像的标签行（不含格式错误），以及目标框 / 关键点的像素坐标供渲染"""
+    n = int(rng.integers(params["objects"][0], params["objects"][1] + 1))
+    k = params["keypoints"]
+    centers = rng.uniform(0.15, 0.85, (n, 2))
+    sizes = rng.uniform(0.05, 0.25, (n, 2))
+    # 关键点落在目标框内
+    kps = np.empty((n, k, 3))
+    kps[..., :2] = centers[:, None, :] + (rng.uniform(-0.5, 0.5, (n, k, 2)) * sizes[:, None, :])
+    kps[..., 2] = np.where(rng.random((n, k)) < params["invisible_ratio"], 0, 2)
+    kps[kps[..., 2] == 0] = 0
+    classes = rng.integers(0, params["classes"], n)
+    if params["coords"] == "pixel":
+        pixel = np.ones(n, dtype=bool)
+    elif params["coords"] == "mixed":
+        pixel = rng.random(n) < 0.5
+    else:
+        pixel = np.zeros(n, dtype=bool)
+
+    scale = np.array([width, height], dtype=np.float64)
+    fmt = "{:" + params["float_format"] + "}"
+    lines = []
+    for i in range(n):
+        s = scale if pixel[i] else 1.0
+        box = np.concatenate([centers[i] * s, sizes[i] * s])
+        points = kps[i].copy()
+        points[:, :2] *= s
+        if params["kp_format"] == "xy":
+            points = points[:, :2]
+        values = " ".join(fmt.format(v) for v in np.concatenate([box, points.ravel()]).tolist())
+        lines.append(f"{int(classes[i])} {values}")
+
+    boxes_px = np.concatenate([(centers - sizes / 2) * scale, (centers + sizes / 2) * scale], axis=1)
+    kps_px = kps.copy()
+    kps_px[..., :2] *= scale
+    return lines, boxes_px, kps_px
+
+
+def _malform(rng, line, kinds):
+    kind = kinds[int(rng.integers(len(kinds)))]
+    parts = line.split()
+    if kind == "short":
+        return " ".join(parts[:int(rng.integers(1, 5))])
+    if kind == "columns":
+        if rng.random() < 0.5 and len(parts) > 6:
+            return " ".join(parts[:-int(rng.integers(1, 3))])
+        return " ".join(parts + ["0"] * int(rng.integers(1, 4)))
+    if kind == "blank":
+        return ""
+    if kind == "whitespace":
+        return "  " + "\t ".join(parts) + "   "
+    parts[int(rng.integers(1, len(parts)))] = "nan?"
+    return " ".join(parts)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _image_path(image_dir, params, index):
+    return os.path.join(image_dir, f"{params['prefix']}_{index:06d}.{params['image_format']}")
+
+
+def _write_chunk(output_dir, params, indices):
+    """生成 indices 中的图像和标签，返回 (图像字节数, 标签字节数, 目标行数, 格式错误行数)"""
+    image_dir = os.path.join(output_dir, "images")
+    labels_dir = os.path.join(output_dir, "labels")
+    width, height = params["width"], params["height"]
+    encode = []
+    if params["image_format"] == "jpg":
+        encode = [cv2.IMWRITE_JPEG_QUALITY, params["quality"]]
+    unique = params["unique_images"]
+    image_bytes = label_bytes = objects = malformed = 0
+    for index in indices:
+        rng = np.random.default_rng([params["seed"], index])
+        lines, boxes, kps = _label_lines(rng, params, width, height)
+        state = rng.random()
+        if state < params["unlabeled_ratio"]:
+            lines = None
+        elif state < params["unlabeled_ratio"] + params["empty_ratio"]:
+            lines = []
+
+        path = _image_path(image_dir, params, index)
+        if unique and index >= unique:
+            _link_or_copy(_image_path(image_dir, params, index % unique), path)
+        else:
+            cv2.imwrite(path, _render(rng, width, height, boxes, kps), encode)
+        image_bytes += os.path.getsize(path)
+
+        if lines is None:
+            continue
+        objects += len(lines)
+        bad = rng.random(len(lines)) < params["malformed_ratio"]
+        for i in np.flatnonzero(bad).tolist():
+            lines[i] = _malform(rng, lines[i], params["malformed_kinds"])
+        malformed += int(bad.sum())
+        text = "".join(line + "\n" for line in lines)
+        with open(os.path.join(labels_dir, f"{params['prefix']}_{index:06d}.txt"), "w") as f:
+            f.write(text)
+        label_bytes += len(text)
+    return image_bytes, label_bytes, objects, malformed
+
+
+def generate(output_dir, images, width=1920, height=1080, image_format="jpg", quality=90, objects=(1, 5),
+             keypoints=17, classes=1, coords="normalized", kp_format="xyv", invisible_ratio=0.0,
+             float_format="6f", empty_ratio=0.0, unlabeled_ratio=0.0, malformed_ratio=0.0,
+             malformed_kinds=DEFAULT_MALFORMED_KINDS, unique_images=0, workers=None, seed=0, prefix="img"):
+    """生成数据集（参数含义见模块说明），返回统计字典
+
+    images_dir / labels_dir、images、image_bytes、label_bytes、objects（目标行数，含格式错误行）、
+    malformed（格式错误行数）、seconds
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图像格式: {image_format}")
+    if coords not in COORD_MODES or kp_format not in KP_FORMATS:
+        raise ValueError(f"无效的坐标或关键点格式: {coords} / {kp_format}")
+    unknown = set(malformed_kinds) - set(MALFORMED_KINDS)
+    if unknown or (malformed_ratio > 0 and not malformed_kinds):
+        raise ValueError(f"无效的格式错误种类: {', '.join(sorted(unknown)) or '（空）'}")
+    params = {
+        "width": width, "height": height, "image_format": image_format, "quality": quality,
+        "objects": tuple(objects), "keypoints": keypoints, "classes": max(1, classes), "coords": coords,
+        "kp_format": kp_format, "invisible_ratio": invisible_ratio,
+        "float_format": {"6f": ".6f", "g": "g"}.get(float_format, float_format),
+        "empty_ratio": empty_ratio, "unlabeled_ratio": unlabeled_ratio, "malformed_ratio": malformed_ratio,
+        "malformed_kinds": tuple(malformed_kinds), "unique_images": min(max(0, unique_images), images),
+        "seed": seed, "prefix": prefix,
+    }
+    images_dir = os.path.join(output_dir, "images")
+    labels_dir = os.path.join(output_dir, "labels")
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(labels_dir, exist_ok=True)
+
+    # 先渲染要被硬链接的图像，再生成其余图像
+    unique = params["unique_images"]
+    phases = [range(unique), range(unique, images)] if unique else [range(images)]
+    totals = np.zeros(4, dtype=np.int64)
+    t0 = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for indices in phases:
+            chunks = [indices[i:i + _CHUNK] for i in range(0, len(indices), _CHUNK)]
+            for counts in pool.map(_write_chunk, [output_dir] * len(chunks), [params] * len(chunks), chunks):
+                totals += counts
+    image_bytes, label_bytes, object_lines, malformed = totals.tolist()
+    return {"images_dir": images_dir, "labels_dir": labels_dir, "images": images, "image_bytes": image_bytes,
+            "label_bytes": label_bytes, "objects": object_lines, "malformed": malformed,
+            "seconds": time.perf_counter() - t0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成数据集生成器（图像 + YOLO keypoints 标签）")
+    parser.add_argument("output", help="输出目录（写入 images/ 与 labels/）")
+    parser.add_argument("--images", type=int, default=1000, help="图像数（默认: 1000）")
+    parser.add_argument("--width", type=int, default=1920, help="图像宽度（默认: 1920）")
+    parser.add_argument("--height", type=int, default=1080, help="图像高度（默认: 1080）")
+    parser.add_argument("--format", choices=IMAGE_FORMATS, default="jpg", dest="image_format",
+                        help="图像格式（默认: jpg）")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG 质量 1-100（默认: 90）")
+    parser.add_argument("--unique-images", type=int, default=0,
+                        help="只渲染这么多张不同的图像，其余硬链接到它们，0 表示全部渲染（默认: 0）")
+    parser.add_argument("--objects", type=_parse_range, default=(1, 5), help="每张图像的目标数，如 3 或 0-10（默认: 1-5）")
+    parser.add_argument("--keypoints", type=int, default=17, help="每个目标的关键点数（默认: 17）")
+    parser.add_argument("--classes", type=int, default=1, help="类别数（默认: 1）")
+    parser.add_argument("--coords", choices=COORD_MODES, default="normalized", help="坐标形式（默认: normalized）")
+    parser.add_argument("--kp-format", choices=KP_FORMATS, default="xyv", help="关键点格式（默认: xyv）")
+    parser.add_argument("--invisible-ratio", type=float, default=0.0, help="不可见关键点比例（默认: 0）")
+    parser.add_argument("--float-format", choices=("6f", "g"), default="6f",
+                        help="数值格式：6f 标注工具格式 / g ultralytics save_txt 格式（默认: 6f）")
+    parser.add_argument("--empty-ratio", type=float, default=0.0, help="标签为空文件的图像比例（默认: 0）")
+    parser.add_argument("--unlabeled-ratio", type=float, default=0.0, help="没有标签文件的图像比例（默认: 0）")
+    parser.add_argument("--malformed-ratio", type=float, default=0.0, help="格式错误行的比例（默认: 0）")
+    parser.add_argument("--malformed-kinds", default=",".join(DEFAULT_MALFORMED_KINDS),
+                        help=f"格式错误种类，逗号分隔，可选 {','.join(MALFORMED_KINDS)}"
+                             f"（默认: {','.join(DEFAULT_MALFORMED_KINDS)}）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认: CPU 核数）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（默认: 0）")
+    parser.add_argument("--prefix", default="img", help="文件名前缀（默认: img）")
+    args = parser.parse_args()
+
+    kwargs = vars(args).copy()
+    output = kwargs.pop("output")
+    count = kwargs.pop("images")
+    kwargs["malformed_kinds"] = tuple(k for k in args.malformed_kinds.split(",") if k)
+    try:
+        stats = generate(output, count, **kwargs)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"已生成 {stats['images']} 张图像（{stats['image_bytes'] / 2 ** 20:.1f} MiB）: {stats['images_dir']}")
+    print(f"标签: {stats['objects']} 行，其中格式错误 {stats['malformed']} 行（{stats['label_bytes'] / 2 ** 20:.1f} MiB）: "
+          f"{stats['labels_dir']}")
+    print(f"耗时 {stats['seconds']:.1f} s（{stats['images'] / max(stats['seconds'], 1e-9):.0f} 张/s）")
+
+
+if __name__ == "__main__":
+    main()
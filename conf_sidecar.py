@@ -0,0 +1,241 @@
+"""
+自动标注置信度旁路文件（sidecar）。
+
+YOLO 标签 txt 中不保存置信度（与手动标注格式保持一致），每个目标和每个关键点的置信度
+以列式 .npz 分片的形式写在标签目录下的 .conf/ 子目录中:
+
+    labels/
+        a.txt  b.txt ...
+        .conf/
+            main.npz            合并后的分片（单机自动标注每次写入 auto_*.npz 后立即合并到这里）
+            chunk_000001.npz    分布式 worker 按块写入的分片（协调者结束时合并为 main.npz）
+
+每个分片包含:
+    stems       (M,)    图像文件名（不含扩展名）
+    offsets     (M+1,)  第 i 张图像的目标位于 obj_conf[offsets[i]:offsets[i+1]]
+    obj_conf    (N,)    每个目标的置信度 float32
+    kp_conf     (N, K)  每个关键点的置信度 float32，模型不输出关键点置信度时 K=0
+
+复核队列只需读取这几个数组即可排序，无需重新解析任何标签文件。
+"""
+import itertools
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+SIDECAR_DIRNAME = ".conf"
+MAIN_SHARD = "main"
+_shard_counter = itertools.count()
+
+
+def sidecar_dir(labels_dir):
+    return Path(labels_dir) / SIDECAR_DIRNAME
+
+
+def auto_shard_name():
+    """单机自动标注每次运行用一个新的分片名，不覆盖尚未合并的旧分片
+
+    除时间（到微秒）外还含进程号和进程内序号：同一秒内启动的多次运行（包括多个进程）也不会写到同一个分片。
+    """
+    now = time.time()
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+    return f"auto_{stamp}_{int(now % 1 * 1e6):06d}_{os.getpid()}_{next(_shard_counter)}"
+
+
+def _save_npz_atomic(path, **arrays):
+    """np.savez 到同目录临时文件后 os.replace，避免读者读到写了一半的分片"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def result_confidences(result):
+    """从 ultralytics 单张图像预测结果中取出 (obj_conf (N,), kp_conf (N,K) 或 None)"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return None, None
+    obj_conf = boxes.conf.cpu().numpy()
+    kp_conf = None
+    if result.keypoints is not None and result.keypoints.conf is not None:
+        kp_conf = result.keypoints.conf.cpu().numpy()
+    return obj_conf, kp_conf
+
+
+class ConfidenceWriter:
+    """累积一批图像的置信度，save() 时写成一个分片"""
+
+    def __init__(self, labels_dir, shard=None):
+        """shard 为 None 时（单机）写入新的 auto_*.npz，save() 后与已有分片合并为 main.npz；分布式 worker 传入块名"""
+        self.labels_dir = labels_dir
+        self.compact = shard is None
+        self.path = sidecar_dir(labels_dir) / f"{shard or auto_shard_name()}.npz"
+        self.stems = []
+        self.obj_conf = []
+        self.kp_conf = []
+
+    def add(self, stem, obj_conf, kp_conf=None):
+        """记录一张图像的置信度；没有目标的图像不记录（也不会生成标签文件）"""
+        obj_conf = np.asarray(obj_conf, dtype=np.float32).reshape(-1)
+        if obj_conf.size == 0:
+            return
+        if kp_conf is None:
+            kp_conf = np.zeros((obj_conf.size, 0), dtype=np.float32)
+        self.stems.append(stem)
+        self.obj_conf.append(obj_conf)
+        self.kp_conf.append(np.asarray(kp_conf, dtype=np.float32).reshape(obj_conf.size, -1))
+
+    def add_result(self, result):
+        obj_conf, kp_conf = result_confidences(result)
+        if obj_conf is not None:
+            self.add(Path(result.path).stem, obj_conf, kp_conf)
+
+    def discard(self, stems):
+        """去掉这些图像的记录（例如预测最终没有写入标签目录）"""
+        stems = set(stems)
+        keep = [i for i, stem in enumerate(self.stems) if stem not in stems]
+        self.stems = [self.stems[i] for i in keep]
+        self.obj_conf = [self.obj_conf[i] for i in keep]
+        self.kp_conf = [self.kp_conf[i] for i in keep]
+
+    def save(self):
+        if not self.stems:
+            return None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        counts = [c.size for c in self.obj_conf]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        _save_npz_atomic(
+            self.path,
+            stems=np.array(self.stems),
+            offsets=offsets,
+            obj_conf=np.concatenate(self.obj_conf),
+            kp_conf=_stack_kp_conf(self.kp_conf),
+        )
+        if self.compact:
+            compact_sidecar(self.labels_dir)
+            return sidecar_dir(self.labels_dir) / f"{MAIN_SHARD}.npz"
+        return self.path
+
+
+def _stack_kp_conf(blocks):
+    """拼接若干 (n_i, K_i) 的关键点置信度块，K 不一致时用 NaN 补齐"""
+    width = max(b.shape[1] for b in blocks)
+    if all(b.shape[1] == width for b in blocks):
+        return np.concatenate(blocks)
+    out = np.full((sum(b.shape[0] for b in blocks), width), np.nan, dtype=np.float32)
+    row = 0
+    for b in blocks:
+        out[row:row + b.shape[0], :b.shape[1]] = b
+        row += b.shape[0]
+    return out
+
+
+class ConfidenceIndex:
+    """合并后的置信度索引，按图像汇总出复核分数"""
+
+    def __init__(self, stems, offsets, obj_conf, kp_conf):
+        self.stems = stems
+        self.offsets = offsets
+        self.obj_conf = obj_conf
+        self.kp_conf = kp_conf
+        # 图像分数：该图中最不可信目标的置信度（目标置信度与其关键点平均置信度取较小者）
+        per_obj = obj_conf
+        if kp_conf.shape[1] > 0:
+            with np.errstate(invalid="ignore"):
+                kp_mean = np.nanmean(kp_conf, axis=1)
+            per_obj = np.fmin(obj_conf, kp_mean)
+        self.image_scores = (np.minimum.reduceat(per_obj, offsets[:-1])
+                             if len(stems) else np.zeros(0, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.stems)
+
+    def image_confidences(self, stem):
+        """返回某张图像的 (obj_conf, kp_conf)，不存在时返回 None"""
+        idx = np.flatnonzero(self.stems == stem)
+        if idx.size == 0:
+            return None
+        start, end = self.offsets[idx[0]], self.offsets[idx[0] + 1]
+        return self.obj_conf[start:end], self.kp_conf[start:end]
+
+    def review_order(self, image_files):
+        """按图像分数从低到高排列 image_files；sidecar 中没有记录的图像保持原顺序排在最后"""
+        if not len(self.stems):
+            return list(image_files)
+        names = np.array([os.path.splitext(n)[0] for n in image_files])
+        order = np.argsort(self.stems)
+        sorted_stems = self.stems[order]
+        pos = np.searchsorted(sorted_stems, names).clip(0, len(sorted_stems) - 1)
+        found = sorted_stems[pos] == names
+        scores = np.full(len(image_files), np.inf, dtype=np.float32)
+        scores[found] = self.image_scores[order[pos[found]]]
+        # 稳定排序保证无记录（inf）的图像维持原有相对顺序
+        return [image_files[i] for i in np.argsort(scores, kind="stable")]
+
+
+def _read_shards(paths):
+    stems, offsets, obj_conf, kp_conf = [], [], [], []
+    base = 0
+    for path in paths:
+        with np.load(path) as data:
+            stems.append(data["stems"])
+            offsets.append(data["offsets"][:-1] + base)
+            obj_conf.append(data["obj_conf"])
+            kp_conf.append(data["kp_conf"])
+            base += data["obj_conf"].size
+    offsets.append(np.array([base], dtype=np.int64))
+    return (np.concatenate(stems), np.concatenate(offsets),
+            np.concatenate(obj_conf), _stack_kp_conf(kp_conf))
+
+
+def load_confidence_index(labels_dir):
+    """读取标签目录下的全部分片并合并为 ConfidenceIndex；没有 sidecar 时返回 None
+
+    同一图像出现在多个分片中时，以修改时间最新的分片为准。
+    """
+    directory = sidecar_dir(labels_dir)
+    if not directory.is_dir():
+        return None
+    paths = sorted((p for p in directory.glob("*.npz")), key=lambda p: p.stat().st_mtime)
+    if not paths:
+        return None
+    stems, offsets, obj_conf, kp_conf = _read_shards(paths)
+
+    # 去重：倒序后 np.unique 取每个 stem 的第一次出现，即最新分片中的记录
+    rev_idx = np.unique(stems[::-1], return_index=True)[1]
+    keep = np.sort(len(stems) - 1 - rev_idx)
+    if keep.size != len(stems):
+        counts_all = np.diff(offsets)
+        keep_mask = np.zeros(len(stems), dtype=bool)
+        keep_mask[keep] = True
+        rows = np.repeat(keep_mask, counts_all)
+        counts = counts_all[keep]
+        stems = stems[keep]
+        obj_conf, kp_conf = obj_conf[rows], kp_conf[rows]
+        offsets = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+    return ConfidenceIndex(stems, offsets, obj_conf, kp_conf)
+
+
+def compact_sidecar(labels_dir):
+    """把所有分片合并为单个 main.npz（分布式运行结束后、单机运行保存后调用），返回合并后的图像数
+
+    先列出要删除的分片再读取，合并期间新写入的分片不会未经合并就被删掉。
+    """
+    directory = sidecar_dir(labels_dir)
+    old_paths = [p for p in directory.glob("*.npz") if p.stem != MAIN_SHARD]
+    index = load_confidence_index(labels_dir)
+    if index is None:
+        return 0
+    _save_npz_atomic(directory / f"{MAIN_SHARD}.npz", stems=index.stems, offsets=index.offsets,
+                     obj_conf=index.obj_conf, kp_conf=index.kp_conf)
+    for p in old_paths:
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+    return len(index)
@@ -0,0 +1,121 @@
+"""
+数据集标签统计（向量化汇总），供 main.py 的“数据集统计”面板使用。
+
+统计量全部建立在 DatasetLabelStore 的列式数组上（并行解析、按 mtime 缓存由标签库负责），
+并且都是可加的计数，保存单张图像时只需减去旧标签、加上新标签即可增量更新，无需重新扫描:
+    class_counts    (C,)    每个类别的目标数
+    kp_visible      (C, K)  每个类别每个关键点可见的次数
+    kp_total        (C, K)  每个类别每个关键点出现的次数（可见率 = kp_visible / kp_total）
+    size_hist       bbox 尺寸 sqrt(w*h)（归一化）直方图，区间见 SIZE_BINS
+    aspect_hist     bbox 宽高比 log2(w/h) 直方图，区间见 ASPECT_BINS（超出范围的计入两端）
+    empty_stems     有标签文件但没有有效目标的图像
+"""
+import os
+
+import numpy as np
+
+from dataset_store import keypoint_counts, keypoints_from_values
+
+SIZE_BINS = np.linspace(0.0, 1.0, 21)
+ASPECT_BINS = np.linspace(-4.0, 4.0, 17)
+
+
+def _histogram(values, bins):
+    """超出范围的值计入两端的区间，保证增量加减时总数守恒"""
+    values = np.clip(values, bins[0], bins[-1])
+    return np.histogram(values, bins=bins)[0].astype(np.int64)
+
+
+class LabelStats:
+    """可增量更新的数据集统计"""
+
+    def __init__(self):
+        self.class_counts = np.zeros(0, dtype=np.int64)
+        self.kp_visible = np.zeros((0, 0), dtype=np.int64)
+        self.kp_total = np.zeros((0, 0), dtype=np.int64)
+        self.size_hist = np.zeros(len(SIZE_BINS) - 1, dtype=np.int64)
+        self.aspect_hist = np.zeros(len(ASPECT_BINS) - 1, dtype=np.int64)
+        self.num_objects = 0
+        self.num_label_files = 0
+        self.empty_stems = set()
+
+    @classmethod
+    def from_store(cls, store):
+        """对整个标签库做一次向量化汇总"""
+        stats = cls()
+        stats._accumulate(store.class_ids, store.values, store.ncols, 1)
+        stats.num_label_files = store.num_images
+        stats.empty_stems = set(store.images_without_targets().tolist())
+        return stats
+
+    def _grow(self, num_classes, num_kps):
+        c, k = self.kp_total.shape
+        if num_classes <= c and num_kps <= k:
+            return
+        c2, k2 = max(c, num_classes), max(k, num_kps)
+        for name in ("kp_visible", "kp_total"):
+            old = getattr(self, name)
+            new = np.zeros((c2, k2), dtype=np.int64)
+            new[:c, :k] = old
+            setattr(self, name, new)
+        counts = np.zeros(c2, dtype=np.int64)
+        counts[:len(self.class_counts)] = self.class_counts
+        self.class_counts = counts
+
+    def _accumulate(self, class_ids, values, ncols, sign):
+        """把一批目标计入（sign=1）或移出（sign=-1）统计"""
+        n = len(class_ids)
+        if n == 0:
+            return
+        class_ids = np.asarray(class_ids, dtype=np.int64)
+        values = np.asarray(values)
+        kps = keypoints_from_values(values, ncols)
+        k = kps.shape[1]
+        self._grow(int(class_ids.max()) + 1, k)
+        num_classes, width = self.kp_total.shape
+
+        self.class_counts += sign * np.bincount(class_ids, minlength=num_classes)
+        if k:
+            in_row = np.arange(k)[None, :] < keypoint_counts(ncols)[:, None]
+            flat = (class_ids[:, None] * width + np.arange(k)[None, :])
+            self.kp_total += sign * np.bincount(flat[in_row], minlength=num_classes * width).reshape(num_classes, width)
+            visible = kps[..., 2] > 0
+            self.kp_visible += sign * np.bincount(flat[visible], minlength=num_classes * width).reshape(
+                num_classes, width)
+
+        w, h = values[:, 2].astype(np.float64), values[:, 3].astype(np.float64)
+        self.size_hist += sign * _histogram(np.sqrt(np.clip(w * h, 0.0, None)), SIZE_BINS)
+        valid = (w > 0) & (h > 0)
+        self.aspect_hist += sign * _histogram(np.log2(w[valid] / h[valid]), ASPECT_BINS)
+        self.num_objects += sign * n
+
+    def update_image(self, store, stem, text):
+        """保存单张图像后调用：同步标签库并增量更新统计（减去旧标签、加上新标签）"""
+        old = store.image_labels(stem)
+        store.update_text(stem, text)
+        new = store.image_labels(stem)
+        if old is not None:
+            self._accumulate(*old, -1)
+        else:
+            self.num_label_files += 1
+        self._accumulate(*new, 1)
+        if len(new[0]):
+            self.empty_stems.discard(stem)
+        else:
+            self.empty_stems.add(stem)
+
+    def keypoint_visibility(self):
+        """(C, K) 每个类别每个关键点的可见率，该类别没有这个关键点时为 NaN"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.kp_total > 0, self.kp_visible / np.maximum(self.kp_total, 1), np.nan)
+
+    def images_without_targets(self, image_files, store):
+        """image_files 中没有标签文件或标签中没有有效目标的图像"""
+        if not image_files:
+            return []
+        stems = np.array([os.path.splitext(n)[0] for n in image_files], dtype=str)
+        has_labels = store.contains(stems)
+        empty = ~has_labels
+        if self.empty_stems:
+            empty |= np.isin(stems, np.array(sorted(self.empty_stems), dtype=str))
+        return [image_files[i] for i in np.flatnonzero(empty)]
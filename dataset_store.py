@@ -0,0 +1,509 @@
+"""
+整个数据集标签的列式存储（可选），用于统计、筛选、清理等数据集级操作。
+
+原先每次数据集级操作都要通过 get_label_path 逐个打开成千上万个小 txt。这里把标签目录下
+全部标签镜像为几组列式数组，存放在标签目录下的 .store/ 子目录中:
+
+    labels/
+        a.txt  b.txt ...
+        .store/
+            meta.json               当前代号（generation）、图像数、目标数、列宽
+            gen_000003/             当前代号的基础数据，每列一个 .npy，用 mmap 只读加载
+                stems.npy    (M,)    图像文件名（不含扩展名），按字典序排列
+                mtimes.npy   (M,)    建库时标签文件的修改时间，用于增量刷新
+                offsets.npy  (M+1,)  第 i 张图像的目标位于 [offsets[i], offsets[i+1])
+                class_ids.npy (N,)   int32
+                values.npy   (N, W)  类别之后的全部数值（bbox + 关键点）float32，不足 W 列补 0
+                ncols.npy    (N,)    每行实际的数值个数
+            delta.npz               基础数据之后的增量（保存标注时写入），条目数达到阈值时合并为新代号
+
+数值以 float32 保存，归一化坐标按 6 位小数导出时与原文本一致；少于 5 列的行与 main.py 一样忽略。
+"""
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from annotation_store import parse_keypoint_block
+from work_queue import atomic_write_text
+
+STORE_DIRNAME = ".store"
+STORE_VERSION = 1
+# 增量条目数达到该值时自动合并为新的基础数据
+COMPACT_THRESHOLD = 1024
+# 标签文件数少于该值时直接在当前进程解析，避免进程池启动开销
+_PARALLEL_MIN_FILES = 2000
+_PARSE_CHUNK = 1000
+_COLUMNS = ("stems", "mtimes", "offsets", "class_ids", "values", "ncols")
+
+
+def store_dir(labels_dir):
+    return Path(labels_dir) / STORE_DIRNAME
+
+
+def parse_label_text(text):
+    """解析一个 YOLO 标签文本，返回 (class_ids (n,), values (n, W), ncols (n,))"""
+    rows = [line.split() for line in text.splitlines()]
+    rows = [r for r in rows if len(r) >= 5]
+    if not rows:
+        return (np.zeros(0, dtype=np.int32), np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int16))
+    lengths = np.array([len(r) for r in rows], dtype=np.int16)
+    width = int(lengths.max())
+    if (lengths == width).all():
+        data = np.array(rows, dtype=np.float64)
+    else:
+        # 列数不一致时按列数分组转换，再放回原来的行序
+        data = np.zeros((len(rows), width), dtype=np.float64)
+        for n in np.unique(lengths).tolist():
+            idxs = np.flatnonzero(lengths == n)
+            data[idxs, :n] = np.array([rows[i] for i in idxs], dtype=np.float64)
+    return data[:, 0].astype(np.int32), data[:, 1:].astype(np.float32), lengths - 1
+
+
+def keypoint_counts(ncols):
+    """每行的关键点数，规则同 annotation_store.parse_keypoint_block（标注工具读标签）:
+    bbox 之后的数值个数能被 3 整除时按 x y v 解析，否则能被 2 整除时按 x y 解析，其他情况没有关键点
+    """
+    n = np.maximum(np.asarray(ncols, dtype=np.int64) - 4, 0)
+    return np.where((n > 0) & (n % 3 == 0), n // 3, np.where(n % 2 == 0, n // 2, 0))
+
+
+def keypoints_from_values(values, ncols):
+    """把 values (n, W) 中 bbox 之后的数值解析为 (n, K, 3)，与标注工具读到的关键点一致
+
+    按每行实际的数值个数分组调用 parse_keypoint_block（x y v 格式 v 一律视为 2；x y 格式 x、y 均非 0 时 v=2），
+    超出该行关键点数的位置为 0（不可见）。坐标保持原样（不按图像尺寸换算像素坐标）。
+    """
+    ncols = np.asarray(ncols, dtype=np.int64)
+    blocks = []
+    for n in np.unique(ncols).tolist():
+        rows = np.flatnonzero(ncols == n)
+        blocks.append((rows, parse_keypoint_block(values[rows, 4:max(n, 4)], 1, 1)))
+    width = max([0] + [kps.shape[1] for _, kps in blocks])
+    out = np.zeros((len(values), width, 3), dtype=np.float32)
+    for rows, kps in blocks:
+        out[rows, :kps.shape[1]] = kps
+    return out
+
+
+def _pad_width(values, width):
+    if values.shape[1] >= width:
+        return values
+    out = np.zeros((values.shape[0], width), dtype=np.float32)
+    out[:, :values.shape[1]] = values
+    return out
+
+
+def _concat_values(blocks):
+    width = max([4] + [b.shape[1] for b in blocks])
+    if not blocks:
+        return np.zeros((0, width), dtype=np.float32)
+    return np.concatenate([_pad_width(b, width) for b in blocks])
+
+
+def _parse_files(paths):
+    """解析一批标签文件（可在子进程中运行），返回拼接后的列"""
+    stems, mtimes, counts, cls, values, ncols = [], [], [], [], [], []
+    for path in paths:
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, "r") as f:
+                c, v, n = parse_label_text(f.read())
+        except (OSError, ValueError):
+            continue
+        stems.append(os.path.splitext(os.path.basename(path))[0])
+        mtimes.append(mtime)
+        counts.append(c.size)
+        cls.append(c)
+        values.append(v)
+        ncols.append(n)
+    return (stems, np.array(mtimes, dtype=np.float64), np.array(counts, dtype=np.int64),
+            np.concatenate(cls) if cls else np.zeros(0, dtype=np.int32),
+            _concat_values(values),
+            np.concatenate(ncols) if ncols else np.zeros(0, dtype=np.int16))
+
+
+def parse_label_files(paths, workers=None):
+    """并行解析若干标签文件，返回 _Columns（按文件名排序）"""
+    paths = list(paths)
+    if len(paths) < _PARALLEL_MIN_FILES or workers == 1:
+        parts = [_parse_files(paths)]
+    else:
+        chunks = [paths[i:i + _PARSE_CHUNK] for i in range(0, len(paths), _PARSE_CHUNK)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_parse_files, chunks))
+    stems = np.array([s for p in parts for s in p[0]], dtype=str)
+    counts = np.concatenate([p[2] for p in parts])
+    columns = _Columns(stems, np.concatenate([p[1] for p in parts]), _offsets(counts),
+                       np.concatenate([p[3] for p in parts]), _concat_values([p[4] for p in parts]),
+                       np.concatenate([p[5] for p in parts]))
+    return columns.sorted()
+
+
+def _offsets(counts):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+class _Columns:
+    """一组按图像分段的列"""
+
+    __slots__ = _COLUMNS
+
+    def __init__(self, stems, mtimes, offsets, class_ids, values, ncols):
+        self.stems = stems
+        self.mtimes = mtimes
+        self.offsets = offsets
+        self.class_ids = class_ids
+        self.values = values
+        self.ncols = ncols
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=str), np.zeros(0), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                   np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int16))
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def image(self, i):
+        """第 i 张图像单独构成的 _Columns（切片，不复制）"""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return _Columns(self.stems[i:i + 1], self.mtimes[i:i + 1], self.offsets[i:i + 2] - start,
+                        self.class_ids[start:end], self.values[start:end], self.ncols[start:end])
+
+    def select(self, image_mask):
+        """按图像掩码取子集"""
+        rows = np.repeat(image_mask, self.counts())
+        return _Columns(self.stems[image_mask], self.mtimes[image_mask], _offsets(self.counts()[image_mask]),
+                        self.class_ids[rows], self.values[rows], self.ncols[rows])
+
+    def sorted(self):
+        """按 stem 字典序重排（便于 searchsorted 查找）"""
+        if len(self.stems) < 2 or (self.stems[:-1] <= self.stems[1:]).all():
+            return self
+        order = np.argsort(self.stems, kind="stable")
+        counts = self.counts()
+        starts = self.offsets[:-1][order]
+        rows = np.repeat(starts - _offsets(counts[order])[:-1], counts[order]) + np.arange(counts.sum())
+        return _Columns(self.stems[order], self.mtimes[order], _offsets(counts[order]),
+                        self.class_ids[rows], self.values[rows], self.ncols[rows])
+
+    @staticmethod
+    def concat(parts):
+        parts = [p for p in parts if len(p.stems)]
+        if not parts:
+            return _Columns.empty()
+        return _Columns(np.concatenate([p.stems for p in parts]), np.concatenate([p.mtimes for p in parts]),
+                        _offsets(np.concatenate([p.counts() for p in parts])),
+                        np.concatenate([p.class_ids for p in parts]), _concat_values([p.values for p in parts]),
+                        np.concatenate([p.ncols for p in parts]))
+
+
+class DatasetLabelStore:
+    """标签目录的列式镜像
+
+    用法:
+        store = DatasetLabelStore.open(labels_dir)       # 首次建库，之后 mmap 加载并按 mtime 增量刷新
+        np.bincount(store.class_ids)                      # 数据集级查询直接在数组上完成
+        store.update_text("frame_001", text)              # 保存标注后同步
+        store.export_yolo(out_dir)                        # 导出回 YOLO txt
+    """
+
+    def __init__(self, labels_dir, base=None, generation=0):
+        self.labels_dir = Path(labels_dir)
+        self.dir = store_dir(labels_dir)
+        self.generation = generation
+        self._base = base if base is not None else _Columns.empty()
+        # 增量：stem -> _Columns（单张图像）或 None（标签已删除）
+        self._overlay = {}
+        self._merged = None
+        self._object_image = None
+        # 内容每变化一次加 1，供上层缓存（如筛选索引）判断是否需要重建
+        self.version = 0
+
+    # ---------- 建库 / 加载 / 持久化 ----------
+    @classmethod
+    def build(cls, labels_dir, workers=None):
+        """扫描标签目录下全部 txt 并建库（写入 .store/）"""
+        with os.scandir(labels_dir) as it:
+            paths = [e.path for e in it if e.name.endswith(".txt") and e.is_file()]
+        store = cls(labels_dir, parse_label_files(paths, workers))
+        store.save()
+        return store
+
+    @classmethod
+    def load(cls, labels_dir):
+        """以 mmap 只读方式加载已有的库；不存在或版本不符时返回 None"""
+        directory = store_dir(labels_dir)
+        try:
+            with open(directory / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != STORE_VERSION:
+            return None
+        gen_dir = directory / f"gen_{meta['generation']:06d}"
+        try:
+            base = _Columns(*(np.load(gen_dir / f"{name}.npy", mmap_mode="r") for name in _COLUMNS))
+        except (OSError, ValueError):
+            return None
+        store = cls(labels_dir, base, meta["generation"])
+        store._load_delta()
+        return store
+
+    @classmethod
+    def open(cls, labels_dir, refresh=True, workers=None):
+        """加载已有库（并按 mtime 刷新被外部修改过的标签），没有则新建"""
+        store = cls.load(labels_dir)
+        if store is None:
+            return cls.build(labels_dir, workers)
+        if refresh:
+            store.refresh(workers)
+        return store
+
+    def save(self):
+        """把基础数据与增量合并，写成新的代号并删除旧代号"""
+        merged = self._columns()
+        generation = self.generation + 1
+        gen_dir = self.dir / f"gen_{generation:06d}"
+        gen_dir.mkdir(parents=True, exist_ok=True)
+        for name in _COLUMNS:
+            np.save(gen_dir / f"{name}.npy", np.ascontiguousarray(getattr(merged, name)))
+        meta = {"version": STORE_VERSION, "generation": generation, "num_images": int(len(merged.stems)),
+                "num_objects": int(merged.offsets[-1]), "width": int(merged.values.shape[1])}
+        atomic_write_text(self.dir / "meta.json", json.dumps(meta, ensure_ascii=False, indent=2))
+        try:
+            (self.dir / "delta.npz").unlink()
+        except FileNotFoundError:
+            pass
+        for old in self.dir.glob("gen_*"):
+            if old != gen_dir:
+                shutil.rmtree(old, ignore_errors=True)
+        self.generation = generation
+        self._base = merged
+        self._overlay = {}
+        self._merged = None
+        return gen_dir
+
+    def _save_delta(self):
+        if len(self._overlay) >= COMPACT_THRESHOLD:
+            self.save()
+            return
+        live = [(stem, cols) for stem, cols in self._overlay.items() if cols is not None]
+        delta = _Columns.concat([cols for _, cols in live])
+        removed = np.array([stem for stem, cols in self._overlay.items() if cols is None], dtype=str)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self.dir / "delta.npz"
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, generation=self.generation, removed=removed,
+                     **{name: getattr(delta, name) for name in _COLUMNS})
+        os.replace(tmp_path, path)
+
+    def _load_delta(self):
+        path = self.dir / "delta.npz"
+        if not path.exists():
+            return
+        with np.load(path) as data:
+            if int(data["generation"]) != self.generation:
+                return
+            delta = _Columns(*(data[name] for name in _COLUMNS))
+            removed = data["removed"]
+        for stem in removed.tolist():
+            self._overlay[stem] = None
+        for i, stem in enumerate(delta.stems.tolist()):
+            self._overlay[stem] = delta.image(i)
+
+    # ---------- 同步 ----------
+    def update_text(self, stem, text, mtime=None):
+        """用标签文本更新一张图像（保存标注后调用）；mtime 缺省时取标签文件当前修改时间"""
+        if mtime is None:
+            try:
+                mtime = os.stat(self.labels_dir / f"{stem}.txt").st_mtime
+            except OSError:
+                mtime = 0.0
+        class_ids, values, ncols = parse_label_text(text)
+        self._overlay[stem] = _Columns(np.array([stem]), np.array([mtime], dtype=np.float64),
+                                       _offsets([class_ids.size]), class_ids, values, ncols)
+        self._invalidate()
+        self._save_delta()
+
+    def remove(self, stem):
+        """标签文件被删除时调用"""
+        self._overlay[stem] = None
+        self._invalidate()
+        self._save_delta()
+
+    def refresh(self, workers=None):
+        """对比标签文件 mtime，重新解析新增/修改的文件并移除已删除的，返回变化的图像数"""
+        on_disk = {}
+        with os.scandir(self.labels_dir) as it:
+            for e in it:
+                if e.name.endswith(".txt") and e.is_file():
+                    on_disk[e.name[:-4]] = (e.path, e.stat().st_mtime)
+        current = self._columns()
+        known = dict(zip(current.stems.tolist(), current.mtimes.tolist()))
+        changed = [path for stem, (path, mtime) in on_disk.items() if known.get(stem) != mtime]
+        removed = [stem for stem in known if stem not in on_disk]
+        if not changed and not removed:
+            return 0
+        parsed = parse_label_files(changed, workers)
+        for stem in removed:
+            self._overlay[stem] = None
+        if len(self._overlay) + len(parsed.stems) >= COMPACT_THRESHOLD:
+            # 变化较多（如自动标注后）：直接合并进基础数据，不逐张记入增量
+            self._base = _Columns.concat([self._columns().select(~np.isin(current.stems, parsed.stems)), parsed])
+            self._base = self._base.sorted()
+            self._overlay = {stem: None for stem in removed}
+            self._invalidate()
+            self.save()
+        else:
+            for i, stem in enumerate(parsed.stems.tolist()):
+                self._overlay[stem] = parsed.image(i)
+            self._invalidate()
+            self._save_delta()
+        return len(changed) + len(removed)
+
+    def _invalidate(self):
+        self._merged = None
+        self._object_image = None
+        self.version += 1
+
+    def _columns(self):
+        """基础数据与增量合并后的列（缓存到下一次修改）"""
+        if self._merged is None:
+            if not self._overlay:
+                self._merged = self._base
+            else:
+                overridden = np.array(list(self._overlay), dtype=str)
+                keep = ~np.isin(self._base.stems, overridden)
+                live = [cols for cols in self._overlay.values() if cols is not None]
+                self._merged = _Columns.concat([self._base.select(keep)] + live).sorted()
+        return self._merged
+
+    # ---------- 查询 ----------
+    @property
+    def stems(self):
+        return self._columns().stems
+
+    @property
+    def offsets(self):
+        return self._columns().offsets
+
+    @property
+    def class_ids(self):
+        return self._columns().class_ids
+
+    @property
+    def values(self):
+        return self._columns().values
+
+    @property
+    def ncols(self):
+        return self._columns().ncols
+
+    @property
+    def bboxes(self):
+        """(N, 4) x_center y_center w h"""
+        return self._columns().values[:, :4]
+
+    @property
+    def num_images(self):
+        return len(self._columns().stems)
+
+    @property
+    def num_objects(self):
+        return int(self._columns().offsets[-1])
+
+    def objects_per_image(self):
+        return self._columns().counts()
+
+    def object_image_index(self):
+        """(N,) 每个目标所属图像在 stems 中的序号"""
+        if self._object_image is None:
+            counts = self.objects_per_image()
+            self._object_image = np.repeat(np.arange(len(counts)), counts)
+        return self._object_image
+
+    def keypoints(self):
+        """(N, K, 3) 关键点 x, y, v，见 keypoints_from_values"""
+        cols = self._columns()
+        return keypoints_from_values(cols.values, cols.ncols)
+
+    def class_counts(self, minlength=0):
+        return np.bincount(self.class_ids, minlength=minlength)
+
+    def image_mask(self, object_mask):
+        """把目标级布尔掩码汇总为图像级（图像中任一目标满足即为 True）"""
+        counts = np.bincount(self.object_image_index()[object_mask], minlength=self.num_images)
+        return counts > 0
+
+    def images_without_targets(self):
+        """库中有标签文件但没有有效目标的图像 stem"""
+        cols = self._columns()
+        return cols.stems[cols.counts() == 0]
+
+    def contains(self, stems):
+        """stems 中每个是否在库中（向量化查找，同样不触发合并）"""
+        names = np.asarray(stems, dtype=str)
+        base = self._base.stems
+        if len(base):
+            pos = np.searchsorted(base, names).clip(0, len(base) - 1)
+            found = base[pos] == names
+        else:
+            found = np.zeros(len(names), dtype=bool)
+        if self._overlay:
+            overlay = np.array(list(self._overlay), dtype=str)
+            live = np.array([cols is not None for cols in self._overlay.values()])
+            hit = np.isin(names, overlay)
+            if hit.any():
+                found[hit] = np.isin(names[hit], overlay[live])
+        return found
+
+    def image_labels(self, stem):
+        """返回某张图像的 (class_ids, values, ncols)，不在库中时返回 None
+
+        只查增量和基础数据，不触发合并，保存单张图像后的增量统计因此不需要复制整个库。
+        """
+        if stem in self._overlay:
+            cols = self._overlay[stem]
+            if cols is None:
+                return None
+            return cols.class_ids, cols.values, cols.ncols
+        cols = self._base
+        i = np.searchsorted(cols.stems, stem)
+        if i >= len(cols.stems) or cols.stems[i] != stem:
+            return None
+        start, end = cols.offsets[i], cols.offsets[i + 1]
+        return cols.class_ids[start:end], cols.values[start:end], cols.ncols[start:end]
+
+    # ---------- 导出 ----------
+    def export_yolo(self, out_dir, stems=None):
+        """把库中标签导出为 YOLO txt（统一 6 位小数），stems 为 None 时导出全部，返回写出的文件数"""
+        cols = self._columns()
+        os.makedirs(out_dir, exist_ok=True)
+        if stems is None:
+            indices = range(len(cols.stems))
+        else:
+            names = np.asarray(stems, dtype=str)
+            indices = np.searchsorted(cols.stems, names)[self.contains(names)].tolist()
+        formats = {}
+        written = 0
+        for i in indices:
+            start, end = int(cols.offsets[i]), int(cols.offsets[i + 1])
+            lines = []
+            for cid, row, n in zip(cols.class_ids[start:end].tolist(), cols.values[start:end].tolist(),
+                                   cols.ncols[start:end].tolist()):
+                fmt = formats.get(n)
+                if fmt is None:
+                    fmt = formats[n] = "%d" + " %.6f" * n + "\n"
+                lines.append(fmt % ((cid,) + tuple(row[:n])))
+            with open(os.path.join(out_dir, f"{cols.stems[i]}.txt"), "w") as f:
+                f.writelines(lines)
+            written += 1
+        return written
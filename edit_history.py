@@ -0,0 +1,189 @@
+"""
+标注编辑的撤销/重做历史。
+
+每一步编辑记录为一个只包含差异的命令（而不是整份 self.annotations 的深拷贝），
+撤销/重做的代价只与这一步改动的大小有关:
+    SetKeypoint     某个目标某个关键点的 (x, y, v) 旧值/新值（加点、拖拽、撤销上一点）
+    AddObject       新建目标的位置、id、类别和关键点数（跟踪传播等带初始关键点的新建还保存这些关键点）
+    RemoveObject    被删除目标的位置、id 以及它自己的关键点（只复制这一个目标）
+    SetClass        类别与关键点数的旧值/新值，以及切换类别时被截断的关键点
+
+命令通过稳定的目标 id 定位目标（见 AnnotationStore），删除/插入其他目标后依然有效。
+历史按当前图像记录，重新从标签文件加载图像时清空；总字节数超过 max_bytes 时丢弃最早的命令。
+给定 journal（见 edit_journal.py）时，每条执行、撤销、重做的命令同时追加到自动保存日志。
+"""
+import struct
+import sys
+from collections import deque
+
+# SetKeypoint 的旧值和新值打包为 6 个 double，比两个 float 元组省一半以上内存
+_KP_PAIR = struct.Struct("<6d")
+# 与 edit_journal.APPLY / REVERT 相同（edit_journal 依赖本模块，这里不反向导入）
+_APPLY, _REVERT = 2, 3
+
+
+def _slots_size(command):
+    """命令实际占用的字节数（实例本身加各字段对象，numpy 数组包含数据区）"""
+    return sys.getsizeof(command) + sum(sys.getsizeof(getattr(command, name)) for name in command.__slots__)
+
+
+class SetKeypoint:
+    __slots__ = ("obj_id", "k", "values")
+
+    def __init__(self, obj_id, k, old, new):
+        self.obj_id = obj_id
+        self.k = k
+        self.values = _KP_PAIR.pack(*old, *new)
+
+    @property
+    def old(self):
+        return _KP_PAIR.unpack(self.values)[:3]
+
+    @property
+    def new(self):
+        return _KP_PAIR.unpack(self.values)[3:]
+
+    @classmethod
+    def capture(cls, store, index, k, new):
+        """以 store 中当前值为旧值创建命令"""
+        if k >= store.num_kps[index]:
+            store.resize_keypoints(index, k + 1)
+        return cls(int(store.ids[index]), k, store.keypoints[index, k], new)
+
+    def apply(self, store):
+        store.set_keypoint(store.index_of(self.obj_id), self.k, *self.new)
+
+    def revert(self, store):
+        store.set_keypoint(store.index_of(self.obj_id), self.k, *self.old)
+
+    def nbytes(self):
+        return _slots_size(self)
+
+
+class AddObject:
+    __slots__ = ("obj_id", "index", "class_id", "num_kps", "keypoints", "bbox")
+
+    def __init__(self, obj_id, index, class_id, num_kps, keypoints=None, bbox=None):
+        self.obj_id = obj_id
+        self.index = index
+        self.class_id = class_id
+        self.num_kps = num_kps
+        self.keypoints = keypoints
+        self.bbox = bbox
+
+    def apply(self, store):
+        store.insert(self.index, self.class_id, keypoints=self.keypoints, num_kps=self.num_kps, bbox=self.bbox,
+                     obj_id=self.obj_id)
+
+    def revert(self, store):
+        store.remove(store.index_of(self.obj_id))
+
+    def nbytes(self):
+        return _slots_size(self)
+
+
+class RemoveObject:
+    __slots__ = ("obj_id", "index", "class_id", "keypoints", "bbox")
+
+    def __init__(self, store, index):
+        self.obj_id = int(store.ids[index])
+        self.index = index
+        self.class_id = int(store.class_ids[index])
+        self.keypoints = store.keypoints[index, :store.num_kps[index]].copy()
+        self.bbox = store.bboxes[index].copy()
+
+    def apply(self, store):
+        store.remove(store.index_of(self.obj_id))
+
+    def revert(self, store):
+        store.insert(self.index, self.class_id, keypoints=self.keypoints, bbox=self.bbox, obj_id=self.obj_id)
+
+    def nbytes(self):
+        return _slots_size(self)
+
+
+class SetClass:
+    __slots__ = ("obj_id", "old_class", "new_class", "old_nkp", "new_nkp", "tail")
+
+    def __init__(self, store, index, class_id, needed):
+        self.obj_id = int(store.ids[index])
+        self.old_class = int(store.class_ids[index])
+        self.new_class = class_id
+        self.old_nkp = int(store.num_kps[index])
+        self.new_nkp = needed
+        # 只有关键点数变少时才需要保存被截断的部分
+        self.tail = store.keypoints[index, needed:self.old_nkp].copy() if needed < self.old_nkp else None
+
+    def apply(self, store):
+        store.set_class(store.index_of(self.obj_id), self.new_class, self.new_nkp)
+
+    def revert(self, store):
+        store.restore_class(store.index_of(self.obj_id), self.old_class, self.old_nkp, self.tail)
+
+    def nbytes(self):
+        return _slots_size(self)
+
+
+class EditHistory:
+    """当前图像的撤销/重做栈"""
+
+    def __init__(self, max_bytes=4 * 1024 * 1024, journal=None):
+        self.max_bytes = max_bytes
+        self.journal = journal
+        self._undo = deque()
+        self._redo = []
+        self.nbytes = 0
+
+    def reset(self):
+        self._undo.clear()
+        self._redo.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._undo)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def execute(self, store, command):
+        """执行并记录一条命令"""
+        command.apply(store)
+        self.record(command)
+        return command
+
+    def record(self, command):
+        """记录一条已经生效的命令（如拖拽过程中已实时修改，松开鼠标时再记录）；新的编辑会清空重做栈"""
+        for old in self._redo:
+            self.nbytes -= old.nbytes()
+        self._redo.clear()
+        self._undo.append(command)
+        self.nbytes += command.nbytes()
+        if self.journal is not None:
+            self.journal.append(_APPLY, command)
+        while self.nbytes > self.max_bytes and len(self._undo) > 1:
+            self.nbytes -= self._undo.popleft().nbytes()
+
+    def undo(self, store):
+        """撤销一步，返回被撤销的命令；没有可撤销的返回 None"""
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        command.revert(store)
+        self._redo.append(command)
+        if self.journal is not None:
+            self.journal.append(_REVERT, command)
+        return command
+
+    def redo(self, store):
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        command.apply(store)
+        self._undo.append(command)
+        if self.journal is not None:
+            self.journal.append(_APPLY, command)
+        return command
+
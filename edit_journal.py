@@ -0,0 +1,414 @@
+"""
+标注编辑的自动保存日志，用于崩溃恢复。
+
+原先编辑只在点击“保存”时写盘，切换图像会直接丢弃 self.annotations 中未保存的修改。这里把
+EditHistory 的每一步编辑（见 edit_history.py）追加到一个只追加的二进制日志中:
+    append      GUI 线程只把 (类型, 命令) 放进内存列表，耗时为微秒级，每次拖拽松开都可以调用
+    flush       后台线程每 interval 秒把新记录编码后追加写入日志文件并 fsync
+    compact     切换图像后，后台线程把上一张图像回放后的结果写入它的标签文件，
+                再重写日志，只保留当前图像
+    recover     启动时回放其他进程遗留的日志（崩溃或未保存就退出），把未保存的修改写回标签文件
+
+日志记录的格式为 kind u8、负载长度 u32、crc32 u32，后面跟负载。记录分三种:
+    SNAPSHOT        打开或保存图像时当前标注的完整数组，以及元信息：标签路径、图像尺寸、
+                    类别关键点数、当时标签文件的 mtime、是否含未写入标签文件的修改
+    APPLY / REVERT  一条编辑命令被执行（含重做）或撤销，作用于最近一个 SNAPSHOT 的图像
+崩溃时写了一半的末尾记录通过长度和 crc 识别后丢弃。
+
+日志文件为 ~/.yolov8_kpt_label/journal/<pid>.journal，每个进程一个。运行中的进程每次 flush 时
+刷新文件 mtime 作为心跳，超过 stale_timeout 未刷新的日志视为遗留日志。
+写回标签文件前会检查标签文件的 mtime：若打开后已被其他程序修改，则写到 <标签>.txt.recovered，不覆盖原文件。
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from annotation_store import AnnotationStore
+from edit_history import AddObject, RemoveObject, SetClass, SetKeypoint
+from work_queue import atomic_write_text
+
+DEFAULT_JOURNAL_DIR = Path.home() / ".yolov8_kpt_label" / "journal"
+SNAPSHOT, APPLY, REVERT = 1, 2, 3
+_SYNC = 0  # 内部标记：flush(wait=True) 的等待事件
+
+_RECORD = struct.Struct("<BII")
+_SNAP_HEAD = struct.Struct("<Iii")
+_SET_KP = struct.Struct("<Bqi")
+_ADD = struct.Struct("<Bqiii")
+_REMOVE = struct.Struct("<Bqiii")
+_SET_CLASS = struct.Struct("<Bqiiiii")
+# 命令类型编号 -> 类，写入日志后不能再改
+_COMMAND_TYPES = {1: SetKeypoint, 2: AddObject, 3: RemoveObject, 4: SetClass, 5: AddObject}
+
+
+def _file_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+def _new_command(cls, **fields):
+    """不经过 __init__（需要 store）直接按字段重建命令"""
+    command = cls.__new__(cls)
+    for name, value in fields.items():
+        setattr(command, name, value)
+    return command
+
+
+# ---------- 编码 ----------
+def encode_command(command):
+    if isinstance(command, SetKeypoint):
+        return _SET_KP.pack(1, command.obj_id, command.k) + command.values
+    if isinstance(command, AddObject):
+        if command.keypoints is None:
+            return _ADD.pack(2, command.obj_id, command.index, command.class_id, command.num_kps)
+        # 5: 带初始关键点和 bbox 的新建
+        bbox = np.zeros(4) if command.bbox is None else command.bbox
+        return (_ADD.pack(5, command.obj_id, command.index, command.class_id, command.num_kps)
+                + np.ascontiguousarray(bbox, dtype=np.float64).tobytes()
+                + np.ascontiguousarray(command.keypoints, dtype=np.float64).tobytes())
+    if isinstance(command, RemoveObject):
+        kps = np.ascontiguousarray(command.keypoints, dtype=np.float64)
+        return (_REMOVE.pack(3, command.obj_id, command.index, command.class_id, len(kps))
+                + np.ascontiguousarray(command.bbox, dtype=np.float64).tobytes() + kps.tobytes())
+    if isinstance(command, SetClass):
+        tail = np.zeros((0, 3)) if command.tail is None else np.ascontiguousarray(command.tail, dtype=np.float64)
+        return (_SET_CLASS.pack(4, command.obj_id, command.old_class, command.new_class, command.old_nkp,
+                                command.new_nkp, len(tail)) + tail.tobytes())
+    raise TypeError(f"无法写入日志的命令: {type(command).__name__}")
+
+
+def decode_command(data):
+    cls = _COMMAND_TYPES[data[0]]
+    if cls is SetKeypoint:
+        _, obj_id, k = _SET_KP.unpack_from(data)
+        return _new_command(cls, obj_id=obj_id, k=k, values=bytes(data[_SET_KP.size:]))
+    if cls is AddObject:
+        kind, obj_id, index, class_id, num_kps = _ADD.unpack_from(data)
+        if kind == 2:
+            return AddObject(obj_id, index, class_id, num_kps)
+        values = np.frombuffer(data, dtype=np.float64, offset=_ADD.size)
+        keypoints = values[4:4 + num_kps * 3].reshape(num_kps, 3).copy()
+        return AddObject(obj_id, index, class_id, num_kps, keypoints=keypoints, bbox=values[:4].copy())
+    if cls is RemoveObject:
+        _, obj_id, index, class_id, nkp = _REMOVE.unpack_from(data)
+        values = np.frombuffer(data, dtype=np.float64, offset=_REMOVE.size)
+        return _new_command(cls, obj_id=obj_id, index=index, class_id=class_id,
+                            bbox=values[:4].copy(), keypoints=values[4:4 + nkp * 3].reshape(nkp, 3).copy())
+    _, obj_id, old_class, new_class, old_nkp, new_nkp, ntail = _SET_CLASS.unpack_from(data)
+    tail = np.frombuffer(data, dtype=np.float64, offset=_SET_CLASS.size).reshape(ntail, 3).copy()
+    return _new_command(cls, obj_id=obj_id, old_class=old_class, new_class=new_class, old_nkp=old_nkp,
+                        new_nkp=new_nkp, tail=tail if ntail else None)
+
+
+def encode_snapshot(meta, arrays):
+    keypoints = arrays[0]
+    n, width = len(arrays[4]), (keypoints.shape[1] if keypoints.ndim == 3 else 0)
+    head = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    return _SNAP_HEAD.pack(len(head), n, width) + head + b"".join(np.ascontiguousarray(a).tobytes() for a in arrays)
+
+
+def decode_snapshot(data):
+    head_len, n, width = _SNAP_HEAD.unpack_from(data)
+    offset = _SNAP_HEAD.size
+    meta = json.loads(bytes(data[offset:offset + head_len]).decode("utf-8"))
+    offset += head_len
+    arrays = []
+    for dtype, shape in ((np.float64, (n, width, 3)), (np.int32, (n,)), (np.int32, (n,)),
+                         (np.float64, (n, 4)), (np.int64, (n,))):
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape).copy())
+        offset += count * np.dtype(dtype).itemsize
+    return meta, arrays
+
+
+def _record(kind, payload):
+    return _RECORD.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_records(data):
+    """逐条解析日志字节，遇到不完整或校验失败的记录（崩溃时写了一半）即停止"""
+    view = memoryview(data)
+    offset = 0
+    while offset + _RECORD.size <= len(view):
+        kind, length, crc = _RECORD.unpack_from(view, offset)
+        start = offset + _RECORD.size
+        payload = view[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield kind, payload
+        offset = start + length
+
+
+# ---------- 回放 ----------
+class JournaledImage:
+    """日志中一张图像回放后的状态"""
+
+    __slots__ = ("label_path", "meta", "store", "dirty")
+
+    def __init__(self, meta, store):
+        self.label_path = meta["label_path"]
+        self.meta = meta
+        self.store = store
+        self.dirty = bool(meta.get("dirty"))
+
+    def label_text(self):
+        return self.store.to_yolo_text(self.meta["category_sizes"], self.meta["img_w"], self.meta["img_h"])
+
+    def write_back(self):
+        """把回放结果写入标签文件，返回实际写入的路径；标签文件打开后被其他程序改过时写到 .recovered"""
+        out_path = self.label_path
+        if _file_mtime_ns(self.label_path) != self.meta["mtime_ns"]:
+            out_path = self.label_path + ".recovered"
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        atomic_write_text(out_path, self.label_text())
+        return out_path
+
+    def snapshot_payload(self):
+        meta = dict(self.meta, dirty=self.dirty)
+        return encode_snapshot(meta, self.store.to_arrays())
+
+
+class _Replayer:
+    """按记录顺序回放，维护每张图像的当前状态；同一路径的新 SNAPSHOT 覆盖旧状态"""
+
+    def __init__(self):
+        self.images = {}
+        self.active = None
+
+    def snapshot(self, meta, arrays):
+        self.images[meta["label_path"]] = JournaledImage(meta, AnnotationStore.from_arrays(*arrays))
+        self.active = meta["label_path"]
+
+    def command(self, kind, command):
+        image = self.images.get(self.active)
+        if image is None:
+            return
+        if kind == APPLY:
+            command.apply(image.store)
+        else:
+            command.revert(image.store)
+        image.dirty = True
+
+
+def read_journal(path):
+    """回放一个日志文件，返回其中各图像最终状态的列表"""
+    with open(path, "rb") as f:
+        data = f.read()
+    replayer = _Replayer()
+    for kind, payload in iter_records(data):
+        if kind == SNAPSHOT:
+            replayer.snapshot(*decode_snapshot(payload))
+        elif kind in (APPLY, REVERT):
+            replayer.command(kind, decode_command(payload))
+    return list(replayer.images.values())
+
+
+def orphan_journals(journal_dir=None, stale_timeout=30.0):
+    """其他进程遗留的日志（心跳超时或已正常退出），按修改时间从旧到新"""
+    journal_dir = Path(journal_dir or DEFAULT_JOURNAL_DIR)
+    if not journal_dir.is_dir():
+        return []
+    now = time.time()
+    own = f"{os.getpid()}.journal"
+    paths = []
+    for p in journal_dir.glob("*.journal"):
+        try:
+            mtime = p.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        if p.name != own and now - mtime > stale_timeout:
+            paths.append((mtime, p))
+    return [p for _, p in sorted(paths)]
+
+
+class EditJournal:
+    """当前进程的自动保存日志；GUI 线程调用 open_image / append，其余工作都在后台线程完成
+
+    on_written(label_path, written_path, text) 在后台线程中、每写回一个标签文件后调用。
+    """
+
+    def __init__(self, journal_dir=None, interval=0.5, compact_bytes=4 * 1024 * 1024, on_written=None):
+        self.journal_dir = Path(journal_dir or DEFAULT_JOURNAL_DIR)
+        self.path = self.journal_dir / f"{os.getpid()}.journal"
+        self.interval = interval
+        self.compact_bytes = compact_bytes
+        self.on_written = on_written
+        self._pending = []
+        self._active = None
+        # 有尚未写回标签文件的修改的图像（GUI 线程加入，后台线程写回后移除）
+        self._unsettled = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._compact_requested = False
+        self._force = set()
+        self._replayer = _Replayer()
+        self._file = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ---------- GUI 线程 ----------
+    def open_image(self, label_path, store, img_w, img_h, category_sizes):
+        """打开或保存图像后调用：记录当前标注的完整快照，此后的命令都作用于这张图像"""
+        if not label_path:
+            self._active = None
+            return
+        label_path = os.path.abspath(label_path)
+        previous = self._active
+        meta = {"label_path": label_path, "img_w": img_w, "img_h": img_h,
+                "category_sizes": list(category_sizes), "mtime_ns": _file_mtime_ns(label_path), "dirty": False}
+        with self._lock:
+            self._unsettled.discard(label_path)
+            self._pending.append((SNAPSHOT, (meta, store.to_arrays())))
+            if previous is not None and previous != label_path and previous in self._unsettled:
+                # 上一张图像有未写回的修改，让后台线程尽快写回标签文件
+                self._compact_requested = True
+                self._wake.set()
+        self._active = label_path
+
+    def append(self, kind, command):
+        """记录一条已执行（APPLY）或已撤销（REVERT）的命令；只做一次列表追加"""
+        if self._active is None:
+            return
+        with self._lock:
+            self._pending.append((kind, command))
+            self._unsettled.add(self._active)
+
+    def has_unsaved(self, label_path):
+        """该图像是否有尚未写回标签文件的修改（任何线程都可以调用，如 AI 标注收尾时判断能否覆盖）"""
+        with self._lock:
+            return os.path.abspath(label_path) in self._unsettled
+
+    def settle(self, label_path):
+        """读取标签文件前调用：若该图像还有未写回的修改，立即写回并等待完成"""
+        label_path = os.path.abspath(label_path)
+        with self._lock:
+            if label_path not in self._unsettled:
+                return
+            self._compact_requested = True
+            self._force.add(label_path)
+        self.flush(wait=True)
+
+    def flush(self, wait=False):
+        if not wait:
+            self._wake.set()
+            return
+        done = threading.Event()
+        with self._lock:
+            self._pending.append((_SYNC, done))
+        self._wake.set()
+        done.wait()
+
+    def close(self):
+        """写回非当前图像的修改并停止后台线程；当前图像没有未保存修改时删除日志文件，
+        否则保留日志并把 mtime 置为 0，下次启动时立即被当作遗留日志恢复"""
+        if not self._thread.is_alive():
+            return
+        with self._lock:
+            self._compact_requested = True
+        self.flush(wait=True)
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not self._unsettled:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        elif self.path.exists():
+            os.utime(self.path, (0, 0))
+
+    # ---------- 后台线程 ----------
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                batch, self._pending = self._pending, []
+                compact = self._compact_requested
+                self._compact_requested = False
+            try:
+                self._write(batch)
+                if compact or (self._file is not None and self._file.tell() > self.compact_bytes):
+                    self._compact()
+                elif self.path.exists():
+                    os.utime(self.path)
+            except Exception as e:
+                # 后台线程不能退出，否则 settle/close 会一直等待
+                print(f"自动保存日志写入失败: {e}")
+            finally:
+                for kind, item in batch:
+                    if kind == _SYNC:
+                        item.set()
+            if self._stop:
+                return
+
+    def _open_file(self):
+        if self._file is None:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def _write(self, batch):
+        """把一批新记录编码后追加写入日志文件，同时回放到后台的图像副本上"""
+        chunks = []
+        for kind, item in batch:
+            if kind == _SYNC:
+                continue
+            if kind == SNAPSHOT:
+                chunks.append(_record(kind, encode_snapshot(*item)))
+                self._replayer.snapshot(*item)
+            else:
+                chunks.append(_record(kind, encode_command(item)))
+                self._replayer.command(kind, item)
+        if chunks:
+            f = self._open_file()
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self):
+        """写回非当前图像的修改，再把日志重写为只含当前图像回放后状态的一条 SNAPSHOT"""
+        replayer = self._replayer
+        with self._lock:
+            unsettled = set(self._unsettled)
+            # settle() 请求的图像即使是当前图像也要写回
+            forced, self._force = self._force, set()
+        for label_path, image in list(replayer.images.items()):
+            if label_path == replayer.active and label_path not in forced:
+                continue
+            if image.dirty and label_path in unsettled:
+                text = image.label_text()
+                written = image.write_back()
+                image.dirty = False
+                image.meta["mtime_ns"] = _file_mtime_ns(image.label_path)
+                with self._lock:
+                    self._unsettled.discard(label_path)
+                if self.on_written is not None:
+                    self.on_written(label_path, written, text)
+            if label_path != replayer.active:
+                del replayer.images[label_path]
+
+        active = replayer.images.get(replayer.active)
+        data = _record(SNAPSHOT, active.snapshot_payload()) if active is not None else b""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
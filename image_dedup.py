@@ -0,0 +1,300 @@
+"""
+近重复帧检测：在标注/自动标注之前跳过、分组或隔离视频抽帧中几乎相同的图像。
+
+每张图像计算 64 位感知哈希（pHash）:
+    JPEG 用 cv2.IMREAD_REDUCED_GRAYSCALE_8 直接按 1/8 分辨率解码（只解 DCT 低频，比全尺寸解码快得多），
+    再缩到 32x32 做 DCT，取左上 8x8 低频系数与其中位数比较得到 64 位。
+哈希在进程池中并行计算，结果缓存在图像目录下的 .phash_cache.npz（文件名、大小、mtime、哈希），
+再次运行只计算新增或修改过的文件。同一次解码顺带保存归一化的 DCT 低频系数（63 维 float16），
+作为主动学习采样（active_learning.py）的外观特征，不需要再读一遍图像。
+
+分组按文件名顺序（视频帧即时间顺序）进行：每张图像先与上一组的代表帧比较（连续重复帧的快速路径），
+不相近时再查 Hamming 距离索引（多索引哈希：64 位切成若干段，距离不超过 threshold 的两个哈希至少有一段
+几乎相同，只需比较同段桶内的候选，见 HammingIndex），找到距离不超过 threshold 的代表帧则归入该组，否则自成一组。
+代表帧即每组第一张图像。
+
+处理方式:
+    skip        只保留代表帧（GUI 列表 / 自动标注只处理代表帧，文件不动）
+    group       保留全部图像，按组排列（GUI）或写出分组清单 dedup_groups.csv（自动标注脚本）
+    quarantine  把非代表帧移到隔离目录（默认 <图像目录>_duplicates/），并写出 dedup_manifest.csv 便于恢复
+"""
+import csv
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from work_queue import IMAGE_EXTS
+
+CACHE_NAME = ".phash_cache.npz"
+# 2: 增加外观特征 signatures（DCT 低频系数），供 active_learning.py 计算多样性
+CACHE_VERSION = 2
+SIGNATURE_DIM = 63
+DEDUP_MODES = ("skip", "group", "quarantine")
+# 图像数少于该值时直接在当前进程计算，避免进程池启动开销
+_PARALLEL_MIN_FILES = 2000
+_HASH_CHUNK = 512
+
+
+def dct_low(gray):
+    """灰度图缩到 32x32 后做 DCT，返回左上 8x8 低频系数 (64,) float32"""
+    import cv2
+
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return cv2.dct(small)[:8, :8].ravel()
+
+
+def phash_from_dct(low):
+    """8x8 低频系数 -> 64 位 pHash（Python int）"""
+    # 直流分量只反映整体亮度，不参与中位数
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def signature_from_dct(low):
+    """8x8 低频系数去掉直流分量后归一化为单位向量 (63,)，作为图像的粗略外观特征（主动学习多样性用）"""
+    sig = low[1:]
+    return sig / max(float(np.linalg.norm(sig)), 1e-6)
+
+
+def phash_image(gray):
+    """灰度图 -> 64 位 pHash（Python int）"""
+    return phash_from_dct(dct_low(gray))
+
+
+def read_reduced_gray(path):
+    """按 1/8 分辨率解码为灰度图；无法读取时返回 None"""
+    import cv2
+
+    gray = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    return gray
+
+
+def phash_file(path):
+    """按缩小分辨率解码并计算 pHash；无法读取时返回 None"""
+    gray = read_reduced_gray(path)
+    return None if gray is None else phash_image(gray)
+
+
+def _hash_files(paths):
+    """计算一批文件的哈希和外观特征（可在子进程中运行），返回 (hashes uint64, signatures float16, valid bool)"""
+    hashes = np.zeros(len(paths), dtype=np.uint64)
+    signatures = np.zeros((len(paths), SIGNATURE_DIM), dtype=np.float16)
+    valid = np.zeros(len(paths), dtype=bool)
+    for i, path in enumerate(paths):
+        gray = read_reduced_gray(path)
+        if gray is None:
+            continue
+        low = dct_low(gray)
+        hashes[i] = phash_from_dct(low)
+        signatures[i] = signature_from_dct(low)
+        valid[i] = True
+    return hashes, signatures, valid
+
+
+def hash_files(paths, workers=None):
+    """并行计算若干图像的哈希和外观特征，返回 (hashes, signatures, valid)"""
+    paths = list(paths)
+    if len(paths) < _PARALLEL_MIN_FILES or workers == 1:
+        return _hash_files(paths)
+    chunks = [paths[i:i + _HASH_CHUNK] for i in range(0, len(paths), _HASH_CHUNK)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_hash_files, chunks))
+    return tuple(np.concatenate([p[j] for p in parts]) for j in range(3))
+
+
+if hasattr(int, "bit_count"):
+    def hamming(a, b):
+        return (a ^ b).bit_count()
+else:
+    def hamming(a, b):
+        return bin(a ^ b).count("1")
+
+
+def _list_images(image_dir):
+    """目录下的图像文件，按文件名排序，返回 (names, sizes, mtimes_ns)"""
+    entries = []
+    with os.scandir(image_dir) as it:
+        for e in it:
+            if e.name.lower().endswith(IMAGE_EXTS) and e.is_file():
+                st = e.stat()
+                entries.append((e.name, st.st_size, st.st_mtime_ns))
+    entries.sort()
+    names = np.array([e[0] for e in entries], dtype=str)
+    sizes = np.array([e[1] for e in entries], dtype=np.int64)
+    mtimes = np.array([e[2] for e in entries], dtype=np.int64)
+    return names, sizes, mtimes
+
+
+def load_image_features(image_dir, workers=None, use_cache=True):
+    """目录下全部图像的 (names, hashes, signatures, valid)，只为新增或修改过的文件解码计算并更新缓存"""
+    names, sizes, mtimes = _list_images(image_dir)
+    hashes = np.zeros(len(names), dtype=np.uint64)
+    signatures = np.zeros((len(names), SIGNATURE_DIM), dtype=np.float16)
+    valid = np.zeros(len(names), dtype=bool)
+    todo = np.ones(len(names), dtype=bool)
+    cache_path = os.path.join(image_dir, CACHE_NAME)
+    if use_cache and os.path.exists(cache_path) and len(names):
+        try:
+            with np.load(cache_path) as cache:
+                if int(cache["version"]) == CACHE_VERSION and len(cache["names"]):
+                    c_names = cache["names"]
+                    pos = np.searchsorted(c_names, names).clip(0, len(c_names) - 1)
+                    hit = ((c_names[pos] == names) & (cache["sizes"][pos] == sizes)
+                           & (cache["mtimes"][pos] == mtimes))
+                    hashes[hit] = cache["hashes"][pos[hit]]
+                    signatures[hit] = cache["signatures"][pos[hit]]
+                    valid[hit] = cache["valid"][pos[hit]]
+                    todo &= ~hit
+        except (OSError, ValueError, KeyError):
+            pass
+    if todo.any():
+        idx = np.flatnonzero(todo)
+        new_hashes, new_signatures, new_valid = hash_files(
+            [os.path.join(image_dir, n) for n in names[idx]], workers)
+        hashes[idx] = new_hashes
+        signatures[idx] = new_signatures
+        valid[idx] = new_valid
+        if use_cache:
+            # 先写临时文件再替换，中途中断不会留下损坏的缓存
+            tmp_path = cache_path + ".tmp.npz"
+            np.savez(tmp_path, version=CACHE_VERSION, names=names, sizes=sizes, mtimes=mtimes,
+                     hashes=hashes, signatures=signatures, valid=valid)
+            os.replace(tmp_path, cache_path)
+    return names, hashes, signatures, valid
+
+
+def load_hashes(image_dir, workers=None, use_cache=True):
+    """目录下全部图像的 (names, hashes, valid)"""
+    names, hashes, _, valid = load_image_features(image_dir, workers, use_cache)
+    return names, hashes, valid
+
+
+class HammingIndex:
+    """多索引哈希：查找与给定哈希距离不超过 threshold 的已加入条目
+
+    64 位切成 threshold // 2 + 1 段，距离不超过 threshold 的两个哈希至少有一段的距离不超过 1，
+    查询时在每段查找自身及翻转一位后的键（阈值 4 时为 3 段 x 22 个键）。每段 20 位以上，
+    百万级条目时每个桶平均不到一个条目，候选数不随条目数增长。
+    """
+
+    def __init__(self, threshold=4):
+        self.threshold = threshold
+        num_blocks = min(threshold // 2 + 1, 64)
+        bounds = np.linspace(0, 64, num_blocks + 1).astype(int).tolist()
+        self._blocks = [((1 << (hi - lo)) - 1, lo, [0] + [1 << b for b in range(hi - lo)] if threshold else [0])
+                        for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self._buckets = [{} for _ in self._blocks]
+        self._hashes = []
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, h):
+        """加入一个哈希，返回其条目序号"""
+        item = len(self._hashes)
+        self._hashes.append(h)
+        for (mask, shift, _), bucket in zip(self._blocks, self._buckets):
+            bucket.setdefault((h >> shift) & mask, []).append(item)
+        return item
+
+    def query(self, h):
+        """返回 (最近条目序号, 距离)；没有距离不超过 threshold 的条目时返回 (-1, -1)"""
+        best, best_d = -1, self.threshold + 1
+        seen = set()
+        for (mask, shift, flips), bucket in zip(self._blocks, self._buckets):
+            key = (h >> shift) & mask
+            for flip in flips:
+                for item in bucket.get(key ^ flip, ()):
+                    if item in seen:
+                        continue
+                    seen.add(item)
+                    d = hamming(h, self._hashes[item])
+                    if d < best_d:
+                        best, best_d = item, d
+        return (best, best_d) if best >= 0 else (-1, -1)
+
+
+class DedupResult:
+    """分组结果：rep[i] 为第 i 张图像所属组的代表帧序号（代表帧自身 rep[i] == i），dist[i] 为与代表帧的距离"""
+
+    def __init__(self, image_dir, names, hashes, rep, dist):
+        self.image_dir = image_dir
+        self.names = names
+        self.hashes = hashes
+        self.rep = rep
+        self.dist = dist
+
+    @property
+    def keep_mask(self):
+        return self.rep == np.arange(len(self.rep))
+
+    @property
+    def num_duplicates(self):
+        return int(len(self.rep) - self.keep_mask.sum())
+
+    def kept_names(self):
+        return self.names[self.keep_mask].tolist()
+
+    def grouped_names(self):
+        """全部图像按组排列：每个代表帧后面紧跟它的近重复帧"""
+        order = np.lexsort((np.arange(len(self.rep)), self.rep))
+        return self.names[order].tolist()
+
+    def write_manifest(self, path):
+        """写出 image,representative,distance 清单（只含近重复帧）"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["image", "representative", "distance"])
+            for i in np.flatnonzero(~self.keep_mask).tolist():
+                writer.writerow([self.names[i], self.names[self.rep[i]], int(self.dist[i])])
+        return path
+
+    def quarantine(self, quarantine_dir=None):
+        """把近重复帧移到隔离目录（同一文件系统内为 rename），写出 dedup_manifest.csv，返回移动的文件数"""
+        quarantine_dir = quarantine_dir or os.path.normpath(self.image_dir) + "_duplicates"
+        os.makedirs(quarantine_dir, exist_ok=True)
+        moved = 0
+        for name in self.names[~self.keep_mask].tolist():
+            src = os.path.join(self.image_dir, name)
+            shutil.move(src, os.path.join(quarantine_dir, name))
+            moved += 1
+        self.write_manifest(os.path.join(quarantine_dir, "dedup_manifest.csv"))
+        return moved
+
+
+def group_duplicates(hashes, valid, threshold=4):
+    """按顺序把每张图像归入距离不超过 threshold 的已有组，返回 (rep, dist)"""
+    n = len(hashes)
+    rep = np.arange(n, dtype=np.int64)
+    dist = np.zeros(n, dtype=np.int64)
+    index = HammingIndex(threshold)
+    index_rep = []
+    last = -1
+    for i, (h, ok) in enumerate(zip(hashes.tolist(), valid.tolist())):
+        if not ok:
+            continue
+        if last >= 0:
+            d = hamming(h, int(hashes[last]))
+            if d <= threshold:
+                rep[i], dist[i] = last, d
+                continue
+        item, d = index.query(h)
+        if item >= 0:
+            rep[i], dist[i] = index_rep[item], d
+            last = index_rep[item]
+            continue
+        index.add(h)
+        index_rep.append(i)
+        last = i
+    return rep, dist
+
+
+def find_duplicates(image_dir, threshold=4, workers=None, use_cache=True):
+    """扫描目录并分组，返回 DedupResult"""
+    names, hashes, valid = load_hashes(image_dir, workers, use_cache)
+    rep, dist = group_duplicates(hashes, valid, threshold)
+    return DedupResult(image_dir, names, hashes, rep, dist)
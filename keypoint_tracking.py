@@ -0,0 +1,207 @@
+"""
+视频帧序列的关键点跟踪传播：用稀疏光流把当前帧的关键点跟踪到下一帧，作为下一帧的标注建议。
+
+每帧先转灰度并缩小到最长边 max_side（默认 960，1080p 帧缩小一半）；缩小后的灰度图按图像路径
+缓存在 FrameCache 中（main.py 解码图像时顺手加入缓存），同一帧作为前一帧和后一帧时只解码、转换一次。
+（OpenCV 的 Python 接口不接受 buildOpticalFlowPyramid 预先建好的金字塔，金字塔由 calcOpticalFlowPyrLK
+在缩小后的图像上内部建立，这一步只占约 1 ms。）
+跟踪用 cv2.calcOpticalFlowPyrLK，并做前向-后向一致性检查：前向跟踪后再反向跟踪回来，
+回到原位置的误差超过 fb_threshold 像素（工作分辨率下）的点视为跟丢，在下一帧中设为不可见；
+全部关键点都跟丢的目标不生成建议。1080p 帧对在 CPU 上约几毫秒（不含解码）。
+cv2 在第一次用到时才导入，main.py 启动时不加载。
+
+命令行批量传播（不需要 GUI）:
+    python keypoint_tracking.py --images data/images --labels data/labels
+    python keypoint_tracking.py --images data/images --labels data/labels --start frame_000120.jpg --count 50
+从 --start（默认第一张有标签的帧）开始按文件名顺序逐帧传播；遇到已有标签的帧时默认把它作为新的起点
+（人工标注优先），--overwrite 则用跟踪结果覆盖。
+"""
+import argparse
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from annotation_store import AnnotationStore
+from work_queue import IMAGE_EXTS, atomic_write_text
+
+
+def downscale_gray(image, max_side=960):
+    """BGR 或灰度图 -> (缩小后的灰度图, 缩放比例)；缩放比例为工作分辨率 / 原图分辨率"""
+    import cv2
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    h, w = gray.shape
+    scale = min(1.0, max_side / max(h, w))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(round(w * scale)), int(round(h * scale))), interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(gray), scale
+
+
+class TrackingFrame:
+    """一帧缩小后的灰度图及其原图尺寸"""
+
+    __slots__ = ("gray", "scale", "width", "height")
+
+    def __init__(self, image, max_side=960):
+        self.height, self.width = image.shape[:2]
+        self.gray, self.scale = downscale_gray(image, max_side)
+
+
+class FrameCache:
+    """按图像路径缓存最近几帧的 TrackingFrame（LRU）"""
+
+    def __init__(self, capacity=4, max_side=960):
+        self.capacity = capacity
+        self.max_side = max_side
+        self._items = OrderedDict()
+
+    def get(self, path, image=None):
+        """取 path 的跟踪帧；不在缓存中时用已解码的 image 建立，没有 image 则从磁盘读取。读取失败返回 None"""
+        frame = self._items.get(path)
+        if frame is not None:
+            self._items.move_to_end(path)
+            return frame
+        if image is None:
+            import cv2
+
+            image = cv2.imread(path)
+            if image is None:
+                return None
+        frame = TrackingFrame(image, self.max_side)
+        self._items[path] = frame
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+        return frame
+
+    def clear(self):
+        self._items.clear()
+
+
+def track_points(prev, nxt, points, win_size=21, levels=3, fb_threshold=1.0):
+    """把 prev 帧上的归一化坐标 points (M, 2) 跟踪到 nxt 帧
+
+    返回 (新的归一化坐标 (M, 2), 是否跟踪成功 (M,) bool)。
+    """
+    import cv2
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return points.copy(), np.zeros(0, dtype=bool)
+    size_prev = np.array([prev.width * prev.scale, prev.height * prev.scale])
+    size_next = np.array([nxt.width * nxt.scale, nxt.height * nxt.scale])
+    p0 = (points * size_prev).astype(np.float32).reshape(-1, 1, 2)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+    lk = dict(winSize=(win_size, win_size), maxLevel=levels, criteria=criteria)
+    p1, st1, _ = cv2.calcOpticalFlowPyrLK(prev.gray, nxt.gray, p0, None, **lk)
+    back, st2, _ = cv2.calcOpticalFlowPyrLK(nxt.gray, prev.gray, p1, None, **lk)
+    fb_error = np.linalg.norm((back - p0).reshape(-1, 2), axis=1)
+    ok = (st1.ravel() == 1) & (st2.ravel() == 1) & (fb_error < fb_threshold)
+    new_points = p1.reshape(-1, 2).astype(np.float64) / size_next
+    ok &= np.all((new_points >= 0.0) & (new_points <= 1.0), axis=1)
+    return new_points, ok
+
+
+def propagate_store(store, prev, nxt, win_size=21, levels=3, fb_threshold=1.0):
+    """把 store 中所有目标的可见关键点跟踪到下一帧，返回新的 AnnotationStore（建议标注）
+
+    跟丢的关键点设为不可见，全部关键点都跟丢的目标不保留；bbox 由跟踪后的可见关键点外接框给出。
+    """
+    n = len(store)
+    result = AnnotationStore(width=store.width)
+    if n == 0:
+        return result
+    kps = store.keypoints
+    in_range = np.arange(store.width)[None, :] < store.num_kps[:, None]
+    visible = (kps[..., 2] > 0) & in_range
+    obj_idx, kp_idx = np.nonzero(visible)
+    new_xy, ok = track_points(prev, nxt, kps[obj_idx, kp_idx, :2], win_size, levels, fb_threshold)
+
+    tracked = np.zeros_like(kps)
+    tracked[obj_idx[ok], kp_idx[ok], :2] = new_xy[ok]
+    tracked[obj_idx[ok], kp_idx[ok], 2] = kps[obj_idx[ok], kp_idx[ok], 2]
+    for i in range(n):
+        vis = tracked[i, :, 2] > 0
+        if not vis.any():
+            continue
+        xy = tracked[i, vis, :2]
+        lo, hi = xy.min(axis=0), xy.max(axis=0)
+        bbox = np.concatenate([(lo + hi) / 2.0, hi - lo])
+        result.add(int(store.class_ids[i]), keypoints=tracked[i, :store.num_kps[i]], bbox=bbox)
+    return result
+
+
+def _read_labels(txt_path, width, height):
+    with open(txt_path, "r") as f:
+        return AnnotationStore.from_yolo_text(f.read(), width, height)
+
+
+def propagate_sequence(image_dir, labels_dir, start=None, count=None, overwrite=False, max_side=960,
+                       levels=3, win_size=21, fb_threshold=1.0):
+    """对按文件名排序的帧序列逐帧传播标注（无界面批量运行），返回统计信息字典
+
+    start: 起始帧文件名，默认第一张有标签文件的帧；count: 最多传播的帧数（不含起始帧）。
+    已有标签文件的帧默认作为新的起点，overwrite=True 时用跟踪结果覆盖。
+    """
+    frames = sorted(n for n in os.listdir(image_dir) if n.lower().endswith(IMAGE_EXTS))
+    label_path = lambda name: os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt")  # noqa: E731
+    if start is None:
+        start_index = next((i for i, n in enumerate(frames) if os.path.exists(label_path(n))), None)
+        if start_index is None:
+            raise FileNotFoundError(f"{labels_dir} 中没有任何帧的标签文件，无法确定起始帧")
+    else:
+        start_index = frames.index(start)
+        if not os.path.exists(label_path(start)):
+            raise FileNotFoundError(f"起始帧没有标签文件: {label_path(start)}")
+    end_index = len(frames) if count is None else min(len(frames), start_index + 1 + count)
+
+    cache = FrameCache(capacity=2, max_side=max_side)
+    prev = cache.get(os.path.join(image_dir, frames[start_index]))
+    store = _read_labels(label_path(frames[start_index]), prev.width, prev.height)
+    written = kept = lost_objects = 0
+    t_track = 0.0
+    t0 = time.perf_counter()
+    for i in range(start_index + 1, end_index):
+        name = frames[i]
+        nxt = cache.get(os.path.join(image_dir, name))
+        if nxt is None:
+            print(f"无法读取图像，传播在此停止: {name}")
+            break
+        txt_path = label_path(name)
+        if os.path.exists(txt_path) and not overwrite:
+            # 人工标注过的帧作为新的起点
+            store = _read_labels(txt_path, nxt.width, nxt.height)
+            kept += 1
+        else:
+            t1 = time.perf_counter()
+            proposal = propagate_store(store, prev, nxt, win_size, levels, fb_threshold)
+            t_track += time.perf_counter() - t1
+            lost_objects += len(store) - len(proposal)
+            atomic_write_text(txt_path, proposal.to_yolo_text([], nxt.width, nxt.height))
+            store = proposal
+            written += 1
+        prev = nxt
+    elapsed = time.perf_counter() - t0
+    print(f"传播完成: 写入 {written} 帧，保留已有标签 {kept} 帧，跟丢目标 {lost_objects} 个；"
+          f"总耗时 {elapsed:.2f}s（跟踪 {t_track * 1e3 / max(written, 1):.1f} ms/帧，其余为解码与灰度缩放）")
+    return {"start": frames[start_index], "written": written, "kept": kept, "lost_objects": lost_objects,
+            "elapsed": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用稀疏光流把关键点标注逐帧传播到后续视频帧")
+    parser.add_argument('--images', type=str, required=True, help='按文件名排序的连续帧图像目录')
+    parser.add_argument('--labels', type=str, required=True, help='标签目录（读取起始帧标签，写入传播结果）')
+    parser.add_argument('--start', type=str, default=None, help='起始帧文件名（默认: 第一张有标签的帧）')
+    parser.add_argument('--count', type=int, default=None, help='最多传播的帧数（默认: 到序列末尾）')
+    parser.add_argument('--overwrite', action='store_true', help='覆盖已有标签的帧（默认把它们作为新的起点）')
+    parser.add_argument('--max-side', type=int, default=960, help='跟踪时的工作分辨率最长边（默认: 960）')
+    parser.add_argument('--levels', type=int, default=3, help='金字塔层数（默认: 3）')
+    parser.add_argument('--win', type=int, default=21, help='光流窗口大小（默认: 21）')
+    parser.add_argument('--fb-threshold', type=float, default=1.0,
+                        help='前向-后向一致性误差阈值，工作分辨率下的像素（默认: 1.0）')
+    args = parser.parse_args()
+    propagate_sequence(args.images, args.labels, start=args.start, count=args.count, overwrite=args.overwrite,
+                       max_side=args.max_side, levels=args.levels, win_size=args.win,
+                       fb_threshold=args.fb_threshold)
@@ -0,0 +1,245 @@
+"""
+不依赖 Qt 的标注数据接口：打开数据集、逐张读写标注（AnnotationStore 或 NumPy 数组）、对整个目录做 AI 标注。
+标注工具（main.py）的图像列表、默认标签目录、类别同步和保存都走这里，脚本、notebook 和多进程 worker
+得到的结果与 GUI 逐字节一致。
+
+    from label_api import Dataset
+
+    ds = Dataset("data/images")                 # 标签目录默认同 GUI: images -> labels
+    for item in ds:                             # 惰性：只列文件名，访问时才读标签/解码图像
+        keypoints, num_kps, class_ids, bboxes, ids = item.read_arrays()
+        ...
+        item.write_arrays(keypoints, num_kps, class_ids, category_sizes=[17])
+    ds.auto_annotate("best.pt", merge=True, on_progress=print)
+
+导入本模块只加载标准库和 work_queue（远低于 100 ms）；NumPy、cv2、ultralytics 在第一次用到时才导入。
+ImageItem / Dataset 只保存路径，可以直接 pickle 给 multiprocessing 的 worker:
+
+    with multiprocessing.Pool() as pool:
+        counts = pool.map(count_objects, Dataset("data/images"))
+"""
+import os
+
+from work_queue import IMAGE_EXTS, atomic_write_text
+
+
+def default_labels_dir(image_dir):
+    """图像目录对应的默认标签目录（与 GUI 相同: 路径含 images 时替换为 labels，否则为同级的 labels），不创建目录"""
+    if "images" in image_dir:
+        return image_dir.replace("images", "labels")
+    return os.path.join(os.path.dirname(image_dir), "labels")
+
+
+def list_images(image_dir):
+    """目录中的图像文件名（按 IMAGE_EXTS 过滤，按文件名排序）"""
+    with os.scandir(image_dir) as entries:
+        return sorted(e.name for e in entries if e.name.lower().endswith(IMAGE_EXTS) and e.is_file())
+
+
+def has_label_lines(label_path):
+    """标签文件存在且至少有一行非空内容；读取出错时按有内容处理（这样的图像不算无目标，不会被删除）"""
+    try:
+        with open(label_path, "r") as f:
+            return any(line.strip() for line in f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        return True
+
+
+def images_without_targets(image_files, labels_dir, store=None):
+    """image_files 中没有标签文件、或标签文件没有非空行的图像（“删除无目标图片”用）
+
+    给出 DatasetLabelStore 时先 refresh()，只用它排除确有目标的图像；其余候选仍逐个检查磁盘上的标签文件：
+    库可能落后于磁盘，解析出错的文件和列数不足的行也不算目标，不能据此删除图像。
+    """
+    candidates = list(image_files)
+    if store is not None and candidates:
+        import numpy as np
+
+        store.refresh()
+        stems = np.array([os.path.splitext(n)[0] for n in candidates], dtype=str)
+        has_targets = store.contains(stems)
+        has_targets[has_targets] = ~np.isin(stems[has_targets], store.images_without_targets())
+        candidates = [n for n, keep in zip(candidates, has_targets.tolist()) if not keep]
+    return [n for n in candidates
+            if not has_label_lines(os.path.join(labels_dir, f"{os.path.splitext(n)[0]}.txt"))]
+
+
+def sync_categories(store, categories):
+    """按标注同步类别定义（原地修改 categories 和 store），返回 categories 是否有变化
+
+    categories 为 [{"name": ..., "keypoints": [...]}, ...]。标注中出现比现有类别更大的类别序号时
+    创建占位类别以保留原序号；关键点数多于类别定义时扩展类别关键点；少于类别定义时补不可见点（不截断）。
+    """
+    changed = False
+    for i, (category_id, kp_count) in enumerate(zip(store.class_ids.tolist(), store.num_kps.tolist())):
+        if category_id >= len(categories):
+            for cid in range(len(categories), category_id + 1):
+                categories.append({
+                    "name": f"class_{cid}",
+                    "keypoints": [f"kp{k}" for k in range(max(1, kp_count))]
+                })
+            changed = True
+        else:
+            needed = len(categories[category_id]["keypoints"])
+            if kp_count > needed:
+                for _ in range(kp_count - needed):
+                    categories[category_id]["keypoints"].append(f"kp{needed}")
+                    needed += 1
+                changed = True
+
+        # 补齐关键点数以匹配类别定义
+        if 0 <= category_id < len(categories):
+            store.resize_keypoints(i, len(categories[category_id]["keypoints"]))
+    return changed
+
+
+def save_label_text(labels_dir, stem, text):
+    """原子写入标签文件，并把其中的目标记为人工标注（之后 AI 合并标注不会覆盖），返回标签路径"""
+    from label_merge import record_human
+
+    path = os.path.join(labels_dir, f"{stem}.txt")
+    atomic_write_text(path, text)
+    record_human(labels_dir, stem, text)
+    return path
+
+
+class ImageItem:
+    """数据集中的一张图像及其标签文件（只保存路径，可以 pickle）"""
+
+    def __init__(self, image_path, label_path):
+        self.image_path = image_path
+        self.label_path = label_path
+        self._size = None
+
+    def __repr__(self):
+        return f"ImageItem({self.image_path!r}, {self.label_path!r})"
+
+    @property
+    def name(self):
+        return os.path.basename(self.image_path)
+
+    @property
+    def stem(self):
+        return os.path.splitext(self.name)[0]
+
+    @property
+    def has_labels(self):
+        return os.path.exists(self.label_path)
+
+    def image(self):
+        """解码图像（BGR 的 NumPy 数组），无法读取时抛 ValueError"""
+        import cv2
+
+        image = cv2.imread(self.image_path)
+        if image is None:
+            raise ValueError(f"无法读取图像: {self.image_path}")
+        self._size = (image.shape[1], image.shape[0])
+        return image
+
+    def image_size(self):
+        """(宽, 高)，第一次调用时解码图像"""
+        if self._size is None:
+            self.image()
+        return self._size
+
+    def read_text(self):
+        """标签文件文本，没有标签文件时为空串"""
+        try:
+            with open(self.label_path, "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def read(self, image_size=None):
+        """标签 -> AnnotationStore（关键点坐标归一化）
+
+        标签中有像素坐标（大于 1）时需要图像尺寸：未给出 image_size 时才解码图像，全部归一化的标签不读图像。
+        """
+        from annotation_store import AnnotationStore
+
+        text = self.read_text()
+        if image_size is not None:
+            return AnnotationStore.from_yolo_text(text, *image_size)
+        store = AnnotationStore.from_yolo_text(text, 1, 1)
+        if (store.keypoints[..., :2] > 1.0).any():
+            store = AnnotationStore.from_yolo_text(text, *self.image_size())
+        return store
+
+    def read_arrays(self, image_size=None):
+        """标签 -> (keypoints, num_kps, class_ids, bboxes, ids)，见 AnnotationStore"""
+        return self.read(image_size).to_arrays()
+
+    def write(self, store, category_sizes=(), image_size=None, human=True):
+        """按 GUI 的保存格式（6 位小数，bbox 由可见关键点计算）原子写入标签，返回写入的文本
+
+        category_sizes 为各类别的关键点数（为空时每个目标保留自身的关键点数）；store 中有像素坐标时
+        需要图像尺寸，规则同 read。human 为 True 时像 GUI 保存一样记为人工标注。
+        """
+        if image_size is None:
+            image_size = self.image_size() if (store.keypoints[..., :2] > 1.0).any() else (1, 1)
+        text = store.to_yolo_text(list(category_sizes), *image_size)
+        labels_dir = os.path.dirname(self.label_path)
+        os.makedirs(labels_dir, exist_ok=True)
+        if human:
+            save_label_text(labels_dir, self.stem, text)
+        else:
+            atomic_write_text(self.label_path, text)
+        return text
+
+    def write_arrays(self, keypoints, num_kps, class_ids, bboxes=None, ids=None, category_sizes=(),
+                     image_size=None, human=True):
+        """由数组写入标签（bboxes 保存时按可见关键点重新计算，可以省略），参数同 write"""
+        import numpy as np
+
+        from annotation_store import AnnotationStore, new_object_id
+
+        keypoints = np.asarray(keypoints, dtype=np.float64)
+        n = len(keypoints)
+        if bboxes is None:
+            bboxes = np.zeros((n, 4))
+        if ids is None:
+            ids = [new_object_id() for _ in range(n)]
+        store = AnnotationStore.from_arrays(keypoints, np.asarray(num_kps), np.asarray(class_ids),
+                                            np.asarray(bboxes, dtype=np.float64), np.asarray(ids, dtype=np.int64))
+        return self.write(store, category_sizes, image_size, human)
+
+
+class Dataset:
+    """一个图像目录及其标签目录；按文件名排序，len / 迭代 / 下标访问得到 ImageItem"""
+
+    def __init__(self, image_dir, labels_dir=None):
+        self.image_dir = os.fspath(image_dir)
+        self.labels_dir = os.fspath(labels_dir) if labels_dir else default_labels_dir(self.image_dir)
+        self.names = list_images(self.image_dir)
+
+    def __repr__(self):
+        return f"Dataset({self.image_dir!r}, {self.labels_dir!r}, {len(self.names)} 张图像)"
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        for name in self.names:
+            yield self._item(name)
+
+    def __getitem__(self, index):
+        return self._item(self.names[index])
+
+    def _item(self, name):
+        stem = os.path.splitext(name)[0]
+        return ImageItem(os.path.join(self.image_dir, name), os.path.join(self.labels_dir, f"{stem}.txt"))
+
+    def auto_annotate(self, model, merge=False, inference=None, keypoint_names=(), on_progress=None):
+        """对全部图像做 AI 标注（阻塞到完成），返回 (是否成功, 消息, 是否被取消)
+
+        参数同 annotate_job.AnnotateJob：model 为权重路径或已加载的模型，merge 为合并模式（保留人工标注），
+        inference 为 TTA / 分块推理方式，on_progress(已完成, 总数, 张/秒, 预计剩余秒数)。
+        """
+        from annotate_job import AnnotateJob
+
+        os.makedirs(self.labels_dir, exist_ok=True)
+        job = AnnotateJob(model, self.image_dir, self.labels_dir, merge=merge, inference=inference,
+                          keypoint_names=keypoint_names, on_progress=on_progress)
+        return job.run()
@@ -0,0 +1,310 @@
+"""
+两个标签目录的差异对比，例如 AI 标注覆盖前后（labels/.prev_labels/ 与 labels/）或人工标注与自动标注。
+
+每张图像把 A（参照）和 B 的目标一一匹配:
+    相似度  OKS（以 A 的 bbox 面积为尺度，每个关键点容差系数统一为 kappa）与 bbox IoU 取较大者，
+            没有共同可见关键点时只用 IoU（整体平移较多的目标 OKS 很低，但框仍大部分重叠，应算作“移动”而不是删除+新增）；
+            整张图像的相似度矩阵一次向量化算出
+    匹配    按相似度从高到低贪心配对（与 COCO 评估相同），低于 min_sim 的不配对
+并统计
+    removed        只在 A 中的目标
+    added          只在 B 中的目标
+    class_changed  配对但类别不同
+    moved          配对且位移（共同可见关键点的平均位移，没有时用 bbox 中心位移）超过 move_threshold
+    vis_changed    配对目标中只在一边可见的关键点数
+    score          removed + added + class_changed + Σ(1 - 配对相似度)，用于按差异大小排序
+位移均为归一化坐标（相对图像宽高）。另按关键点序号汇总配对目标的平均位移。
+
+文件内容完全相同的图像不解析（只数目标数），全部图像分块在进程池中并行处理。
+
+命令行:
+    python label_diff.py --a labels/.prev_labels --b labels --out diff.csv
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset_store import keypoints_from_values, parse_label_text
+from postprocess import place_file
+
+PREV_LABELS_DIRNAME = ".prev_labels"
+DEFAULT_KAPPA = 0.1
+# 图像数少于该值时直接在当前进程计算，避免进程池启动开销
+_PARALLEL_MIN_FILES = 2000
+_DIFF_CHUNK = 1000
+# 每张图像一行的统计列
+COLUMNS = ("n_a", "n_b", "matched", "removed", "added", "class_changed", "moved", "vis_changed",
+           "mean_disp", "max_disp", "score")
+
+
+def parse_objects(text):
+    """标签文本 -> (class_ids (n,), bboxes (n, 4), keypoints (n, K, 3))，关键点按标注工具的规则解析（x y v 或 x y）"""
+    class_ids, values, ncols = parse_label_text(text)
+    return class_ids, values[:, :4], keypoints_from_values(values, ncols)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """(na, 4) 与 (nb, 4) 的 cx cy w h 框 -> (na, nb) IoU"""
+    a_lo, a_hi = boxes_a[:, None, :2] - boxes_a[:, None, 2:] / 2, boxes_a[:, None, :2] + boxes_a[:, None, 2:] / 2
+    b_lo, b_hi = boxes_b[None, :, :2] - boxes_b[None, :, 2:] / 2, boxes_b[None, :, :2] + boxes_b[None, :, 2:] / 2
+    inter = np.clip(np.minimum(a_hi, b_hi) - np.maximum(a_lo, b_lo), 0, None).prod(axis=2)
+    union = boxes_a[:, None, 2:].prod(axis=2) + boxes_b[None, :, 2:].prod(axis=2) - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-12), 0.0)
+
+
+def _pad_kps(kps, width):
+    if kps.shape[1] >= width:
+        return kps
+    out = np.zeros((kps.shape[0], width, 3), dtype=kps.dtype)
+    out[:, :kps.shape[1]] = kps
+    return out
+
+
+def oks_matrix(kps_a, boxes_a, kps_b, kappa=DEFAULT_KAPPA):
+    """(na, nb) OKS 与共同可见关键点数；没有共同可见关键点的位置 OKS 为 NaN
+
+    尺度取 A 的 bbox 面积（归一化坐标），e = d² / (2 s² κ²)，OKS = 共同可见关键点上 exp(-e) 的平均。
+    """
+    width = max(kps_a.shape[1], kps_b.shape[1])
+    kps_a, kps_b = _pad_kps(kps_a, width), _pad_kps(kps_b, width)
+    both = (kps_a[:, None, :, 2] > 0) & (kps_b[None, :, :, 2] > 0)
+    d2 = ((kps_a[:, None, :, :2] - kps_b[None, :, :, :2]) ** 2).sum(axis=3)
+    area = np.maximum(boxes_a[:, 2] * boxes_a[:, 3], 1e-6)[:, None, None]
+    sim = np.exp(-d2 / (2.0 * area * kappa ** 2))
+    shared = both.sum(axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        oks = np.where(shared > 0, (sim * both).sum(axis=2) / shared, np.nan)
+    return oks, shared
+
+
+def similarity_matrix(boxes_a, kps_a, boxes_b, kps_b, kappa=DEFAULT_KAPPA):
+    """max(OKS, IoU) 组成的 (na, nb) 相似度矩阵（没有共同可见关键点时为 IoU）"""
+    iou = iou_matrix(boxes_a, boxes_b)
+    if kps_a.shape[1] == 0 and kps_b.shape[1] == 0:
+        return iou
+    oks, _ = oks_matrix(kps_a, boxes_a, kps_b, kappa)
+    return np.fmax(oks, iou)
+
+
+def greedy_match(sim, min_sim=0.5):
+    """按相似度从高到低贪心配对，返回 (ia, ib) 两个等长数组"""
+    if sim.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    flat = np.argsort(-sim, axis=None, kind="stable")
+    flat = flat[sim.ravel()[flat] >= min_sim]
+    used_a = np.zeros(sim.shape[0], dtype=bool)
+    used_b = np.zeros(sim.shape[1], dtype=bool)
+    ia, ib = [], []
+    for a, b in zip(*np.unravel_index(flat, sim.shape)):
+        if used_a[a] or used_b[b]:
+            continue
+        used_a[a] = used_b[b] = True
+        ia.append(a)
+        ib.append(b)
+        if len(ia) == min(sim.shape):
+            break
+    return np.array(ia, dtype=np.int64), np.array(ib, dtype=np.int64)
+
+
+def _count_objects(text):
+    return sum(1 for line in text.splitlines() if len(line.split()) >= 5)
+
+
+def diff_texts(text_a, text_b, min_sim=0.5, move_threshold=0.01, kappa=DEFAULT_KAPPA):
+    """对比一张图像的两份标签文本，返回 (统计行 (len(COLUMNS),), 每个关键点位移之和 (K,), 计数 (K,))"""
+    row = np.zeros(len(COLUMNS), dtype=np.float64)
+    if text_a == text_b:
+        n = _count_objects(text_a)
+        row[:3] = n
+        return row, np.zeros(0), np.zeros(0, dtype=np.int64)
+    cls_a, boxes_a, kps_a = parse_objects(text_a)
+    cls_b, boxes_b, kps_b = parse_objects(text_b)
+    na, nb = len(cls_a), len(cls_b)
+    width = max(kps_a.shape[1], kps_b.shape[1])
+    kps_a, kps_b = _pad_kps(kps_a, width), _pad_kps(kps_b, width)
+    sim = similarity_matrix(boxes_a, kps_a, boxes_b, kps_b, kappa) if na and nb else np.zeros((na, nb))
+    ia, ib = greedy_match(sim, min_sim)
+    m = len(ia)
+
+    ka, kb = kps_a[ia], kps_b[ib]
+    vis_a, vis_b = ka[..., 2] > 0, kb[..., 2] > 0
+    both = vis_a & vis_b
+    kp_disp = np.linalg.norm(ka[..., :2] - kb[..., :2], axis=2)
+    shared = both.sum(axis=1)
+    center_disp = np.linalg.norm(boxes_a[ia, :2] - boxes_b[ib, :2], axis=1)
+    obj_disp = np.where(shared > 0, (kp_disp * both).sum(axis=1) / np.maximum(shared, 1), center_disp)
+
+    class_changed = int((cls_a[ia] != cls_b[ib]).sum())
+    row[:] = (na, nb, m, na - m, nb - m, class_changed, int((obj_disp > move_threshold).sum()),
+              int((vis_a != vis_b).sum()), obj_disp.mean() if m else 0.0, obj_disp.max() if m else 0.0,
+              (na - m) + (nb - m) + class_changed + float((1.0 - sim[ia, ib]).sum()))
+    return row, (kp_disp * both).sum(axis=0), both.sum(axis=0)
+
+
+def _read_text(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def _diff_chunk(args):
+    """对比一批图像（可在子进程中运行），返回 (统计 (n, len(COLUMNS)), 关键点位移之和, 计数)"""
+    dir_a, dir_b, stems, min_sim, move_threshold, kappa = args
+    rows = np.zeros((len(stems), len(COLUMNS)), dtype=np.float64)
+    disp_sum = np.zeros(0)
+    disp_count = np.zeros(0, dtype=np.int64)
+    for i, stem in enumerate(stems):
+        rows[i], s, c = diff_texts(_read_text(os.path.join(dir_a, stem + ".txt")),
+                                   _read_text(os.path.join(dir_b, stem + ".txt")), min_sim, move_threshold, kappa)
+        if len(s) > len(disp_sum):
+            disp_sum = np.pad(disp_sum, (0, len(s) - len(disp_sum)))
+            disp_count = np.pad(disp_count, (0, len(c) - len(disp_count)))
+        disp_sum[:len(s)] += s
+        disp_count[:len(c)] += c
+    return rows, disp_sum, disp_count
+
+
+def _label_stems(labels_dir):
+    if not os.path.isdir(labels_dir):
+        return set()
+    with os.scandir(labels_dir) as it:
+        return {e.name[:-4] for e in it if e.name.endswith(".txt") and e.is_file()}
+
+
+class LabelDiff:
+    """两个标签目录的逐图像差异"""
+
+    def __init__(self, dir_a, dir_b, stems, rows, kp_disp_sum, kp_disp_count):
+        self.dir_a = dir_a
+        self.dir_b = dir_b
+        self.stems = stems
+        self.rows = rows
+        self.kp_disp_sum = kp_disp_sum
+        self.kp_disp_count = kp_disp_count
+        self._index = {s: i for i, s in enumerate(stems.tolist())}
+
+    def __len__(self):
+        return len(self.stems)
+
+    def column(self, name):
+        return self.rows[:, COLUMNS.index(name)]
+
+    @property
+    def kp_mean_disp(self):
+        """每个关键点序号在配对目标上的平均位移"""
+        return self.kp_disp_sum / np.maximum(self.kp_disp_count, 1)
+
+    def totals(self):
+        return {name: float(self.column(name).sum()) for name in COLUMNS[:8]}
+
+    def changed_mask(self):
+        return self.column("score") > 0
+
+    def order(self):
+        """按 score 从大到小的图像序号"""
+        return np.argsort(-self.column("score"), kind="stable")
+
+    def image(self, stem):
+        """某张图像的统计字典，不在对比范围内时返回 None"""
+        i = self._index.get(stem)
+        return None if i is None else dict(zip(COLUMNS, self.rows[i].tolist()))
+
+    def summary(self):
+        t = self.totals()
+        return (f"{len(self)} 张图像中 {int(self.changed_mask().sum())} 张有差异: 新增 {int(t['added'])}、"
+                f"删除 {int(t['removed'])}、移动 {int(t['moved'])}、类别变化 {int(t['class_changed'])} 个目标，"
+                f"可见性变化 {int(t['vis_changed'])} 个关键点")
+
+    def write_csv(self, path):
+        """按差异从大到小写出 stem + 各统计列"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("stem",) + COLUMNS)
+            for i in self.order().tolist():
+                row = self.rows[i]
+                writer.writerow([self.stems[i]] + [int(v) for v in row[:8]] + [f"{v:.6f}" for v in row[8:]])
+        return path
+
+
+def diff_dirs(dir_a, dir_b, workers=None, min_sim=0.5, move_threshold=0.01, kappa=DEFAULT_KAPPA):
+    """对比两个标签目录中全部同名标签文件（只在一边存在的视为另一边为空），返回 LabelDiff"""
+    stems = sorted(_label_stems(dir_a) | _label_stems(dir_b))
+    tasks = [(dir_a, dir_b, stems[i:i + _DIFF_CHUNK], min_sim, move_threshold, kappa)
+             for i in range(0, len(stems), _DIFF_CHUNK)]
+    if len(stems) < _PARALLEL_MIN_FILES or workers == 1:
+        parts = [_diff_chunk(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_diff_chunk, tasks))
+    rows = np.concatenate([p[0] for p in parts]) if parts else np.zeros((0, len(COLUMNS)))
+    width = max([0] + [len(p[1]) for p in parts])
+    disp_sum = np.zeros(width)
+    disp_count = np.zeros(width, dtype=np.int64)
+    for _, s, c in parts:
+        disp_sum[:len(s)] += s
+        disp_count[:len(c)] += c
+    return LabelDiff(dir_a, dir_b, np.array(stems, dtype=str), rows, disp_sum, disp_count)
+
+
+def snapshot_labels(labels_dir, dest=None):
+    """把标签目录中的 txt 增量同步到 dest（默认 labels/.prev_labels/），返回本次复制的文件数
+
+    用于 AI 标注覆盖前保留现有标签，之后可与新标签对比。快照文件的修改时间设为对应标签的修改时间，
+    大小和修改时间都与标签相同的文件视为未变、不再复制，标签目录中已不存在的文件从快照删除，
+    所以重复运行只复制上次之后改动过的标签。支持时用 reflink 克隆，不占额外空间；
+    不用硬链接：main.py 保存是写临时文件再替换，但 format_six_decimals 和旧版标注脚本原地改写标签，会连带改掉快照。
+    """
+    dest = dest or os.path.join(labels_dir, PREV_LABELS_DIRNAME)
+    os.makedirs(dest, exist_ok=True)
+    with os.scandir(dest) as it:
+        previous = {e.name: e.stat() for e in it if e.name.endswith(".txt") and e.is_file()}
+    count = 0
+    with os.scandir(labels_dir) as it:
+        for e in it:
+            if not (e.name.endswith(".txt") and e.is_file()):
+                continue
+            st = e.stat()
+            old = previous.pop(e.name, None)
+            if old is not None and old.st_size == st.st_size and old.st_mtime_ns == st.st_mtime_ns:
+                continue
+            target = os.path.join(dest, e.name)
+            place_file(e.path, target, "reflink")
+            os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+            count += 1
+    for name in previous:
+        os.unlink(os.path.join(dest, name))
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比两个 YOLO keypoints 标签目录，按差异大小列出图像")
+    parser.add_argument('--a', type=str, required=True, help='参照标签目录（如 labels/.prev_labels 或人工标注）')
+    parser.add_argument('--b', type=str, required=True, help='对比标签目录（如 AI 标注后的 labels）')
+    parser.add_argument('--out', type=str, default=None, help='逐图像差异 CSV（按差异从大到小）')
+    parser.add_argument('--min-sim', type=float, default=0.5, help='OKS/IoU 低于该值不配对（默认: 0.5）')
+    parser.add_argument('--move-threshold', type=float, default=0.01,
+                        help='配对目标位移超过该值（归一化坐标）计为移动（默认: 0.01）')
+    parser.add_argument('--kappa', type=float, default=DEFAULT_KAPPA, help='OKS 关键点容差系数（默认: 0.1）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认: CPU 核数）')
+    parser.add_argument('--top', type=int, default=10, help='打印差异最大的图像数（默认: 10）')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    result = diff_dirs(args.a, args.b, args.workers, args.min_sim, args.move_threshold, args.kappa)
+    print(f"{result.summary()}（耗时 {time.perf_counter() - t0:.2f}s）")
+    if len(result.kp_mean_disp):
+        print("各关键点平均位移: " + " ".join(f"{k}:{d:.4f}" for k, d in enumerate(result.kp_mean_disp.tolist())))
+    for i in result.order()[:args.top].tolist():
+        if result.rows[i, -1] <= 0:
+            break
+        info = dict(zip(COLUMNS, result.rows[i].tolist()))
+        print(f"  {result.stems[i]}: score {info['score']:.2f}  新增 {int(info['added'])}  删除 {int(info['removed'])}  "
+              f"移动 {int(info['moved'])}  类别变化 {int(info['class_changed'])}  平均位移 {info['mean_disp']:.4f}")
+    if args.out:
+        result.write_csv(args.out)
+        print(f"已写出: {args.out}")
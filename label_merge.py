@@ -0,0 +1,275 @@
+"""
+AI 标注的合并模式：保留人工标注的目标，只补充新的检测；每个目标的来源（人工/模型）记录在旁路文件中。
+
+来源旁路文件写在标签目录下的 .provenance/ 子目录中（与 .conf/ 置信度分片同样的列式布局）:
+
+    labels/
+        .provenance/
+            main.npz            合并后的分片
+            auto_*.npz          单机自动标注每次运行写入的分片
+            chunk_000001.npz    分布式 worker 按块写入的分片
+            human.log           main.py 保存标注时追加的记录（一行一张图像）
+
+每个分片包含:
+    stems       (M,)    图像文件名（不含扩展名）
+    offsets     (M+1,)  第 i 张图像的目标来源位于 sources[offsets[i]:offsets[i+1]]
+    sources     (N,)    每个目标的来源 uint8，MODEL=0 / HUMAN=1，顺序与标签文件中的目标行一致
+    times       (M,)    记录时间（time.time()），同一图像有多条记录时以最新的为准
+human.log 每行为 "stem<TAB>time<TAB>来源串"，例如 "frame_000120\t1718000000.5\t1101"。
+
+没有来源记录、或记录的目标数与标签文件不一致（被其他程序改过）的图像，全部目标按人工标注处理，
+宁可多保留也不覆盖人工修正。
+
+合并（每张图像，在推理的流式循环中完成，不需要额外的目录扫描）:
+    1. 现有标签中的人工目标原样保留（原文本行，不重新格式化）
+    2. 本次预测与人工目标按 max(OKS, IoU) 贪心配对（见 label_diff.py），整张图像一次向量化计算；
+       配上的预测视为同一目标，以人工标注为准，丢弃
+    3. 其余预测作为模型目标追加；旧的模型目标被本次预测整体替换
+"""
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from conf_sidecar import _save_npz_atomic, auto_shard_name
+from label_diff import DEFAULT_KAPPA, _pad_kps, greedy_match, parse_objects, similarity_matrix
+from work_queue import atomic_write_text
+
+PROVENANCE_DIRNAME = ".provenance"
+MAIN_SHARD = "main"
+HUMAN_LOG = "human.log"
+MODEL, HUMAN = 0, 1
+# 合并统计的键
+MERGE_STATS = ("kept", "suppressed", "added", "dropped")
+
+
+def provenance_dir(labels_dir):
+    return Path(labels_dir) / PROVENANCE_DIRNAME
+
+
+def _object_lines(text):
+    """标签文本中的目标行（与 parse_label_text 相同的过滤规则，保证行号与解析结果一一对应）"""
+    return [line for line in text.splitlines() if len(line.split()) >= 5]
+
+
+def record_human(labels_dir, stem, text):
+    """main.py 保存标注后调用：把该图像标签文本中的目标全部记为人工标注（追加一行到 human.log）"""
+    directory = provenance_dir(labels_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / HUMAN_LOG, "a") as f:
+        f.write(f"{stem}\t{time.time():.6f}\t{'1' * len(_object_lines(text))}\n")
+
+
+def result_text(result):
+    """ultralytics 单张图像预测结果 -> 标签文本（6 位小数）
+
+    列与 ultralytics save_txt 相同：class x y w h，之后每个关键点 x y，模型输出关键点置信度时为 x y v（v 为置信度）。
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return ""
+    xywhn = boxes.xywhn.cpu().numpy()
+    kpts = None
+    if result.keypoints is not None:
+        kpts = result.keypoints.xyn.cpu().numpy()
+        if result.keypoints.conf is not None:
+            kpts = np.concatenate([kpts, result.keypoints.conf.cpu().numpy()[..., None]], axis=2)
+        kpts = kpts.reshape(len(xywhn), -1)
+    lines = []
+    for i, cls_id in enumerate(boxes.cls.int().tolist()):
+        values = xywhn[i] if kpts is None else np.concatenate([xywhn[i], kpts[i]])
+        lines.append(" ".join([str(cls_id)] + [f"{v:.6f}" for v in values.tolist()]) + "\n")
+    return "".join(lines)
+
+
+class ProvenanceWriter:
+    """累积一批图像的目标来源，save() 时写成一个分片"""
+
+    def __init__(self, labels_dir, shard=MAIN_SHARD):
+        self.path = provenance_dir(labels_dir) / f"{shard}.npz"
+        self.stems = []
+        self.times = []
+        self.sources = []
+
+    def __len__(self):
+        return len(self.stems)
+
+    def add(self, stem, sources, when=None):
+        self.stems.append(stem)
+        self.times.append(time.time() if when is None else when)
+        self.sources.append(np.asarray(sources, dtype=np.uint8).reshape(-1))
+
+    def add_model(self, stem, count):
+        """整张图像的 count 个目标都来自模型（覆盖模式写出的预测标签）"""
+        self.add(stem, np.full(count, MODEL, dtype=np.uint8))
+
+    def discard(self, stems):
+        """去掉这些图像的记录（例如预测最终没有写入标签目录）"""
+        stems = set(stems)
+        keep = [i for i, stem in enumerate(self.stems) if stem not in stems]
+        self.stems = [self.stems[i] for i in keep]
+        self.times = [self.times[i] for i in keep]
+        self.sources = [self.sources[i] for i in keep]
+
+    def save(self):
+        if not self.stems:
+            return None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        offsets = np.zeros(len(self.sources) + 1, dtype=np.int64)
+        np.cumsum([s.size for s in self.sources], out=offsets[1:])
+        _save_npz_atomic(self.path, stems=np.array(self.stems), offsets=offsets,
+                         sources=np.concatenate(self.sources), times=np.array(self.times, dtype=np.float64))
+        return self.path
+
+
+def _read_log(path):
+    stems, times, sources = [], [], []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 3:
+                    continue  # 写了一半的最后一行
+                stems.append(parts[0])
+                times.append(float(parts[1]))
+                sources.append(np.frombuffer(parts[2].encode(), dtype=np.uint8) - ord("0"))
+    except FileNotFoundError:
+        pass
+    return stems, times, sources
+
+
+def load_provenance(labels_dir, log_path=None):
+    """读取全部分片和 human.log，返回 {stem: sources (n,) uint8}，同一图像取时间最新的记录"""
+    directory = provenance_dir(labels_dir)
+    if not directory.is_dir():
+        return {}
+    stems, times, sources = _read_log(log_path or directory / HUMAN_LOG)
+    for path in sorted(directory.glob("*.npz")):
+        with np.load(path) as data:
+            offsets = data["offsets"]
+            stems.extend(data["stems"].tolist())
+            times.extend(data["times"].tolist())
+            sources.extend(np.split(data["sources"], offsets[1:-1]))
+    if not stems:
+        return {}
+    # 按时间倒序稳定排序后每个 stem 取第一条
+    order = np.argsort(-np.array(times), kind="stable")
+    records = {}
+    for i in order.tolist():
+        records.setdefault(stems[i], sources[i])
+    return records
+
+
+def compact_provenance(labels_dir):
+    """把全部分片和 human.log 合并为单个 main.npz，返回记录的图像数
+
+    先把 human.log 改名再读取，合并期间 main.py 追加的新记录写入新的 human.log，不会丢失。
+    """
+    directory = provenance_dir(labels_dir)
+    if not directory.is_dir():
+        return 0
+    log_path = directory / HUMAN_LOG
+    pending_log = directory / f".{HUMAN_LOG}.{os.getpid()}.compacting"
+    try:
+        os.replace(log_path, pending_log)
+    except FileNotFoundError:
+        pending_log = None
+    old_shards = [p for p in directory.glob("*.npz") if p.stem != MAIN_SHARD]
+    records = load_provenance(labels_dir, log_path=pending_log or log_path)
+    now = time.time()
+    writer = ProvenanceWriter(labels_dir)
+    for stem, sources in records.items():
+        writer.add(stem, sources, now)
+    if len(writer):
+        # 记录时间统一为合并时刻：合并之后 human.log 中的新记录总是更新
+        writer.save()
+    for p in old_shards + ([pending_log] if pending_log else []):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+    return len(records)
+
+
+def merge_texts(old_text, old_sources, new_text, min_sim=0.5, kappa=DEFAULT_KAPPA):
+    """合并一张图像的现有标签与本次预测，返回 (标签文本, 来源 (n,) uint8, 统计 (len(MERGE_STATS),))
+
+    old_sources 为 None 或长度与现有目标数不符时，全部现有目标按人工处理。
+    """
+    old_lines = _object_lines(old_text)
+    new_lines = _object_lines(new_text)
+    if old_sources is None or len(old_sources) != len(old_lines):
+        human = np.ones(len(old_lines), dtype=bool)
+    else:
+        human = np.asarray(old_sources) == HUMAN
+    kept = [line for line, h in zip(old_lines, human.tolist()) if h]
+    keep_new = np.ones(len(new_lines), dtype=bool)
+    if kept and new_lines:
+        # 只有同时存在人工目标和预测时才需要解析和配对
+        _, boxes_h, kps_h = parse_objects("\n".join(kept))
+        _, boxes_p, kps_p = parse_objects("\n".join(new_lines))
+        width = max(kps_h.shape[1], kps_p.shape[1])
+        sim = similarity_matrix(boxes_h, _pad_kps(kps_h, width), boxes_p, _pad_kps(kps_p, width), kappa)
+        _, ib = greedy_match(sim, min_sim)
+        keep_new[ib] = False
+    added = [line for line, k in zip(new_lines, keep_new.tolist()) if k]
+    lines = kept + added
+    sources = np.concatenate([np.full(len(kept), HUMAN, dtype=np.uint8), np.full(len(added), MODEL, dtype=np.uint8)])
+    stats = np.array([len(kept), len(new_lines) - len(added), len(added), len(old_lines) - len(kept)], dtype=np.int64)
+    return "".join(line + "\n" for line in lines), sources, stats
+
+
+class LabelMerger:
+    """在自动标注的流式循环中逐张合并预测，直接原子写入标签目录
+
+        merger = LabelMerger(labels_dir)
+        for result in model.predict(..., stream=True):
+            merger.merge(Path(result.path).stem, "".join(_result_to_lines(result, columns)))
+        merger.close()
+    """
+
+    def __init__(self, labels_dir, shard=None, min_sim=0.5, kappa=DEFAULT_KAPPA):
+        """shard 为 None 时（单机）先合并已有分片，再写入新的 auto_*.npz；分布式 worker 传入块名"""
+        self.labels_dir = Path(labels_dir)
+        self.min_sim = min_sim
+        self.kappa = kappa
+        if shard is None:
+            compact_provenance(labels_dir)
+            shard = auto_shard_name()
+        self.records = load_provenance(labels_dir)
+        self.writer = ProvenanceWriter(labels_dir, shard)
+        self.totals = np.zeros(len(MERGE_STATS), dtype=np.int64)
+        self.files_written = 0
+
+    def new_shard(self, shard):
+        """之后的来源记录写入新的分片（分布式 worker 每领取一块调用一次）"""
+        self.writer = ProvenanceWriter(self.labels_dir, shard)
+
+    def merge(self, stem, pred_text):
+        """合并一张图像，返回写入后的标签文本（没有标签文件且没有预测时返回空串、不创建文件）"""
+        path = self.labels_dir / (stem + ".txt")
+        try:
+            with open(path, "r") as f:
+                old_text = f.read()
+        except FileNotFoundError:
+            old_text = None
+        if old_text is None and not pred_text.strip():
+            return ""
+        text, sources, stats = merge_texts(old_text or "", self.records.get(stem), pred_text,
+                                           self.min_sim, self.kappa)
+        self.totals += stats
+        if text != old_text:
+            atomic_write_text(path, text)
+            self.files_written += 1
+        self.records[stem] = sources
+        self.writer.add(stem, sources)
+        return text
+
+    def summary(self):
+        kept, suppressed, added, dropped = self.totals.tolist()
+        return (f"合并写入 {self.files_written} 个标签文件：保留人工目标 {kept} 个（{suppressed} 个预测与之重合被忽略），"
+                f"新增模型目标 {added} 个，替换旧模型目标 {dropped} 个")
+
+    def close(self):
+        return self.writer.save()
@@ -0,0 +1,247 @@
+"""
+图像列表筛选查询语言，在预先建立的逐图像索引上向量化求值。
+
+示例:
+    class==2 and count>3        含类别 2 的目标且目标数大于 3 的图像
+    missing_kp(4)               有目标缺少第 4 个关键点（不可见或不存在）的图像
+    unlabeled                   没有标签文件的图像
+    empty                       有标签文件但没有有效目标的图像
+    bbox_area<0.001             含极小目标的图像
+    class==0 and bbox_area<0.01 同一个目标同时满足两个条件（见下）
+    not (conf>=0.5)             自动标注置信度低于 0.5 或没有置信度记录的图像
+
+语法: 条件之间用 and / or / not 和括号组合；比较运算符 == != < <= > >=。
+字段分两级:
+    目标级  class bbox_area bbox_w bbox_h aspect(w/h) kp_visible(可见关键点数) missing_kp(k) visible_kp(k)
+    图像级  count(目标数) conf(置信度复核分数) unlabeled empty labeled
+同一个 and/or 中的目标级条件作用于同一个目标，与图像级条件组合或被 not 取反时，
+先汇总为“图像中存在满足条件的目标”。
+"""
+import os
+import re
+
+import numpy as np
+
+from dataset_store import keypoints_from_values
+
+
+class QueryError(ValueError):
+    """查询语法错误"""
+
+
+_TOKEN_RE = re.compile(r"\s*(?:(?P<num>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|-?\.\d+(?:[eE][-+]?\d+)?)"
+                       r"|(?P<op>==|!=|<=|>=|<|>|=)|(?P<paren>[()])|(?P<name>[A-Za-z_][A-Za-z_0-9]*))")
+_COMPARE = {
+    "==": np.equal, "=": np.equal, "!=": np.not_equal,
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+}
+OBJECT_FIELDS = ("class", "bbox_area", "bbox_w", "bbox_h", "aspect", "kp_visible")
+IMAGE_FIELDS = ("count", "conf")
+OBJECT_FUNCTIONS = ("missing_kp", "visible_kp")
+IMAGE_FLAGS = ("unlabeled", "empty", "labeled")
+_KIND_NAMES = {"num": "数字", "op": "比较运算符", "name": "字段名", "paren": "括号"}
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise QueryError(f"无法识别的字符: {text[pos:pos + 10]!r}")
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    """递归下降解析，生成嵌套元组形式的语法树"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        tok = self.peek()
+        if tok[0] is None or (kind and tok[0] != kind) or (value and tok[1] != value):
+            expected = value or _KIND_NAMES.get(kind, "更多内容")
+            raise QueryError(f"此处应为 {expected}，实际为 {tok[1] if tok[1] else '结尾'}")
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("查询为空")
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise QueryError(f"多余的内容: {self.peek()[1]}")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ("name", "or"):
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() == ("name", "and"):
+            self.take()
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == ("name", "not"):
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind, value = self.peek()
+        if (kind, value) == ("paren", "("):
+            self.take()
+            node = self.parse_or()
+            self.take("paren", ")")
+            return node
+        name = self.take("name")[1]
+        if name in OBJECT_FUNCTIONS:
+            self.take("paren", "(")
+            arg = self.take("num")[1]
+            self.take("paren", ")")
+            if not re.fullmatch(r"\d+", arg):
+                raise QueryError(f"{name}() 的参数应为非负整数")
+            return ("func", name, int(arg))
+        if name in IMAGE_FLAGS:
+            return ("flag", name)
+        if name in OBJECT_FIELDS or name in IMAGE_FIELDS:
+            op = self.take("op")[1]
+            return ("cmp", name, op, float(self.take("num")[1]))
+        raise QueryError(f"未知的字段: {name}（可用: {', '.join(OBJECT_FIELDS + IMAGE_FIELDS + OBJECT_FUNCTIONS + IMAGE_FLAGS)}）")
+
+
+def parse_query(text):
+    return _Parser(tokenize(text)).parse()
+
+
+class LabelIndex:
+    """image_files 对应的逐图像/逐目标索引
+
+    图像级数组与 image_files 一一对应；目标级数组只包含属于 image_files 中图像的目标，
+    object_image 为每个目标所属图像在 image_files 中的序号。
+    """
+
+    def __init__(self, image_files, store, conf_index=None):
+        self.num_images = len(image_files)
+        names = np.array([os.path.splitext(n)[0] for n in image_files], dtype=str)
+        stems = store.stems
+        counts_all = store.objects_per_image()
+        # store 中每张图像 -> image_files 中的序号（不在 image_files 中为 -1）
+        order = np.argsort(names, kind="stable")
+        sorted_names = names[order]
+        store_to_image = np.full(len(stems), -1, dtype=np.int64)
+        if len(names) and len(stems):
+            pos = np.searchsorted(sorted_names, stems).clip(0, len(names) - 1)
+            found = sorted_names[pos] == stems
+            store_to_image[found] = order[pos[found]]
+
+        self.has_label = np.zeros(self.num_images, dtype=bool)
+        self.count = np.zeros(self.num_images, dtype=np.int64)
+        linked = store_to_image >= 0
+        self.has_label[store_to_image[linked]] = True
+        self.count[store_to_image[linked]] = counts_all[linked]
+
+        object_image = store_to_image[store.object_image_index()]
+        self._obj_rows = np.flatnonzero(object_image >= 0)
+        self.object_image = object_image[self._obj_rows]
+        self.class_ids = store.class_ids[self._obj_rows]
+        bboxes = store.bboxes[self._obj_rows]
+        self.bbox_w = bboxes[:, 2].astype(np.float64)
+        self.bbox_h = bboxes[:, 3].astype(np.float64)
+        self._store = store
+        self._kp_visible = None
+
+        self.conf = np.full(self.num_images, np.nan)
+        if conf_index is not None and len(conf_index):
+            c_order = np.argsort(conf_index.stems)
+            c_sorted = conf_index.stems[c_order]
+            pos = np.searchsorted(c_sorted, names).clip(0, len(c_sorted) - 1)
+            found = c_sorted[pos] == names
+            self.conf[found] = conf_index.image_scores[c_order[pos[found]]]
+
+    def kp_visible_matrix(self):
+        """(n_obj, K) 关键点可见性，首次使用时才计算"""
+        if self._kp_visible is None:
+            rows = self._obj_rows
+            kps = keypoints_from_values(self._store.values[rows], self._store.ncols[rows])
+            self._kp_visible = kps[..., 2] > 0
+        return self._kp_visible
+
+    # ---------- 求值 ----------
+    def evaluate(self, query):
+        """返回满足查询的图像在 image_files 中的序号（升序）"""
+        node = parse_query(query) if isinstance(query, str) else query
+        level, mask = self._eval(node)
+        if level == "object":
+            mask = self._lift(mask)
+        return np.flatnonzero(mask)
+
+    def _lift(self, obj_mask):
+        return np.bincount(self.object_image[obj_mask], minlength=self.num_images) > 0
+
+    def _eval(self, node):
+        kind = node[0]
+        if kind in ("and", "or"):
+            left_level, left = self._eval(node[1])
+            right_level, right = self._eval(node[2])
+            if left_level != right_level:
+                if left_level == "object":
+                    left = self._lift(left)
+                else:
+                    right = self._lift(right)
+                left_level = "image"
+            return left_level, (left & right) if kind == "and" else (left | right)
+        if kind == "not":
+            level, mask = self._eval(node[1])
+            if level == "object":
+                mask = self._lift(mask)
+            return "image", ~mask
+        if kind == "flag":
+            name = node[1]
+            if name == "unlabeled":
+                return "image", ~self.has_label
+            if name == "empty":
+                return "image", self.has_label & (self.count == 0)
+            return "image", self.count > 0
+        if kind == "func":
+            name, k = node[1], node[2]
+            vis = self.kp_visible_matrix()
+            visible = vis[:, k] if k < vis.shape[1] else np.zeros(len(self.class_ids), dtype=bool)
+            return "object", (~visible if name == "missing_kp" else visible)
+        _, field, op, value = node
+        compare = _COMPARE[op]
+        if field == "count":
+            return "image", compare(self.count, value)
+        if field == "conf":
+            with np.errstate(invalid="ignore"):
+                return "image", compare(self.conf, value) & ~np.isnan(self.conf)
+        if field == "class":
+            data = self.class_ids
+        elif field == "bbox_area":
+            data = self.bbox_w * self.bbox_h
+        elif field == "bbox_w":
+            data = self.bbox_w
+        elif field == "bbox_h":
+            data = self.bbox_h
+        elif field == "aspect":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                data = np.where(self.bbox_h > 0, self.bbox_w / np.where(self.bbox_h > 0, self.bbox_h, 1), np.nan)
+        else:
+            data = self.kp_visible_matrix().sum(axis=1)
+        with np.errstate(invalid="ignore"):
+            return "object", compare(data, value)
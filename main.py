@@ -5,23 +5,41 @@ import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QPushButton, QListWidget, QFileDialog, QMessageBox,
                              QInputDialog, QSpinBox, QTreeWidget, QTreeWidgetItem, QSplitter,
-                             QProgressBar, QStatusBar, QToolBar, QAction, QDockWidget, QComboBox)
+                             QProgressBar, QStatusBar, QToolBar, QAction, QDockWidget, QComboBox, QLineEdit)
 from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QFont, QIcon, QCursor
-from PyQt5.QtCore import Qt, QPoint, QRect, QSize
-import cv2
+from PyQt5.QtCore import Qt, QPoint, QRect, QSize, pyqtSignal
 import threading
-import shutil
-import tempfile
+import time
 from pathlib import Path
 from PyQt5.QtCore import QTimer
-try:
-    from ultralytics import YOLO
-    ULTRALYTICS_AVAILABLE = True
-except Exception:
-    ULTRALYTICS_AVAILABLE = False
+from conf_sidecar import load_confidence_index, sidecar_dir
+from annotation_store import AnnotationStore, new_object_id, parse_keypoint_values
+from edit_history import AddObject, EditHistory, RemoveObject, SetClass, SetKeypoint
+from edit_journal import EditJournal, orphan_journals, read_journal
+from keypoint_tracking import FrameCache, propagate_store
+from image_dedup import find_duplicates
+from label_diff import PREV_LABELS_DIRNAME, diff_dirs
+from label_merge import record_human
+from label_api import default_labels_dir, images_without_targets, list_images, save_label_text, sync_categories
+from active_learning import ActiveSampler, human_labeled_stems, state_path, write_manifest
+from dataset_store import DatasetLabelStore
+from dataset_stats import LabelStats
+from label_query import LabelIndex, QueryError, parse_query
+from stats_panel import StatsPanel
+
+# 各类别关键点的显示颜色
+ANNOTATION_COLORS = [QColor(0, 255, 0), QColor(255, 0, 0), QColor(0, 0, 255),
+                     QColor(255, 255, 0), QColor(255, 0, 255), QColor(0, 255, 255)]
 
 class KeypointAnnotationTool(QMainWindow):
-    def __init__(self):
+    # 自动保存日志在后台线程写回标签文件后发出 (标签路径, 实际写入路径, 文本)，在主线程处理
+    labelWritten = pyqtSignal(str, str, str)
+    # 近重复帧检测在后台线程完成后发出 (图像目录, 处理方式, DedupResult 或异常)
+    dedupFinished = pyqtSignal(str, str, object)
+    # 标签目录对比在后台线程完成后发出 LabelDiff 或异常
+    diffFinished = pyqtSignal(object)
+
+    def __init__(self, ai=True):
         super().__init__()
         self.keypoints_list = QListWidget(self)
         self.setWindowTitle("YOLOv8 Keypoints 标注工具 - 增强版")
@@ -36,20 +54,51 @@ class KeypointAnnotationTool(QMainWindow):
         self.scale_factor = 1.0
         self.original_image = None
 
-        # AI model path
-        self.model_path = ""  # 用户选择的 .pt 模型路径
-        
-        # 标注数据
-        self.annotations = []
+        # AI 自动标注插件（ai_plugin.py）；手动标注版（labeling_tool_without_ai.py）不加载，也不导入其依赖
+        self.ai = None
+        if ai:
+            from ai_plugin import AIPlugin
+            self.ai = AIPlugin(self)
+
+        # 标注数据：当前图像全部目标存放在 AnnotationStore 数组中，current_annotation 为其中一个目标的视图
+        self.annotations = AnnotationStore()
         self.current_annotation = None
         self.selected_point_index = -1
         self.dragging = False
+        # 自动保存日志：每步编辑追加到日志，切换图像后在后台写回标签文件，崩溃后启动时恢复
+        self.journal = EditJournal(on_written=self.labelWritten.emit)
+        self.labelWritten.connect(self._on_label_autosaved)
+        # 撤销/重做历史（只记录差异），重新从文件加载图像时清空
+        self.history = EditHistory(journal=self.journal)
+        self._drag_start = None
+        # 最近几帧缩小后的灰度图，供“传播到下一帧”的光流跟踪使用（加载图像时加入）
+        self.frame_cache = FrameCache()
+        self.dedupFinished.connect(self._on_dedup_finished)
+        # 主动学习采样状态（首次选样时建立，同一图像/标签目录下之后只读取新增的预测分片）
+        self.al_sampler = None
+        self._al_key = None
+        # 最近一次标签目录对比结果（加载图像时在状态栏显示该图像的差异）
+        self.label_diff = None
+        self.diffFinished.connect(self._on_diff_finished)
+
+        # 可选的整个数据集标签列式镜像（labels/.store/），加载后保存标注时同步更新
+        self.dataset_store = None
+        # 数据集统计（打开统计面板后创建，保存标注时增量更新）
+        self.label_stats = None
+        self.stats_dock = None
+
+        # 图像列表筛选：file_list 第 row 行对应 image_files[visible_indices[row]]，None 表示不筛选
+        self.filter_query = ""
+        self.visible_indices = None
+        self._label_index = None
+        self._label_index_key = None
         
         # 类别和关键点配置（启动时为空，导入标签后自动扩展）
         self.categories = []
         self.current_category_id = 0
         
         self.init_ui()
+        QTimer.singleShot(0, self.recover_autosave)
         
     def init_ui(self):
         # 创建中央窗口和主布局
@@ -67,6 +116,13 @@ class KeypointAnnotationTool(QMainWindow):
         self.btn_open_folder = QPushButton("打开图像文件夹")
         self.btn_open_folder.clicked.connect(self.open_image_folder)
         left_layout.addWidget(self.btn_open_folder)
+
+        # 打开文件夹时的近重复帧处理（感知哈希，哈希缓存在图像目录 .phash_cache.npz）
+        self.dedup_combo = QComboBox()
+        for text, mode in (("近重复帧: 不处理", "off"), ("近重复帧: 跳过", "skip"),
+                           ("近重复帧: 分组排列", "group"), ("近重复帧: 移到隔离目录", "quarantine")):
+            self.dedup_combo.addItem(text, mode)
+        left_layout.addWidget(self.dedup_combo)
         
         # 标签文件夹选择按钮
         self.btn_open_labels_folder = QPushButton("选择标签文件夹")
@@ -77,23 +133,43 @@ class KeypointAnnotationTool(QMainWindow):
         self.lbl_current_labels_dir = QLabel("未选择标签目录")
         left_layout.addWidget(self.lbl_current_labels_dir)
 
-        # ===== 新增：模型选择与 AI 自动标注按钮 =====
-        self.btn_select_model = QPushButton("选择 .pt 模型")
-        self.btn_select_model.clicked.connect(self.select_model)
-        left_layout.addWidget(self.btn_select_model)
+        # 模型选择与 AI 自动标注（插件）
+        if self.ai is not None:
+            self.ai.build(left_layout)
+
+        # 复核队列：按自动标注置信度从低到高排列图像
+        self.btn_review_queue = QPushButton("按置信度排序（复核队列）")
+        self.btn_review_queue.clicked.connect(self.sort_images_by_confidence)
+        left_layout.addWidget(self.btn_review_queue)
+
+        # 主动学习：按不确定度和外观多样性选出下一批最值得人工标注的图像，排在列表最前
+        self.btn_active_learning = QPushButton("主动学习选样")
+        self.btn_active_learning.clicked.connect(self.sort_images_by_active_learning)
+        left_layout.addWidget(self.btn_active_learning)
 
-        self.lbl_model_path = QLabel("未选择模型")
-        left_layout.addWidget(self.lbl_model_path)
+        # 标签对比：与 AI 标注前的标签（或任意标签目录）逐目标对比，差异最大的图像排在最前
+        self.btn_label_diff = QPushButton("对比标签（差异排序）")
+        self.btn_label_diff.clicked.connect(self.compare_label_dirs)
+        left_layout.addWidget(self.btn_label_diff)
 
-        self.btn_auto_annotate = QPushButton("AI 标注全部图像")
-        self.btn_auto_annotate.clicked.connect(self.auto_annotate_all)
-        left_layout.addWidget(self.btn_auto_annotate)
-        # ============================================
+        # 数据集标签库：把整个标签目录镜像为列式数组，数据集级操作不再逐个打开 txt
+        self.btn_dataset_store = QPushButton("加载数据集标签库")
+        self.btn_dataset_store.clicked.connect(self.open_dataset_store)
+        left_layout.addWidget(self.btn_dataset_store)
+
+        self.btn_stats = QPushButton("数据集统计")
+        self.btn_stats.clicked.connect(self.show_stats_panel)
+        left_layout.addWidget(self.btn_stats)
         
         # 文件列表
         self.file_list = QListWidget()
-        self.file_list.currentRowChanged.connect(self.load_image)
+        self.file_list.currentRowChanged.connect(self._on_file_row_changed)
         left_layout.addWidget(QLabel("图像文件:"))
+        # 筛选栏：输入查询后回车，列表和上下键导航只包含匹配的图像；清空后回车恢复全部
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("筛选，如 class==2 and count>3、missing_kp(4)、unlabeled")
+        self.filter_edit.returnPressed.connect(self.apply_filter)
+        left_layout.addWidget(self.filter_edit)
         left_layout.addWidget(self.file_list)
         
         # 标签操作按钮
@@ -162,6 +238,11 @@ class KeypointAnnotationTool(QMainWindow):
         self.btn_clear = QPushButton("清除当前标注")
         self.btn_clear.clicked.connect(self.clear_current_annotation)
         right_layout.addWidget(self.btn_clear)
+
+        # 视频帧序列：用光流把当前标注跟踪到列表中的下一帧
+        self.btn_propagate = QPushButton("传播到下一帧")
+        self.btn_propagate.clicked.connect(self.propagate_to_next_frame)
+        right_layout.addWidget(self.btn_propagate)
         
         # 类别管理按钮
         right_layout.addWidget(QLabel("类别管理:"))
@@ -184,6 +265,14 @@ class KeypointAnnotationTool(QMainWindow):
         # 工具栏
         toolbar = QToolBar()
         self.addToolBar(toolbar)
+        self.action_undo = QAction("撤销", self)
+        self.action_undo.setShortcuts(["Ctrl+Z"])
+        self.action_undo.triggered.connect(self.undo_edit)
+        toolbar.addAction(self.action_undo)
+        self.action_redo = QAction("重做", self)
+        self.action_redo.setShortcuts(["Ctrl+Y", "Ctrl+Shift+Z"])
+        self.action_redo.triggered.connect(self.redo_edit)
+        toolbar.addAction(self.action_redo)
         
         # 添加快捷键说明
         self.status_bar.showMessage("快捷键: S-保存 | N-新建标注 | U-撤销 | C-清除 | ←/→-切换图像")
@@ -193,6 +282,8 @@ class KeypointAnnotationTool(QMainWindow):
         folder_path = QFileDialog.getExistingDirectory(self, "选择标签文件夹")
         if folder_path:
             self.labels_dir = folder_path
+            self.dataset_store = None
+            self.label_stats = None
             self.lbl_current_labels_dir.setText(f"标签目录: {os.path.basename(folder_path)}")
             self.status_bar.showMessage(f"已选择标签目录: {folder_path}")
     
@@ -202,10 +293,7 @@ class KeypointAnnotationTool(QMainWindow):
             return self.labels_dir
         elif self.image_dir:
             # 如果没有手动选择标签目录，尝试自动创建与images同级的labels目录
-            if "images" in self.image_dir:
-                labels_dir = self.image_dir.replace("images", "labels")
-            else:
-                labels_dir = os.path.join(os.path.dirname(self.image_dir), "labels")
+            labels_dir = default_labels_dir(self.image_dir)
             
             # 确保labels目录存在
             if not os.path.exists(labels_dir):
@@ -239,15 +327,12 @@ class KeypointAnnotationTool(QMainWindow):
         self.current_category_id = index
         self.update_keypoints_list()
 
-        # 如果当前有选中的标注，修改该标注的 category_id 并调整 keypoints 数量
+        # 如果当前有选中的标注，修改该标注的 category_id 并调整 keypoints 数量（补齐或截断）
         if self.current_annotation is not None and 0 <= index < len(self.categories):
-            self.current_annotation["category_id"] = index
             needed = len(self.categories[index]["keypoints"])
-            # 补齐或截断关键点列表
-            kps = self.current_annotation.get("keypoints", [])
-            while len(kps) < needed:
-                kps.append([0.0, 0.0, 0])
-            self.current_annotation["keypoints"] = kps[:needed]
+            ann_index = self.current_annotation.index
+            if self.annotations.class_ids[ann_index] != index or self.annotations.num_kps[ann_index] != needed:
+                self.history.execute(self.annotations, SetClass(self.annotations, ann_index, index, needed))
             self.update_display()
             self.status_bar.showMessage(f"当前标注类别已设为: {self.categories[index]['name']}")
     
@@ -262,15 +347,67 @@ class KeypointAnnotationTool(QMainWindow):
         folder_path = QFileDialog.getExistingDirectory(self, "选择图像文件夹")
         if folder_path:
             self.image_dir = folder_path
-            self.image_files = [f for f in os.listdir(folder_path) 
-                               if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
-            self.file_list.clear()
-            self.file_list.addItems(self.image_files)
+            if self.ai is not None:
+                self.ai.folder_opened()
+            self.image_files = list_images(folder_path)
+            self.refresh_file_list()
             if self.image_files:
                 self.file_list.setCurrentRow(0)
+            mode = self.dedup_combo.currentData()
+            if mode != "off" and self.image_files:
+                self.btn_open_folder.setEnabled(False)
+                self.status_bar.showMessage(f"正在检测近重复帧（{len(self.image_files)} 张）...")
+                threading.Thread(target=self._dedup_worker, args=(folder_path, mode), daemon=True).start()
+
+    def _dedup_worker(self, folder_path, mode):
+        try:
+            result = find_duplicates(folder_path)
+        except Exception as e:
+            result = e
+        self.dedupFinished.emit(folder_path, mode, result)
+
+    def _on_dedup_finished(self, folder_path, mode, result):
+        """按处理方式更新图像列表：skip 只列代表帧，group 把近重复帧排在代表帧之后，quarantine 移走近重复帧"""
+        self.btn_open_folder.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.warning(self, "错误", f"近重复帧检测失败: {str(result)}")
+            return
+        if folder_path != self.image_dir:
+            return
+        if result.num_duplicates == 0:
+            self.status_bar.showMessage(f"未发现近重复帧（{len(result.names)} 张）")
+            return
+        current = self.image_files[self.current_image_index] if 0 <= self.current_image_index < len(self.image_files) else None
+        if mode == "group":
+            self.image_files = result.grouped_names()
+            msg = f"已按组排列: {result.num_duplicates} 张近重复帧排在各自代表帧之后"
+        else:
+            if mode == "quarantine":
+                if QMessageBox.question(self, "隔离近重复帧",
+                                        f"将 {result.num_duplicates} 张近重复帧移到 {folder_path}_duplicates，是否继续?",
+                                        QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+                    return
+                result.quarantine()
+                self.frame_cache.clear()
+                msg = f"已将 {result.num_duplicates} 张近重复帧移到 {folder_path}_duplicates"
+            else:
+                msg = f"已跳过 {result.num_duplicates} 张近重复帧"
+            self.image_files = result.kept_names()
+        self.refresh_file_list()
+        if self.image_files:
+            index = self.image_files.index(current) if current in self.image_files else 0
+            if self.visible_indices is not None:
+                row = self.visible_indices.index(index) if index in self.visible_indices else 0
+            else:
+                row = index
+            self.file_list.setCurrentRow(row)
+        self.status_bar.showMessage(f"{msg}（共 {len(result.names)} 张，列表 {len(self.image_files)} 张）")
     
     def load_image(self, index):
         if 0 <= index < len(self.image_files):
+            # cv2 在第一次加载图像时才导入，不计入启动时间
+            import cv2
+
             self.current_image_index = index
             image_path = os.path.join(self.image_dir, self.image_files[index])
             
@@ -292,9 +429,11 @@ class KeypointAnnotationTool(QMainWindow):
             # 缩放图像以适应标签大小
             self.current_image = pixmap
             self.display_image()
+            self.frame_cache.get(image_path, self.original_image)
             
             # 自动加载对应的标注文件（如果存在）
             self.load_annotation_file()
+            self._show_diff_status()
     
     def display_image(self):
         if self.current_image:
@@ -313,7 +452,7 @@ class KeypointAnnotationTool(QMainWindow):
         self.display_image()
     
     def image_mouse_press(self, event):
-        if not self.current_image or not self.current_annotation:
+        if not self.current_image or self.current_annotation is None:
             return
 
         pos = event.pos()
@@ -326,40 +465,31 @@ class KeypointAnnotationTool(QMainWindow):
 
         x_img = (pos.x() - img_x) / self.scale_factor
         y_img = (pos.y() - img_y) / self.scale_factor
+        img_w, img_h = self.current_image.width(), self.current_image.height()
+        ann_index = self.current_annotation.index
+
+        # 判断是否点中了某个关键点（允许10像素范围内拖拽）
+        hit = self.annotations.hit_test(ann_index, x_img, y_img, img_w, img_h, radius=10)
+        if hit >= 0:
+            self.selected_point_index = hit
+            self.dragging = True
+            # 记录拖拽前的位置，松开鼠标时作为一步编辑记入历史
+            self._drag_start = tuple(self.annotations.keypoints[ann_index, hit])
+            return
 
-        # 判断是否点中了某个关键点（允许拖拽）
-        found = False
-        for i, (x, y, v) in enumerate(self.current_annotation["keypoints"]):
-            if v > 0:
-                kp_x = x * self.current_image.width()
-                kp_y = y * self.current_image.height()
-                dist = ((kp_x - x_img) ** 2 + (kp_y - y_img) ** 2) ** 0.5
-                if dist < 10:  # 允许10像素范围内拖拽
-                    self.selected_point_index = i
-                    self.dragging = True
-                    found = True
-                    break
-
-        if not found and event.button() == Qt.LeftButton:
-            # 没点中任何关键点，则添加新点（原逻辑）
-            if self.current_annotation and 0 <= self.current_category_id < len(self.categories):
-                current_category = self.categories[self.current_category_id]
-                for i in range(len(current_category["keypoints"])):
-                    if i >= len(self.current_annotation["keypoints"]) or self.current_annotation["keypoints"][i][2] == 0:
-                        if i >= len(self.current_annotation["keypoints"]):
-                            while len(self.current_annotation["keypoints"]) <= i:
-                                self.current_annotation["keypoints"].append([0, 0, 0])
-                        self.current_annotation["keypoints"][i] = [
-                            x_img / self.current_image.width(),
-                            y_img / self.current_image.height(),
-                            2
-                        ]
-                        self.selected_point_index = i
-                        self.update_display()
-                        break
+        if event.button() == Qt.LeftButton:
+            # 没点中任何关键点，则在类别定义的第一个空位添加新点
+            if 0 <= self.current_category_id < len(self.categories):
+                needed = len(self.categories[self.current_category_id]["keypoints"])
+                k = self.annotations.first_free_keypoint(ann_index, needed)
+                if k >= 0:
+                    self.history.execute(self.annotations, SetKeypoint.capture(
+                        self.annotations, ann_index, k, (x_img / img_w, y_img / img_h, 2)))
+                    self.selected_point_index = k
+                    self.update_display()
 
     def image_mouse_move(self, event):
-        if self.dragging and self.selected_point_index >= 0 and self.current_annotation:
+        if self.dragging and self.selected_point_index >= 0 and self.current_annotation is not None:
             pos = event.pos()
             pixmap = self.image_label.pixmap()
             if not pixmap:
@@ -369,11 +499,19 @@ class KeypointAnnotationTool(QMainWindow):
             x_img = (pos.x() - img_x) / self.scale_factor
             y_img = (pos.y() - img_y) / self.scale_factor
             # 更新关键点坐标
-            self.current_annotation["keypoints"][self.selected_point_index][0] = x_img / self.current_image.width()
-            self.current_annotation["keypoints"][self.selected_point_index][1] = y_img / self.current_image.height()
+            self.annotations.move_keypoint(self.current_annotation.index, self.selected_point_index,
+                                           x_img / self.current_image.width(),
+                                           y_img / self.current_image.height())
             self.update_display()
 
     def image_mouse_release(self, event):
+        if self.dragging and self._drag_start is not None and self.current_annotation is not None:
+            ann_index = self.current_annotation.index
+            k = self.selected_point_index
+            end = tuple(self.annotations.keypoints[ann_index, k])
+            if end != self._drag_start:
+                self.history.record(SetKeypoint(self.current_annotation.id, k, self._drag_start, end))
+        self._drag_start = None
         self.dragging = False
         self.selected_point_index = -1
     
@@ -383,38 +521,36 @@ class KeypointAnnotationTool(QMainWindow):
             QMessageBox.warning(self, "警告", "请先选择一个物体类别")
             return
             
-        # 创建新极标注
-        self.current_annotation = {
-            "category_id": current_category_id,
-            "keypoints": []  # 格式: [[x1, y1, v1], [x2, y2, v2], ...]
-        }
-        
-        # 初始化关键点列表（全部不可见）
+        # 创建新标注，关键点按类别定义初始化（全部不可见）
+        num_kps = 0
         if 0 <= current_category_id < len(self.categories):
-            current_category = self.categories[current_category_id]
-            for _ in current_category["keypoints"]:
-                self.current_annotation["keypoints"].append([0, 0, 0])  # x, y, visibility
+            num_kps = len(self.categories[current_category_id]["keypoints"])
+        self.current_annotation = self.annotations.add(current_category_id, num_kps=num_kps)
+        self.history.record(AddObject(self.current_annotation.id, self.current_annotation.index,
+                                      current_category_id, num_kps))
         
-        self.annotations.append(self.current_annotation)
         self.update_display()
         self.status_bar.showMessage("新建标注已创建，请点击图像添加关键点")
         self.refresh_annotation_list()
     
     def undo_last_point(self):
-        if self.current_annotation:
+        if self.current_annotation is not None:
             # 找到最后一个可见的点并将其设置为不可见
-            for i in range(len(self.current_annotation["keypoints"]) - 1, -1, -1):
-                if self.current_annotation["keypoints"][i][2] > 0:
-                    self.current_annotation["keypoints"][i][2] = 0  # 设置为不可见
-                    self.update_display()
-                    self.status_bar.showMessage(f"已撤销关键点 {i}")
-                    return
+            ann_index = self.current_annotation.index
+            i = self.annotations.last_visible_keypoint(ann_index)
+            if i >= 0:
+                old = self.annotations.keypoints[ann_index, i]
+                self.history.execute(self.annotations, SetKeypoint(
+                    self.current_annotation.id, i, old, (old[0], old[1], 0)))  # 设置为不可见
+                self.update_display()
+                self.status_bar.showMessage(f"已撤销关键点 {i}")
+                return
             
             self.status_bar.showMessage("没有可撤销的关键点")
     
     def clear_current_annotation(self):
-        if self.current_annotation and self.annotations:
-            self.annotations.remove(self.current_annotation)
+        if self.current_annotation is not None and self.annotations:
+            self.history.execute(self.annotations, RemoveObject(self.annotations, self.current_annotation.index))
             self.current_annotation = None
             if self.annotations:
                 self.current_annotation = self.annotations[-1]
@@ -429,28 +565,20 @@ class KeypointAnnotationTool(QMainWindow):
         display_pixmap = self.current_image.copy()
         painter = QPainter(display_pixmap)
         painter.setRenderHint(QPainter.Antialiasing)
+        painter.setFont(QFont("Arial", 10))
         
-        for annotation in self.annotations:
-            category_id = annotation["category_id"]
-            keypoints = annotation["keypoints"]
-            colors = [QColor(0, 255, 0), QColor(255, 0, 0), QColor(0, 0, 255), 
-                     QColor(255, 255, 0), QColor(255, 0, 255), QColor(0, 255, 255)]
-            color = colors[category_id % len(colors)]
-            pen = QPen(color, 2)
-            painter.setPen(pen)
-            for i, kp in enumerate(keypoints):
-                try:
-                    x = float(kp[0])
-                    y = float(kp[1])
-                    visible = int(kp[2]) if len(kp) > 2 else 2
-                except Exception:
-                    continue
-                if visible > 0:
-                    x_pix = x * display_pixmap.width()
-                    y_pix = y * display_pixmap.height()
-                    painter.drawEllipse(QPoint(int(x_pix), int(y_pix)), 5, 5)
-                    painter.setFont(QFont("Arial", 10))
-                    painter.drawText(QPoint(int(x_pix) + 8, int(y_pix) - 8), str(i))
+        # 一次性取出所有可见关键点并换算为像素坐标，只在绘制时逐点循环
+        obj_idx, kp_idx, xs, ys = self.annotations.visible_points()
+        xs = (xs * display_pixmap.width()).astype(int).tolist()
+        ys = (ys * display_pixmap.height()).astype(int).tolist()
+        class_ids = self.annotations.class_ids[obj_idx].tolist()
+        last_class = None
+        for cid, k, x_pix, y_pix in zip(class_ids, kp_idx.tolist(), xs, ys):
+            if cid != last_class:
+                painter.setPen(QPen(ANNOTATION_COLORS[cid % len(ANNOTATION_COLORS)], 2))
+                last_class = cid
+            painter.drawEllipse(QPoint(x_pix, y_pix), 5, 5)
+            painter.drawText(QPoint(x_pix + 8, y_pix - 8), str(k))
         painter.end()
         scaled_pixmap = display_pixmap.scaled(
             self.image_label.size(), 
@@ -482,81 +610,16 @@ class KeypointAnnotationTool(QMainWindow):
             open(txt_path, 'w').close()
         
         try:
-            self.annotations = []
+            self.journal.settle(txt_path)
+            self.annotations = self._read_label_file(txt_path)
             self.current_annotation = None
-            
-            # 获取当前图像的宽高（像素），用于判断/归一化
-            if self.original_image is not None:
-                img_h, img_w = self.original_image.shape[:2]
-            else:
-                img_w = self.current_image.width() if self.current_image else 1
-                img_h = self.current_image.height() if self.current_image else 1
-            
-            with open(txt_path, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) < 5:  # 至少需要类别ID和bbox
-                        continue
-                        
-                    # 解析YOLOv8格式
-                    category_id = int(parts[0])
-                    bbox = list(map(float, parts[1:5]))
-                    keypoints = []
-                    
-                    # 解析关键点（如果有），兼容两种格式： (x y v) 或 (x y)
-                    if len(parts) > 5:
-                        keypoints = self.parse_keypoints_with_v(parts[5:], img_w, img_h)
-                    
-                    # 如果读入的是像素坐标（存在>1的坐标），则转换为归一化坐标
-                    normalized_keypoints = []
-                    for x, y, v in keypoints:
-                        if x > 1.0 or y > 1.0:
-                            nx = x / img_w
-                            ny = y / img_h
-                        else:
-                            nx = x
-                            ny = y
-                        normalized_keypoints.append([nx, ny, v])
-                    
-                    # 如果文件中包含比现有 categories 更多的类别索引，则自动创建占位类别以保留原类别序号
-                    # 在解析完 normalized_keypoints 后
-                    if category_id >= len(self.categories):
-                        for cid in range(len(self.categories), category_id + 1):
-                            kp_count = max(1, len(normalized_keypoints))
-                            placeholder_kps = [f"kp{i}" for i in range(kp_count)]
-                            self.categories.append({
-                                "name": f"class_{cid}",
-                                "keypoints": placeholder_kps
-                            })
-                        self.update_category_combo()
-                    else:
-                        needed = len(self.categories[category_id]["keypoints"])
-                        if len(normalized_keypoints) > needed:
-                            extra = len(normalized_keypoints) - needed
-                            for _ in range(extra):
-                                self.categories[category_id]["keypoints"].append(f"kp{needed}")
-                                needed += 1
-                            self.update_category_combo()
-
-                    # 补齐关键点数以匹配类别定义
-                    if 0 <= category_id < len(self.categories):
-                        needed = len(self.categories[category_id]["keypoints"])
-                        while len(normalized_keypoints) < needed:
-                            normalized_keypoints.append([0.0, 0.0, 0])
-                        # 不截断，保留所有点
-                        # normalized_keypoints = normalized_keypoints[:needed]
-                    
-                    annotation = {
-                        "category_id": category_id,
-                        "bbox": bbox,
-                        "keypoints": normalized_keypoints
-                    }
-                    self.annotations.append(annotation)
+            self.history.reset()
+            self._journal_open(txt_path)
             
             if self.annotations:
                 # 默认选中第一个标注
                 self.current_annotation = self.annotations[0]
-                self.current_category_id = self.current_annotation["category_id"]
+                self.current_category_id = self.current_annotation.category_id
                 self.category_combo.setCurrentIndex(self.current_category_id)
                 # 刷新标注列表
                 self.refresh_annotation_list()
@@ -585,73 +648,23 @@ class KeypointAnnotationTool(QMainWindow):
 
         try:
             # 获取图像像素大小，用于将像素坐标归一化（如果检测到有像素坐标）
-            if self.original_image is not None:
-                img_h, img_w = self.original_image.shape[:2]
-            else:
-                img_w = self.current_image.width() if self.current_image else 1
-                img_h = self.current_image.height() if self.current_image else 1
-
-            with open(txt_path, 'w') as f:
-                for annotation in self.annotations:
-                    category_id = int(annotation.get("category_id", 0))
-                    keypoints = annotation.get("keypoints", [])
-
-                    # 确保关键点数量等于类别定义数（不足补 0）
-                    if 0 <= category_id < len(self.categories):
-                        needed = len(self.categories[category_id]["keypoints"])
-                    else:
-                        needed = len(keypoints)
-                    # 复制一份避免修改原数据结构顺序/长度
-                    kps = [list(k) for k in keypoints]
-                    while len(kps) < needed:
-                        kps.append([0.0, 0.0, 0])
-                    kps = kps[:needed]
-
-                    # 计算边界框（基于可见关键点）
-                    valid_points = [kp for kp in kps if kp[2] > 0]
-                    if not valid_points:
-                        # 没有可见关键点则跳过该 annotation
-                        continue
-
-                    # 提取并归一化坐标（如果检测到为像素坐标）
-                    xs = []
-                    ys = []
-                    for kp in valid_points:
-                        x, y = float(kp[0]), float(kp[1])
-                        if x > 1.0 or y > 1.0:
-                            nx = x / img_w
-                            ny = y / img_h
-                        else:
-                            nx = x
-                            ny = y
-                        xs.append(nx)
-                        ys.append(ny)
-
-                    x_min, x_max = min(xs), max(xs)
-                    y_min, y_max = min(ys), max(ys)
-                    x_center = (x_min + x_max) / 2.0
-                    y_center = (y_min + y_max) / 2.0
-                    width = (x_max - x_min)
-                    height = (y_max - y_min)
-
-                    # 写入类别ID和边界框（统一 6 位小数）
-                    f.write(f"{category_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}")
-
-                    # 按类别关键点顺序写入关键点坐标：只写 x y（不可见点写 0 0），确保归一化并使用 6 位小数
-                    for kp in kps:
-                        x, y, v = float(kp[0]), float(kp[1]), int(kp[2])
-                        if x > 1.0 or y > 1.0:
-                            nx = x / img_w
-                            ny = y / img_h
-                        else:
-                            nx = x
-                            ny = y
-                        if v > 0:
-                            f.write(f" {nx:.6f} {ny:.6f}")
-                        else:
-                            f.write(f" {0.0:.6f} {0.0:.6f}")
-
-                    f.write("\n")
+            img_w, img_h = self._image_size()
+
+            # 关键点数补齐/截断为类别定义数，无可见关键点的目标跳过，bbox 由可见关键点计算（见 AnnotationStore.to_yolo_text）
+            category_sizes = [len(c["keypoints"]) for c in self.categories]
+            text = self.annotations.to_yolo_text(category_sizes, img_w, img_h)
+            stem = os.path.splitext(image_name)[0]
+            # 原子写入，人工保存过的目标记为人工标注，之后 AI 合并标注不会覆盖
+            save_label_text(os.path.dirname(txt_path), stem, text)
+            self._journal_open(txt_path)
+            if self.al_sampler is not None:
+                self.al_sampler.mark_labeled([stem])
+            if self.label_stats is not None:
+                # 统计只减去旧标签、加上新标签，不重新扫描
+                self.label_stats.update_image(self.dataset_store, stem, text)
+                self.refresh_stats_panel()
+            elif self.dataset_store is not None:
+                self.dataset_store.update_text(stem, text)
 
             self.status_bar.showMessage(f"标注已保存: {txt_path}")
             return True
@@ -665,84 +678,22 @@ class KeypointAnnotationTool(QMainWindow):
         if not self.image_files or self.current_image_index < 0:
             return
             
-        self.annotations = []
+        self.annotations = AnnotationStore()
         self.current_annotation = None
-        
-        # 当前图像像素尺寸
-        if self.original_image is not None:
-            img_h, img_w = self.original_image.shape[:2]
-        else:
-            img_w = self.current_image.width() if self.current_image else 1
-            img_h = self.current_image.height() if self.current_image else 1 
+        self.history.reset()
         
         image_name = self.image_files[self.current_image_index]
         txt_path = self.get_label_path(image_name)
         
+        if txt_path:
+            self.journal.settle(txt_path)
         if txt_path and os.path.exists(txt_path):
             try:
-                with open(txt_path, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) < 5:  # 至少需要类别ID和bbox
-                            continue
-                            
-                        category_id = int(parts[0])
-                        bbox = list(map(float, parts[1:5]))
-                        keypoints = []
-                        
-                        # 解析关键点（如果有），兼容 (x y v) 和 (x y)
-                        if len(parts) > 5:
-                            keypoints = self.parse_keypoints_with_v(parts[5:], img_w, img_h)
-                        
-                        # 将像素坐标转换为归一化（如果检测到 >1）
-                        normalized_keypoints = []
-                        for x, y, v in keypoints:
-                            if x > 1.0 or y > 1.0:
-                                nx = x / img_w
-                                ny = y / img_h
-                            else:
-                                nx = x
-                                ny = y
-                            normalized_keypoints.append([nx, ny, v])
-                        
-                        # 如果文件中包含比现有 categories 更多的类别索引，则自动创建占位类别
-                        # 在解析完 normalized_keypoints 后
-                        if category_id >= len(self.categories):
-                            for cid in range(len(self.categories), category_id + 1):
-                                kp_count = max(1, len(normalized_keypoints))
-                                placeholder_kps = [f"kp{i}" for i in range(kp_count)]
-                                self.categories.append({
-                                    "name": f"class_{cid}",
-                                    "keypoints": placeholder_kps
-                                })
-                            self.update_category_combo()
-                        else:
-                            needed = len(self.categories[category_id]["keypoints"])
-                            if len(normalized_keypoints) > needed:
-                                extra = len(normalized_keypoints) - needed
-                                for _ in range(extra):
-                                    self.categories[category_id]["keypoints"].append(f"kp{needed}")
-                                    needed += 1
-                                self.update_category_combo()
-                                                
-                        # 补齐关键点数量
-                        if 0 <= category_id < len(self.categories):
-                            needed = len(self.categories[category_id]["keypoints"])
-                            while len(normalized_keypoints) < needed:
-                                normalized_keypoints.append([0.0, 0.0, 0])
-                            # 不截断，保留所有点
-                            # normalized_keypoints = normalized_keypoints[:needed]
-                        
-                        annotation = {
-                            "category_id": category_id,
-                            "bbox": bbox,
-                            "keypoints": normalized_keypoints
-                        }
-                        self.annotations.append(annotation)
+                self.annotations = self._read_label_file(txt_path)
                 
                 if self.annotations:
                     self.current_annotation = self.annotations[-1]
-                    self.current_category_id = self.current_annotation["category_id"]
+                    self.current_category_id = self.current_annotation.category_id
                     self.category_combo.setCurrentIndex(self.current_category_id)
                 
                 self.update_display()
@@ -751,6 +702,103 @@ class KeypointAnnotationTool(QMainWindow):
                 
             except Exception as e:
                 self.status_bar.showMessage(f"加载标注文件时出错: {str(e)}")
+        self._journal_open(txt_path)
+
+    def _journal_open(self, txt_path):
+        """在自动保存日志中记录当前图像标注的快照（打开、重新导入、保存后调用）"""
+        img_w, img_h = self._image_size()
+        self.journal.open_image(txt_path, self.annotations, img_w, img_h,
+                                [len(c["keypoints"]) for c in self.categories])
+
+    def _on_label_autosaved(self, label_path, written_path, text):
+        """后台写回切换前图像的未保存修改后，同步数据集标签库/统计"""
+        if written_path != label_path:
+            self.status_bar.showMessage(f"{os.path.basename(label_path)} 已被其他程序修改，未保存的标注写入: {written_path}")
+            return
+        self.status_bar.showMessage(f"已自动保存: {os.path.basename(label_path)}")
+        labels_dir = self.get_labels_dir()
+        if not labels_dir or os.path.dirname(os.path.abspath(label_path)) != os.path.abspath(labels_dir):
+            return
+        stem = os.path.splitext(os.path.basename(label_path))[0]
+        record_human(labels_dir, stem, text)
+        if self.al_sampler is not None:
+            self.al_sampler.mark_labeled([stem])
+        if self.dataset_store is None:
+            return
+        if self.label_stats is not None:
+            self.label_stats.update_image(self.dataset_store, stem, text)
+            self.refresh_stats_panel()
+        else:
+            self.dataset_store.update_text(stem, text)
+
+    def recover_autosave(self):
+        """启动时检查上次崩溃或未保存就退出时遗留的自动保存日志，询问是否写回标签文件"""
+        journals = orphan_journals()
+        if not journals:
+            return
+        images = {}
+        readable = []
+        for path in journals:
+            try:
+                for image in read_journal(path):
+                    if image.dirty:
+                        images[image.label_path] = image
+                readable.append(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"读取自动保存日志 {path} 失败: {e}")
+        if images:
+            names = "\n".join(os.path.basename(p) for p in list(images)[:10])
+            more = f"\n...（共 {len(images)} 个）" if len(images) > 10 else ""
+            reply = QMessageBox.question(self, "恢复未保存的标注",
+                                         f"检测到上次未保存的标注修改（{len(images)} 个标签文件）:\n{names}{more}\n\n"
+                                         "是否写回标签文件？选择“否”将丢弃这些修改。",
+                                         QMessageBox.Yes | QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                conflicts = [w for w in (image.write_back() for image in images.values()) if w.endswith(".recovered")]
+                message = f"已恢复 {len(images)} 个标签文件"
+                if conflicts:
+                    message += f"，其中 {len(conflicts)} 个已被其他程序修改，恢复结果写入 .recovered 文件"
+                self.status_bar.showMessage(message)
+        for path in readable:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def closeEvent(self, event):
+        # 写回已切换走的图像的修改；当前图像未保存的修改留在日志中，下次启动时询问是否恢复
+        self.journal.close()
+        if self.ai is not None:
+            self.ai.shutdown()
+        super().closeEvent(event)
+
+    def _image_size(self):
+        """当前图像的像素宽高，用于像素坐标与归一化坐标互转"""
+        if self.original_image is not None:
+            img_h, img_w = self.original_image.shape[:2]
+        else:
+            img_w = self.current_image.width() if self.current_image else 1
+            img_h = self.current_image.height() if self.current_image else 1
+        return img_w, img_h
+
+    def _read_label_file(self, txt_path):
+        """读取标签文件为 AnnotationStore，并按文件内容同步类别定义
+        
+        文件中出现比现有 categories 更大的类别序号时自动创建占位类别以保留原类别序号；
+        关键点数多于类别定义时扩展类别关键点；少于类别定义时补不可见点（不截断）。
+        """
+        with open(txt_path, 'r') as f:
+            return self._read_label_text(f.read())
+
+    def _read_label_text(self, text):
+        """标签文本 -> AnnotationStore，类别同步规则同 _read_label_file"""
+        img_w, img_h = self._image_size()
+        store = AnnotationStore.from_yolo_text(text, img_w, img_h)
+
+        categories_changed = sync_categories(store, self.categories)
+        if categories_changed:
+            self.update_category_combo()
+        return store
     
     def add_new_category(self):
         name, ok = QInputDialog.getText(self, "添加新类别", "请输入类别名称:")
@@ -782,197 +830,394 @@ class KeypointAnnotationTool(QMainWindow):
                     category["keypoints"] = kp_list
                     self.update_category_combo()
     
-    def select_model(self):
-        """选择已训练好的 .pt 模型（独立于手动标注）"""
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择模型文件(.pt/.pth)", filter="模型文件 (*.pt *.pth);;所有文件 (*)")
-        if file_path:
-            self.model_path = file_path
-            self.lbl_model_path.setText(os.path.basename(file_path))
-            self.status_bar.showMessage(f"已选择模型: {file_path}")
-            if not ULTRALYTICS_AVAILABLE:
-                QMessageBox.warning(self, "依赖缺失", "ultralytics 库未检测到，自动标注功能将无法运行。请 pip install ultralytics")
-    
-    def auto_annotate_all(self):
-        """开始对当前 image_dir 中所有图片进行 AI 标注（后台线程执行）"""
-        if not ULTRALYTICS_AVAILABLE:
-            QMessageBox.warning(self, "错误", "ultralytics 库未安装，无法执行自动标注。")
+    def sort_images_by_confidence(self):
+        """复核队列：按 labels/.conf/ 中记录的置信度从低到高排列图像，优先修正最差的预测"""
+        if not self.image_files:
+            QMessageBox.warning(self, "警告", "请先选择图像文件夹")
             return
-        if not self.model_path:
-            QMessageBox.warning(self, "错误", "请先选择 .pt 模型")
+        index = load_confidence_index(self.get_labels_dir())
+        if index is None or len(index) == 0:
+            QMessageBox.information(self, "提示", "未找到置信度记录，请先运行 AI 标注")
             return
-        if not self.image_dir:
-            QMessageBox.warning(self, "错误", "请先选择图像文件夹")
+        self.image_files = index.review_order(self.image_files)
+        self.refresh_file_list()
+        self.file_list.setCurrentRow(0)
+        self.status_bar.showMessage(f"已按置信度排序，{len(index)} 张图像有置信度记录，最不可信的排在最前")
+
+    def sort_images_by_active_learning(self):
+        """主动学习队列：选出一批最值得人工标注的图像排在最前，其余未标注图像按优先级排列，已标注的在最后"""
+        if not self.image_files:
+            QMessageBox.warning(self, "警告", "请先选择图像文件夹")
             return
+        labels_dir = self.get_labels_dir()
+        if load_confidence_index(labels_dir) is None:
+            QMessageBox.information(self, "提示", "未找到置信度记录，请先运行 AI 标注")
+            return
+        budget, ok = QInputDialog.getInt(self, "主动学习选样", "本批选出的图像数:", 100, 1, 1000000)
+        if not ok:
+            return
+        self.status_bar.showMessage("正在计算主动学习排序...")
+        QApplication.processEvents()
+        try:
+            key = (self.image_dir, labels_dir)
+            if self.al_sampler is None or self._al_key != key:
+                self.al_sampler = ActiveSampler.open(self.image_dir, labels_dir)
+                self._al_key = key
+            sampler = self.al_sampler
+            shards = sampler.ingest_sidecar(labels_dir)
+            sampler.mark_labeled(list(human_labeled_stems(labels_dir)))
+            picked = sampler.next_batch(budget)
+            write_manifest(sampler, picked, os.path.join(labels_dir, "al_selection.csv"))
+            sampler.save(state_path(labels_dir))
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"主动学习选样时出错: {str(e)}")
+            return
+        self.image_files = sampler.names[sampler.queue_order()].tolist()
+        self.refresh_file_list()
+        self.file_list.setCurrentRow(0)
+        self.status_bar.showMessage(f"已选出 {len(picked)} 张待标注图像排在最前（读取预测分片 {shards} 个，"
+                                    f"已标注 {int(sampler.labeled.sum())} 张），清单: al_selection.csv")
 
-        reply = QMessageBox.question(self, "确认", "开始对所有图像执行 AI 标注？这将生成/覆盖 labels 目录中的标签文件。继续？",
-                                     QMessageBox.Yes | QMessageBox.No)
-        if reply != QMessageBox.Yes:
+    def compare_label_dirs(self):
+        """在后台对比参照标签目录与当前标签目录，完成后按差异从大到小排列图像"""
+        if not self.image_files:
+            QMessageBox.warning(self, "警告", "请先选择图像文件夹")
             return
+        labels_dir = self.get_labels_dir()
+        reference = os.path.join(labels_dir, PREV_LABELS_DIRNAME)
+        if not os.path.isdir(reference) or QMessageBox.question(
+                self, "对比标签", "与最近一次 AI 标注覆盖前的标签对比？选择“否”可指定其他参照目录。",
+                QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            reference = QFileDialog.getExistingDirectory(self, "选择参照标签文件夹")
+            if not reference:
+                return
+        self.btn_label_diff.setEnabled(False)
+        self.status_bar.showMessage("正在对比标签...")
+        threading.Thread(target=self._diff_worker, args=(reference, labels_dir), daemon=True).start()
 
-        self.status_bar.showMessage("AI 标注进行中...（后台）")
-        self.btn_auto_annotate.setEnabled(False)
-        self.btn_select_model.setEnabled(False)
-        thread = threading.Thread(target=self._auto_annotate_worker, daemon=True)
-        thread.start()
+    def _diff_worker(self, reference, labels_dir):
+        try:
+            result = diff_dirs(reference, labels_dir)
+        except Exception as e:
+            result = e
+        self.diffFinished.emit(result)
+
+    def _on_diff_finished(self, result):
+        self.btn_label_diff.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "错误", f"对比标签时出错: {str(result)}")
+            return
+        self.label_diff = result
+        scores = dict(zip(result.stems.tolist(), result.column("score").tolist()))
+        stems = [os.path.splitext(n)[0] for n in self.image_files]
+        order = np.argsort([-scores.get(s, 0.0) for s in stems], kind="stable")
+        self.image_files = [self.image_files[i] for i in order]
+        self.refresh_file_list()
+        self.file_list.setCurrentRow(0)
+        self.status_bar.showMessage(f"{result.summary()}；差异最大的图像已排在最前")
 
-    def _auto_annotate_worker(self):
-        """后台 worker：调用 YOLO.predict 并移动生成的 labels 到 labels_dir"""
-        success = False
-        message = ""
+    def _show_diff_status(self):
+        """当前图像在最近一次标签对比中的差异"""
+        if self.label_diff is None or not (0 <= self.current_image_index < len(self.image_files)):
+            return
+        info = self.label_diff.image(os.path.splitext(self.image_files[self.current_image_index])[0])
+        if info is None or info["score"] <= 0:
+            return
+        self.status_bar.showMessage(
+            f"差异 {info['score']:.2f}: 参照 {int(info['n_a'])} 个目标 / 当前 {int(info['n_b'])} 个，"
+            f"新增 {int(info['added'])}、删除 {int(info['removed'])}、移动 {int(info['moved'])}、"
+            f"类别变化 {int(info['class_changed'])}，平均位移 {info['mean_disp']:.4f}、最大位移 {info['max_disp']:.4f}")
+
+    def open_dataset_store(self):
+        """加载（首次则建立）当前标签目录的列式标签库，之后保存标注时自动同步"""
+        labels_dir = self.get_labels_dir()
+        if not labels_dir:
+            QMessageBox.warning(self, "警告", "请先选择标签目录")
+            return
+        self.status_bar.showMessage("正在加载数据集标签库...")
+        QApplication.processEvents()
         try:
-            model = YOLO(self.model_path)
-            # 使用临时目录保存 ultralytics 的预测输出
-            tmp_root = tempfile.mkdtemp(prefix="auto_annot_")
-            # 批量预测整个文件夹
-            model.predict(
-                source=self.image_dir,
-                save=False,        # 不保存可视化到默认位置（可按需改）
-                save_txt=True,     # 保存 txt 标签
-                save_conf=False,   # 不保存置信度（与手动标注格式一致）
-                project=tmp_root,
-                name="predictions",
-                exist_ok=True
-            )
-            default_labels_dir = Path(tmp_root) / "predictions" / "labels"
-            target_labels_dir = Path(self.get_labels_dir())
-            target_labels_dir.mkdir(parents=True, exist_ok=True)
+            self.dataset_store = DatasetLabelStore.open(labels_dir)
+        except Exception as e:
+            self.dataset_store = None
+            QMessageBox.critical(self, "错误", f"加载数据集标签库时出错: {str(e)}")
+            return
+        store = self.dataset_store
+        if self.label_stats is not None:
+            self.label_stats = LabelStats.from_store(store)
+            self.refresh_stats_panel()
+        self.status_bar.showMessage(f"数据集标签库已加载: {store.num_images} 个标签文件，{store.num_objects} 个目标，"
+                                    f"{len(store.images_without_targets())} 个无目标")
+
+    def show_stats_panel(self):
+        """打开数据集统计面板（需要数据集标签库，未加载时自动加载）"""
+        if self.dataset_store is None:
+            self.open_dataset_store()
+            if self.dataset_store is None:
+                return
+        self.label_stats = LabelStats.from_store(self.dataset_store)
+        if self.stats_dock is None:
+            self.stats_panel = StatsPanel()
+            self.stats_panel.imageActivated.connect(self.jump_to_image)
+            self.stats_panel.refreshRequested.connect(self.rescan_stats)
+            self.stats_dock = QDockWidget("数据集统计", self)
+            self.stats_dock.setWidget(self.stats_panel)
+            self.addDockWidget(Qt.RightDockWidgetArea, self.stats_dock)
+        self.stats_dock.show()
+        self.refresh_stats_panel()
+
+    def rescan_stats(self):
+        """按 mtime 刷新标签库（只重新解析被外部修改过的文件）并重新汇总统计"""
+        if self.dataset_store is None:
+            return
+        changed = self.dataset_store.refresh()
+        self.label_stats = LabelStats.from_store(self.dataset_store)
+        self.refresh_stats_panel()
+        self.status_bar.showMessage(f"统计已刷新，{changed} 个标签文件有变化")
+
+    def refresh_stats_panel(self):
+        if self.stats_dock is None or self.label_stats is None:
+            return
+        empty_images = self.label_stats.images_without_targets(self.image_files, self.dataset_store)
+        self.stats_panel.show_stats(self.label_stats, self.categories, empty_images)
+
+    def jump_to_image(self, image_name):
+        if image_name not in self.image_files:
+            return
+        index = self.image_files.index(image_name)
+        if self.visible_indices is not None and index not in self.visible_indices:
+            # 目标图像不在当前筛选结果中，取消筛选
+            self.filter_edit.clear()
+            self.filter_query = ""
+            self.refresh_file_list()
+        row = self.visible_indices.index(index) if self.visible_indices is not None else index
+        self.file_list.setCurrentRow(row)
+
+    def _on_file_row_changed(self, row):
+        if self.visible_indices is not None:
+            if 0 <= row < len(self.visible_indices):
+                self.load_image(self.visible_indices[row])
+        else:
+            self.load_image(row)
+
+    def _get_label_index(self):
+        """image_files 与标签库对应的筛选索引，标签库或图像列表变化后才重建"""
+        store = self.dataset_store
+        key = (id(store), store.version, id(self.image_files), len(self.image_files))
+        if self._label_index is None or self._label_index_key != key:
+            self._label_index = LabelIndex(self.image_files, store, load_confidence_index(self.get_labels_dir()))
+            self._label_index_key = key
+        return self._label_index
+
+    def current_image_name(self):
+        """当前图像文件名，没有当前图像时为空串"""
+        if 0 <= self.current_image_index < len(self.image_files):
+            return self.image_files[self.current_image_index]
+        return ""
+
+    def mark_file_rows(self, stems, color, tooltip):
+        """文件列表中 stems 对应的行用 color 显示并加提示（只遍历可见行一次）"""
+        if not stems:
+            return
+        indices = self.visible_indices if self.visible_indices is not None else range(len(self.image_files))
+        for row, index in enumerate(indices):
+            if os.path.splitext(self.image_files[index])[0] in stems:
+                item = self.file_list.item(row)
+                item.setForeground(color)
+                item.setToolTip(tooltip)
 
-            moved = 0
-            if default_labels_dir.exists():
-                for label_file in default_labels_dir.glob("*.txt"):
-                    shutil.move(str(label_file), str(target_labels_dir / label_file.name))
-                    moved += 1
+    def show_label_text(self, text):
+        """把标签文本作为当前图像的标注显示（不写文件）；自动保存日志的快照同步为该文本，之后的编辑照常保存"""
+        self.annotations = self._read_label_text(text)
+        self.current_annotation = self.annotations[-1] if self.annotations else None
+        if self.current_annotation is not None:
+            self.current_category_id = self.current_annotation.category_id
+            self.category_combo.setCurrentIndex(self.current_category_id)
+        self._journal_open(self.get_label_path(self.current_image_name()))
+        self.update_display()
+        self.refresh_annotation_list()
 
-            # 尝试清理临时预测目录
+    def labels_changed_on_disk(self):
+        """标签目录被批量改写后（如 AI 标注）同步数据集标签库和统计"""
+        if self.dataset_store is not None:
+            self.dataset_store.refresh()
+            if self.label_stats is not None:
+                self.label_stats = LabelStats.from_store(self.dataset_store)
+                self.refresh_stats_panel()
+
+    def refresh_file_list(self):
+        """按当前筛选条件重新填充 file_list（image_files 变化后调用）"""
+        self.visible_indices = None
+        names = self.image_files
+        if self.filter_query and self.dataset_store is not None:
             try:
-                shutil.rmtree(Path(tmp_root) / "predictions")
-            except Exception:
-                pass
+                self.visible_indices = self._get_label_index().evaluate(self.filter_query).tolist()
+                names = [self.image_files[i] for i in self.visible_indices]
+            except QueryError as e:
+                self.filter_query = ""
+                self.status_bar.showMessage(f"筛选条件有误，已取消筛选: {str(e)}")
+        self.file_list.blockSignals(True)
+        self.file_list.clear()
+        self.file_list.addItems(names)
+        if self.ai is not None:
+            self.ai.file_list_refreshed()
+        self.file_list.blockSignals(False)
 
-            success = True
-            message = f"AI 标注完成，已生成 {moved} 个标签文件，存放于: {target_labels_dir}"
-        except Exception as e:
-            message = f"AI 标注失败: {str(e)}"
-
-        # 在主线程回调更新 UI / 弹窗
-        QTimer.singleShot(0, lambda: self._on_auto_done(success, message))
-
-    def _on_auto_done(self, success, message):
-        self.btn_auto_annotate.setEnabled(True)
-        self.btn_select_model.setEnabled(True)
-        self.status_bar.showMessage(message)
-        if success:
-            # 修正所有标签文件为严格六位小数
-            labels_dir = Path(self.get_labels_dir())
-            for txt_file in labels_dir.glob("*.txt"):
-                lines = []
-                with open(txt_file, "r") as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        new_parts = []
-                        for idx, p in enumerate(parts):
-                            try:
-                                if idx == 0:
-                                    # 类别ID保持整数
-                                    new_parts.append(str(int(float(p))))
-                                else:
-                                    # 保证严格六位小数（多余截断，少于补零）
-                                    float_val = float(p)
-                                    formatted = f"{float_val:.6f}"
-                                    # 截断多余位数
-                                    if '.' in formatted:
-                                        int_part, dec_part = formatted.split('.')
-                                        dec_part = dec_part[:6].ljust(6, '0')
-                                        formatted = f"{int_part}.{dec_part}"
-                                    else:
-                                        formatted = f"{formatted}.000000"
-                                    new_parts.append(formatted)
-                            except Exception:
-                                new_parts.append(p)
-                        lines.append(" ".join(new_parts))
-                with open(txt_file, "w") as f:
-                    for line in lines:
-                        f.write(line + "\n")
-            QMessageBox.information(self, "AI 标注完成", message)
+    def apply_filter(self):
+        """应用筛选栏中的查询（需要数据集标签库，未加载时自动加载）"""
+        query = self.filter_edit.text().strip()
+        if query and self.dataset_store is None:
+            self.open_dataset_store()
+            if self.dataset_store is None:
+                return
+        if query:
             try:
-                self.load_annotation_file()
-            except Exception:
-                pass
+                # 先单独解析一次，语法错误时保留原列表
+                parse_query(query)
+            except QueryError as e:
+                QMessageBox.warning(self, "筛选条件有误", str(e))
+                return
+        current = self.current_image_index
+        self.filter_query = query
+        self.refresh_file_list()
+        if self.visible_indices is None:
+            self.file_list.setCurrentRow(current if 0 <= current < len(self.image_files) else 0)
+            self.status_bar.showMessage("已取消筛选")
+            return
+        if self.visible_indices:
+            row = self.visible_indices.index(current) if current in self.visible_indices else 0
+            self.file_list.setCurrentRow(row)
+        self.status_bar.showMessage(f"筛选结果: {len(self.visible_indices)} / {len(self.image_files)} 张图像")
+
+    def propagate_to_next_frame(self):
+        """用稀疏光流把当前帧的关键点跟踪到列表中的下一帧，切换过去并作为可撤销的新建目标加入"""
+        if self.current_image_index < 0 or self.original_image is None:
+            QMessageBox.warning(self, "警告", "请先加载图像")
+            return
+        if not self.annotations:
+            self.status_bar.showMessage("当前图像没有标注，无法传播")
+            return
+        row = self.file_list.currentRow() + 1
+        if row >= self.file_list.count():
+            self.status_bar.showMessage("已经是列表中的最后一帧")
+            return
+        next_index = self.visible_indices[row] if self.visible_indices is not None else row
+        current_path = os.path.join(self.image_dir, self.image_files[self.current_image_index])
+        next_path = os.path.join(self.image_dir, self.image_files[next_index])
+        prev = self.frame_cache.get(current_path, self.original_image)
+        nxt = self.frame_cache.get(next_path)
+        if nxt is None:
+            QMessageBox.warning(self, "错误", f"无法加载图像: {next_path}")
+            return
+        t0 = time.perf_counter()
+        proposal = propagate_store(self.annotations, prev, nxt)
+        elapsed = time.perf_counter() - t0
+        lost = len(self.annotations) - len(proposal)
+
+        self.file_list.setCurrentRow(row)
+        if self.current_image_index != next_index:
+            return
+        if self.annotations:
+            reply = QMessageBox.question(self, "下一帧已有标注",
+                                         f"下一帧已有 {len(self.annotations)} 个标注目标。\n"
+                                         "是：用跟踪结果替换；否：追加到现有标注；取消：不修改",
+                                         QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Yes:
+                for i in reversed(range(len(self.annotations))):
+                    self.history.execute(self.annotations, RemoveObject(self.annotations, i))
+        command = None
+        for i in range(len(proposal)):
+            nkp = int(proposal.num_kps[i])
+            command = self.history.execute(self.annotations, AddObject(
+                new_object_id(), len(self.annotations), int(proposal.class_ids[i]), nkp,
+                keypoints=proposal.keypoints[i, :nkp].copy(), bbox=proposal.bboxes[i].copy()))
+        if command is not None:
+            # 选中最后一个跟踪得到的目标并刷新界面
+            self._after_history_step(command)
         else:
-            QMessageBox.critical(self, "AI 标注失败", message)
+            self.current_annotation = self.annotations[-1] if self.annotations else None
+            self.update_display()
+            self.refresh_annotation_list()
+        self.status_bar.showMessage(f"已跟踪 {len(proposal)} 个目标到 {self.image_files[next_index]}"
+                                    f"（跟丢 {lost} 个，{elapsed * 1e3:.0f} ms），请检查后保存")
+
+    def undo_edit(self):
+        """撤销一步编辑（加点、拖拽、新建/删除目标、切换类别）"""
+        command = self.history.undo(self.annotations)
+        if command is None:
+            self.status_bar.showMessage("没有可撤销的操作")
+            return
+        self._after_history_step(command)
+        self.status_bar.showMessage(f"已撤销（剩余 {len(self.history)} 步）")
+
+    def redo_edit(self):
+        command = self.history.redo(self.annotations)
+        if command is None:
+            self.status_bar.showMessage("没有可重做的操作")
+            return
+        self._after_history_step(command)
+        self.status_bar.showMessage("已重做")
+
+    def _after_history_step(self, command):
+        """撤销/重做后选中受影响的目标（已被删除时选中最后一个）并刷新界面"""
+        index = self.annotations.index_of(command.obj_id)
+        if index < 0:
+            index = len(self.annotations) - 1
+        self.current_annotation = self.annotations[index] if index >= 0 else None
+        if self.current_annotation is not None:
+            self.current_category_id = self.current_annotation.category_id
+            self.category_combo.blockSignals(True)
+            self.category_combo.setCurrentIndex(self.current_category_id)
+            self.category_combo.blockSignals(False)
+            self.update_keypoints_list()
+        self.update_display()
+        self.refresh_annotation_list()
 
     def switch_annotation(self, index):
         if 0 <= index < len(self.annotations):
             self.current_annotation = self.annotations[index]
-            self.current_category_id = self.current_annotation["category_id"]
+            self.current_category_id = self.current_annotation.category_id
             self.category_combo.setCurrentIndex(self.current_category_id)
             self.update_keypoints_list()
             self.update_display()
     
     def refresh_annotation_list(self):
         self.annotation_list.clear()
-        for idx, ann in enumerate(self.annotations):
-            cname = self.categories[ann["category_id"]]["name"] if 0 <= ann["category_id"] < len(self.categories) else f"class_{ann['category_id']}"
+        for idx, cid in enumerate(self.annotations.class_ids.tolist()):
+            cname = self.categories[cid]["name"] if 0 <= cid < len(self.categories) else f"class_{cid}"
             self.annotation_list.addItem(f"{idx}: {cname}")
         # 保持当前选中
-        if self.current_annotation in self.annotations:
-            self.annotation_list.setCurrentRow(self.annotations.index(self.current_annotation))
+        if self.current_annotation is not None and self.current_annotation.index >= 0:
+            self.annotation_list.setCurrentRow(self.current_annotation.index)
 
     def parse_keypoints_with_v(self, parts, img_w, img_h):
-        kp_data = list(map(float, parts))
-        keypoints = []
-        # 如果是三元组 (x, y, v)，只取 x, y
-        if len(kp_data) % 3 == 0:
-            for i in range(0, len(kp_data), 3):
-                x, y = kp_data[i], kp_data[i+1]
-                if x > 1.0 or y > 1.0:
-                    x = x / img_w
-                    y = y / img_h
-                keypoints.append([x, y, 2])  # v=2，始终可见
-        elif len(kp_data) % 2 == 0:
-            for i in range(0, len(kp_data), 2):
-                x, y = kp_data[i], kp_data[i+1]
-                if x > 1.0 or y > 1.0:
-                    x = x / img_w
-                    y = y / img_h
-                v = 2 if (x != 0 and y != 0) else 0
-                keypoints.append([x, y, v])
-        else:
-            pass
-        return keypoints
+        """兼容旧接口：解析关键点数值为 [[x, y, v], ...]（实际解析在 annotation_store 中向量化完成）"""
+        return parse_keypoint_values(list(map(float, parts)), img_w, img_h).tolist()
 
     def delete_images_without_targets(self):
-        """删除所有未识别到目标的图片（无标签或标签文件为空）"""
+        """删除所有未识别到目标的图片（无标签或标签文件为空）
+
+        已加载数据集标签库时用它跳过确有目标的图像，不逐个打开标签文件；是否删除始终以磁盘上的标签文件为准。
+        """
         if not self.image_dir:
             QMessageBox.warning(self, "警告", "请先选择图像文件夹")
             return
-        labels_dir = self.get_labels_dir()
+        doomed = set(images_without_targets(self.image_files, self.get_labels_dir(), self.dataset_store))
         removed = 0
-        for img_name in list(self.image_files):  # 用list防止遍历时修改
-            label_path = self.get_label_path(img_name)
-            if not os.path.exists(label_path):
-                # 没有标签文件，删除图片
-                img_path = os.path.join(self.image_dir, img_name)
+        kept = []
+        for img_name in self.image_files:
+            if img_name in doomed:
                 try:
-                    os.remove(img_path)
+                    os.remove(os.path.join(self.image_dir, img_name))
                     removed += 1
-                    self.image_files.remove(img_name)
+                    continue
                 except Exception:
                     pass
-            else:
-                # 标签文件存在但内容为空或无有效目标
-                with open(label_path, "r") as f:
-                    lines = [line.strip() for line in f if line.strip()]
-                if not lines:
-                    img_path = os.path.join(self.image_dir, img_name)
-                    try:
-                        os.remove(img_path)
-                        removed += 1
-                        self.image_files.remove(img_name)
-                    except Exception:
-                        pass
-        self.file_list.clear()
-        self.file_list.addItems(self.image_files)
+            kept.append(img_name)
+        self.image_files = kept
+        self.refresh_file_list()
         self.status_bar.showMessage(f"已删除 {removed} 张无目标图片")
 
 # 运行应用程序
@@ -1,10 +1,73 @@
 import argparse
 from pathlib import Path
 from ultralytics import YOLO
-import shutil
 import os
+import time
+import multiprocessing
+from work_queue import IMAGE_EXTS, ChunkQueue, Heartbeat, atomic_write_text, default_worker_id
+from conf_sidecar import ConfidenceWriter, compact_sidecar
+from postprocess import LINK_MODES, fix_columns, place_file, run_postprocess
+from vis_writer import VisWriter
+from image_dedup import DEDUP_MODES, find_duplicates
+from label_merge import LabelMerger, ProvenanceWriter, auto_shard_name, compact_provenance
+from tta_inference import TTAPredictor, flip_index_from_names, parse_flip_idx, parse_scales
+from tiled_inference import TiledPredictor
 
-def auto_annotate(model_path, source_dir, output_dir, save_vis=True, save_conf=True, expected_columns=13):
+
+def _result_to_lines(result, expected_columns):
+    """把单张图像的 ultralytics 预测结果转换为标签行（class x y w h kp1_x kp1_y ...，与 main.py 保存格式一致）"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    classes = boxes.cls.int().tolist()
+    xywhn = boxes.xywhn.tolist()
+    kpts = result.keypoints.xyn.tolist() if result.keypoints is not None else None
+
+    lines = []
+    for i, cls_id in enumerate(classes):
+        parts = [str(cls_id)] + [f"{v:.6f}" for v in xywhn[i]]
+        if kpts is not None:
+            for x, y in kpts[i]:
+                parts.extend([f"{x:.6f}", f"{y:.6f}"])
+        parts, _ = fix_columns(parts, expected_columns)
+        lines.append(" ".join(parts) + "\n")
+    return lines
+
+
+def _format_bytes_summary(bytes_copied, bytes_linked, fallbacks=0):
+    """原图放置统计：复制与链接的字节数"""
+    mb = 1024 * 1024
+    msg = f"原图字节: 复制 {bytes_copied / mb:.1f} MB，链接 {bytes_linked / mb:.1f} MB（不占额外空间）"
+    if fallbacks:
+        msg += f"，{fallbacks} 个文件因不支持链接已退回复制"
+    return msg
+
+
+def run_dedup(source_dir, output_dir, mode, threshold=4):
+    """
+    推理前的近重复帧处理，返回需要跳过的图像文件名集合。
+    skip 跳过非代表帧；group 不跳过，只写出分组清单；quarantine 把非代表帧移到 <source>_duplicates/ 后不再需要跳过。
+    三种方式都会在输出目录写出 dedup_groups.csv（近重复帧 -> 代表帧）。
+    """
+    t0 = time.time()
+    result = find_duplicates(source_dir, threshold=threshold)
+    os.makedirs(output_dir, exist_ok=True)
+    result.write_manifest(os.path.join(output_dir, "dedup_groups.csv"))
+    print(f"近重复帧检测: {len(result.names)} 张图像中有 {result.num_duplicates} 张近重复帧"
+          f"（阈值 {threshold}，耗时 {time.time() - t0:.1f}s）")
+    if mode == "quarantine":
+        moved = result.quarantine()
+        print(f"已将 {moved} 张近重复帧移到 {os.path.normpath(source_dir)}_duplicates")
+        return set()
+    if mode == "skip":
+        return set(result.names[~result.keep_mask].tolist())
+    return set()
+
+
+def auto_annotate(model_path, source_dir, output_dir, save_vis=True, save_conf=True, expected_columns=13, workers=8,
+                  link_mode="copy", vis_max_side=640, vis_quality=80, vis_sheet=0, vis_workers=2,
+                  dedup="off", dedup_threshold=4, merge=False, tta=False, tta_scales=(1.0, 1.5), tta_flip=True,
+                  flip_idx=None, imgsz=None, tile=0, tile_overlap=0.2, tile_batch=16):
     """
     使用训练好的YOLOv8模型对图像进行自动标注（推理），并保存有有效目标的原始图像。
     同时修复标签格式问题，确保每行有正确的字段数。
@@ -14,8 +77,26 @@ def auto_annotate(model_path, source_dir, output_dir, save_vis=True, save_conf=T
         source_dir (str): 包含未标注图像的源目录路径
         output_dir (str): 保存输出标签、可视化结果和原始图像的根目录
         save_vis (bool): 是否保存带预测结果的可视化图像，用于人工检查
-        save_conf (bool): 是否在生成的标签文件中保存置信度
+        save_conf (bool): 是否保存置信度（写入 labels/.conf/ 旁路文件，标签 txt 本身不含置信度列）
         expected_columns (int): 每行期望的列数（默认13）
+        workers (int): 后处理线程数（修复/移动标签、复制原图）
+        link_mode (str): 有目标原图放入 images/ 的方式 copy/hardlink/symlink/reflink，跨文件系统等情况自动退回复制
+        vis_max_side (int): 可视化缩略图最长边像素
+        vis_quality (int): 可视化 JPEG 质量（1-100）
+        vis_sheet (int): 大于 0 时把这么多张缩略图拼成一张总览图（拼图模式），0 为每张图单独输出
+        vis_workers (int): 可视化后台写出线程数
+        dedup (str): 近重复帧处理方式 off/skip/group/quarantine（见 image_dedup.py）
+        dedup_threshold (int): 判为近重复的 pHash 最大 Hamming 距离
+        merge (bool): 合并模式，保留输出目录 labels/ 中人工标注过的目标，只补充新检测（见 label_merge.py）；
+                      在推理的流式循环中逐张合并写入，不经过临时预测目录和后处理
+        tta (bool): 测试时增强，翻转 + 多尺度推理后按置信度加权融合（见 tta_inference.py）
+        tta_scales (tuple): TTA 的尺度（相对 imgsz）
+        tta_flip (bool): TTA 是否包含水平翻转视图
+        flip_idx (list): 水平翻转后的关键点重排（左右互换），None 表示关键点不区分左右
+        imgsz (int): 推理输入尺寸，None 表示使用模型训练时的尺寸
+        tile (int): 大于 0 时分块推理，块边长像素（高分辨率大图，见 tiled_inference.py；与 tta 同时指定时优先）
+        tile_overlap (float): 相邻块的重叠比例
+        tile_batch (int): 分块推理每批的块数（块跨图像凑批）
     """
     
     # 转换为Path对象以便处理路径
@@ -48,108 +129,108 @@ def auto_annotate(model_path, source_dir, output_dir, save_vis=True, save_conf=T
     except Exception as e:
         raise RuntimeError(f"模型加载失败: {str(e)}。请检查模型路径和格式。")
     
-    # 进行预测（推理）
-    try:
-        results = model.predict(
-            source=source_dir,
-            save=save_vis,          # 保存可视化图像
-            save_txt=True,          # 将预测结果保存为.txt标签文件
-            save_conf=save_conf,    # 在标签中保存置信度
-            project=output_dir,     # 项目根目录
-            name="predictions",     # 此次预测运行的名称
-            exist_ok=True           # 允许覆盖现有目录
-        )
-        print("模型预测完成!")
-    except Exception as e:
-        raise RuntimeError(f"模型预测失败: {str(e)}")
+    # 置信度写入旁路文件（供 main.py 复核队列排序）；可视化由我们自己的流式写出器在缩略图上绘制
+    conf_writer = ConfidenceWriter(labels_output_dir) if save_conf else None
+    vis_writer = VisWriter(vis_output_dir, max_side=vis_max_side, jpeg_quality=vis_quality,
+                           sheet_size=vis_sheet, workers=vis_workers) if save_vis else None
+    
+    # 近重复帧：skip 时只把代表帧交给模型
+    predict_source = source_dir
+    if dedup != "off":
+        skipped = run_dedup(source_dir, output_dir, dedup, dedup_threshold)
+        if skipped:
+            predict_source = [str(source_path / n) for n in sorted(os.listdir(source_dir))
+                              if n.lower().endswith(IMAGE_EXTS) and n not in skipped]
+    
+    # 目标来源旁路文件：合并模式逐张合并，覆盖模式把写出的预测全部记为模型目标
+    merger = LabelMerger(labels_output_dir) if merge else None
+    provenance = None if merge else ProvenanceWriter(labels_output_dir, auto_shard_name())
+    merge_stats = {"labels": 0, "images": 0, "bytes_copied": 0, "bytes_linked": 0, "fallbacks": 0,
+                   "fixed_lines": 0, "first_label": None}
     
     # 定义YOLOv8默认保存的路径
     default_prediction_dir = output_path / "predictions"
     default_labels_dir = default_prediction_dir / "labels"
-    default_vis_dir = default_prediction_dir
-    
-    # 检查并修复标签格式
-    if default_labels_dir.exists():
-        fixed_count = 0
-        for label_file in default_labels_dir.glob("*.txt"):
-            try:
-                with open(label_file, 'r') as f:
-                    lines = f.readlines()
-                
-                new_lines = []
-                for line in lines:
-                    parts = line.strip().split()
-                    
-                    # 修复标签格式：确保每行有expected_columns个字段
-                    if len(parts) != expected_columns:
-                        # 如果字段不足，补充0值
-                        if len(parts) < expected_columns:
-                            parts.extend(['0'] * (expected_columns - len(parts)))
-                        # 如果字段过多，截断
-                        else:
-                            parts = parts[:expected_columns]
-                        
-                        fixed_count += 1
-                        print(f"修复标签格式: {label_file.name} -> {len(parts)}列")
-                    
-                    new_lines.append(" ".join(parts) + "\n")
-                
-                # 写入修复后的标签
-                with open(label_file, 'w') as f:
-                    f.writelines(new_lines)
-                    
-            except Exception as e:
-                print(f"处理标签文件 {label_file.name} 时出错: {str(e)}")
-        
-        if fixed_count > 0:
-            print(f"已修复 {fixed_count} 个标签文件的格式问题")
-    
-    # 检查并复制有有效目标的原始图像到images文件夹
-    if default_labels_dir.exists():
-        copied_count = 0
-        for label_file in default_labels_dir.glob("*.txt"):
-            stem = label_file.stem  # 获取文件名（不带扩展名）
-            
-            # 在源目录中查找对应图像文件（支持常见图像格式）
-            found = False
-            for ext in [".jpg", ".jpeg", ".png", ".bmp", ".JPG", ".JPEG", ".PNG", ".BMP"]:
-                potential_image_path = source_path / (stem + ext)
-                if potential_image_path.exists():
-                    # 复制原图到images文件夹
-                    shutil.copy2(str(potential_image_path), str(images_output_dir / (stem + ext)))
-                    copied_count += 1
-                    found = True
-                    break
-            
-            if not found:
-                print(f"警告: 未找到与标签文件 {label_file.name} 对应的图像文件")
-        
-        print(f"已复制 {copied_count} 个有有效目标的原始图像")
-    
-    # 检查并移动标签文件
-    if default_labels_dir.exists():
-        moved_count = 0
-        for label_file in default_labels_dir.glob("*.txt"):
-            shutil.move(str(label_file), str(labels_output_dir / label_file.name))
-            moved_count += 1
-        
-        # 删除空的默认labels目录
-        try:
-            default_labels_dir.rmdir()
-        except OSError:
-            pass  # 目录可能不为空，忽略错误
-        
-        print(f"已移动 {moved_count} 个标签文件")
-    
-    # 检查并移动可视化图像（如果要求保存）
-    if save_vis and default_vis_dir.exists():
-        moved_vis_count = 0
-        for img_file in default_vis_dir.glob("*.*"):
-            if img_file.suffix.lower() in [".jpg", ".jpeg", ".png", ".bmp"]:
-                shutil.move(str(img_file), str(vis_output_dir / img_file.name))
-                moved_vis_count += 1
-        
-        print(f"已移动 {moved_vis_count} 个可视化图像")
+    
+    # 进行预测（推理），流式逐张处理，不在内存中保留全部结果
+    vis_count = 0
+    num_predicted = 0
+    t_predict = time.time()
+    predictor = None
+    if tile > 0:
+        predictor = TiledPredictor(model, tile=tile, overlap=tile_overlap, batch=tile_batch)
+    elif tta:
+        predictor = TTAPredictor(model, scales=tta_scales, flip=tta_flip, flip_idx=flip_idx, imgsz=imgsz)
+    try:
+        if predictor is not None:
+            # TTA / 分块推理的结果由我们自己写出标签（覆盖模式写到默认预测目录，后处理照常移动）
+            results = predictor.predict(predict_source)
+            if not merge:
+                default_labels_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            # 只在指定了 imgsz 时传入，否则 ultralytics 使用模型训练时的尺寸
+            size_args = {"imgsz": imgsz} if imgsz else {}
+            results = model.predict(
+                source=predict_source,
+                save=False,             # 不使用 ultralytics 的原分辨率可视化
+                save_txt=not merge,     # 覆盖模式将预测结果保存为.txt标签文件，合并模式在下面直接写入
+                save_conf=False,        # 置信度写入旁路文件，避免追加列后被 expected_columns 修复截断
+                project=output_dir,     # 项目根目录
+                name="predictions",     # 此次预测运行的名称
+                exist_ok=True,          # 允许覆盖现有目录
+                stream=True,            # 逐张返回结果
+                **size_args
+            )
+        for result in results:
+            num_predicted += 1
+            if predictor is not None and not merge:
+                lines = _result_to_lines(result, expected_columns)
+                if lines:
+                    (default_labels_dir / (Path(result.path).stem + ".txt")).write_text("".join(lines))
+            if conf_writer is not None:
+                conf_writer.add_result(result)
+            if vis_writer is not None:
+                vis_writer.submit_result(result)
+            if merger is not None:
+                _merge_result(merger, result, expected_columns, images_output_dir, link_mode, merge_stats)
+            elif result.boxes is not None and len(result.boxes):
+                provenance.add_model(Path(result.path).stem, len(result.boxes))
+        elapsed = time.time() - t_predict
+        print(f"模型预测完成! {num_predicted} 张，{elapsed / max(num_predicted, 1) * 1e3:.0f} ms/张")
+        if predictor is not None:
+            print(predictor.summary())
+    except Exception as e:
+        raise RuntimeError(f"模型预测失败: {str(e)}")
+    finally:
+        if vis_writer is not None:
+            vis_count = vis_writer.close()
+    
+    if conf_writer is not None:
+        sidecar_path = conf_writer.save()
+        if sidecar_path:
+            print(f"置信度已保存: {sidecar_path}")
+    
+    if merger is not None:
+        merger.close()
+        stats = merge_stats
+        print(merger.summary())
+        print(f"已放置 {stats['images']} 个有有效目标的原始图像（方式: {link_mode}）")
+    else:
+        # 单遍后处理：修复列数、移动标签、复制有有效目标的原始图像（一次目录扫描 + 线程池逐文件处理）
+        stats = run_postprocess(
+            pred_labels_dir=str(default_labels_dir),
+            labels_output_dir=str(labels_output_dir),
+            source_dir=str(source_path),
+            images_output_dir=str(images_output_dir),
+            expected_columns=expected_columns,
+            workers=workers,
+            link_mode=link_mode
+        )
+        provenance.save()
+        if stats["fixed_lines"] > 0:
+            print(f"已修复 {stats['fixed_lines']} 行标签的格式问题")
+        print(f"已放置 {stats['images']} 个有有效目标的原始图像（方式: {link_mode}）")
+        print(f"已移动 {stats['labels']} 个标签文件")
     
     # 删除空的默认预测目录
     if default_prediction_dir.exists():
@@ -158,21 +239,21 @@ def auto_annotate(model_path, source_dir, output_dir, save_vis=True, save_conf=T
         except OSError:
             print(f"注意: 目录 {default_prediction_dir} 不为空，未能删除")
     
-    # 验证最终输出
-    labels_count = len(list(labels_output_dir.glob("*.txt")))
-    images_count = len(list(images_output_dir.glob("*.*")))
-    vis_count = len(list(vis_output_dir.glob("*.*"))) if save_vis else 0
+    # 验证最终输出（数量直接取自后处理结果，不再扫描输出目录）
+    labels_count = stats["labels"]
+    images_count = stats["images"]
     
     print(f"\n[完成] 自动标注完成!")
     print(f"生成的标签文件: {labels_count} 个 (位于 {labels_output_dir})")
     print(f"有有效目标的原始图像: {images_count} 个 (位于 {images_output_dir})")
+    print(_format_bytes_summary(stats["bytes_copied"], stats["bytes_linked"], stats["fallbacks"]))
     if save_vis:
-        print(f"可视化结果: {vis_count} 个 (位于 {vis_output_dir})")
+        print(f"可视化结果: {vis_count} 个{'总览图' if vis_sheet > 0 else ''} (位于 {vis_output_dir})")
     
     # 验证标签格式
-    if labels_count > 0:
+    if stats["first_label"]:
         print(f"\n标签格式验证:")
-        sample_label = next(labels_output_dir.glob("*.txt"))
+        sample_label = Path(stats["first_label"])
         with open(sample_label, 'r') as f:
             sample_line = f.readline().strip()
             columns = len(sample_line.split())
@@ -186,9 +267,201 @@ def auto_annotate(model_path, source_dir, output_dir, save_vis=True, save_conf=T
         "vis_dir": str(vis_output_dir) if save_vis else None,
         "labels_count": labels_count,
         "images_count": images_count,
-        "vis_count": vis_count
+        "vis_count": vis_count,
+        "bytes_copied": stats["bytes_copied"],
+        "bytes_linked": stats["bytes_linked"]
+    }
+
+def _merge_result(merger, result, expected_columns, images_output_dir, link_mode, stats):
+    """合并模式下处理单张预测结果：合并写入标签，合并后有目标时把原图放入 images/"""
+    image_path = Path(result.path)
+    text = merger.merge(image_path.stem, "".join(_result_to_lines(result, expected_columns)))
+    if not text:
+        return
+    stats["labels"] += 1
+    if stats["first_label"] is None:
+        stats["first_label"] = str(merger.labels_dir / (image_path.stem + ".txt"))
+    used, size = place_file(str(image_path), str(Path(images_output_dir) / image_path.name), link_mode)
+    stats["images"] += 1
+    if used == "copy":
+        stats["bytes_copied"] += size
+        if link_mode != "copy":
+            stats["fallbacks"] += 1
+    else:
+        stats["bytes_linked"] += size
+
+
+def run_worker(model_path, queue_dir, output_dir, expected_columns=13, worker_id=None, save_conf=True,
+               link_mode="copy", stale_timeout=60.0, heartbeat_interval=10.0, poll_interval=5.0, merge=False):
+    """
+    分布式模式的 worker：从共享目录队列中领取图像块，推理后原子写入标签并复制原图。
+    多个节点（或同一节点上的多个进程）可以同时运行，直到队列中所有块完成后退出。
+    
+    参数:
+        model_path (str): 训练好的模型权重文件路径
+        queue_dir (str): 共享文件系统上的队列目录（由协调者创建）
+        output_dir (str): 共享的输出根目录，标签写入 labels/，原图复制到 images/
+        expected_columns (int): 每行期望的列数（默认13）
+        worker_id (str): worker 标识，默认 主机名-进程号
+        save_conf (bool): 是否按块保存置信度旁路分片（协调者结束时合并）
+        link_mode (str): 原图放入 images/ 的方式 copy/hardlink/symlink/reflink
+        stale_timeout (float): 心跳超时秒数，超时的块会被其他节点回收
+        heartbeat_interval (float): 心跳刷新间隔秒数
+        poll_interval (float): 暂无可领取块时的轮询间隔秒数
+        merge (bool): 合并模式，保留 labels/ 中人工标注过的目标，只补充新检测（见 label_merge.py）
+    """
+    queue = ChunkQueue(queue_dir, stale_timeout=stale_timeout)
+    worker_id = worker_id or default_worker_id()
+    labels_output_dir = Path(output_dir) / "labels"
+    images_output_dir = Path(output_dir) / "images"
+    labels_output_dir.mkdir(parents=True, exist_ok=True)
+    images_output_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        model = YOLO(model_path)
+    except Exception as e:
+        raise RuntimeError(f"模型加载失败: {str(e)}。请检查模型路径和格式。")
+    print(f"[{worker_id}] 模型加载成功，开始领取任务")
+    # 目标来源记录只在启动时读取一次；各块写入自己的来源分片，块被回收重做时覆盖，与置信度分片一样幂等
+    merger = LabelMerger(labels_output_dir, shard=default_worker_id()) if merge else None
+
+    chunks_done = 0
+    labels_written = 0
+    bytes_copied = 0
+    bytes_linked = 0
+    while True:
+        queue.reclaim_stale()
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            if queue.is_finished():
+                break
+            # 剩余块都被其他 worker 领取，等待它们完成或超时后被回收
+            time.sleep(poll_interval)
+            continue
+
+        claimed_path, payload = claimed
+        chunk_name = Path(claimed_path).name.split("@", 1)[0]
+        source_path = Path(payload["source_dir"])
+        image_paths = [str(source_path / name) for name in payload["images"]]
+        # 每块一个置信度分片，块被回收重做时直接覆盖，保持幂等
+        conf_writer = ConfidenceWriter(labels_output_dir, shard=Path(chunk_name).stem) if save_conf else None
+        if merger is not None:
+            merger.new_shard(Path(chunk_name).stem)
+        provenance = merger.writer if merger is not None else ProvenanceWriter(labels_output_dir, Path(chunk_name).stem)
+        with Heartbeat(queue, claimed_path, interval=heartbeat_interval):
+            for result in model.predict(source=image_paths, stream=True, verbose=False):
+                lines = _result_to_lines(result, expected_columns)
+                image_path = Path(result.path)
+                if merger is not None:
+                    lines = merger.merge(image_path.stem, "".join(lines)).splitlines()
+                if not lines:
+                    continue
+                if merger is None:
+                    atomic_write_text(labels_output_dir / (image_path.stem + ".txt"), "".join(lines))
+                    provenance.add_model(image_path.stem, len(lines))
+                used, size = place_file(str(image_path), str(images_output_dir / image_path.name), link_mode)
+                if used == "copy":
+                    bytes_copied += size
+                else:
+                    bytes_linked += size
+                if conf_writer is not None:
+                    conf_writer.add_result(result)
+                labels_written += 1
+            if conf_writer is not None:
+                conf_writer.save()
+            provenance.save()
+        queue.complete(claimed_path)
+        chunks_done += 1
+        print(f"[{worker_id}] 完成 {chunk_name}（{len(image_paths)} 张图像）")
+
+    print(f"[{worker_id}] 队列已全部完成，本 worker 处理 {chunks_done} 块，写入 {labels_written} 个标签文件")
+    print(f"[{worker_id}] {_format_bytes_summary(bytes_copied, bytes_linked)}")
+    return {
+        "labels_dir": str(labels_output_dir),
+        "images_dir": str(images_output_dir),
+        "chunks_done": chunks_done,
+        "labels_written": labels_written,
+        "bytes_copied": bytes_copied,
+        "bytes_linked": bytes_linked
+    }
+
+
+def run_coordinator(model_path, source_dir, output_dir, queue_dir=None, chunk_size=64, local_workers=0,
+                    expected_columns=13, save_conf=True, link_mode="copy", stale_timeout=60.0,
+                    heartbeat_interval=10.0, poll_interval=5.0, dedup="off", dedup_threshold=4, merge=False):
+    """
+    分布式模式的协调者：把源目录切块写入共享队列，监控进度并回收心跳超时的块。
+    local_workers > 0 时在本机额外启动相应数量的 worker 进程，便于单机验证或单机多进程加速；
+    其他节点只需以 --mode worker 指向同一个 --queue-dir 和 --output 即可加入。
+    若队列目录中已有 meta.json，则视为断点续跑，直接沿用已有队列。
+    dedup 不为 off 时在建队列前做近重复帧处理（skip 的近重复帧不进入任何块）。
+    merge 为 True 时已有标签的图像也进入队列，由 worker 合并（否则视为已完成跳过）。
+    """
+    output_path = Path(output_dir)
+    queue_dir = queue_dir or str(output_path / "queue")
+    queue = ChunkQueue(queue_dir, stale_timeout=stale_timeout)
+
+    if queue.meta_path.exists():
+        print(f"检测到已有队列，继续处理: {queue_dir}")
+    else:
+        skipped = run_dedup(source_dir, output_dir, dedup, dedup_threshold) if dedup != "off" else set()
+        num_chunks = queue.create(source_dir, chunk_size=chunk_size,
+                                  skip_done_labels_dir=None if merge else str(output_path / "labels"),
+                                  exclude_names=skipped)
+        print(f"已创建队列: {queue_dir}，共 {num_chunks} 块（每块 {chunk_size} 张）")
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = []
+    for _ in range(local_workers):
+        p = ctx.Process(target=run_worker, kwargs=dict(
+            model_path=model_path, queue_dir=queue_dir, output_dir=output_dir,
+            expected_columns=expected_columns, save_conf=save_conf, link_mode=link_mode,
+            stale_timeout=stale_timeout,
+            heartbeat_interval=heartbeat_interval, poll_interval=poll_interval, merge=merge))
+        p.start()
+        workers.append(p)
+
+    total = queue.num_chunks()
+    while not queue.is_finished():
+        reclaimed = queue.reclaim_stale()
+        pending, claimed, done = queue.counts()
+        msg = f"进度: {done}/{total} 块完成，{claimed} 块处理中，{pending} 块待领取"
+        if reclaimed:
+            msg += f"，回收超时块 {reclaimed} 个"
+        print(msg)
+        if workers and not any(p.is_alive() for p in workers):
+            print("警告: 本机 worker 进程已全部退出但队列未完成，请检查 worker 日志后重新运行以续跑")
+            break
+        time.sleep(poll_interval)
+
+    for p in workers:
+        p.join()
+
+    # 全部完成后把各块的置信度分片合并为一个文件，复核时只需读一次
+    if save_conf and queue.is_finished():
+        merged = compact_sidecar(output_path / "labels")
+        if merged:
+            print(f"已合并 {merged} 张图像的置信度记录")
+    if queue.is_finished():
+        compact_provenance(output_path / "labels")
+
+    labels_output_dir = output_path / "labels"
+    images_output_dir = output_path / "images"
+    labels_count = len(list(labels_output_dir.glob("*.txt"))) if labels_output_dir.exists() else 0
+    images_count = len(list(images_output_dir.glob("*.*"))) if images_output_dir.exists() else 0
+    print(f"\n[完成] 分布式自动标注结束!")
+    print(f"生成的标签文件: {labels_count} 个 (位于 {labels_output_dir})")
+    print(f"有有效目标的原始图像: {images_count} 个 (位于 {images_output_dir})")
+    return {
+        "labels_dir": str(labels_output_dir),
+        "images_dir": str(images_output_dir),
+        "vis_dir": None,
+        "labels_count": labels_count,
+        "images_count": images_count,
+        "vis_count": 0
     }
 
+
 if __name__ == "__main__":
     # 设置命令行参数解析
     parser = argparse.ArgumentParser(
@@ -202,23 +475,131 @@ if __name__ == "__main__":
                        help='保存输出结果的根目录，默认: ./zichen/auto_label_outputs/auto_annotate_output')
     parser.add_argument('--no-vis', action='store_false', dest='save_vis',
                        help='不保存带预测结果的可视化图像')
+    parser.add_argument('--vis-max-side', type=int, default=640,
+                       help='可视化缩略图最长边像素（默认: 640）')
+    parser.add_argument('--vis-quality', type=int, default=80,
+                       help='可视化 JPEG 质量 1-100（默认: 80）')
+    parser.add_argument('--vis-sheet', type=int, default=0,
+                       help='拼图模式：每张总览图包含的缩略图数，0 表示逐张输出（默认: 0）')
+    parser.add_argument('--vis-workers', type=int, default=2,
+                       help='可视化后台写出线程数（默认: 2）')
     parser.add_argument('--no-conf', action='store_false', dest='save_conf',
-                       help='不在生成的标签文件中保存置信度')
+                       help='不保存置信度旁路文件（labels/.conf/）')
     parser.add_argument('--columns', type=int, default=13,
                        help='每行期望的列数（默认: 13）')
+    parser.add_argument('--link-mode', choices=LINK_MODES, default='copy',
+                       help='有目标原图放入 images/ 的方式：copy 复制（默认）/ hardlink 硬链接 / symlink 软链接 / '
+                            'reflink 写时复制克隆；跨文件系统等不支持时自动退回复制')
+    parser.add_argument('--io-workers', type=int, default=8,
+                       help='后处理线程数，网络存储上可适当调大（默认: 8）')
+    # 分布式模式：协调者切块写入共享目录队列，各节点 worker 领取处理
+    parser.add_argument('--mode', choices=['single', 'coordinator', 'worker'], default='single',
+                       help='运行模式：single 单机（默认）/ coordinator 协调者 / worker 分布式工作节点')
+    parser.add_argument('--queue-dir', type=str, default=None,
+                       help='共享文件系统上的队列目录（默认: <output>/queue）')
+    parser.add_argument('--chunk-size', type=int, default=64,
+                       help='每个任务块包含的图像数（默认: 64）')
+    parser.add_argument('--local-workers', type=int, default=0,
+                       help='协调者模式下在本机额外启动的 worker 进程数（默认: 0）')
+    parser.add_argument('--stale-timeout', type=float, default=60.0,
+                       help='心跳超时秒数，超时的块会被回收重新分配（默认: 60）')
+    parser.add_argument('--heartbeat', type=float, default=10.0,
+                       help='worker 心跳间隔秒数（默认: 10）')
+    # 近重复帧：推理前用感知哈希找出几乎相同的帧（哈希缓存在源目录 .phash_cache.npz，重跑只算新文件）
+    parser.add_argument('--dedup', choices=('off',) + DEDUP_MODES, default='off',
+                       help='近重复帧处理：off 不处理（默认）/ skip 只标注代表帧 / group 全部标注并写出分组清单 / '
+                            'quarantine 把近重复帧移到 <source>_duplicates/；均在输出目录写出 dedup_groups.csv')
+    parser.add_argument('--dedup-threshold', type=int, default=4,
+                       help='判为近重复的 64 位感知哈希最大 Hamming 距离（默认: 4）')
+    # 测试时增强：翻转 + 多尺度推理后融合，小目标更准，代价是每张图像多次前向
+    parser.add_argument('--imgsz', type=int, default=None,
+                       help='推理输入尺寸（默认: 模型训练时的尺寸）')
+    parser.add_argument('--tta', action='store_true',
+                       help='测试时增强：水平翻转 + 多尺度推理，按置信度加权融合（仅 single 模式）')
+    parser.add_argument('--tta-scales', type=str, default='1.0,1.5',
+                       help='TTA 尺度，相对 --imgsz，逗号分隔（默认: 1.0,1.5）')
+    parser.add_argument('--tta-no-flip', action='store_false', dest='tta_flip',
+                       help='TTA 不使用水平翻转视图')
+    # 分块推理：高分辨率大图切成有重叠的块分别推理，再合并回整图
+    parser.add_argument('--tile', type=int, default=0,
+                       help='分块推理的块边长像素，0 表示不分块（默认: 0）；与 --tta 同时指定时使用分块推理')
+    parser.add_argument('--tile-overlap', type=float, default=0.2,
+                       help='相邻块的重叠比例（默认: 0.2）')
+    parser.add_argument('--tile-batch', type=int, default=16,
+                       help='分块推理每批的块数，来自多张图像的块一起前向（默认: 16）')
+    parser.add_argument('--flip-idx', type=str, default=None,
+                       help='水平翻转后的关键点重排，如 "1,0,3,2"（左右成对互换）；不提供时按 --kpt-names 推出')
+    parser.add_argument('--kpt-names', type=str, default=None,
+                       help='关键点名称，逗号分隔，如 "nose,left_eye,right_eye"，用于推出左右互换的 flip_idx')
+    # 合并模式：输出目录已有（人工修正过的）标签时，保留人工目标，只补充新检测
+    parser.add_argument('--merge', action='store_true',
+                       help='合并模式：保留 labels/ 中人工标注过的目标，只追加新检测到的目标，'
+                            '目标来源记录在 labels/.provenance/（默认覆盖已有标签）')
     
     args = parser.parse_args()
+    flip_idx = None
+    if args.flip_idx:
+        flip_idx = parse_flip_idx(args.flip_idx)
+    elif args.kpt_names:
+        flip_idx = flip_index_from_names([n.strip() for n in args.kpt_names.split(",")])
     
     # 运行自动标注函数
     try:
-        result = auto_annotate(
-            model_path=args.model,
-            source_dir=args.source,
-            output_dir=args.output,
-            save_vis=args.save_vis,
-            save_conf=args.save_conf,
-            expected_columns=args.columns
-        )
+        if args.mode == 'worker':
+            result = run_worker(
+                model_path=args.model,
+                queue_dir=args.queue_dir or str(Path(args.output) / "queue"),
+                output_dir=args.output,
+                expected_columns=args.columns,
+                save_conf=args.save_conf,
+                link_mode=args.link_mode,
+                stale_timeout=args.stale_timeout,
+                heartbeat_interval=args.heartbeat,
+                merge=args.merge
+            )
+        elif args.mode == 'coordinator':
+            result = run_coordinator(
+                model_path=args.model,
+                source_dir=args.source,
+                output_dir=args.output,
+                queue_dir=args.queue_dir,
+                chunk_size=args.chunk_size,
+                local_workers=args.local_workers,
+                expected_columns=args.columns,
+                save_conf=args.save_conf,
+                link_mode=args.link_mode,
+                stale_timeout=args.stale_timeout,
+                heartbeat_interval=args.heartbeat,
+                dedup=args.dedup,
+                dedup_threshold=args.dedup_threshold,
+                merge=args.merge
+            )
+        else:
+            result = auto_annotate(
+                model_path=args.model,
+                source_dir=args.source,
+                output_dir=args.output,
+                save_vis=args.save_vis,
+                save_conf=args.save_conf,
+                expected_columns=args.columns,
+                workers=args.io_workers,
+                link_mode=args.link_mode,
+                vis_max_side=args.vis_max_side,
+                vis_quality=args.vis_quality,
+                vis_sheet=args.vis_sheet,
+                vis_workers=args.vis_workers,
+                dedup=args.dedup,
+                dedup_threshold=args.dedup_threshold,
+                merge=args.merge,
+                tta=args.tta,
+                tta_scales=parse_scales(args.tta_scales),
+                tta_flip=args.tta_flip,
+                flip_idx=flip_idx,
+                imgsz=args.imgsz,
+                tile=args.tile,
+                tile_overlap=args.tile_overlap,
+                tile_batch=args.tile_batch
+            )
         
         print(f"\n下一步: 请检查 {result['labels_dir']} 中的标签文件，确保格式正确。")
         print("然后可以使用这些数据训练最终模型。")
@@ -0,0 +1,270 @@
+"""
+自动标注推理后的单遍后处理阶段。
+
+原先 auto_annotate 在推理后对 predictions/labels 做三遍 glob（修复列数、复制原图、移动标签），
+每个标签还要用最多 8 次 exists() 探测源图像扩展名，最后再 glob 输出目录统计数量。
+这里改为：
+    1. 对源目录只做一次 os.scandir，在内存中建立 stem -> 图像文件 的映射；
+    2. 对预测标签目录只做一次 os.scandir；
+    3. 每个标签文件在线程池中一次性完成 修复列数 -> 移动标签 -> 放置原图，
+       列数本来就正确的文件不再重写，直接 rename，复制也省掉 copy2 的冗余 stat；
+       原图可用硬链接/软链接/reflink 代替复制（link_mode），只改元数据不占额外空间；
+    4. 数量统计直接来自处理结果，不再扫描输出目录。
+"""
+import errno
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Linux 上 sendfile 支持文件到文件，零拷贝；其他平台退回 copyfileobj
+_USE_SENDFILE = sys.platform.startswith("linux") and hasattr(os, "sendfile")
+
+# 原图放入 images/ 的方式：copy 复制，hardlink 硬链接，symlink 软链接，reflink 写时复制克隆（btrfs/xfs）
+LINK_MODES = ("copy", "hardlink", "symlink", "reflink")
+# linux/fs.h: FICLONE = _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+# 这些错误说明当前文件系统/跨文件系统不支持该链接方式，退回复制
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+                    errno.ENOTTY, errno.EMLINK, errno.EACCES}
+
+# 与原实现探测顺序一致：同名多种扩展名并存时优先取排在前面的
+IMAGE_EXT_PRIORITY = {ext: i for i, ext in enumerate(
+    [".jpg", ".jpeg", ".png", ".bmp", ".JPG", ".JPEG", ".PNG", ".BMP"])}
+
+
+def build_image_map(source_dir):
+    """扫描一次源目录，返回 {stem: 图像路径}"""
+    best = {}
+    with os.scandir(source_dir) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            rank = IMAGE_EXT_PRIORITY.get(ext)
+            if rank is None:
+                continue
+            current = best.get(stem)
+            if current is None or rank < current[0]:
+                best[stem] = (rank, entry.path)
+    return {stem: path for stem, (_, path) in best.items()}
+
+
+def fix_columns(parts, expected_columns):
+    """修复标签格式：字段不足补 0，字段过多截断，返回 (parts, 是否修改过)"""
+    if len(parts) == expected_columns:
+        return parts, False
+    if len(parts) < expected_columns:
+        parts = parts + ['0'] * (expected_columns - len(parts))
+    else:
+        parts = parts[:expected_columns]
+    return parts, True
+
+
+def fix_label_lines(lines, expected_columns):
+    """把每行补齐/截断为 expected_columns 列，返回 (新行列表, 修复行数)"""
+    new_lines = []
+    fixed = 0
+    for line in lines:
+        parts, changed = fix_columns(line.split(), expected_columns)
+        fixed += changed
+        new_lines.append(" ".join(parts) + "\n")
+    return new_lines, fixed
+
+
+def copy_file(src, dst):
+    """复制文件并保留访问/修改时间
+
+    shutil.copy2 每次复制会额外做约 6 次 stat 和 chmod/utime，在网络存储上每次都是一次往返；
+    这里只做 open/fstat/sendfile/utime，数据集图像不需要复制权限位和扩展属性。
+    已有的 dst 先删除：它可能是之前 hardlink/symlink 方式留下的指向 src 的链接，直接以 "wb" 打开会把 src 截断。
+    """
+    with open(src, "rb") as fsrc:
+        st = os.fstat(fsrc.fileno())
+        try:
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+        with open(dst, "wb") as fdst:
+            if _USE_SENDFILE:
+                offset = 0
+                while offset < st.st_size:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, st.st_size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            else:
+                shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return st.st_size
+
+
+def _reflink(src, dst):
+    """用 FICLONE ioctl 创建写时复制克隆，不支持的平台抛出 ENOTSUP"""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.ENOTSUP, "reflink 仅支持 Linux")
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.ENOTSUP, "reflink 仅支持 Linux")
+    with open(src, "rb") as fsrc:
+        st = os.fstat(fsrc.fileno())
+        try:
+            with open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            try:
+                os.unlink(dst)
+            except FileNotFoundError:
+                pass
+            raise
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return st.st_size
+
+
+def place_file(src, dst, link_mode="copy"):
+    """按 link_mode 把 src 放到 dst，链接失败（如跨文件系统）时自动退回复制
+
+    总是先放到同目录临时名再 os.replace：其他进程不会看到半成品；目标已存在时（重复运行）被替换，
+    即使它是之前以 hardlink/symlink 方式放置、指向 src 的链接，也只替换链接本身，不会写穿到 src。
+
+    返回 (实际使用的方式, 文件字节数)
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"未知的 link_mode: {link_mode}，可选: {', '.join(LINK_MODES)}")
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    used = link_mode
+    try:
+        try:
+            if link_mode in ("hardlink", "symlink"):
+                make_link = os.link if link_mode == "hardlink" else (lambda s, d: os.symlink(os.path.abspath(s), d))
+                make_link(src, tmp)
+                size = os.stat(src).st_size
+            elif link_mode == "reflink":
+                size = _reflink(src, tmp)
+            else:
+                size = copy_file(src, tmp)
+        except OSError as e:
+            if link_mode == "copy" or e.errno not in _FALLBACK_ERRNOS:
+                raise
+            used = "copy"
+            size = copy_file(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    if used == "hardlink":
+        # dst 已是 src 的硬链接（重复运行）时 rename 什么都不做，临时名还留着
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+    return used, size
+
+
+def _move(src, dst):
+    """同一文件系统直接 rename（一次系统调用），跨文件系统时退回 shutil.move"""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.move(src, dst)
+
+
+def _process_one(label_path, label_name, image_map, labels_output_dir, images_output_dir, expected_columns,
+                 link_mode):
+    """处理单个标签文件：修复 -> 移动 -> 按 link_mode 放置原图
+
+    返回 (修复行数, 是否已移动, (原图实际放置方式, 字节数) 或 None, 警告信息或 None, 错误信息或 None)
+    """
+    fixed = 0
+    try:
+        if expected_columns:
+            with open(label_path, "r") as f:
+                lines = f.readlines()
+            new_lines, fixed = fix_label_lines(lines, expected_columns)
+            if fixed:
+                with open(label_path, "w") as f:
+                    f.writelines(new_lines)
+        _move(label_path, os.path.join(labels_output_dir, label_name))
+    except Exception as e:
+        return fixed, False, None, None, f"处理标签文件 {label_name} 时出错: {str(e)}"
+
+    if images_output_dir is None:
+        return fixed, True, None, None, None
+    image_path = image_map.get(os.path.splitext(label_name)[0])
+    if image_path is None:
+        return fixed, True, None, f"警告: 未找到与标签文件 {label_name} 对应的图像文件", None
+    try:
+        placed = place_file(image_path, os.path.join(images_output_dir, os.path.basename(image_path)), link_mode)
+    except Exception as e:
+        return fixed, True, None, None, f"复制图像 {os.path.basename(image_path)} 时出错: {str(e)}"
+    return fixed, True, placed, None, None
+
+
+def run_postprocess(pred_labels_dir, labels_output_dir, source_dir=None, images_output_dir=None,
+                    expected_columns=None, workers=8, verbose=True, link_mode="copy"):
+    """
+    单遍处理预测标签目录。
+
+    参数:
+        pred_labels_dir (str): ultralytics 写出的预测标签目录（predictions/labels）
+        labels_output_dir (str): 标签最终存放目录
+        source_dir (str): 源图像目录；与 images_output_dir 同时提供时复制有目标的原图
+        images_output_dir (str): 有目标原图的输出目录，为 None 时不复制
+        expected_columns (int): 每行期望的列数，为 None 时不修复
+        workers (int): 线程池大小（I/O 密集，网络存储上可适当调大）
+        verbose (bool): 是否打印每个文件的修复/警告信息
+        link_mode (str): 原图放置方式 copy/hardlink/symlink/reflink，链接失败时自动退回复制
+
+    返回:
+        dict: labels（移动的标签数）、images（放置的原图数）、fixed_lines（修复的行数）、
+              missing（找不到原图的标签数）、errors（出错的文件数）、first_label（第一个输出标签路径，用于抽样校验）、
+              bytes_copied / bytes_linked（复制与链接的原图字节数）、fallbacks（链接失败退回复制的次数）
+    """
+    stats = {"labels": 0, "images": 0, "fixed_lines": 0, "missing": 0, "errors": 0, "first_label": None,
+             "bytes_copied": 0, "bytes_linked": 0, "fallbacks": 0}
+    if not os.path.isdir(pred_labels_dir):
+        return stats
+
+    image_map = build_image_map(source_dir) if (source_dir and images_output_dir) else {}
+    with os.scandir(pred_labels_dir) as it:
+        label_entries = [(e.path, e.name) for e in it if e.name.endswith(".txt")]
+    label_entries.sort(key=lambda x: x[1])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = pool.map(
+            lambda e: _process_one(e[0], e[1], image_map, labels_output_dir, images_output_dir, expected_columns,
+                                   link_mode),
+            label_entries)
+        for (_, label_name), (fixed, moved, placed, warning, error) in zip(label_entries, results):
+            stats["fixed_lines"] += fixed
+            if verbose and fixed:
+                print(f"修复标签格式: {label_name} -> {expected_columns}列")
+            if warning:
+                stats["missing"] += 1
+            if error:
+                stats["errors"] += 1
+            if verbose and (warning or error):
+                print(warning or error)
+            if moved:
+                stats["labels"] += 1
+                if stats["first_label"] is None:
+                    stats["first_label"] = os.path.join(labels_output_dir, label_name)
+            if placed:
+                used, size = placed
+                stats["images"] += 1
+                if used == "copy":
+                    stats["bytes_copied"] += size
+                    stats["fallbacks"] += link_mode != "copy"
+                else:
+                    stats["bytes_linked"] += size
+
+    # 删除已清空的预测标签目录
+    try:
+        os.rmdir(pred_labels_dir)
+    except OSError:
+        pass
+    return stats
@@ -0,0 +1,100 @@
+"""
+“数据集统计”面板：显示 LabelStats 的类别计数、关键点可见率、bbox 尺寸/宽高比直方图和无目标图像。
+"""
+import numpy as np
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QPixmap
+from PyQt5.QtWidgets import (QLabel, QListWidget, QPushButton, QTreeWidget, QTreeWidgetItem, QVBoxLayout,
+                             QWidget)
+
+from dataset_stats import ASPECT_BINS, SIZE_BINS
+
+# 无目标图像列表最多显示的条数
+MAX_EMPTY_ITEMS = 2000
+
+
+def draw_histogram(counts, bins, title, width=320, height=140):
+    """用 QPainter 画一个简单的柱状图，返回 QPixmap"""
+    pixmap = QPixmap(width, height)
+    pixmap.fill(Qt.white)
+    painter = QPainter(pixmap)
+    painter.setFont(QFont("Arial", 8))
+    painter.setPen(QPen(Qt.black))
+    painter.drawText(4, 12, title)
+    top, bottom, left = 18, height - 16, 4
+    plot_w = width - 2 * left
+    peak = max(int(counts.max()) if len(counts) else 0, 1)
+    bar_w = plot_w / max(len(counts), 1)
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(70, 130, 180))
+    for i, c in enumerate(counts.tolist()):
+        bar_h = (bottom - top) * c / peak
+        painter.drawRect(int(left + i * bar_w) + 1, int(bottom - bar_h), max(1, int(bar_w) - 2), int(bar_h))
+    painter.setPen(QPen(Qt.black))
+    painter.drawLine(left, bottom, width - left, bottom)
+    painter.drawText(left, height - 3, f"{bins[0]:g}")
+    painter.drawText(width - left - 30, height - 3, f"{bins[-1]:g}")
+    painter.drawText(width // 2 - 30, height - 3, f"max={peak}")
+    painter.end()
+    return pixmap
+
+
+class StatsPanel(QWidget):
+    """数据集统计面板；双击无目标图像时发出 imageActivated(图像文件名)"""
+
+    imageActivated = pyqtSignal(str)
+    refreshRequested = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        self.btn_refresh = QPushButton("重新扫描")
+        self.btn_refresh.clicked.connect(self.refreshRequested.emit)
+        layout.addWidget(self.btn_refresh)
+
+        self.lbl_summary = QLabel()
+        self.lbl_summary.setWordWrap(True)
+        layout.addWidget(self.lbl_summary)
+
+        self.class_tree = QTreeWidget()
+        self.class_tree.setHeaderLabels(["类别 / 关键点", "目标数", "可见率"])
+        layout.addWidget(self.class_tree, 2)
+
+        self.lbl_size_hist = QLabel()
+        self.lbl_aspect_hist = QLabel()
+        layout.addWidget(self.lbl_size_hist)
+        layout.addWidget(self.lbl_aspect_hist)
+
+        layout.addWidget(QLabel("无目标图像（双击跳转）:"))
+        self.empty_list = QListWidget()
+        self.empty_list.itemDoubleClicked.connect(lambda item: self.imageActivated.emit(item.text()))
+        layout.addWidget(self.empty_list, 1)
+
+    def show_stats(self, stats, categories, empty_images):
+        """用 LabelStats 刷新面板；empty_images 为无目标图像文件名列表"""
+        self.lbl_summary.setText(f"标签文件: {stats.num_label_files}    目标: {stats.num_objects}    "
+                                 f"无目标图像: {len(empty_images)}")
+
+        visibility = stats.keypoint_visibility()
+        self.class_tree.clear()
+        for cid, count in enumerate(stats.class_counts.tolist()):
+            if count == 0:
+                continue
+            name = categories[cid]["name"] if cid < len(categories) else f"class_{cid}"
+            kp_names = categories[cid]["keypoints"] if cid < len(categories) else []
+            row = visibility[cid]
+            total = stats.kp_visible[cid].sum() / max(stats.kp_total[cid].sum(), 1)
+            item = QTreeWidgetItem([f"{cid}: {name}", str(count), f"{total:.1%}"])
+            for k in np.flatnonzero(~np.isnan(row)).tolist():
+                kp_name = kp_names[k] if k < len(kp_names) else f"kp{k}"
+                item.addChild(QTreeWidgetItem([f"{k}: {kp_name}", str(int(stats.kp_total[cid, k])), f"{row[k]:.1%}"]))
+            self.class_tree.addTopLevelItem(item)
+        self.class_tree.resizeColumnToContents(0)
+
+        self.lbl_size_hist.setPixmap(draw_histogram(stats.size_hist, SIZE_BINS, "bbox 尺寸 sqrt(w*h)"))
+        self.lbl_aspect_hist.setPixmap(draw_histogram(stats.aspect_hist, ASPECT_BINS, "bbox 宽高比 log2(w/h)"))
+
+        self.empty_list.clear()
+        self.empty_list.addItems(empty_images[:MAX_EMPTY_ITEMS])
+        if len(empty_images) > MAX_EMPTY_ITEMS:
+            self.empty_list.addItem(f"...（共 {len(empty_images)} 张，仅显示前 {MAX_EMPTY_ITEMS} 张）")
@@ -0,0 +1,136 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from annotate_job import AnnotateJob
+from conf_sidecar import load_confidence_index
+from label_diff import PREV_LABELS_DIRNAME
+from label_merge import load_provenance
+
+
+class _Tensor:
+    """ultralytics 结果中张量的最小替身"""
+
+    def __init__(self, array):
+        self.array = np.asarray(array)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+    def int(self):
+        return _Tensor(self.array.astype(np.int64))
+
+    def tolist(self):
+        return self.array.tolist()
+
+
+class _Boxes:
+    def __init__(self, xywhn, conf, cls):
+        self.xywhn, self.conf, self.cls = _Tensor(xywhn), _Tensor(conf), _Tensor(cls)
+
+    def __len__(self):
+        return len(self.conf.array)
+
+
+class FakeModel:
+    """每张图像预测一个目标（两个关键点）的假模型，接口同 YOLO.predict(stream=True)"""
+
+    def predict(self, source, **kwargs):
+        for path in source:
+            xywhn = np.array([[0.5, 0.5, 0.2, 0.2]])
+            kps = np.array([[[0.45, 0.45], [0.55, 0.55]]])
+            yield SimpleNamespace(path=path, names={0: "obj"}, boxes=_Boxes(xywhn, [0.9], [0]),
+                                  keypoints=SimpleNamespace(xyn=_Tensor(kps), conf=_Tensor([[0.8, 0.7]])))
+
+
+@pytest.fixture()
+def dataset(tmp_path):
+    images = tmp_path / "images"
+    labels = tmp_path / "labels"
+    images.mkdir()
+    labels.mkdir()
+    for stem in ("a", "b"):
+        (images / f"{stem}.jpg").write_bytes(b"")
+    (labels / "a.txt").write_text("0 0.200000 0.200000 0.100000 0.100000 0.150000 0.150000 0.250000 0.250000\n")
+    return images, labels
+
+
+def test_overwrite_mode_snapshots_previous_labels(dataset):
+    images, labels = dataset
+    success, message, cancelled = AnnotateJob(FakeModel(), images, labels).run()
+    assert success and not cancelled, message
+    prev = labels / PREV_LABELS_DIRNAME
+    assert sorted(p.name for p in prev.iterdir()) == ["a.txt"]
+    assert (prev / "a.txt").read_text().startswith("0 0.200000")
+    assert (labels / "a.txt").read_text().startswith("0 0.500000")
+
+
+def test_live_results_match_final_labels(dataset):
+    images, labels = dataset
+    job = AnnotateJob(FakeModel(), images, labels)
+    success, message, _ = job.run()
+    assert success, message
+    live = job.drain_results()
+    assert sorted(live) == ["a", "b"]
+    for stem, text in live.items():
+        assert (labels / f"{stem}.txt").read_text() == text
+    # 模型输出关键点置信度时与 ultralytics save_txt 一样写 x y v
+    assert live["b"] == "0 0.500000 0.500000 0.200000 0.200000 0.450000 0.450000 0.800000 0.550000 0.550000 0.700000\n"
+
+
+def test_merge_mode_skips_snapshot(dataset):
+    images, labels = dataset
+    success, message, cancelled = AnnotateJob(FakeModel(), images, labels, merge=True).run()
+    assert success and not cancelled, message
+    assert not (labels / PREV_LABELS_DIRNAME).exists()
+    assert (labels / "b.txt").exists()
+
+
+class SavingDuringRun(FakeModel):
+    """推理到 b 时模拟用户在 GUI 中修改实时预览并保存 b 的标签"""
+
+    def __init__(self, label_path):
+        self.label_path = label_path
+
+    def predict(self, source, **kwargs):
+        for result in super().predict(source, **kwargs):
+            if Path(result.path).stem == "b":
+                self.label_path.write_text(USER_TEXT)
+            yield result
+
+
+USER_TEXT = "0 0.300000 0.300000 0.100000 0.100000 0.250000 0.250000 0.350000 0.350000\n"
+
+
+def test_overwrite_keeps_labels_saved_during_run(dataset):
+    images, labels = dataset
+    success, message, _ = AnnotateJob(SavingDuringRun(labels / "b.txt"), images, labels).run()
+    assert success, message
+    assert (labels / "b.txt").read_text() == USER_TEXT
+    assert (labels / "a.txt").read_text().startswith("0 0.500000")
+    assert "1 张图像在 AI 标注期间被人工修改" in message and "b" in message
+    # 未写入的预测不留下置信度和来源记录
+    assert load_confidence_index(labels).stems.tolist() == ["a"]
+    assert list(load_provenance(labels)) == ["a"]
+
+
+def test_overwrite_keeps_labels_with_unsaved_edits(dataset):
+    images, labels = dataset
+    original = (labels / "a.txt").read_text()
+    asked = []
+
+    def has_unsaved(path):
+        asked.append(Path(path).name)
+        return Path(path).name == "a.txt"
+
+    success, message, _ = AnnotateJob(FakeModel(), images, labels, has_unsaved=has_unsaved).run()
+    assert success, message
+    assert sorted(asked) == ["a.txt", "b.txt"]
+    assert (labels / "a.txt").read_text() == original
+    assert (labels / "b.txt").read_text().startswith("0 0.500000")
+    assert "未覆盖: a" in message
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from conf_sidecar import ConfidenceWriter, auto_shard_name, compact_sidecar, load_confidence_index, sidecar_dir
+
+
+def _write(labels_dir, records, shard=None):
+    writer = ConfidenceWriter(labels_dir, shard=shard)
+    for stem, obj_conf in records.items():
+        writer.add(stem, obj_conf, np.full((len(obj_conf), 2), 0.9))
+    return writer.save()
+
+
+def test_single_machine_runs_keep_earlier_confidences(tmp_path):
+    first = _write(tmp_path, {"a": [0.4], "b": [0.5]})
+    # 第二次运行只标注了部分图像，不能丢掉第一次运行的记录
+    second = _write(tmp_path, {"b": [0.8, 0.6], "c": [0.7]})
+    assert first == second == sidecar_dir(tmp_path) / "main.npz"
+    assert sorted(os.listdir(sidecar_dir(tmp_path))) == ["main.npz"]
+
+    index = load_confidence_index(tmp_path)
+    assert sorted(index.stems.tolist()) == ["a", "b", "c"]
+    np.testing.assert_allclose(index.image_confidences("a")[0], [0.4])
+    np.testing.assert_allclose(index.image_confidences("b")[0], [0.8, 0.6])
+
+
+def test_worker_shards_are_kept_until_compacted(tmp_path):
+    _write(tmp_path, {"a": [0.4]})
+    _write(tmp_path, {"b": [0.5]}, shard="chunk_000001")
+    _write(tmp_path, {"c": [0.6]}, shard="chunk_000002")
+    assert sorted(os.listdir(sidecar_dir(tmp_path))) == ["chunk_000001.npz", "chunk_000002.npz", "main.npz"]
+    assert compact_sidecar(tmp_path) == 3
+    assert sorted(os.listdir(sidecar_dir(tmp_path))) == ["main.npz"]
+    assert sorted(load_confidence_index(tmp_path).stems.tolist()) == ["a", "b", "c"]
+
+
+def test_empty_writer_writes_nothing(tmp_path):
+    assert ConfidenceWriter(tmp_path).save() is None
+    assert load_confidence_index(tmp_path) is None
+
+
+def _names(_):
+    return [auto_shard_name() for _ in range(100)]
+
+
+def test_auto_shard_names_are_unique_within_a_second():
+    # 多个进程同时启动、每个进程连续取名，都不能撞名
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        names = [n for chunk in pool.map(_names, range(8)) for n in chunk]
+    names += _names(None)
+    assert len(set(names)) == len(names)
+    assert all(n.startswith("auto_") for n in names)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from annotation_store import AnnotationStore
+from dataset_stats import LabelStats
+from dataset_store import DatasetLabelStore, keypoint_counts, keypoints_from_values, parse_label_text
+
+XYV_LINE = "0 .5 .5 .2 .2 .4 .4 2 0 0 0\n"
+XY_LINE = "1 0.5 0.5 0.2 0.2 0.1 0.2 0 0\n"
+
+
+def _gui_keypoints(text):
+    """标注工具读到的关键点（只取每个目标实际的关键点数）"""
+    store = AnnotationStore.from_yolo_text(text, 1, 1)
+    return [store.keypoints[i, :n] for i, n in enumerate(store.num_kps.tolist())]
+
+
+def _store_keypoints(text):
+    class_ids, values, ncols = parse_label_text(text)
+    kps = keypoints_from_values(values, ncols)
+    return [kps[i, :n] for i, n in enumerate(keypoint_counts(ncols).tolist())]
+
+
+def test_keypoint_counts_follow_gui_rules():
+    # 6 个数值: x y v 两个点；4 个: x y 两个点；5 个: 无法解析，没有关键点；0 个: 没有关键点
+    assert keypoint_counts([10, 8, 9, 4, 13]).tolist() == [2, 2, 0, 0, 3]
+
+
+def test_xyv_line_matches_gui():
+    kps = _store_keypoints(XYV_LINE)
+    assert len(kps[0]) == 2
+    np.testing.assert_allclose(kps[0][0], [0.4, 0.4, 2])
+    for ours, gui in zip(kps, _gui_keypoints(XYV_LINE)):
+        np.testing.assert_allclose(ours, gui, rtol=1e-6)
+
+
+def test_mixed_formats_in_one_file_match_gui():
+    rng = np.random.default_rng(0)
+    lines = [XYV_LINE, XY_LINE]
+    for k in (1, 2, 4, 5, 17):
+        values = rng.uniform(0.01, 0.99, (2, 4 + 3 * k))
+        lines.append("0 " + " ".join(f"{v:.6f}" for v in values[0]) + "\n")
+        lines.append("2 " + " ".join(f"{v:.6f}" for v in values[1, :4 + 2 * k]) + "\n")
+    text = "".join(lines)
+    ours, gui = _store_keypoints(text), _gui_keypoints(text)
+    assert [len(k) for k in ours] == [len(k) for k in gui]
+    for a, b in zip(ours, gui):
+        np.testing.assert_allclose(a, b, rtol=1e-6)
+
+
+def test_stats_on_xyv_labels(tmp_path):
+    (tmp_path / "a.txt").write_text(XYV_LINE)
+    (tmp_path / "b.txt").write_text(XY_LINE)
+    store = DatasetLabelStore.build(str(tmp_path))
+    assert store.keypoints().shape == (2, 2, 3)
+    stats = LabelStats.from_store(store)
+    # 类别 0: x y v 的两个点都视为可见（同标注工具）；类别 1: (0, 0) 不可见
+    assert stats.kp_total.tolist() == [[1, 1], [1, 1]]
+    assert stats.kp_visible.tolist() == [[1, 1], [1, 0]]
@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from annotation_store import AnnotationStore
+from edit_history import AddObject, EditHistory, RemoveObject, SetClass, SetKeypoint
+
+CATEGORY_SIZES = [17, 5, 1]
+
+
+def make_store(num_objects, seed=0):
+    """每个目标的关键点数等于其类别定义的关键点数（同 main.py 加载后的状态）"""
+    rng = random.Random(seed)
+    store = AnnotationStore()
+    for i in range(num_objects):
+        cid = i % len(CATEGORY_SIZES)
+        store.add(cid, keypoints=[(rng.uniform(0.01, 0.99), rng.uniform(0.01, 0.99), 2 if rng.random() > 0.2 else 0)
+                                  for _ in range(CATEGORY_SIZES[cid])])
+    return store
+
+
+def snapshot(store):
+    """含 id、类别、关键点数和关键点的完整状态，撤销必须精确还原"""
+    return [(int(store.ids[i]), int(store.class_ids[i]), int(store.num_kps[i]),
+             store.keypoints[i, :store.num_kps[i]].tolist()) for i in range(len(store))]
+
+
+def random_edit(store, history, rng):
+    """模拟 main.py 中的一步编辑（加点、拖拽、撤销上一点、新建/删除目标、切换类别），返回是否产生了编辑"""
+    op = rng.random()
+    if not len(store) or op < 0.05:
+        cid = rng.randrange(len(CATEGORY_SIZES))
+        view = store.add(cid, num_kps=CATEGORY_SIZES[cid])
+        history.record(AddObject(view.id, view.index, cid, CATEGORY_SIZES[cid]))
+        return True
+    index = rng.randrange(len(store))
+    if op < 0.55:
+        k = rng.randrange(CATEGORY_SIZES[int(store.class_ids[index])])
+        history.execute(store, SetKeypoint.capture(store, index, k, (rng.random(), rng.random(), 2)))
+    elif op < 0.85:
+        # 拖拽：过程中实时修改，松开时记录一步
+        k = rng.randrange(int(store.num_kps[index]))
+        start = tuple(store.keypoints[index, k])
+        for _ in range(5):
+            store.move_keypoint(index, k, rng.random(), rng.random())
+        history.record(SetKeypoint(int(store.ids[index]), k, start, tuple(store.keypoints[index, k])))
+    elif op < 0.90:
+        k = store.last_visible_keypoint(index)
+        if k < 0:
+            return False
+        old = store.keypoints[index, k]
+        history.execute(store, SetKeypoint(int(store.ids[index]), k, old, (old[0], old[1], 0)))
+    elif op < 0.95:
+        history.execute(store, RemoveObject(store, index))
+    else:
+        cid = rng.randrange(len(CATEGORY_SIZES))
+        history.execute(store, SetClass(store, index, cid, CATEGORY_SIZES[cid]))
+    return True
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_edits_undo_redo_round_trip(seed):
+    rng = random.Random(seed)
+    store = make_store(30, seed)
+    history = EditHistory(max_bytes=1 << 40)
+    states = [snapshot(store)]
+    for _ in range(500):
+        if random_edit(store, history, rng):
+            states.append(snapshot(store))
+    # 每一步撤销后都与当时的状态一致
+    for expected in reversed(states[:-1]):
+        assert history.undo(store) is not None
+        assert snapshot(store) == expected
+    assert history.undo(store) is None
+    # 每一步重做后都与当时的状态一致
+    for expected in states[1:]:
+        assert history.redo(store) is not None
+        assert snapshot(store) == expected
+    assert history.redo(store) is None
+
+
+def test_commands_locate_objects_by_id_after_other_removals():
+    store = make_store(4)
+    initial = snapshot(store)
+    history = EditHistory()
+    target = int(store.ids[3])
+    history.execute(store, SetKeypoint.capture(store, 3, 0, (0.1, 0.2, 2)))
+    history.execute(store, RemoveObject(store, 0))
+    history.execute(store, SetClass(store, store.index_of(target), 2, CATEGORY_SIZES[2]))
+    assert store.class_ids[store.index_of(target)] == 2 and store.num_kps[store.index_of(target)] == 1
+    history.undo(store)
+    # 切换到关键点更少的类别后撤销，被截断的关键点原样恢复
+    assert store.num_kps[store.index_of(target)] == CATEGORY_SIZES[0]
+    history.undo(store)
+    history.undo(store)
+    assert snapshot(store) == initial
+
+
+def test_new_edit_clears_redo():
+    store = make_store(2)
+    history = EditHistory()
+    history.execute(store, SetKeypoint.capture(store, 0, 0, (0.1, 0.1, 2)))
+    history.undo(store)
+    assert history.can_redo()
+    history.execute(store, SetKeypoint.capture(store, 1, 0, (0.2, 0.2, 2)))
+    assert not history.can_redo()
+    assert history.redo(store) is None
+
+
+def test_oldest_commands_dropped_over_max_bytes():
+    store = make_store(2)
+    probe = SetKeypoint.capture(store, 0, 0, (0.5, 0.5, 2))
+    history = EditHistory(max_bytes=probe.nbytes() * 3)
+    for i in range(10):
+        history.execute(store, SetKeypoint.capture(store, 0, 0, (i / 10, i / 10, 2)))
+    assert len(history) == 3
+    assert history.nbytes <= history.max_bytes
+    while history.undo(store) is not None:
+        pass
+    # 只能撤销到被保留的最早一步之前
+    assert store.keypoints[0, 0].tolist() == [0.6, 0.6, 2]
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("ultralytics", "torch", "cv2")
+# 累计导入耗时上限（毫秒），留有余量，只拦截重量级依赖被提前导入这类数量级的回归
+BUDGET_MS = {"main": 1500.0, "label_api": 200.0}
+
+
+def import_times(module):
+    """在新的解释器中用 -X importtime 导入 module，返回 {模块全名: 累计微秒}"""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in stderr.splitlines():
+        # import time:  self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module, forbidden", [
+    ("main", HEAVY),
+    # 脚本和多进程 worker 用的无界面接口连 Qt 和 NumPy 也不导入
+    ("label_api", HEAVY + ("PyQt5", "numpy")),
+])
+def test_import_stays_lightweight(module, forbidden):
+    times = import_times(module)
+    assert module in times
+    loaded = sorted({name.split(".")[0] for name in times} & set(forbidden))
+    assert loaded == []
+    assert times[module] / 1e3 < BUDGET_MS[module]
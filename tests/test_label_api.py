@@ -0,0 +1,29 @@
+import pytest
+
+from dataset_store import DatasetLabelStore
+from label_api import images_without_targets
+
+IMAGES = ["bad.jpg", "empty.jpg", "good.jpg", "new.jpg", "nolabel.jpg", "short.jpg"]
+
+
+@pytest.fixture()
+def labels(tmp_path):
+    (tmp_path / "bad.txt").write_text("0 x y w h\n")
+    (tmp_path / "empty.txt").write_text("\n\n")
+    (tmp_path / "good.txt").write_text("0 0.5 0.5 0.1 0.1 0.5 0.5\n")
+    (tmp_path / "short.txt").write_text("0 0.5 0.5\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize("use_store", [False, True])
+def test_only_images_without_label_lines_are_selected(labels, use_store):
+    # 标签库在 new.txt 写入之前建立（落后于磁盘），bad.txt 解析出错、short.txt 列数不足都不在库的目标中
+    store = DatasetLabelStore.build(str(labels)) if use_store else None
+    (labels / "new.txt").write_text("0 0.5 0.5 0.1 0.1 0.5 0.5\n")
+    assert images_without_targets(IMAGES, str(labels), store) == ["empty.jpg", "nolabel.jpg"]
+
+
+def test_stale_store_is_refreshed_before_use(labels):
+    store = DatasetLabelStore.build(str(labels))
+    (labels / "good.txt").write_text("")
+    assert images_without_targets(IMAGES, str(labels), store) == ["empty.jpg", "good.jpg", "new.jpg", "nolabel.jpg"]
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+
+from annotation_store import AnnotationStore
+from label_diff import COLUMNS, PREV_LABELS_DIRNAME, diff_dirs, parse_objects, snapshot_labels
+
+XYV_LINE = "0 0.5 0.5 0.2 0.2 0.4 0.4 2 0.6 0.6 1\n"
+
+
+def test_parse_objects_xyv_matches_gui():
+    class_ids, bboxes, kps = parse_objects(XYV_LINE)
+    gui = AnnotationStore.from_yolo_text(XYV_LINE, 1, 1)
+    assert class_ids.tolist() == [0]
+    np.testing.assert_allclose(bboxes, [[0.5, 0.5, 0.2, 0.2]])
+    assert kps.shape == (1, 2, 3)
+    np.testing.assert_allclose(kps[0], gui.keypoints[0, :2], rtol=1e-6)
+
+
+def test_diff_identical_xyv_labels_is_empty(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "img.txt").write_text(XYV_LINE)
+    (tmp_path / "b" / "moved.txt").write_text(XYV_LINE)
+    (tmp_path / "a" / "moved.txt").write_text("0 0.5 0.5 0.2 0.2 0.45 0.4 2 0.65 0.6 1\n")
+    result = diff_dirs(str(tmp_path / "a"), str(tmp_path / "b"), workers=1)
+    rows = dict(zip(result.stems.tolist(), (dict(zip(COLUMNS, r)) for r in result.rows.tolist())))
+    assert rows["img"]["moved"] == 0 and rows["img"]["vis_changed"] == 0 and rows["img"]["score"] == 0
+    assert rows["moved"]["matched"] == 1 and rows["moved"]["moved"] == 1
+
+
+def _snapshot(labels):
+    dest = labels / PREV_LABELS_DIRNAME
+    return {p.name: p.read_text() for p in dest.iterdir()}
+
+
+def test_snapshot_labels_is_incremental(tmp_path):
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    for i in range(3):
+        (labels / f"{i}.txt").write_text(f"{i} 0.5 0.5 0.1 0.1\n")
+    assert snapshot_labels(str(labels)) == 3
+    assert snapshot_labels(str(labels)) == 0
+
+    (labels / "1.txt").write_text("1 0.4 0.4 0.1 0.1\n")
+    os.unlink(labels / "2.txt")
+    assert snapshot_labels(str(labels)) == 1
+    assert _snapshot(labels) == {"0.txt": "0 0.5 0.5 0.1 0.1\n", "1.txt": "1 0.4 0.4 0.1 0.1\n"}
+
+
+def test_snapshot_survives_in_place_rewrite(tmp_path):
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    (labels / "a.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+    snapshot_labels(str(labels))
+    # format_six_decimals 等原地改写不能连带改掉快照
+    with open(labels / "a.txt", "w") as f:
+        f.write("0 0.500000 0.500000 0.100000 0.100000\n")
+    assert _snapshot(labels) == {"a.txt": "0 0.5 0.5 0.1 0.1\n"}
+    assert snapshot_labels(str(labels)) == 1
+    assert _snapshot(labels) == {"a.txt": "0 0.500000 0.500000 0.100000 0.100000\n"}
@@ -0,0 +1,49 @@
+import pytest
+
+from dataset_store import DatasetLabelStore
+from label_query import LabelIndex, QueryError, parse_query
+
+LABELS = {
+    # x y v：两个关键点都可见（同标注工具，v 一律视为 2）
+    "xyv": "0 0.5 0.5 0.2 0.2 0.4 0.4 2 0 0 0\n",
+    # x y：第二个点为 (0, 0)，不可见
+    "xy": "1 0.5 0.5 0.2 0.2 0.1 0.2 0 0\n",
+    "empty": "",
+}
+IMAGES = ["empty.jpg", "nolabel.jpg", "xy.jpg", "xyv.jpg"]
+
+
+@pytest.fixture()
+def index(tmp_path):
+    for stem, text in LABELS.items():
+        (tmp_path / f"{stem}.txt").write_text(text)
+    return LabelIndex(IMAGES, DatasetLabelStore.build(str(tmp_path)))
+
+
+def names(index, query):
+    return [IMAGES[i] for i in index.evaluate(query)]
+
+
+def test_keypoint_predicates_on_xyv(index):
+    assert names(index, "missing_kp(1)") == ["xy.jpg"]
+    assert names(index, "visible_kp(1)") == ["xyv.jpg"]
+    assert names(index, "kp_visible==2") == ["xyv.jpg"]
+    # 超出关键点数的序号视为缺失
+    assert names(index, "missing_kp(2)") == ["xy.jpg", "xyv.jpg"]
+
+
+def test_object_level_conditions_apply_to_same_object(index):
+    assert names(index, "class==0 and missing_kp(1)") == []
+    assert names(index, "class==1 and missing_kp(1)") == ["xy.jpg"]
+    assert names(index, "not missing_kp(1)") == ["empty.jpg", "nolabel.jpg", "xyv.jpg"]
+
+
+def test_image_flags(index):
+    assert names(index, "unlabeled") == ["nolabel.jpg"]
+    assert names(index, "empty") == ["empty.jpg"]
+    assert names(index, "labeled and count==1") == ["xy.jpg", "xyv.jpg"]
+
+
+def test_syntax_error():
+    with pytest.raises(QueryError):
+        parse_query("class==")
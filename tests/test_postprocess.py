@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from postprocess import place_file, run_postprocess
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize("first_mode", ["hardlink", "symlink"])
+@pytest.mark.parametrize("second_mode", ["copy", "reflink", "hardlink", "symlink"])
+def test_place_over_previous_link_keeps_source(tmp_path, first_mode, second_mode):
+    src = tmp_path / "a.jpg"
+    _write(src, b"pixels" * 100)
+    dst = tmp_path / "out.jpg"
+    place_file(str(src), str(dst), first_mode)
+    place_file(str(src), str(dst), second_mode)
+    assert src.read_bytes() == b"pixels" * 100
+    assert dst.read_bytes() == b"pixels" * 100
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+
+@pytest.mark.parametrize("first_mode", ["hardlink", "symlink"])
+def test_run_postprocess_copy_after_link_run(tmp_path, first_mode):
+    source = tmp_path / "source"
+    images_out = tmp_path / "images"
+    labels_out = tmp_path / "labels"
+    for d in (source, images_out, labels_out):
+        d.mkdir()
+    for name in ("a", "b"):
+        _write(source / f"{name}.jpg", name.encode() * 1000)
+
+    for mode in (first_mode, "copy"):
+        pred = tmp_path / f"pred_{mode}"
+        pred.mkdir()
+        for name in ("a", "b"):
+            (pred / f"{name}.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+        stats = run_postprocess(str(pred), str(labels_out), str(source), str(images_out), verbose=False,
+                                link_mode=mode)
+        assert stats["errors"] == 0 and stats["images"] == 2
+
+    for name in ("a", "b"):
+        assert (source / f"{name}.jpg").read_bytes() == name.encode() * 1000
+        assert (images_out / f"{name}.jpg").read_bytes() == name.encode() * 1000
+        assert not (images_out / f"{name}.jpg").is_symlink()
@@ -0,0 +1,72 @@
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+from work_queue import ChunkQueue
+
+NUM_NODES = 6
+
+
+def _node(queue_dir, worker_id, log_path, stale_timeout):
+    """模拟一个节点：不停回收超时块、领取、“处理”（记录块名）、完成，直到全部完成"""
+    queue = ChunkQueue(queue_dir, stale_timeout)
+    processed = []
+    while not queue.is_finished():
+        queue.reclaim_stale()
+        item = queue.claim(worker_id)
+        if item is None:
+            time.sleep(0.001)
+            continue
+        claimed_path, payload = item
+        processed.append(payload["images"][0])
+        queue.complete(claimed_path)
+    Path(log_path).write_text(json.dumps(processed))
+
+
+def _make_queue(tmp_path, num_images, chunk_size):
+    source = tmp_path / "images"
+    source.mkdir()
+    for i in range(num_images):
+        (source / f"{i:05d}.jpg").write_bytes(b"")
+    queue = ChunkQueue(tmp_path / "queue")
+    num_chunks = queue.create(str(source), chunk_size=chunk_size)
+    return queue, num_chunks
+
+
+def test_each_chunk_processed_exactly_once_across_nodes(tmp_path):
+    queue, num_chunks = _make_queue(tmp_path, 400, 1)
+    # 块在队列里等了很久（mtime 远早于超时），领取瞬间若还保留旧 mtime 就会被其他节点当作超时回收
+    old = time.time() - 3600
+    for entry in os.scandir(queue.pending_dir):
+        os.utime(entry.path, (old, old))
+
+    ctx = multiprocessing.get_context("fork")
+    logs = [tmp_path / f"node{i}.json" for i in range(NUM_NODES)]
+    nodes = [ctx.Process(target=_node, args=(str(queue.queue_dir), f"node{i}", str(log), 5.0))
+             for i, log in enumerate(logs)]
+    for p in nodes:
+        p.start()
+    for p in nodes:
+        p.join(60)
+    assert [p.exitcode for p in nodes] == [0] * NUM_NODES
+
+    processed = [name for log in logs for name in json.loads(log.read_text())]
+    assert len(processed) == num_chunks
+    assert sorted(processed) == [f"{i:05d}.jpg" for i in range(400)]
+    assert queue.counts() == (0, 0, num_chunks)
+
+
+def test_claim_lost_to_reclaim_is_not_returned(tmp_path):
+    queue, _ = _make_queue(tmp_path, 2, 1)
+    claimed_path, payload = queue.claim("a")
+    assert payload["images"] == ["00000.jpg"]
+    # 心跳停止超过超时：被回收后由另一个节点领取，原 worker 的心跳与完成都不生效
+    old = time.time() - 3600
+    os.utime(claimed_path, (old, old))
+    assert ChunkQueue(queue.queue_dir, stale_timeout=60).reclaim_stale() == 1
+    assert not queue.heartbeat(claimed_path)
+    assert queue.claim("b")[1]["images"] == ["00000.jpg"]
+    queue.complete(claimed_path)
+    assert queue.counts() == (1, 1, 0)
@@ -0,0 +1,213 @@
+"""
+高分辨率图像的分块（切片）推理。
+
+8K 帧直接送进模型会被缩小到输入尺寸，小目标几乎消失。TiledPredictor 把每张图像切成有重叠的块，
+逐块推理后映射回整图坐标并合并块边界上的重复检测:
+
+    切块      块边长 tile、相邻块重叠 overlap（比例），最后一行/列的块贴齐图像边缘；
+              另加一个整图视图（full_image=True），保证比块还大的目标也能被检出
+    批处理    块不按图像分组，来自多张图像的块凑满 batch 个一起前向，小图像也不会浪费批大小
+    内存      每张图像只解码一次，块是解码结果上的切片视图（不复制）；图像的最后一块推理完即释放，
+              同时在内存中的图像数不超过 batch / 每张块数 + 2，峰值内存与图像总数无关
+    合并      整图所有检测按同类别的 IoS（交集 / 较小框面积）聚类，块边界截断的检测是完整检测的子集，
+              IoS 高而 IoU 低，因此用 IoS（两段都被截断时改看垂直于截断方向的跨度是否一致）；每组取得分最高者为代表（贴着块内侧边界的检测得分减半），
+              代表被截断时框取组内并集，代表不可见（置信度低于 kp_conf）的关键点由组内其他检测补上
+
+predict() 逐张返回 ultralytics 的 Results 对象，与 model.predict(stream=True) 的结果可以互换使用。
+"""
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from tta_inference import _empty_predictions, _list_sources, _to_numpy, make_result
+
+# 检测框离块内侧边界不超过该像素数时视为被截断
+_EDGE_MARGIN = 2.0
+
+
+def tile_grid(width, height, tile=640, overlap=0.2):
+    """整图 (width, height) 切成边长 tile、重叠比例 overlap 的块，返回 (n, 4) 的 x0 y0 x1 y1"""
+    def starts(size):
+        if size <= tile:
+            return [0]
+        step = max(1, int(tile * (1.0 - overlap)))
+        s = list(range(0, size - tile, step))
+        s.append(size - tile)
+        return s
+    xs, ys = starts(width), starts(height)
+    return np.array([(x, y, min(x + tile, width), min(y + tile, height)) for y in ys for x in xs], dtype=np.int64)
+
+
+def tile_predictions(result, window, width, height):
+    """一个块的预测 -> (xyxy, conf, cls, kps, 截断标记)，坐标已加上块偏移"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return _empty_predictions() + (np.zeros(0, dtype=bool),)
+    x0, y0, x1, y1 = window.tolist()
+    xyxy = _to_numpy(boxes.xyxy).astype(np.float64) + [x0, y0, x0, y0]
+    conf = _to_numpy(boxes.conf).astype(np.float64)
+    cls = _to_numpy(boxes.cls).astype(np.int64)
+    if result.keypoints is not None:
+        kps = _to_numpy(result.keypoints.data).astype(np.float64)
+        if kps.shape[2] == 2:
+            kps = np.concatenate([kps, np.ones(kps.shape[:2] + (1,))], axis=2)
+        kps = kps.copy()
+        kps[..., 0] = np.where(kps[..., 0] != 0, kps[..., 0] + x0, 0)
+        kps[..., 1] = np.where(kps[..., 1] != 0, kps[..., 1] + y0, 0)
+    else:
+        kps = np.zeros((len(conf), 0, 3))
+    # 只有块内侧的边（不是整图边缘）会截断目标
+    cut = np.zeros(len(conf), dtype=bool)
+    if x0 > 0:
+        cut |= xyxy[:, 0] <= x0 + _EDGE_MARGIN
+    if y0 > 0:
+        cut |= xyxy[:, 1] <= y0 + _EDGE_MARGIN
+    if x1 < width:
+        cut |= xyxy[:, 2] >= x1 - _EDGE_MARGIN
+    if y1 < height:
+        cut |= xyxy[:, 3] >= y1 - _EDGE_MARGIN
+    return xyxy, conf, cls, kps, cut
+
+
+def ios_matrix(xyxy):
+    """(n, 4) 框两两之间的交集 / 较小框面积"""
+    lo = np.maximum(xyxy[:, None, :2], xyxy[None, :, :2])
+    hi = np.minimum(xyxy[:, None, 2:], xyxy[None, :, 2:])
+    inter = np.clip(hi - lo, 0, None).prod(axis=2)
+    area = np.clip(xyxy[:, 2:] - xyxy[:, :2], 0, None).prod(axis=1)
+    return inter / np.maximum(np.minimum(area[:, None], area[None, :]), 1e-9)
+
+
+def _span_iou(xyxy, axis):
+    """(n, 4) 框两两之间在 x（axis=0）或 y（axis=1）方向上的一维 IoU"""
+    lo, hi = xyxy[:, axis], xyxy[:, axis + 2]
+    inter = np.clip(np.minimum(hi[:, None], hi[None, :]) - np.maximum(lo[:, None], lo[None, :]), 0, None)
+    union = np.maximum(hi[:, None], hi[None, :]) - np.minimum(lo[:, None], lo[None, :])
+    return inter / np.maximum(union, 1e-9)
+
+
+def merge_tiles(parts, merge_ios=0.6, kp_conf=0.5):
+    """合并一张图像全部块（及整图视图）的检测，返回 (xyxy, conf, cls, kps)"""
+    parts = [p for p in parts if len(p[1])]
+    if not parts:
+        return _empty_predictions()
+    num_kps = max(p[3].shape[1] for p in parts)
+    xyxy = np.concatenate([p[0] for p in parts])
+    conf = np.concatenate([p[1] for p in parts])
+    cls = np.concatenate([p[2] for p in parts])
+    kps = np.concatenate([np.pad(p[3], ((0, 0), (0, num_kps - p[3].shape[1]), (0, 0))) for p in parts])
+    cut = np.concatenate([p[4] for p in parts])
+
+    ios = ios_matrix(xyxy)
+    # 两个都被截断的检测（同一目标在相邻两块中的两段）只在重叠带内相交，IoS 可能不高：
+    # 相交且垂直于截断方向的跨度基本一致时也视为同一目标
+    both_cut = cut[:, None] & cut[None, :] & (ios > 0)
+    fragments = both_cut & ((_span_iou(xyxy, 0) >= 0.7) | (_span_iou(xyxy, 1) >= 0.7))
+    same = ((ios >= merge_ios) | fragments) & (cls[:, None] == cls[None, :])
+    rank = conf * np.where(cut, 0.5, 1.0)
+    assigned = np.zeros(len(conf), dtype=bool)
+    out_xyxy, out_conf, out_cls, out_kps = [], [], [], []
+    for i in np.argsort(-rank, kind="stable").tolist():
+        if assigned[i]:
+            continue
+        members = np.flatnonzero(same[i] & ~assigned)
+        assigned[members] = True
+        box = xyxy[i]
+        if cut[i]:
+            box = np.concatenate([xyxy[members, :2].min(axis=0), xyxy[members, 2:].max(axis=0)])
+        kp = kps[i].copy()
+        if num_kps and len(members) > 1:
+            # 代表检测不可信的关键点取组内置信度最高的
+            best = members[np.argmax(kps[members, :, 2], axis=0)]
+            weak = kp[:, 2] < kp_conf
+            kp[weak] = kps[best[weak], np.flatnonzero(weak)]
+        out_xyxy.append(box)
+        out_conf.append(conf[members].max())
+        out_cls.append(cls[i])
+        out_kps.append(kp)
+    return np.array(out_xyxy), np.array(out_conf), np.array(out_cls, dtype=np.int64), np.array(out_kps)
+
+
+class TiledPredictor:
+    """分块推理
+
+        predictor = TiledPredictor(YOLO("best.pt"), tile=1024, overlap=0.2, batch=16)
+        for result in predictor.predict("images/"):
+            ...
+        print(predictor.summary())
+    """
+
+    def __init__(self, model, tile=640, overlap=0.2, batch=16, full_image=True, conf=0.25, merge_ios=0.6):
+        self.model = model
+        self.tile = tile
+        self.overlap = overlap
+        self.batch = max(1, batch)
+        self.full_image = full_image
+        self.conf = conf
+        self.merge_ios = merge_ios
+        self.images = 0
+        self.tiles = 0
+        self.seconds = 0.0
+
+    def _run(self, queue, pending, names):
+        """对队列中的 batch 个块推理，把检测记到各自图像上；返回 names"""
+        items = [queue.popleft() for _ in range(min(self.batch, len(queue)))]
+        results = self.model.predict(source=[crop for _, _, crop, _ in items], imgsz=self.tile,
+                                     conf=self.conf, verbose=False)
+        for (key, window, _, whole), result in zip(items, results):
+            image = pending[key]
+            h, w = image["image"].shape[:2]
+            part = tile_predictions(result, window, w, h)
+            if whole:
+                # 整图视图不存在块边界
+                part = part[:4] + (np.zeros(len(part[1]), dtype=bool),)
+            image["parts"].append(part)
+            image["left"] -= 1
+        self.tiles += len(items)
+        return results[0].names if results else names
+
+    def predict(self, source):
+        """逐张返回合并后的 Results；source 为图像目录、图像路径列表或单个路径"""
+        for path, image, names, xyxy, conf, cls, kps in self.predict_arrays(source):
+            yield make_result(image, path, names, xyxy, conf, cls, kps)
+
+    def predict_arrays(self, source):
+        """同 predict，但逐张返回 (path, image, names, xyxy, conf, cls, kps) 数组，不构造 Results（不需要 torch）"""
+        paths = _list_sources(source)
+        queue = deque()
+        pending = {}
+        order = deque()
+        names = None
+        t0 = time.perf_counter()
+        for key, path in enumerate(paths + [None]):
+            if path is not None:
+                image = cv2.imread(path)
+                if image is None:
+                    continue
+                h, w = image.shape[:2]
+                windows = tile_grid(w, h, self.tile, self.overlap)
+                pending[key] = {"path": path, "image": image, "parts": [], "left": len(windows)}
+                order.append(key)
+                for window in windows:
+                    x0, y0, x1, y1 = window.tolist()
+                    queue.append((key, window, image[y0:y1, x0:x1], False))
+                if self.full_image and len(windows) > 1:
+                    pending[key]["left"] += 1
+                    queue.append((key, np.array([0, 0, w, h]), image, True))
+            # 凑满一批就推理；最后一张读完后把剩余的块全部推理
+            while len(queue) >= self.batch or (path is None and queue):
+                names = self._run(queue, pending, names)
+            while order and pending[order[0]]["left"] == 0:
+                done = pending.pop(order.popleft())
+                xyxy, conf, cls, kps = merge_tiles(done["parts"], self.merge_ios)
+                self.images += 1
+                self.seconds += time.perf_counter() - t0
+                yield done["path"], done["image"], names, xyxy, conf, cls, kps
+                t0 = time.perf_counter()
+
+    def summary(self):
+        per_image = self.seconds / max(self.images, 1)
+        return (f"分块推理: 块 {self.tile}px，重叠 {self.overlap:.0%}，{self.images} 张共 {self.tiles} 块"
+                f"（{self.tiles / max(self.images, 1):.1f} 块/张），{per_image * 1e3:.0f} ms/张")
@@ -0,0 +1,245 @@
+"""
+自动标注的测试时增强（TTA）：水平翻转 + 多尺度推理，按置信度加权融合关键点。
+
+小目标在默认输入尺寸下经常漏检或关键点偏移，而人工修正远比多花的算力贵。TTAPredictor 对每张图像生成
+若干视图（原图 / 水平翻转 x 每个尺度），用同一模型推理后映射回原图坐标并融合:
+
+    视图      每批 batch 张图像的原图和翻转图放在同一个列表里一次前向（同一 imgsz 的视图共用一次 predict），
+              尺度通过 imgsz 实现（图像本身不缩放，ultralytics 输出的坐标总是在原图像素坐标系中）
+    翻转映射  翻转视图的 x 取 W - x，关键点按 flip_idx 交换左右（如 left_eye <-> right_eye），
+              flip_idx 可由类别的关键点名称推出（flip_index_from_names）
+    融合      全部视图的检测按置信度从高到低贪心聚类：同类别且 max(OKS, IoU) 不低于 fuse_iou 的归为同一目标
+              （每个视图至多一个），框按目标置信度加权平均，每个关键点按关键点置信度加权平均；
+              融合后的目标置信度 = 各视图置信度之和 / 视图数（只在少数视图中出现的检测被降权），
+              低于 conf / 2 的丢弃
+
+predict() 逐张返回 ultralytics 的 Results 对象，与 model.predict(stream=True) 的结果可以互换使用
+（置信度旁路文件、可视化、合并模式都不需要改动）。每张图像的前向次数 = 尺度数，
+视图数 = 尺度数 x (2 if flip else 1)；images/seconds 累计实际耗时（summary()），便于与单次推理对比取舍。
+"""
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from label_diff import DEFAULT_KAPPA, similarity_matrix
+from work_queue import IMAGE_EXTS
+
+# 关键点名称中表示左右的写法，翻转时互换
+_SIDE_PATTERNS = [(r"left", "right"), (r"Left", "Right"), (r"LEFT", "RIGHT"), (r"左", "右"),
+                  (r"(?<![A-Za-z])l(?=[_\-\s]|$)", "r"), (r"(?<![A-Za-z])L(?=[_\-\s]|$)", "R")]
+
+
+def _swap_side(name):
+    for a, b in _SIDE_PATTERNS:
+        if re.search(a, name):
+            return re.sub(a, b, name)
+        if re.search(b, name):
+            return re.sub(b, a, name)
+    return name
+
+
+def flip_index_from_names(names):
+    """由关键点名称推出水平翻转后的关键点重排 flip_idx，如 [nose, left_eye, right_eye] -> [0, 2, 1]
+
+    名称中含 left/right、左/右、l_/r_ 等的按对互换，找不到对应名称的保持原位。
+    """
+    index = {n: i for i, n in enumerate(names)}
+    return [index.get(_swap_side(n), i) for i, n in enumerate(names)]
+
+
+def parse_flip_idx(text):
+    """命令行的 "1,0,3,2" -> [1, 0, 3, 2]"""
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def parse_scales(text):
+    """命令行的 "1.0,1.5" -> (1.0, 1.5)"""
+    return tuple(float(v) for v in text.split(",") if v.strip())
+
+
+def _to_numpy(tensor):
+    return tensor.cpu().numpy() if hasattr(tensor, "cpu") else np.asarray(tensor)
+
+
+def _empty_predictions(num_kps=0):
+    return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros((0, num_kps, 3))
+
+
+def view_predictions(result, flipped, width, flip_idx=None):
+    """单个视图的预测 -> (xyxy (n, 4), conf (n,), cls (n,), kps (n, K, 3))，坐标映射回原图（翻转视图已翻回）"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return _empty_predictions()
+    xyxy = _to_numpy(boxes.xyxy).astype(np.float64)
+    conf = _to_numpy(boxes.conf).astype(np.float64)
+    cls = _to_numpy(boxes.cls).astype(np.int64)
+    if result.keypoints is not None:
+        kps = _to_numpy(result.keypoints.data).astype(np.float64)
+        if kps.shape[2] == 2:
+            # 模型不输出关键点置信度时按全部可信处理
+            kps = np.concatenate([kps, np.ones(kps.shape[:2] + (1,))], axis=2)
+    else:
+        kps = np.zeros((len(conf), 0, 3))
+    if flipped:
+        xyxy = np.column_stack([width - xyxy[:, 2], xyxy[:, 1], width - xyxy[:, 0], xyxy[:, 3]])
+        kps = kps.copy()
+        kps[..., 0] = np.where(kps[..., 2] > 0, width - kps[..., 0], kps[..., 0])
+        if flip_idx is not None and kps.shape[1] == len(flip_idx):
+            kps = kps[:, flip_idx]
+    return xyxy, conf, cls, kps
+
+
+def fuse_views(views, num_views, width, height, fuse_iou=0.55, conf=0.25, kappa=DEFAULT_KAPPA):
+    """融合一张图像全部视图的预测，返回 (xyxy, conf, cls, kps)，格式同 view_predictions
+
+    views 为 [(xyxy, conf, cls, kps), ...]，每项来自一个视图。
+    """
+    views = [v for v in views if len(v[1])]
+    if not views:
+        return _empty_predictions()
+    num_kps = max(v[3].shape[1] for v in views)
+    xyxy = np.concatenate([v[0] for v in views])
+    scores = np.concatenate([v[1] for v in views])
+    cls = np.concatenate([v[2] for v in views])
+    kps = np.concatenate([np.pad(v[3], ((0, 0), (0, num_kps - v[3].shape[1]), (0, 0))) for v in views])
+    view_id = np.repeat(np.arange(len(views)), [len(v[1]) for v in views])
+
+    # 整张图像所有检测两两之间的相似度一次算出（归一化坐标）
+    scale = np.array([width, height, width, height], dtype=np.float64)
+    boxes_n = np.column_stack([(xyxy[:, :2] + xyxy[:, 2:]) / 2, xyxy[:, 2:] - xyxy[:, :2]]) / scale
+    kps_n = kps.copy()
+    kps_n[..., 0] /= width
+    kps_n[..., 1] /= height
+    kps_n[..., 2] = np.where(kps[..., 2] > 0, 2, 0)
+    sim = similarity_matrix(boxes_n, kps_n, boxes_n, kps_n, kappa)
+    sim[cls[:, None] != cls[None, :]] = -1.0
+
+    order = np.argsort(-scores, kind="stable")
+    assigned = np.zeros(len(scores), dtype=bool)
+    out_xyxy, out_conf, out_cls, out_kps = [], [], [], []
+    for i in order.tolist():
+        if assigned[i]:
+            continue
+        # 每个其他视图取与 i 最相似的一个未分配检测
+        cand = np.flatnonzero(~assigned & (sim[i] >= fuse_iou) & (view_id != view_id[i]))
+        members = [i]
+        if cand.size:
+            cand = cand[np.argsort(-sim[i, cand], kind="stable")]
+            _, first = np.unique(view_id[cand], return_index=True)
+            members.extend(cand[first].tolist())
+        members = np.array(members)
+        assigned[members] = True
+        w = scores[members]
+        fused = w.sum() / num_views
+        if fused < conf / 2:
+            continue
+        out_xyxy.append((xyxy[members] * w[:, None]).sum(axis=0) / w.sum())
+        kc = kps[members, :, 2]
+        kc_sum = kc.sum(axis=0)
+        xy = (kps[members, :, :2] * kc[..., None]).sum(axis=0) / np.maximum(kc_sum, 1e-12)[:, None]
+        out_kps.append(np.column_stack([np.where(kc_sum[:, None] > 0, xy, 0.0), kc_sum / num_views]))
+        out_conf.append(fused)
+        out_cls.append(cls[i])
+    if not out_conf:
+        return _empty_predictions(num_kps)
+    return np.array(out_xyxy), np.array(out_conf), np.array(out_cls, dtype=np.int64), np.array(out_kps)
+
+
+def make_result(orig_img, path, names, xyxy, conf, cls, kps):
+    """把融合结果包装成 ultralytics 的 Results（需要 torch，只在已安装 ultralytics 时调用）"""
+    import torch
+    from ultralytics.engine.results import Results
+
+    boxes = torch.from_numpy(np.column_stack([xyxy, conf, cls]).astype(np.float32).reshape(-1, 6))
+    keypoints = torch.from_numpy(kps.astype(np.float32)) if kps.shape[1] > 0 else None
+    return Results(orig_img, path=path, names=names, boxes=boxes, keypoints=keypoints)
+
+
+def _list_sources(source):
+    if isinstance(source, (list, tuple)):
+        return [str(p) for p in source]
+    if os.path.isdir(source):
+        return [os.path.join(source, n) for n in sorted(os.listdir(source)) if n.lower().endswith(IMAGE_EXTS)]
+    return [str(source)]
+
+
+def _model_imgsz(model, default=640):
+    """模型训练时的输入尺寸（ultralytics 的 model.overrides["imgsz"]），取不到时为 default"""
+    imgsz = (getattr(model, "overrides", None) or {}).get("imgsz")
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = max(imgsz) if imgsz else None
+    return int(imgsz) if imgsz else default
+
+
+class TTAPredictor:
+    """翻转 + 多尺度 TTA 推理
+
+        predictor = TTAPredictor(YOLO("best.pt"), scales=(1.0, 1.5), flip=True, flip_idx=[0, 2, 1])
+        for result in predictor.predict("images/"):
+            ...
+        print(predictor.summary())
+    """
+
+    def __init__(self, model, scales=(1.0, 1.5), flip=True, flip_idx=None, imgsz=None, batch=4, conf=0.25,
+                 fuse_iou=0.55, kappa=DEFAULT_KAPPA):
+        self.model = model
+        self.scales = tuple(scales) or (1.0,)
+        self.flip = flip
+        self.flip_idx = list(flip_idx) if flip_idx is not None else None
+        # 未指定时用模型训练时的尺寸（与不加 TTA 的 model.predict 一致）
+        self.imgsz = imgsz or _model_imgsz(model)
+        self.batch = max(1, batch)
+        self.conf = conf
+        self.fuse_iou = fuse_iou
+        self.kappa = kappa
+        self.images = 0
+        self.seconds = 0.0
+
+    @property
+    def num_views(self):
+        return len(self.scales) * (2 if self.flip else 1)
+
+    def _imgsz(self, scale):
+        # ultralytics 要求输入尺寸为 32 的倍数
+        return max(32, int(round(self.imgsz * scale / 32.0)) * 32)
+
+    def predict(self, source):
+        """逐张返回融合后的 Results；source 为图像目录、图像路径列表或单个路径"""
+        paths = _list_sources(source)
+        for start in range(0, len(paths), self.batch):
+            t0 = time.perf_counter()
+            batch_paths, images = [], []
+            for path in paths[start:start + self.batch]:
+                image = cv2.imread(path)
+                if image is not None:
+                    batch_paths.append(path)
+                    images.append(image)
+            if not images:
+                continue
+            views = []
+            for image in images:
+                views.append(image)
+                if self.flip:
+                    views.append(np.ascontiguousarray(image[:, ::-1]))
+            per_image = [[] for _ in images]
+            names = None
+            for scale in self.scales:
+                results = self.model.predict(source=views, imgsz=self._imgsz(scale), conf=self.conf, verbose=False)
+                names = results[0].names if results else names
+                for j, result in enumerate(results):
+                    i, flipped = (j // 2, j % 2 == 1) if self.flip else (j, False)
+                    per_image[i].append(view_predictions(result, flipped, images[i].shape[1], self.flip_idx))
+            fused = [fuse_views(v, self.num_views, img.shape[1], img.shape[0], self.fuse_iou, self.conf, self.kappa)
+                     for v, img in zip(per_image, images)]
+            self.seconds += time.perf_counter() - t0
+            self.images += len(images)
+            for path, image, (xyxy, conf, cls, kps) in zip(batch_paths, images, fused):
+                yield make_result(image, path, names, xyxy, conf, cls, kps)
+
+    def summary(self):
+        per_image = self.seconds / max(self.images, 1)
+        return (f"TTA: {len(self.scales)} 个尺度{' x 翻转' if self.flip else ''}（{self.num_views} 个视图/张），"
+                f"{self.images} 张，{per_image * 1e3:.0f} ms/张")
@@ -0,0 +1,186 @@
+"""
+自动标注可视化的流式写出器。
+
+原先 save_vis=True 时由 ultralytics 在原分辨率上绘制并保存每张图，之后再 glob 一遍移动文件，
+可视化输出往往比推理本身更耗时、更占盘。这里改为:
+    - 推理线程只把原图缩小到 max_side 以内（INTER_AREA），队列中只存缩略图，内存有上界；
+    - 后台线程池在缩略图上绘制框和关键点、JPEG 编码并写盘；
+    - 队列有界（queue_size），写盘跟不上时推理线程阻塞等待，而不是无限堆积；
+    - 拼图模式（sheet_size > 0）把多张缩略图拼成一张总览图，便于人工快速浏览，
+      同时写出 sheets.txt 记录每张总览图包含的原图文件名。
+"""
+import math
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+# 与 main.py 中标注颜色保持一致（BGR）
+CLASS_COLORS = [(0, 255, 0), (0, 0, 255), (255, 0, 0), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+_CAPTION_HEIGHT = 18
+
+
+def _to_numpy(tensor):
+    return tensor.cpu().numpy() if hasattr(tensor, "cpu") else np.asarray(tensor)
+
+
+def make_thumbnail(image, max_side):
+    """把图像等比缩小到最长边不超过 max_side，返回 (缩略图, 缩放比例)"""
+    h, w = image.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))),
+                           interpolation=cv2.INTER_AREA)
+    return image, scale
+
+
+def draw_predictions(thumb, boxes, classes, confs, keypoints):
+    """在缩略图上绘制框、类别/置信度和关键点（坐标已按缩略图缩放）"""
+    for i in range(len(classes)):
+        color = CLASS_COLORS[int(classes[i]) % len(CLASS_COLORS)]
+        x1, y1, x2, y2 = (int(round(v)) for v in boxes[i])
+        cv2.rectangle(thumb, (x1, y1), (x2, y2), color, 1, cv2.LINE_AA)
+        cv2.putText(thumb, f"{int(classes[i])} {confs[i]:.2f}", (x1, max(10, y1 - 3)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1, cv2.LINE_AA)
+        if keypoints is not None:
+            for k, (x, y) in enumerate(keypoints[i]):
+                if x == 0 and y == 0:
+                    continue
+                cv2.circle(thumb, (int(round(x)), int(round(y))), 2, color, -1, cv2.LINE_AA)
+                cv2.putText(thumb, str(k), (int(round(x)) + 3, int(round(y)) - 3),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1, cv2.LINE_AA)
+    return thumb
+
+
+class VisWriter:
+    """有界队列 + 后台线程池的可视化写出器
+
+    用法:
+        with VisWriter(vis_dir, max_side=640, jpeg_quality=80, sheet_size=0) as vis:
+            for result in model.predict(..., stream=True):
+                vis.submit_result(result)
+        print(vis.written)
+    """
+
+    def __init__(self, out_dir, max_side=640, jpeg_quality=80, sheet_size=0, workers=2, queue_size=32):
+        self.out_dir = str(out_dir)
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self.sheet_size = sheet_size
+        self.written = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._pending_tiles = []
+        self._sheet_index = []
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max(1, workers))]
+        os.makedirs(self.out_dir, exist_ok=True)
+        for t in self._threads:
+            t.start()
+
+    # ---------- 生产者（推理线程） ----------
+    def submit(self, name, image, boxes, classes, confs, keypoints=None):
+        """提交一张图像；image 为原分辨率 BGR，boxes 为 xyxy 像素坐标，keypoints 为 (N,K,2) 像素坐标"""
+        thumb, scale = make_thumbnail(image, self.max_side)
+        if thumb is image:
+            thumb = image.copy()
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale
+        if keypoints is not None:
+            keypoints = np.asarray(keypoints, dtype=np.float32)[..., :2] * scale
+        item = (name, thumb, boxes, np.asarray(classes).reshape(-1), np.asarray(confs).reshape(-1), keypoints)
+
+        if self.sheet_size > 0:
+            self._pending_tiles.append(item)
+            if len(self._pending_tiles) >= self.sheet_size:
+                self._flush_sheet()
+        else:
+            self._queue.put(("single", item))
+
+    def submit_result(self, result):
+        """直接提交一个 ultralytics 预测结果"""
+        boxes = result.boxes
+        if boxes is not None and len(boxes):
+            xyxy, classes, confs = _to_numpy(boxes.xyxy), _to_numpy(boxes.cls), _to_numpy(boxes.conf)
+            keypoints = _to_numpy(result.keypoints.xy) if result.keypoints is not None else None
+        else:
+            xyxy, classes, confs, keypoints = np.zeros((0, 4)), np.zeros(0), np.zeros(0), None
+        self.submit(os.path.basename(result.path), result.orig_img, xyxy, classes, confs, keypoints)
+
+    def _flush_sheet(self):
+        if not self._pending_tiles:
+            return
+        sheet_no = len(self._sheet_index) + 1
+        tiles, self._pending_tiles = self._pending_tiles, []
+        self._sheet_index.append((f"sheet_{sheet_no:06d}.jpg", [t[0] for t in tiles]))
+        self._queue.put(("sheet", (sheet_no, tiles)))
+
+    def close(self):
+        """写出剩余拼图、等待后台线程写完；返回写出的文件数"""
+        if self.sheet_size > 0:
+            self._flush_sheet()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        if self._sheet_index:
+            with open(os.path.join(self.out_dir, "sheets.txt"), "w", encoding="utf-8") as f:
+                for sheet_name, names in self._sheet_index:
+                    f.write(f"{sheet_name}\t{' '.join(names)}\n")
+        return self.written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ---------- 消费者（后台线程） ----------
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            kind, payload = job
+            try:
+                if kind == "single":
+                    name, thumb, boxes, classes, confs, keypoints = payload
+                    draw_predictions(thumb, boxes, classes, confs, keypoints)
+                    out_name = os.path.splitext(name)[0] + ".jpg"
+                    self._write(out_name, thumb)
+                else:
+                    sheet_no, tiles = payload
+                    self._write(f"sheet_{sheet_no:06d}.jpg", self._compose_sheet(tiles))
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"写出可视化图像时出错: {str(e)}")
+
+    def _compose_sheet(self, tiles):
+        """把若干缩略图按网格拼成一张总览图，每格顶部标注文件名"""
+        cols = int(math.ceil(math.sqrt(len(tiles))))
+        rows = int(math.ceil(len(tiles) / cols))
+        cell_h = self.max_side + _CAPTION_HEIGHT
+        sheet = np.full((rows * cell_h, cols * self.max_side, 3), 32, dtype=np.uint8)
+        for idx, (name, thumb, boxes, classes, confs, keypoints) in enumerate(tiles):
+            draw_predictions(thumb, boxes, classes, confs, keypoints)
+            if thumb.ndim == 2:
+                thumb = cv2.cvtColor(thumb, cv2.COLOR_GRAY2BGR)
+            r, c = divmod(idx, cols)
+            y0, x0 = r * cell_h, c * self.max_side
+            h, w = thumb.shape[:2]
+            sheet[y0 + _CAPTION_HEIGHT:y0 + _CAPTION_HEIGHT + h, x0:x0 + w] = thumb[:, :, :3]
+            cv2.putText(sheet, f"{name} ({len(classes)})", (x0 + 3, y0 + 13),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA)
+        return sheet
+
+    def _write(self, out_name, image):
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)])
+        if not ok:
+            raise RuntimeError(f"JPEG 编码失败: {out_name}")
+        with open(os.path.join(self.out_dir, out_name), "wb") as f:
+            f.write(buf.tobytes())
+        with self._lock:
+            self.written += 1
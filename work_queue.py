@@ -0,0 +1,172 @@
+"""
+基于共享文件系统的分块任务队列，用于多节点分布式自动标注。
+
+队列目录结构:
+    queue_dir/
+        pending/   chunk_000001.json              待领取的图像块
+        claimed/   chunk_000001.json@<worker_id>  已被某个 worker 领取（文件 mtime 即心跳）
+        done/      chunk_000001.json              已完成
+        meta.json                                 队列元信息（源目录、块数等）
+
+所有状态迁移都通过 os.rename 完成，rename 在 POSIX 本地文件系统和 NFS 上都是原子的，
+因此多个节点同时领取同一块时只有一个能成功，不需要任何外部服务。
+"""
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
+
+
+def atomic_write_text(path, text):
+    """原子写入文本文件：先写同目录下的临时文件再 os.replace，读者永远看不到写了一半的文件"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def default_worker_id():
+    """默认 worker 标识：主机名-进程号（不含 @，便于拼接到领取文件名中）"""
+    return f"{socket.gethostname()}-{os.getpid()}".replace("@", "_")
+
+
+class ChunkQueue:
+    """共享目录上的图像分块队列"""
+
+    def __init__(self, queue_dir, stale_timeout=60.0):
+        self.queue_dir = Path(queue_dir)
+        self.pending_dir = self.queue_dir / "pending"
+        self.claimed_dir = self.queue_dir / "claimed"
+        self.done_dir = self.queue_dir / "done"
+        self.meta_path = self.queue_dir / "meta.json"
+        self.stale_timeout = stale_timeout
+
+    # ---------- 协调者 ----------
+    def create(self, source_dir, chunk_size=64, skip_done_labels_dir=None, exclude_names=None):
+        """扫描源目录并把图像切成若干块写入 pending/，返回块数
+
+        skip_done_labels_dir: 若提供，则跳过该目录下已有标签的图像（用于断点续跑）
+        exclude_names: 若提供，则跳过这些文件名的图像（例如近重复帧）
+        """
+        for d in (self.pending_dir, self.claimed_dir, self.done_dir):
+            d.mkdir(parents=True, exist_ok=True)
+
+        done_stems = set()
+        if skip_done_labels_dir and os.path.isdir(skip_done_labels_dir):
+            done_stems = {os.path.splitext(n)[0] for n in os.listdir(skip_done_labels_dir) if n.endswith(".txt")}
+
+        source_dir = os.path.abspath(source_dir)
+        images = sorted(
+            n for n in os.listdir(source_dir)
+            if n.lower().endswith(IMAGE_EXTS) and os.path.splitext(n)[0] not in done_stems
+        )
+        if exclude_names:
+            images = [n for n in images if n not in exclude_names]
+
+        num_chunks = 0
+        for start in range(0, len(images), chunk_size):
+            num_chunks += 1
+            chunk_name = f"chunk_{num_chunks:06d}.json"
+            payload = {"source_dir": source_dir, "images": images[start:start + chunk_size]}
+            atomic_write_text(self.pending_dir / chunk_name, json.dumps(payload, ensure_ascii=False))
+
+        meta = {"source_dir": source_dir, "num_chunks": num_chunks, "num_images": len(images),
+                "chunk_size": chunk_size, "created": time.time()}
+        atomic_write_text(self.meta_path, json.dumps(meta, ensure_ascii=False))
+        return num_chunks
+
+    def reclaim_stale(self):
+        """把心跳超时的已领取块放回 pending/，返回回收的块数（任何节点都可以调用）"""
+        reclaimed = 0
+        now = time.time()
+        for entry in os.scandir(self.claimed_dir):
+            try:
+                if now - entry.stat().st_mtime <= self.stale_timeout:
+                    continue
+                chunk_name = entry.name.split("@", 1)[0]
+                os.rename(entry.path, self.pending_dir / chunk_name)
+                reclaimed += 1
+            except FileNotFoundError:
+                # 已被 worker 完成或被其他节点回收
+                continue
+        return reclaimed
+
+    def counts(self):
+        """返回 (pending, claimed, done) 块数"""
+        return tuple(len(os.listdir(d)) for d in (self.pending_dir, self.claimed_dir, self.done_dir))
+
+    def num_chunks(self):
+        with open(self.meta_path, "r") as f:
+            return json.load(f)["num_chunks"]
+
+    def is_finished(self):
+        """以 done/ 中的块数为准判断是否全部完成（逐个目录 listdir 不是原子快照，不能用 pending+claimed==0）"""
+        return len(os.listdir(self.done_dir)) >= self.num_chunks()
+
+    # ---------- worker ----------
+    def claim(self, worker_id):
+        """领取一个待处理块，返回 (claimed_path, payload)；当前没有可领取的块时返回 None"""
+        for name in sorted(os.listdir(self.pending_dir)):
+            if name.startswith("."):
+                continue
+            pending_path = self.pending_dir / name
+            claimed_path = self.claimed_dir / f"{name}@{worker_id}"
+            try:
+                # rename 保留原 mtime：先刷新再改名，领取文件一出现就是新的心跳，不会立即被其他节点判为超时回收
+                os.utime(pending_path)
+                os.rename(pending_path, claimed_path)
+                os.utime(claimed_path)
+                with open(claimed_path, "r") as f:
+                    return claimed_path, json.load(f)
+            except FileNotFoundError:
+                # 被其他 worker 抢先领取，或领取后（如本进程停顿超过 stale_timeout）已被回收，视为没有领到
+                continue
+        return None
+
+    def heartbeat(self, claimed_path):
+        """刷新领取文件的 mtime；若块已被回收则返回 False"""
+        try:
+            os.utime(claimed_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, claimed_path):
+        """标记块已完成；若块在处理期间已被回收（心跳丢失）也不报错，结果写入是幂等的"""
+        chunk_name = Path(claimed_path).name.split("@", 1)[0]
+        try:
+            os.rename(claimed_path, self.done_dir / chunk_name)
+        except FileNotFoundError:
+            pass
+
+
+class Heartbeat:
+    """后台线程定期刷新领取文件的心跳，用 with 语句包住单个块的处理过程"""
+
+    def __init__(self, queue, claimed_path, interval=10.0):
+        self.queue = queue
+        self.claimed_path = claimed_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.queue.heartbeat(self.claimed_path):
+                break
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False